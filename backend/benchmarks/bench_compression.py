@@ -0,0 +1,161 @@
+"""
+Benchmark compression before encryption on a recorded conversation corpus.
+
+A corpus is a JSONL file with one stored message per line, as returned by
+``RedisStorage.get_messages``. Record one from a running deployment with:
+
+    python benchmarks/bench_compression.py --record USER_ID CONVERSATION_ID corpus.jsonl
+
+and benchmark one or more corpora with:
+
+    python benchmarks/bench_compression.py corpus.jsonl [more.jsonl ...]
+
+For every payload this reports the stored size with and without compression
+and the CPU time spent in encrypt/decrypt, per size bucket.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from agents.storage.encryption_service import EncryptionService
+
+BUCKETS = [(0, 1024), (1024, 16 * 1024), (16 * 1024, 256 * 1024), (256 * 1024, None)]
+
+
+def _bucket_name(low: int, high) -> str:
+    return f"{low // 1024}KB+" if high is None else f"{low // 1024}-{high // 1024}KB"
+
+
+def _bucket_for(size: int) -> str:
+    for low, high in BUCKETS:
+        if size >= low and (high is None or size < high):
+            return _bucket_name(low, high)
+    return _bucket_name(*BUCKETS[-1])
+
+
+def load_corpus(paths: List[str]) -> List[str]:
+    payloads = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    # Re-serialise the way the storage layer does
+                    payloads.append(json.dumps(json.loads(line)))
+    return payloads
+
+
+def _run(service: EncryptionService, payloads: List[str], user_id: str) -> Dict:
+    results = defaultdict(lambda: {"count": 0, "raw": 0, "stored": 0, "enc_s": 0.0, "dec_s": 0.0})
+    for payload in payloads:
+        bucket = results[_bucket_for(len(payload))]
+
+        start = time.perf_counter()
+        stored = service.encrypt(payload, user_id)
+        bucket["enc_s"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        service.decrypt(stored, user_id)
+        bucket["dec_s"] += time.perf_counter() - start
+
+        bucket["count"] += 1
+        bucket["raw"] += len(payload)
+        bucket["stored"] += len(stored)
+    return results
+
+
+def benchmark(payloads: List[str]) -> None:
+    user_id = "benchmark-user"
+
+    baseline = EncryptionService()
+    baseline.compression_enabled = False
+    compressed = EncryptionService()
+    compressed.compression_enabled = True
+
+    # Warm the per-user key derivation so it does not skew the first bucket
+    baseline.encrypt("warmup", user_id)
+    compressed.encrypt("warmup", user_id)
+
+    before = _run(baseline, payloads, user_id)
+    after = _run(compressed, payloads, user_id)
+
+    print(
+        f"{'bucket':<12}{'count':>8}{'raw':>12}{'stored':>12}{'compressed':>12}"
+        f"{'saved':>8}{'enc us':>10}{'enc+z us':>10}{'dec us':>10}{'dec+z us':>10}"
+    )
+    totals = defaultdict(float)
+    for low, high in BUCKETS:
+        name = _bucket_name(low, high)
+        if name not in before:
+            continue
+        b, a = before[name], after[name]
+        saved = 1 - a["stored"] / b["stored"] if b["stored"] else 0
+        print(
+            f"{name:<12}{b['count']:>8}{b['raw']:>12}{b['stored']:>12}{a['stored']:>12}"
+            f"{saved:>8.1%}"
+            f"{b['enc_s'] / b['count'] * 1e6:>10.1f}{a['enc_s'] / a['count'] * 1e6:>10.1f}"
+            f"{b['dec_s'] / b['count'] * 1e6:>10.1f}{a['dec_s'] / a['count'] * 1e6:>10.1f}"
+        )
+        for key in ("raw", "enc_s", "dec_s"):
+            totals[f"before_{key}"] += b[key]
+            totals[f"after_{key}"] += a[key]
+        totals["before_stored"] += b["stored"]
+        totals["after_stored"] += a["stored"]
+
+    if totals["before_stored"]:
+        print()
+        print(f"payloads:        {len(payloads)}")
+        print(f"raw bytes:       {int(totals['before_raw'])}")
+        print(f"stored before:   {int(totals['before_stored'])}")
+        print(f"stored after:    {int(totals['after_stored'])}")
+        print(
+            f"bytes saved:     {int(totals['before_stored'] - totals['after_stored'])} "
+            f"({1 - totals['after_stored'] / totals['before_stored']:.1%})"
+        )
+        print(
+            f"extra CPU:       encrypt {(totals['after_enc_s'] - totals['before_enc_s']) * 1000:.1f} ms, "
+            f"decrypt {(totals['after_dec_s'] - totals['before_dec_s']) * 1000:.1f} ms"
+        )
+
+
+async def record(user_id: str, conversation_id: str, output: str) -> None:
+    from agents.storage.global_services import get_secure_redis_client
+    from agents.storage.redis_storage import RedisStorage
+
+    storage = RedisStorage(get_secure_redis_client())
+    messages = await storage.get_messages(user_id, conversation_id)
+    with open(output, "w") as f:
+        for message in messages:
+            f.write(json.dumps(message) + "\n")
+    print(f"Recorded {len(messages)} messages to {output}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("corpus", nargs="*", help="JSONL corpus files")
+    parser.add_argument(
+        "--record",
+        nargs=3,
+        metavar=("USER_ID", "CONVERSATION_ID", "OUTPUT"),
+        help="Record a conversation from Redis into a corpus file",
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(*args.record))
+        return
+
+    if not args.corpus:
+        parser.error("at least one corpus file is required")
+
+    os.environ.setdefault("REDIS_MASTER_SALT", "benchmark-salt")
+    benchmark(load_corpus(args.corpus))
+
+
+if __name__ == "__main__":
+    main()
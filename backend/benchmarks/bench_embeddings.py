@@ -0,0 +1,142 @@
+"""
+Benchmark the shared, micro-batched embedding service.
+
+Throughput: CLIENTS concurrent coroutines each embed QUERIES short queries,
+once with one model call per query on a thread (the unbatched baseline)
+and once through ``EmbeddingService``:
+
+    python benchmarks/bench_embeddings.py throughput --clients 32 --queries 20
+
+Memory: resident set size after loading the model once per API key, as the
+per-key vector store cache used to, versus once for the shared service:
+
+    python benchmarks/bench_embeddings.py memory --keys 4
+
+``--fake`` swaps the sentence-transformers model for a synthetic one with a
+fixed per-call overhead and a per-text cost, for machines without the model.
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import time
+from typing import Callable, List
+
+import numpy as np
+from agents.rag.embeddings import EmbeddingService, _load_huggingface_model
+from langchain_core.embeddings import Embeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """Synthetic encoder: one weight matrix, a fixed cost per forward pass."""
+
+    def __init__(self, dim: int = 384, vocab: int = 30522, call_ms: float = 4.0, text_ms: float = 0.2):
+        self.weights = np.random.default_rng(0).standard_normal((vocab, dim), dtype=np.float32)
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # sleep releases the GIL like the torch forward pass does
+        time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        rows = [self.weights[hash(text) % len(self.weights)] for text in texts]
+        return [row.tolist() for row in rows]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _rss_mb() -> float:
+    with open(f"/proc/{os.getpid()}/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _queries(count: int) -> List[str]:
+    return [f"what does section {i} of the uploaded report say about revenue?" for i in range(count)]
+
+
+async def _drive(embed: Callable, clients: int, queries: int) -> dict:
+    latencies: List[float] = []
+
+    async def client(client_id: int) -> None:
+        for query in _queries(queries):
+            start = time.perf_counter()
+            await embed(f"{client_id}: {query}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "qps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+async def throughput(args: argparse.Namespace) -> None:
+    factory = FakeEmbeddings if args.fake else _load_huggingface_model
+    model = factory()
+    model.embed_query("warmup")
+
+    async def unbatched(text: str):
+        return await asyncio.to_thread(model.embed_query, text)
+
+    service = EmbeddingService(
+        model_factory=lambda: model,
+        max_batch_size=args.batch_size,
+        batch_wait_ms=args.wait_ms,
+        worker_threads=args.threads,
+    )
+
+    print(f"{'mode':<12}{'queries/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, embed in (("unbatched", unbatched), ("batched", service.aembed_query)):
+        result = await _drive(embed, args.clients, args.queries)
+        print(f"{name:<12}{result['qps']:>12.1f}{result['p50']:>10.2f}{result['p95']:>10.2f}")
+    await service.aclose()
+
+
+def memory(args: argparse.Namespace) -> None:
+    factory = FakeEmbeddings if args.fake else _load_huggingface_model
+
+    gc.collect()
+    baseline = _rss_mb()
+    per_key = [factory() for _ in range(args.keys)]
+    for model in per_key:
+        model.embed_query("warmup")
+    per_key_mb = _rss_mb() - baseline
+    del per_key, model
+    gc.collect()
+
+    baseline = _rss_mb()
+    service = EmbeddingService(model_factory=factory)
+    service.embed_query("warmup")
+    shared_mb = _rss_mb() - baseline
+
+    print(f"models per API key ({args.keys} keys): {per_key_mb:8.1f} MB")
+    print(f"shared service:                {shared_mb:8.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("mode", choices=["throughput", "memory"])
+    parser.add_argument("--fake", action="store_true", help="Use a synthetic model")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=20, help="Queries per client")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--wait-ms", type=float, default=5.0)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--keys", type=int, default=4, help="Distinct API keys (memory)")
+    args = parser.parse_args()
+
+    if args.mode == "throughput":
+        asyncio.run(throughput(args))
+    else:
+        memory(args)
+
+
+if __name__ == "__main__":
+    main()
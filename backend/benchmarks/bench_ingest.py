@@ -0,0 +1,340 @@
+"""
+Benchmark the staged ingestion pipeline on a large PDF.
+
+Each stage runs on its own over the whole document, first the way ingestion
+used to do it and then the way the pipeline does, and reports pages/sec;
+finally the whole document is ingested end to end both ways, also reporting
+the longest event loop stall:
+
+    python benchmarks/bench_ingest.py --pages 500 --fake
+
+Without ``--pdf`` a synthetic text PDF with ``--pages`` pages is generated.
+``--fake`` uses the synthetic embedding model from ``bench_embeddings``.
+With ``--redis-url`` (Redis Stack) chunks are written to a throwaway
+``bench-ingest`` index; otherwise the write stage is skipped and chunks go
+to an in-memory vector store. ``--char-splitter`` swaps the token splitter
+for a character splitter of similar chunk size, for machines without the
+tiktoken vocabulary.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from agents.rag import ingest
+from agents.rag.embeddings import EmbeddingService, _load_huggingface_model
+from agents.rag.parsing import MIMETYPE_BASED_PARSER
+from bench_embeddings import FakeEmbeddings
+from langchain_community.document_loaders import Blob
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TokenTextSplitter
+
+USER_ID = "bench-user"
+DOCUMENT_ID = "bench-document"
+
+WORDS = (
+    "revenue margin quarter growth customer segment forecast operating cash "
+    "flow guidance inventory supply demand pricing contract renewal region "
+    "headcount capital expenditure depreciation liquidity covenant dividend"
+).split()
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 45) -> None:
+    """Write a plain text PDF, roughly a page of prose per page."""
+    rng = random.Random(0)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        lines = [
+            " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)
+        ]
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(
+            f"({_escape_pdf_text(f'{page + 1}.{n} {line}')}) '"
+            for n, line in enumerate(lines)
+        ) + " ET"
+        content = stream.encode("latin-1")
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids),
+        pages,
+    )
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(objects) + 1, xref)
+        )
+
+
+async def legacy_ingest(blob, splitter, vectorstore, batch_size: int = 100) -> List[str]:
+    """Ingestion before the pipeline: parse on the loop, then split/embed in turn."""
+    docs_to_index, ids = [], []
+    for document in MIMETYPE_BASED_PARSER.lazy_parse(blob):
+        docs = await asyncio.to_thread(splitter.split_documents, [document])
+        for doc in docs:
+            doc.page_content = ingest.clean_page_text(doc.page_content)
+            ingest._update_document_metadata(doc, USER_ID, DOCUMENT_ID)
+            ingest._clean_text(doc)
+            if doc.page_content:
+                docs_to_index.append(doc)
+        if len(docs_to_index) >= batch_size:
+            ids.extend(await vectorstore.aadd_documents(docs_to_index))
+            docs_to_index = []
+    if docs_to_index:
+        ids.extend(await vectorstore.aadd_documents(docs_to_index))
+    return ids
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+
+async def _max_loop_stall(coro) -> Tuple[float, float]:
+    """Run ``coro``; return its duration and the longest event loop stall."""
+    stall = 0.0
+    done = asyncio.Event()
+
+    async def probe():
+        nonlocal stall
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stall = max(stall, time.perf_counter() - start - 0.01)
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    _, elapsed = await _timed(coro)
+    done.set()
+    await prober
+    return elapsed, stall
+
+
+async def bench_parse(blob):
+    async def sequential():
+        return list(await asyncio.to_thread(MIMETYPE_BASED_PARSER.parse, blob))
+
+    async def pooled():
+        pages = []
+        async for group in ingest.parse_pages(blob, MIMETYPE_BASED_PARSER):
+            pages.extend(group)
+        return pages
+
+    # Start the parse processes outside the measurement
+    await pooled()
+    _, before = await _timed(sequential())
+    pages, after = await _timed(pooled())
+    return pages, before, after
+
+
+async def bench_split(pages: List[Document], splitter):
+    groups = [
+        pages[i : i + ingest.PAGES_PER_PARSE_TASK]
+        for i in range(0, len(pages), ingest.PAGES_PER_PARSE_TASK)
+    ]
+
+    async def sequential():
+        chunks = []
+        for group in groups:
+            chunks.extend(
+                await asyncio.to_thread(
+                    ingest.split_pages, group, splitter, USER_ID, DOCUMENT_ID
+                )
+            )
+        return chunks
+
+    async def threaded():
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(
+                ingest._get_split_pool(),
+                ingest.split_pages,
+                group,
+                splitter,
+                USER_ID,
+                DOCUMENT_ID,
+            )
+            for group in groups
+        ]
+        return [chunk for chunks in await asyncio.gather(*futures) for chunk in chunks]
+
+    _, before = await _timed(sequential())
+    chunks, after = await _timed(threaded())
+    return chunks, before, after
+
+
+async def bench_embed(chunks: List[Document], service: EmbeddingService, batch_size: int):
+    batches = [
+        [doc.page_content for doc in chunks[i : i + batch_size]]
+        for i in range(0, len(chunks), batch_size)
+    ]
+
+    async def sequential():
+        vectors = []
+        for batch in batches:
+            vectors.extend(await asyncio.to_thread(service.embed_documents, batch))
+        return vectors
+
+    async def concurrent():
+        vectors, pending = [], deque()
+        for batch in batches:
+            pending.append(asyncio.ensure_future(service.aembed_documents(batch)))
+            if len(pending) >= ingest.EMBED_CONCURRENCY:
+                vectors.extend(await pending.popleft())
+        while pending:
+            vectors.extend(await pending.popleft())
+        return vectors
+
+    _, before = await _timed(sequential())
+    vectors, after = await _timed(concurrent())
+    return vectors, before, after
+
+
+def _redis_vectorstore(url: str, service: EmbeddingService):
+    from langchain_redis import RedisVectorStore
+    from redis import Redis
+
+    return RedisVectorStore(
+        embeddings=service,
+        index_name="bench-ingest",
+        metadata_schema=[
+            {"name": "user_id", "type": "tag"},
+            {"name": "document_id", "type": "tag"},
+        ],
+        redis_client=Redis.from_url(url),
+    )
+
+
+async def bench_write(vectorstore, chunks, vectors, batch_size: int):
+    def pipelined():
+        for i in range(0, len(chunks), batch_size):
+            ingest.write_redis_chunks(
+                vectorstore, chunks[i : i + batch_size], vectors[i : i + batch_size]
+            )
+
+    _, elapsed = await _timed(asyncio.to_thread(pipelined))
+    return elapsed
+
+
+def _row(stage: str, pages: int, before: Optional[float], after: float) -> None:
+    if before is None:
+        # Writes used to be interleaved with embedding; no standalone baseline
+        print(f"{stage:<12}{'-':>14}{pages / after:>14.1f}{'-':>11}")
+        return
+    print(
+        f"{stage:<12}{pages / before:>14.1f}{pages / after:>14.1f}"
+        f"{before / after:>10.2f}x"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    if args.char_splitter:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=500)
+    else:
+        splitter = TokenTextSplitter(chunk_size=512, chunk_overlap=128)
+    model = FakeEmbeddings() if args.fake else _load_huggingface_model()
+    service = EmbeddingService(model_factory=lambda: model)
+    service.embed_query("warmup")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if path is None:
+            path = os.path.join(tmp, "bench.pdf")
+            make_pdf(path, args.pages)
+        with open(path, "rb") as f:
+            blob = Blob.from_data(f.read(), path=path, mime_type="application/pdf")
+
+        pages, parse_before, parse_after = await bench_parse(blob)
+        page_count = len(pages)
+        chunks, split_before, split_after = await bench_split(pages, splitter)
+        vectors, embed_before, embed_after = await bench_embed(
+            chunks, service, args.batch_size
+        )
+        print(
+            f"{page_count} pages, {len(chunks)} chunks, "
+            f"{ingest.PARSE_PROCESSES} parse processes, {os.cpu_count()} CPUs\n"
+        )
+        print(f"{'stage':<12}{'before p/s':>14}{'after p/s':>14}{'speedup':>11}")
+        _row("parse", page_count, parse_before, parse_after)
+        _row("split", page_count, split_before, split_after)
+        _row("embed", page_count, embed_before, embed_after)
+
+        if args.redis_url:
+            vectorstore = _redis_vectorstore(args.redis_url, service)
+            write_after = await bench_write(vectorstore, chunks, vectors, args.batch_size)
+            _row("write", page_count, None, write_after)
+        else:
+            vectorstore = InMemoryVectorStore(service)
+
+        total_before, stall_before = await _max_loop_stall(
+            legacy_ingest(blob, splitter, vectorstore)
+        )
+        total_after, stall_after = await _max_loop_stall(
+            ingest.ingest_blob(
+                blob,
+                MIMETYPE_BASED_PARSER,
+                splitter,
+                vectorstore,
+                USER_ID,
+                DOCUMENT_ID,
+                batch_size=args.batch_size,
+            )
+        )
+        _row("end to end", page_count, total_before, total_after)
+        print(
+            f"\nlongest event loop stall: {stall_before * 1000:.0f} ms before, "
+            f"{stall_after * 1000:.0f} ms after"
+        )
+
+        if args.redis_url:
+            vectorstore._index.delete(drop=True)
+
+    await service.aclose()
+    ingest.shutdown_ingest_pools()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pdf", help="PDF to ingest instead of a generated one")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--fake", action="store_true", help="Use a synthetic model")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--redis-url", default=os.getenv("BENCH_REDIS_URL"))
+    parser.add_argument("--char-splitter", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
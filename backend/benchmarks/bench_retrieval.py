@@ -0,0 +1,237 @@
+"""
+Benchmark retrieval latency and recall against either vector backend.
+
+A synthetic corpus of topical documents is loaded into the backend, then
+QUERIES queries of a few words from random chunks run through the
+retriever the retrieval tool uses, CONCURRENCY at a time, each filtered to
+a random set of the user's documents as in a conversation. Reports latency
+percentiles, queries per second and recall@k of the returned chunks
+against an exact float64 cosine search over the same chunks (hybrid search
+reranks the k nearest chunks, so this measures the vector search):
+
+    python benchmarks/bench_retrieval.py --backend memory
+    python benchmarks/bench_retrieval.py --backend redis --redis-url redis://localhost:6379
+
+The Redis backend needs Redis Stack and writes to ``rag-index``; use a
+scratch database. Queries are embedded by a bag-of-words model, so the
+numbers measure the search, not the embedding model.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from agents.rag import ingest
+from agents.rag.embeddings import EmbeddingService, set_embedding_service
+from agents.rag.vector_backends import (
+    MemoryVectorBackend,
+    RedisVectorBackend,
+    VectorBackend,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+USER_ID = "bench-retrieval-user"
+
+
+class BagOfWordsEmbeddings(Embeddings):
+    """Sum of a fixed random vector per word: similar words, similar vectors."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._words: Dict[str, np.ndarray] = {}
+
+    def _word(self, word: str) -> np.ndarray:
+        if word not in self._words:
+            seed = int.from_bytes(hashlib.sha256(word.encode()).digest()[:8], "little")
+            self._words[word] = np.random.default_rng(seed).standard_normal(
+                self.dim, dtype=np.float32
+            )
+        return self._words[word]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.sum([self._word(word) for word in text.lower().split()], axis=0)
+        return (vector / (np.linalg.norm(vector) or 1)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def make_corpus(
+    documents: int, chunks_per_document: int, seed: int = 0
+) -> List[Document]:
+    """Chunks mixing a document's topic words with a shared vocabulary."""
+    rng = random.Random(seed)
+    common = [f"word{i}" for i in range(2000)]
+    chunks = []
+    for document in range(documents):
+        topic = [f"topic{document}term{i}" for i in range(40)]
+        for chunk in range(chunks_per_document):
+            words = rng.choices(topic, k=40) + rng.choices(common, k=200)
+            rng.shuffle(words)
+            chunks.append(
+                Document(
+                    page_content=f"chunk{document}x{chunk} " + " ".join(words),
+                    metadata={"user_id": USER_ID, "document_id": f"doc-{document}"},
+                )
+            )
+    return chunks
+
+
+def make_queries(
+    chunks: List[Document], count: int, documents: int, per_query: int, seed: int = 1
+) -> List[Tuple[str, Tuple[str, ...]]]:
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        chunk = rng.choice(chunks)
+        others = rng.sample(range(documents), min(per_query, documents))
+        document_ids = {chunk.metadata["document_id"]} | {f"doc-{i}" for i in others}
+        words = chunk.page_content.split()[1:]
+        queries.append((" ".join(rng.sample(words, 8)), tuple(sorted(document_ids))))
+    return queries
+
+
+def exact_top_k(
+    chunks: List[Document],
+    vectors: np.ndarray,
+    model: Embeddings,
+    query: str,
+    document_ids: Tuple[str, ...],
+    k: int,
+) -> List[str]:
+    rows = [
+        i for i, chunk in enumerate(chunks) if chunk.metadata["document_id"] in document_ids
+    ]
+    similarities = vectors[rows] @ np.asarray(model.embed_query(query), dtype=np.float64)
+    top = np.argsort(-similarities, kind="stable")[:k]
+    return [chunks[rows[i]].page_content for i in top]
+
+
+async def load(backend: VectorBackend, store, chunks, vectors: np.ndarray) -> List[str]:
+    if isinstance(backend, MemoryVectorBackend):
+        return store.add_embeddings(
+            [chunk.page_content for chunk in chunks],
+            vectors,
+            [chunk.metadata for chunk in chunks],
+        )
+    ids = []
+    for i in range(0, len(chunks), 500):
+        ids.extend(
+            await asyncio.to_thread(
+                ingest.write_redis_chunks,
+                store,
+                chunks[i : i + 500],
+                vectors[i : i + 500].tolist(),
+            )
+        )
+    return ids
+
+
+async def run_queries(
+    backend: VectorBackend, store, queries, k: int, concurrency: int
+) -> Tuple[List[float], List[List[str]], float]:
+    latencies = [0.0] * len(queries)
+    results: List[List[str]] = [[] for _ in queries]
+    next_query = iter(range(len(queries)))
+
+    async def client() -> None:
+        for i in next_query:
+            query, document_ids = queries[i]
+            retriever = backend.retriever(store, USER_ID, document_ids, k=k)
+            start = time.perf_counter()
+            docs = await retriever.ainvoke(query)
+            latencies[i] = (time.perf_counter() - start) * 1000
+            results[i] = [doc.page_content for doc in docs]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, results, time.perf_counter() - start
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    return float(np.percentile(values, percentile))
+
+
+async def run(args: argparse.Namespace) -> None:
+    model = BagOfWordsEmbeddings(args.dims)
+    service = EmbeddingService(model_factory=lambda: model)
+    set_embedding_service(service)
+
+    if args.backend == "redis":
+        import redis
+        import redis.asyncio as aioredis
+
+        backend: VectorBackend = RedisVectorBackend(
+            async_redis_client=aioredis.Redis.from_url(args.redis_url)
+        )
+        sync_client = redis.Redis.from_url(args.redis_url)
+    else:
+        backend = MemoryVectorBackend()
+        sync_client = None
+    store = backend.vector_store(sync_client)
+
+    chunks = make_corpus(args.documents, args.chunks_per_document)
+    vectors = np.asarray(
+        model.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float64
+    )
+    started = time.perf_counter()
+    ids = await load(backend, store, chunks, vectors)
+    load_seconds = time.perf_counter() - started
+
+    queries = make_queries(chunks, args.queries, args.documents, args.documents_per_query)
+    # Warm up connections, threads and the query path
+    await run_queries(backend, store, queries[:10], args.k, args.concurrency)
+    latencies, results, elapsed = await run_queries(
+        backend, store, queries, args.k, args.concurrency
+    )
+    recalls = [
+        len(set(found) & set(exact_top_k(chunks, vectors, model, query, document_ids, args.k)))
+        / args.k
+        for found, (query, document_ids) in zip(results, queries)
+    ]
+
+    print(
+        f"{args.backend} backend: {len(chunks)} chunks in {args.documents} documents, "
+        f"loaded in {load_seconds:.1f}s; {len(queries)} queries over "
+        f"{args.documents_per_query + 1} documents, concurrency {args.concurrency}\n"
+    )
+    print(
+        f"latency ms   p50 {_percentile(latencies, 50):.2f}   "
+        f"p95 {_percentile(latencies, 95):.2f}   p99 {_percentile(latencies, 99):.2f}   "
+        f"max {max(latencies):.2f}"
+    )
+    print(f"throughput   {len(queries) / elapsed:.1f} queries/s")
+    print(f"recall@{args.k}    {statistics.mean(recalls):.3f} vs exact cosine")
+
+    if args.backend == "redis":
+        # The index is shared; drop the benchmark's chunks
+        for i in range(0, len(ids), 1000):
+            sync_client.unlink(*ids[i : i + 1000])
+    await service.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backend", choices=["memory", "redis"], default="memory")
+    parser.add_argument("--redis-url")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--chunks-per-document", type=int, default=250)
+    parser.add_argument("--documents-per-query", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    if args.backend == "redis" and not args.redis_url:
+        parser.error("--redis-url is required for the redis backend")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark compact layouts of the RAG vector index against the current one.
+
+Loads the same chunks into a throwaway index per layout, then reports
+memory per 1k chunks (growth of Redis ``used_memory`` and the index's
+vector size) and recall@k of vector search against the current layout,
+LangChain's flat float32 index with stored text and per-chunk JSON
+metadata:
+
+    python benchmarks/bench_vector_index.py --redis-url redis://localhost:6379
+
+Requires Redis Stack; use a scratch database, as the measurement reads
+``INFO memory``. Chunks are synthetic: word-salad text and clustered
+unit vectors of ``--dims`` dimensions. ``--fake`` embeds the text with the
+synthetic model from ``bench_embeddings`` instead, ``--model`` with the
+configured embedding model.
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from agents.rag.vector_index import (
+    EMBEDDING_FIELD,
+    TAG_FIELDS,
+    ChunkLayout,
+    VectorIndexSettings,
+)
+from bench_ingest import WORDS
+from redis import Redis
+from redisvl.index import SearchIndex
+from redisvl.query import VectorQuery
+from redisvl.query.filter import Tag
+
+USER_ID = "bench-user"
+PREFIX = "bench-vector-index"
+
+LAYOUTS: Dict[str, VectorIndexSettings] = {
+    "flat f32 text": VectorIndexSettings(),
+    "flat f16 text": VectorIndexSettings(datatype="float16"),
+    "flat f16 no-text": VectorIndexSettings(datatype="float16", store_text=False),
+    "hnsw f32 text": VectorIndexSettings(algorithm="hnsw"),
+    "hnsw f16 no-text": VectorIndexSettings(
+        algorithm="hnsw", datatype="float16", store_text=False
+    ),
+}
+
+
+def make_chunks(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    # Token chunks of 512 are roughly 2,000 characters of prose
+    return [" ".join(rng.choice(WORDS) for _ in range(280)) for _ in range(count)]
+
+
+def make_vectors(count: int, dims: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Unit vectors around a few centroids, like embeddings of one corpus."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dims), dtype=np.float32)
+    vectors = centroids[rng.integers(clusters, size=count)]
+    vectors += 0.6 * rng.standard_normal((count, dims), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def embed(texts: List[str], args: argparse.Namespace) -> np.ndarray:
+    if args.fake:
+        from bench_embeddings import FakeEmbeddings
+
+        model = FakeEmbeddings(dim=args.dims, call_ms=0, text_ms=0)
+    else:
+        from agents.rag.embeddings import _load_huggingface_model
+
+        model = _load_huggingface_model()
+    vectors = []
+    for i in range(0, len(texts), 256):
+        vectors.extend(model.embed_documents(texts[i : i + 256]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def current_schema(name: str, dims: int):
+    """The schema LangChain's RedisVectorStore creates for ``rag-index``."""
+    from langchain_redis.config import RedisConfig
+
+    config = RedisConfig(
+        index_name=name,
+        key_prefix=name,
+        metadata_schema=[{"name": field, "type": "tag"} for field in TAG_FIELDS],
+        embedding_dimensions=dims,
+    )
+    return config.to_index_schema()
+
+
+def current_record(name: str, text: str, vector, metadata: Dict) -> Dict:
+    """A chunk the way ``RedisVectorStore.add_texts`` writes it."""
+    return {
+        "text": text,
+        EMBEDDING_FIELD: np.asarray(vector, dtype=np.float32).tobytes(),
+        "_index_name": name,
+        "_metadata_json": json.dumps(metadata),
+        **metadata,
+    }
+
+
+def _used_memory(client: Redis) -> int:
+    return int(client.info("memory")["used_memory"])
+
+
+def _wait_until_indexed(index: SearchIndex) -> None:
+    while float(index.info().get("percent_indexed", 1)) < 1:
+        time.sleep(0.2)
+
+
+def load(
+    client: Redis, schema, ids: List[str], records: List[Dict]
+) -> Tuple[SearchIndex, int, float]:
+    """Create and fill one index; return it, its memory and its vector MB."""
+    index = SearchIndex(schema, redis_client=client)
+    prefix = schema.index.prefix.rstrip(":")
+    keys = [f"{prefix}:{chunk_id}" for chunk_id in ids]
+    before = _used_memory(client)
+    index.create(overwrite=True, drop=True)
+    for i in range(0, len(records), 500):
+        index.load(records[i : i + 500], keys=keys[i : i + 500], batch_size=500)
+    _wait_until_indexed(index)
+    memory = _used_memory(client) - before
+    return index, memory, float(index.info().get("vector_index_sz_mb", 0))
+
+
+def search(index: SearchIndex, datatype: str, queries: np.ndarray, k: int) -> Tuple[List[List[str]], float]:
+    results, started = [], time.perf_counter()
+    for vector in queries:
+        query = VectorQuery(
+            vector=np.asarray(vector, dtype=datatype).tobytes(),
+            vector_field_name=EMBEDDING_FIELD,
+            return_fields=["document_id"],
+            filter_expression=Tag("user_id") == USER_ID,
+            dtype=datatype,
+            num_results=k,
+        )
+        results.append([doc["id"].rsplit(":", 1)[-1] for doc in index.query(query)])
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def recall(results: List[List[str]], truth: List[List[str]]) -> float:
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(results, truth))
+    return hits / max(1, sum(len(expected) for expected in truth))
+
+
+def run(args: argparse.Namespace) -> None:
+    client = Redis.from_url(args.redis_url)
+    texts = make_chunks(args.chunks)
+    if args.fake or args.model:
+        vectors = embed(texts, args)
+        queries = embed(make_chunks(args.queries, seed=1), args)
+    else:
+        vectors = make_vectors(args.chunks, args.dims)
+        queries = make_vectors(args.queries, args.dims, seed=1)
+    dims = vectors.shape[1]
+    metadata = [
+        {"user_id": USER_ID, "document_id": f"doc-{i // 50}", "page": i // 4}
+        for i in range(args.chunks)
+    ]
+    ids = [f"{i:08d}" for i in range(args.chunks)]
+
+    name = f"{PREFIX}-current"
+    schema = current_schema(name, dims)
+    records = [
+        current_record(name, text, vector, meta)
+        for text, vector, meta in zip(texts, vectors, metadata)
+    ]
+    index, memory, vector_mb = load(client, schema, ids, records)
+    truth, latency = search(index, "float32", queries, args.k)
+    index.delete(drop=True)
+
+    print(f"{args.chunks} chunks, {dims} dimensions, {args.queries} queries, k={args.k}\n")
+    print(
+        f"{'layout':<20}{'MB/1k chunks':>14}{'vector MB/1k':>14}"
+        f"{f'recall@{args.k}':>12}{'query ms':>10}"
+    )
+    per_1k = 1000 / args.chunks / 2**20
+
+    def row(label: str, memory: int, vector_mb: float, results, latency: float) -> None:
+        print(
+            f"{label:<20}{memory * per_1k:>14.2f}{vector_mb * 1000 / args.chunks:>14.2f}"
+            f"{recall(results, truth):>12.3f}{latency:>10.2f}"
+        )
+
+    row("current", memory, vector_mb, truth, latency)
+    for label, settings in LAYOUTS.items():
+        name = f"{PREFIX}-{label.replace(' ', '-')}"
+        schema = settings.schema(dims, name=name, prefix=name)
+        layout = ChunkLayout.from_schema(schema)
+        records = [
+            layout.record(text, vector, meta)
+            for text, vector, meta in zip(texts, vectors, metadata)
+        ]
+        index, memory, vector_mb = load(client, schema, ids, records)
+        results, latency = search(index, layout.datatype, queries, args.k)
+        index.delete(drop=True)
+        row(label, memory, vector_mb, results, latency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--redis-url", required=True)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--fake", action="store_true", help="Use a synthetic model")
+    parser.add_argument("--model", action="store_true", help="Use the embedding model")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import mlflow
 import structlog
 from agents.api.data_types import APIKeys
 from agents.api.middleware import LoggingMiddleware
+from agents.api.routers.admin import require_admin_user
 from agents.api.routers.admin import router as admin_router
 from agents.api.routers.agent import router as agent_router
 from agents.api.routers.chat import router as chat_router
@@ -23,13 +24,25 @@ from agents.components.compound.xml_agent import (
     create_checkpointer,
     set_global_checkpointer,
 )
+from agents.components.datagen.tools.sandbox_pool import get_sandbox_pool
+from agents.components.datagen.tools.sandbox_sessions import (
+    SandboxSessions,
+    set_sandbox_sessions,
+)
+from agents.rag.ingest import shutdown_ingest_pools
+from agents.rag.ingestion_jobs import IngestionWorker
 from agents.storage.global_services import (
     get_secure_redis_client,
+    get_secure_redis_replica_client,
     get_sync_redis_client,
     set_global_redis_storage_service,
 )
+from agents.storage.message_compaction import MessageCompactor
+from agents.storage.record_cache import RecordCache, set_record_cache
 from agents.storage.redis_storage import RedisStorage
+from agents.storage.replica_router import ReplicaRouter, set_replica_router
 from agents.utils.logging_config import configure_logging
+from agents.utils.metrics import get_metrics_registry
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -80,6 +93,19 @@ async def lifespan(app: FastAPI):
     app.state.redis_storage_service = RedisStorage(redis_client=app.state.redis_client)
     app.state.sync_redis_client = get_sync_redis_client()
 
+    # Stale-tolerant reads go to the replica while it keeps up (REDIS_REPLICA_HOST)
+    app.state.replica_router = ReplicaRouter(
+        app.state.redis_client, get_secure_redis_replica_client()
+    )
+    set_replica_router(app.state.replica_router)
+    app.state.replica_router.start()
+
+    # Serve API keys, connector and LLM configs from memory until Redis
+    # reports a change (REDIS_RECORD_CACHE_INVALIDATION)
+    app.state.record_cache = RecordCache()
+    set_record_cache(app.state.record_cache)
+    app.state.record_cache.start(app.state.redis_client)
+
     # Set global Redis storage service for tools
     set_global_redis_storage_service(app.state.redis_storage_service)
     
@@ -115,8 +141,58 @@ async def lifespan(app: FastAPI):
     if app.state.checkpointer:
         await app.state.checkpointer.asetup()
 
+    # Periodically rewrite completed runs into their compact form
+    app.state.message_compactor = MessageCompactor(app.state.redis_client)
+    app.state.message_compactor.start()
+
+    # Move conversations idle for CONVERSATION_ARCHIVE_AFTER_DAYS out of Redis
+    app.state.conversation_archiver = app.state.redis_storage_service.archive
+    app.state.conversation_archiver.start(
+        is_active=lambda user_id, conversation_id: f"{user_id}:{conversation_id}"
+        in app.state.manager.connections
+    )
+
+    # Index uploaded documents in the background; deployments that run
+    # dedicated workers (python -m agents.rag.ingestion_jobs) can turn it off
+    app.state.ingestion_worker = IngestionWorker(
+        app.state.redis_storage_service, app.state.sync_redis_client
+    )
+    if os.getenv("INGESTION_WORKER_ENABLED", "true").lower() == "true":
+        app.state.ingestion_worker.start()
+
+    # Keep Daytona sandboxes warm so code runs do not wait for creation
+    app.state.sandbox_pool = get_sandbox_pool()
+    if (
+        os.getenv("DAYTONA_API_KEY")
+        and os.getenv("DAYTONA_POOL_ENABLED", "true").lower() == "true"
+    ):
+        app.state.sandbox_pool.start()
+
+    # Keep each conversation's sandbox between runs; reap idle ones
+    app.state.sandbox_sessions = None
+    if os.getenv("SANDBOX_SESSIONS_ENABLED", "true").lower() == "true":
+        app.state.sandbox_sessions = SandboxSessions(
+            app.state.redis_client, app.state.sandbox_pool
+        )
+        set_sandbox_sessions(app.state.sandbox_sessions)
+        app.state.sandbox_sessions.start()
+
     yield
 
+    if app.state.sandbox_sessions:
+        await app.state.sandbox_sessions.stop()
+    await app.state.sandbox_pool.stop()
+
+    await app.state.ingestion_worker.stop()
+    shutdown_ingest_pools()
+    await app.state.conversation_archiver.stop()
+    await app.state.message_compactor.stop()
+    await app.state.replica_router.stop()
+    await app.state.record_cache.stop()
+
+    # Persist any streamed events still waiting in the write-behind buffer
+    await app.state.manager.message_buffer.flush_all()
+
 
 # get_user_id_from_token is now imported from auth0_config.py
 
@@ -208,6 +284,12 @@ async def health_check():
         )
 
 
+@app.get("/metrics")
+async def get_metrics(user_id: str = Depends(require_admin_user)):
+    """Expose in-process storage and retrieval metrics to admins; they span all tenants."""
+    return JSONResponse(status_code=200, content=get_metrics_registry().snapshot())
+
+
 @app.post("/set_api_keys")
 async def set_api_keys(
     keys: APIKeys,
@@ -279,7 +361,9 @@ async def get_api_keys(
     """
     try:
         # Use the redis_storage_service which properly handles the data
-        stored_keys = await app.state.redis_storage_service.get_user_api_key(user_id)
+        stored_keys = await app.state.redis_storage_service.get_user_api_key(
+            user_id, allow_stale=True
+        )
 
         if not stored_keys or not stored_keys.sambanova_key:
             return JSONResponse(
@@ -11,6 +11,7 @@ from pydantic import BaseModel
 import structlog
 
 from agents.api.utils import validate_external_url
+from agents.storage.keys import user_scope
 from agents.config.llm_config_manager import get_config_manager
 from agents.utils.llm_provider import get_llm
 from agents.storage.redis_storage import RedisStorage
@@ -63,6 +64,19 @@ def check_admin_enabled():
     return True
 
 
+async def require_admin_user(user_id: str = Depends(get_current_user_id)) -> str:
+    """Allow only the operators listed in ADMIN_USER_IDS (comma-separated)."""
+    check_admin_enabled()
+    admin_ids = {
+        admin_id.strip()
+        for admin_id in os.getenv("ADMIN_USER_IDS", "").split(",")
+        if admin_id.strip()
+    }
+    if user_id not in admin_ids:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user_id
+
+
 @router.get("/status")
 async def get_admin_status():
     """Check if admin panel is enabled"""
@@ -95,10 +109,10 @@ async def get_configuration(
         # First, check if singleton has stale config that doesn't exist in Redis
         if request and hasattr(request.app.state, 'redis_storage_service'):
             redis_storage = request.app.state.redis_storage_service
-            config_key = f"llm_config:{user_id}"
+            config_key = f"llm_config:{user_scope(user_id)}"
 
             try:
-                stored_config = await redis_storage.redis_client.get(
+                stored_config = await redis_storage.get_cached_record(
                     config_key,
                     user_id=user_id
                 )
@@ -251,7 +265,7 @@ async def update_configuration(
     # Also persist to Redis using existing infrastructure
     if request and hasattr(request.app.state, 'redis_storage_service'):
         redis_storage = request.app.state.redis_storage_service
-        config_key = f"llm_config:{user_id}"
+        config_key = f"llm_config:{user_scope(user_id)}"
 
         try:
             # Store configuration in Redis using the redis_client directly
@@ -263,7 +277,7 @@ async def update_configuration(
                 if custom_api_keys:
                     overrides["custom_api_keys"] = custom_api_keys
 
-            await redis_storage.redis_client.set(
+            await redis_storage.set_cached_record(
                 config_key,
                 json.dumps(overrides),
                 user_id=user_id
@@ -355,10 +369,10 @@ async def reset_configuration(
     # Also clear from Redis
     if request and hasattr(request.app.state, 'redis_storage_service'):
         redis_storage = request.app.state.redis_storage_service
-        config_key = f"llm_config:{user_id}"
+        config_key = f"llm_config:{user_scope(user_id)}"
         try:
-            # Delete from Redis - delete doesn't need user_id parameter
-            await redis_storage.redis_client.delete(config_key)
+            # Delete from Redis and the record cache
+            await redis_storage.delete_cached_record(config_key)
             logger.info(f"Cleared LLM config from Redis for user {user_id[:8]}...")
         except Exception as e:
             logger.error(f"Failed to clear config from Redis: {e}")
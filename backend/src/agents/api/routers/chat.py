@@ -14,6 +14,8 @@ from agents.auth.auth0_config import (
 from fastapi import APIRouter, Depends, Query, Request, WebSocket
 from fastapi.responses import JSONResponse
 from fastapi.websockets import WebSocketDisconnect, WebSocketState
+from agents.storage.keys import user_scope
+from agents.storage.replica_router import REPLICA_ERRORS
 
 logger = structlog.get_logger(__name__)
 
@@ -158,16 +160,20 @@ async def init_chat(
             "updated_at": timestamp,
             "user_id": user_id,
         }
-        chat_meta_key = f"chat_metadata:{user_id}:{conversation_id}"
+        request.app.state.redis_storage_service.replicas.note_write(user_id)
+        chat_meta_key = f"chat_metadata:{user_scope(user_id)}:{conversation_id}"
         await request.app.state.redis_client.set(
             chat_meta_key, json.dumps(metadata), user_id
         )
 
         # Add to user's conversation list
-        user_chats_key = f"user_chats:{user_id}"
+        user_chats_key = f"user_chats:{user_scope(user_id)}"
         await request.app.state.redis_client.zadd(
             user_chats_key, {conversation_id: timestamp}
         )
+        await request.app.state.redis_storage_service.mark_conversation_files_indexed(
+            user_id, conversation_id
+        )
 
         return JSONResponse(
             status_code=200,
@@ -204,7 +210,7 @@ async def get_conversation_messages(
     try:
         # Verify chat exists and belongs to user
         if not await request.app.state.redis_storage_service.verify_conversation_exists(
-            user_id, conversation_id
+            user_id, conversation_id, allow_stale=True
         ):
             return JSONResponse(
                 status_code=404,
@@ -212,7 +218,7 @@ async def get_conversation_messages(
             )
 
         messages = await request.app.state.redis_storage_service.get_messages(
-            user_id, conversation_id
+            user_id, conversation_id, allow_stale=True
         )
 
         if not messages:
@@ -254,17 +260,19 @@ async def list_chats(
             )
 
         # Get all conversation IDs for the user, sorted by most recent
-        user_chats_key = f"user_chats:{user_id}"
-        conversation_ids = await request.app.state.redis_client.zrevrange(
-            user_chats_key, 0, -1
+        redis_storage = request.app.state.redis_storage_service
+        conversation_ids = await redis_storage.get_user_chat_ids(
+            user_id, allow_stale=True
         )
+        # Metadata is read from the same node as the chat list
+        reader = redis_storage.replicas.replica_for(user_id) or request.app.state.redis_client
 
         if not conversation_ids:
             return JSONResponse(status_code=200, content={"chats": []})
 
         # Optimize: Use controlled concurrent Redis calls to avoid connection pool exhaustion
         meta_keys = [
-            f"chat_metadata:{user_id}:{conv_id}" for conv_id in conversation_ids
+            f"chat_metadata:{user_scope(user_id)}:{conv_id}" for conv_id in conversation_ids
         ]
 
         # Limit concurrent connections to prevent pool exhaustion
@@ -280,7 +288,7 @@ async def list_chats(
 
         async def get_metadata_with_semaphore(meta_key):
             async with semaphore:
-                return await request.app.state.redis_client.get(meta_key, user_id)
+                return await reader.get(meta_key, user_id)
 
         # Try concurrent approach first
         try:
@@ -304,8 +312,13 @@ async def list_chats(
                 )
                 raise Exception("Connection pool exhausted")
 
+            replica_errors = [r for r in meta_data_results if isinstance(r, REPLICA_ERRORS)]
+            if replica_errors and reader is not request.app.state.redis_client:
+                redis_storage.replicas.mark_unavailable(replica_errors[0])
+                raise replica_errors[0]
+
         except Exception as e:
-            # Fallback to sequential calls if concurrent approach fails
+            # Fallback to sequential calls on the primary if concurrent approach fails
             logger.info(f"Using sequential Redis calls for user {user_id}")
             meta_data_results = []
             for meta_key in meta_keys:
@@ -381,21 +394,13 @@ async def delete_chat(
                 content={"error": "Chat not found or access denied"},
             )
 
-        # Get all messages in the conversation to find file references
-        conversation_messages = (
-            await request.app.state.redis_storage_service.get_messages(
+        # Collect all file IDs referenced in the conversation
+        file_ids_to_delete = (
+            await request.app.state.redis_storage_service.get_conversation_file_ids(
                 user_id, conversation_id
             )
         )
 
-        # Collect all file IDs referenced in the conversation
-        file_ids_to_delete = set()
-
-        for message in conversation_messages:
-            # Check files in additional_kwargs
-            files = message.get("additional_kwargs", {}).get("files", [])
-            file_ids_to_delete.update(files)
-
         # Delete all referenced files
         deleted_files = []
         failed_files = []
@@ -427,6 +432,14 @@ async def delete_chat(
             await connection.close(code=4000, reason="Chat deleted")
             request.app.state.manager.remove_connection(user_id, conversation_id)
 
+        # Delete the conversation's sandbox rather than waiting for the reaper
+        sandbox_sessions = getattr(request.app.state, "sandbox_sessions", None)
+        if sandbox_sessions:
+            try:
+                await sandbox_sessions.close(user_id, conversation_id)
+            except Exception as e:
+                logger.warning(f"Could not delete sandbox of chat {conversation_id}: {str(e)}")
+
         # Delete chat metadata
         await request.app.state.redis_storage_service.delete_all_user_data(
             user_id, conversation_id
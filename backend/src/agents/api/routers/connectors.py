@@ -11,6 +11,7 @@ from urllib.parse import quote
 
 import structlog
 from agents.auth.auth0_config import get_current_user_id
+from agents.storage.keys import user_scope
 from agents.connectors.core.connector_manager import get_connector_manager
 from agents.connectors.core.base_connector import ConnectorStatus
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
@@ -405,8 +406,8 @@ async def get_connector_tools(
         connector = manager.connectors[provider_id]
         
         # Get user config
-        config_key = f"user:{user_id}:connector:{provider_id}:config"
-        config_data = await connector.redis_storage.redis_client.get(config_key, user_id)
+        config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+        config_data = await connector.redis_storage.get_cached_record(config_key, user_id)
         
         if config_data:
             config_dict = json.loads(config_data)
@@ -556,8 +557,8 @@ async def toggle_connector_chat(
         connector = manager.connectors[provider_id]
 
         # Get current user config
-        config_key = f"user:{user_id}:connector:{provider_id}:config"
-        config_data = await connector.redis_storage.redis_client.get(config_key, user_id)
+        config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+        config_data = await connector.redis_storage.get_cached_record(config_key, user_id)
 
         if config_data:
             config_dict = json.loads(config_data)
@@ -568,7 +569,7 @@ async def toggle_connector_chat(
         config_dict["enabled_in_chat"] = request.enabled
 
         # Save updated config
-        await connector.redis_storage.redis_client.set(
+        await connector.redis_storage.set_cached_record(
             config_key,
             json.dumps(config_dict),
             user_id
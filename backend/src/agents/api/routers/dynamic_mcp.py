@@ -9,6 +9,7 @@ from typing import Optional
 
 import structlog
 from agents.connectors.core.connector_manager import ConnectorManager
+from agents.storage.keys import user_scope
 from agents.connectors.providers.generic_mcp import create_generic_mcp_connector
 from agents.storage.redis_storage import RedisStorage
 from fastapi import APIRouter, Depends, HTTPException
@@ -107,7 +108,7 @@ async def add_mcp_connector(
         
         # Store the custom connector configuration for the user
         # This allows it to be loaded on restart
-        custom_connector_key = f"user:{user_id}:custom_mcp:{provider_id}"
+        custom_connector_key = f"user:{user_scope(user_id)}:custom_mcp:{provider_id}"
         custom_connector_data = {
             "provider_id": provider_id,
             "name": request.name,
@@ -174,7 +175,7 @@ async def list_custom_mcp_connectors(
     
     try:
         # Get all custom MCP connectors for this user
-        pattern = f"user:{user_id}:custom_mcp:*"
+        pattern = f"user:{user_scope(user_id)}:custom_mcp:*"
         keys = []
         cursor = 0
         while True:
@@ -224,7 +225,7 @@ async def remove_custom_mcp_connector(
     
     try:
         # Remove from Redis
-        custom_connector_key = f"user:{user_id}:custom_mcp:{provider_id}"
+        custom_connector_key = f"user:{user_scope(user_id)}:custom_mcp:{provider_id}"
         deleted = await redis_storage.redis_client.delete(custom_connector_key)
         
         if deleted == 0:
@@ -8,6 +8,7 @@ from typing import Optional
 
 import structlog
 from agents.auth.auth0_config import get_current_user_id, get_token_payload
+from agents.storage.keys import user_scope
 from agents.services.export_service import ExportService
 from fastapi import APIRouter, BackgroundTasks, Depends, Request
 from fastapi.responses import JSONResponse, Response
@@ -22,7 +23,7 @@ router = APIRouter(
 async def get_export_ttl_hours(request: Request, user_id: str) -> Optional[float]:
     """Get the remaining TTL for export data in hours"""
     try:
-        export_key = f"export:{user_id}:latest"
+        export_key = f"export:{user_scope(user_id)}:latest"
         redis_client = request.app.state.redis_storage_service.redis_client
         ttl_seconds = await super(type(redis_client), redis_client).ttl(export_key)
         
@@ -75,7 +76,7 @@ async def process_export_background(
         
         # Store the export temporarily in Redis for download
         # Using a TTL of 24 hours
-        export_key = f"export:{user_id}:latest"
+        export_key = f"export:{user_scope(user_id)}:latest"
         
         # Store binary data using the same pattern as existing file storage
         # This handles encryption properly and works with binary data
@@ -85,7 +86,7 @@ async def process_export_background(
         await redis_client.set(export_key, zip_data, user_id)
         
         # Store metadata separately
-        metadata_key = f"export_meta:{user_id}:latest" 
+        metadata_key = f"export_meta:{user_scope(user_id)}:latest" 
         metadata = {
             "filename": filename,
             "size": len(zip_data),
@@ -164,7 +165,7 @@ async def get_export_status(
 ):
     """Get the status of the latest export request"""
     try:
-        metadata_key = f"export_meta:{user_id}:latest"
+        metadata_key = f"export_meta:{user_scope(user_id)}:latest"
         metadata_raw = await request.app.state.redis_storage_service.redis_client.get(metadata_key, user_id)
         
         if not metadata_raw:
@@ -208,8 +209,8 @@ async def download_export(
 ):
     """Download the latest export file"""
     try:
-        export_key = f"export:{user_id}:latest"
-        metadata_key = f"export_meta:{user_id}:latest"
+        export_key = f"export:{user_scope(user_id)}:latest"
+        metadata_key = f"export_meta:{user_scope(user_id)}:latest"
         
         # Get export data and metadata using the same pattern as existing file retrieval
         redis_client = request.app.state.redis_storage_service.redis_client
@@ -263,8 +264,8 @@ async def clear_export(
 ):
     """Clear the stored export data"""
     try:
-        export_key = f"export:{user_id}:latest"
-        metadata_key = f"export_meta:{user_id}:latest"
+        export_key = f"export:{user_scope(user_id)}:latest"
+        metadata_key = f"export_meta:{user_scope(user_id)}:latest"
         
         # Delete both keys (delete doesn't require user_id as it's not overridden)
         redis_client = request.app.state.redis_storage_service.redis_client
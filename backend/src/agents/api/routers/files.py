@@ -28,7 +28,9 @@ async def get_user_files(
                 content={"error": "Invalid authentication token"},
             )
 
-        files = await request.app.state.redis_storage_service.list_user_files(user_id)
+        files = await request.app.state.redis_storage_service.list_user_files(
+            user_id, allow_stale=True
+        )
 
         files.sort(key=lambda x: x.get("created_at", 0), reverse=True)
 
@@ -99,7 +101,9 @@ async def delete_file(
                 content={"error": "File not found"},
             )
 
-        if metadata and metadata.get("indexed"):
+        # Deduplicated content releases its shared vectors in delete_file once
+        # the last file referencing it is gone
+        if metadata and metadata.get("indexed") and not metadata.get("content_hash"):
             vector_ids = metadata.get("vector_ids")
             if vector_ids:
                 api_keys = (
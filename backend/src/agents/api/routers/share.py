@@ -12,23 +12,41 @@ router = APIRouter(
     prefix="/share",
 )
 
+# Shares are immutable snapshots; a deleted share may stay cached this long
+SHARE_CACHE_CONTROL = (
+    f"public, max-age={int(os.getenv('SHARE_CACHE_MAX_AGE_SECONDS', '300'))}"
+)
+
 
 @router.get("/{share_token}")
 async def get_shared_conversation(request: Request, share_token: str):
     """Get shared conversation (public access, no authentication required)"""
     try:
-        shared_conversation = (
-            await request.app.state.redis_storage_service.get_shared_conversation(
-                share_token
-            )
+        snapshot = await request.app.state.redis_storage_service.get_share_snapshot(
+            share_token
         )
 
-        if not shared_conversation:
+        if not snapshot:
             return JSONResponse(
                 status_code=404, content={"error": "Shared conversation not found"}
             )
 
-        return JSONResponse(status_code=200, content=shared_conversation)
+        headers = {
+            "Cache-Control": SHARE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        gzip_accepted = "gzip" in request.headers.get("accept-encoding", "")
+        headers["ETag"] = snapshot.gzip_etag if gzip_accepted else snapshot.etag
+
+        if snapshot.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+
+        if gzip_accepted:
+            headers["Content-Encoding"] = "gzip"
+            return Response(
+                content=snapshot.gzipped, media_type="application/json", headers=headers
+            )
+        return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
     except Exception as e:
         logger.error(f"Error accessing shared conversation: {str(e)}")
@@ -43,44 +61,17 @@ async def get_shared_file(
 ):
     """Get file from shared conversation (public access, no authentication required)"""
     try:
-        # First verify the share token is valid and get the original user/conversation
-        shared_conversation = (
-            await request.app.state.redis_storage_service.get_shared_conversation(
-                share_token
-            )
+        # The snapshot names the owner and every file the share may serve
+        snapshot = await request.app.state.redis_storage_service.get_share_snapshot(
+            share_token
         )
 
-        if not shared_conversation:
+        if not snapshot:
             return JSONResponse(
                 status_code=404, content={"error": "Shared conversation not found"}
             )
 
-        # Get the original user_id and conversation_id from the shared conversation
-        original_user_id = shared_conversation.get("user_id")
-        conversation_id = shared_conversation.get("conversation_id")
-
-        if not original_user_id or not conversation_id:
-            return JSONResponse(
-                status_code=404, content={"error": "Invalid shared conversation data"}
-            )
-
-        # Get the conversation messages to verify the file is actually part of this conversation
-        conversation_messages = (
-            await request.app.state.redis_storage_service.get_messages(
-                original_user_id, conversation_id
-            )
-        )
-
-        # Check if the file_id is referenced in any message in this conversation
-        file_referenced_in_conversation = False
-        for message in conversation_messages:
-            # Parse file references from the message content
-            files = message.get("additional_kwargs", {}).get("files", [])
-            if file_id in files:
-                file_referenced_in_conversation = True
-                break
-
-        if not file_referenced_in_conversation:
+        if file_id not in snapshot.file_ids:
             return JSONResponse(
                 status_code=403,
                 content={"error": "File not part of this shared conversation"},
@@ -89,7 +80,7 @@ async def get_shared_file(
         # Get the file data using the original user's context
         file_data, file_metadata = (
             await request.app.state.redis_storage_service.get_file(
-                original_user_id, file_id
+                snapshot.user_id, file_id
             )
         )
 
@@ -100,12 +91,16 @@ async def get_shared_file(
             )
 
         safe_filename = quote(os.path.basename(file_metadata.get("filename", file_id)))
+        headers = {
+            "Content-Disposition": f'attachment; filename="{safe_filename}"',
+            "Cache-Control": SHARE_CACHE_CONTROL,
+        }
+        if file_metadata.get("content_hash"):
+            headers["ETag"] = f'"{file_metadata["content_hash"]}"'
         return Response(
             content=file_data,
             media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{safe_filename}"'
-            },
+            headers=headers,
         )
 
     except Exception as e:
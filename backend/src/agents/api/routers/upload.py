@@ -4,7 +4,7 @@ import uuid
 
 import structlog
 from agents.auth.auth0_config import get_current_user_id
-from agents.rag.upload import convert_ingestion_input_to_blob, ingest_runnable
+from agents.rag.ingestion_jobs import enqueue_ingestion
 from fastapi import APIRouter, Depends, File, Request, UploadFile
 from fastapi.responses import JSONResponse
 
@@ -43,31 +43,34 @@ async def process_and_store_file(
     content = await file.read()
     indexed = False
     vector_ids = []
+    vector_document_id = file_id
+    ingestion_status = None
+
+    storage = request.app.state.redis_storage_service
+    content_hash = storage.compute_content_hash(user_id, content)
+    existing_content = await storage.get_file_content_entry(user_id, content_hash)
 
     upload_time = time.time()
     logger.info(f"[UPLOAD_TRACE] Processing file: {safe_filename}, content_type: {safe_content_type}, file_id: {file_id}")
-    if safe_content_type == "application/pdf":
-        logger.info(f"[UPLOAD_TRACE] File is PDF, starting indexing for {file_id}")
-        file_blobs = await convert_ingestion_input_to_blob(content, safe_filename)
-        api_keys = await request.app.state.redis_storage_service.get_user_api_key(
-            user_id
-        )
-        vector_ids = await ingest_runnable.ainvoke(
-            file_blobs,
-            {
-                "user_id": user_id,
-                "document_id": file_id,
-                "api_key": api_keys.sambanova_key,
-                "redis_client": request.app.state.sync_redis_client,
-            },
-        )
-        logger.info(f"[UPLOAD_TRACE] Indexed file successfully - file_id: {file_id}, vector_ids: {len(vector_ids)}")
+    if (
+        safe_content_type == "application/pdf"
+        and existing_content
+        and existing_content.get("indexed")
+    ):
+        # Same content was already ingested for this user - reuse its vectors
+        vector_ids = existing_content.get("vector_ids", [])
+        vector_document_id = existing_content["document_id"]
         indexed = True
+        ingestion_status = "completed"
+        logger.info(f"[UPLOAD_TRACE] Reusing existing index for duplicate content - file_id: {file_id}, vector_ids: {len(vector_ids)}")
+    elif safe_content_type == "application/pdf":
+        # Parsing and embedding run on an ingestion worker, not in the request
+        ingestion_status = "queued"
     else:
         logger.warning(f"[UPLOAD_TRACE] File is NOT PDF ({safe_content_type}), skipping indexing for {file_id}")
 
     logger.info(f"[UPLOAD_TRACE] Storing file in Redis - file_id: {file_id}, indexed: {indexed}")
-    await request.app.state.redis_storage_service.put_file(
+    await storage.put_file(
         user_id,
         file_id,
         data=content,
@@ -77,15 +80,32 @@ async def process_and_store_file(
         indexed=indexed,
         source="upload",
         vector_ids=vector_ids,
+        content_hash=content_hash,
+        vector_document_id=vector_document_id,
+        ingestion_status=ingestion_status,
     )
     logger.info(f"[UPLOAD_TRACE] File stored successfully in Redis - file_id: {file_id}")
-    return {
+    # Chat context reads the extracted text instead of the file
+    storage.file_text.populate_in_background(
+        user_id, file_id, content, safe_content_type, content_hash
+    )
+
+    if ingestion_status == "queued":
+        # Progress and completion are pushed to the user's WebSockets
+        await enqueue_ingestion(storage.redis_client, user_id, file_id)
+        logger.info(f"[UPLOAD_TRACE] Queued PDF for indexing - file_id: {file_id}")
+
+    file_details = {
         "file_id": file_id,
         "filename": safe_filename,
         "type": safe_content_type,
         "created_at": upload_time,
         "user_id": user_id,
+        "indexed": indexed,
     }
+    if ingestion_status:
+        file_details["ingestion_status"] = ingestion_status
+    return file_details
 
 
 @router.post("")
@@ -1,5 +1,8 @@
+import asyncio
+
 import structlog
 from agents.auth.auth0_config import get_current_user_id
+from agents.storage.user_erasure import UserDataEraser
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import JSONResponse
 
@@ -18,20 +21,18 @@ async def delete_user_data(
 ):
     """
     Delete all data associated with the authenticated user.
-    This includes all conversations, documents, and API keys.
+    This includes conversations, files, documents, shares, vector chunks,
+    checkpoints, connector tokens, voice sessions and API keys.
 
     Args:
         token_data (HTTPAuthorizationCredentials): The authentication token data
     """
     try:
-        # 1. Delete all conversations
-        user_chats_key = f"user_chats:{user_id}"
-        conversation_ids = await request.app.state.redis_client.zrange(
-            user_chats_key, 0, -1
-        )
-
-        for conversation_id in conversation_ids:
-            # Close any active WebSocket connections
+        # Close any active WebSocket connections first
+        for session_key in list(request.app.state.manager.connections.keys()):
+            if not session_key.startswith(f"{user_id}:"):
+                continue
+            conversation_id = session_key[len(user_id) + 1 :]
             connection = request.app.state.manager.get_connection(
                 user_id, conversation_id
             )
@@ -39,40 +40,49 @@ async def delete_user_data(
                 await connection.close(code=4000, reason="User data deleted")
                 request.app.state.manager.remove_connection(user_id, conversation_id)
 
-            # Delete chat metadata and messages
-            meta_key = f"chat_metadata:{user_id}:{conversation_id}"
-            message_key = f"messages:{user_id}:{conversation_id}"
-            await request.app.state.redis_client.delete(meta_key)
-            await request.app.state.redis_client.delete(message_key)
+        eraser = UserDataEraser(
+            request.app.state.redis_client,
+            checkpointer=getattr(request.app.state, "checkpointer", None),
+            archive=request.app.state.redis_storage_service.archive,
+        )
+        # Shielded so a client disconnect does not leave a half-erased account
+        summary = await asyncio.shield(eraser.erase(user_id))
 
-        # Delete the user's chat list
-        await request.app.state.redis_client.delete(user_chats_key)
+        return JSONResponse(
+            status_code=200,
+            content={
+                "message": "All user data deleted successfully",
+                "removed": summary,
+            },
+        )
 
-        # 2. Delete all documents
-        user_docs_key = f"user_documents:{user_id}"
-        doc_ids = await request.app.state.redis_client.smembers(user_docs_key)
+    except Exception as e:
+        logger.error(f"Error deleting user data: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"error": "An internal error occurred"},
+        )
 
-        for doc_id in doc_ids:
-            # Delete document metadata and chunks
-            doc_key = f"document:{doc_id}"
-            chunks_key = f"document_chunks:{doc_id}"
-            await request.app.state.redis_client.delete(doc_key)
-            await request.app.state.redis_client.delete(chunks_key)
 
-        # Delete the user's document list
-        await request.app.state.redis_client.delete(user_docs_key)
+@router.get("/data/erasure")
+async def get_user_data_erasure_progress(
+    request: Request,
+    user_id: str = Depends(get_current_user_id),
+):
+    """Report the progress of the latest user data erasure."""
+    try:
+        eraser = UserDataEraser(request.app.state.redis_client)
+        progress = await eraser.get_progress(user_id)
 
-        # 3. Delete API keys
-        key_prefix = f"api_keys:{user_id}"
-        await request.app.state.redis_client.delete(key_prefix)
+        if not progress:
+            return JSONResponse(
+                status_code=404, content={"error": "No erasure in progress"}
+            )
 
-        return JSONResponse(
-            status_code=200,
-            content={"message": "All user data deleted successfully"},
-        )
+        return JSONResponse(status_code=200, content=progress)
 
     except Exception as e:
-        logger.error(f"Error deleting user data: {str(e)}")
+        logger.error(f"Error reading erasure progress: {str(e)}")
         return JSONResponse(
             status_code=500,
             content={"error": "An internal error occurred"},
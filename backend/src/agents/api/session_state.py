@@ -3,6 +3,7 @@ from typing import Optional
 import json
 from autogen_core.models import UserMessage, AssistantMessage
 import redis
+from agents.storage.keys import user_scope
 
 
 class SessionStateManager:
@@ -17,7 +18,7 @@ class SessionStateManager:
         Should be called when a new conversation websocket connection is established.
         """
         # Load existing messages from Redis
-        messages_key = f"messages:{user_id}:{conversation_id}"
+        messages_key = f"messages:{user_scope(user_id)}:{conversation_id}"
         messages_data = redis_client.lrange(messages_key, 0, -1, user_id)
         
         # Initialize history deque
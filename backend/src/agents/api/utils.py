@@ -10,6 +10,7 @@ from typing import List, Optional
 from urllib.parse import urlparse
 
 from agents.storage.redis_storage import RedisStorage
+from agents.storage.keys import user_scope
 import markdown
 import structlog
 from agents.api.session_state import SessionStateManager
@@ -106,7 +107,7 @@ def load_documents(
 
     for doc_id in document_ids:
         # Verify document exists and belongs to user
-        user_docs_key = f"user_documents:{user_id}"
+        user_docs_key = f"user_documents:{user_scope(user_id)}"
         if not redis_client.sismember(user_docs_key, doc_id):
             continue  # Skip if document doesn't belong to user
 
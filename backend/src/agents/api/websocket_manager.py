@@ -1,18 +1,18 @@
 import asyncio
 import json
 import os
-import tempfile
 import time
 import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional
 
-import pdfplumber  # Unified PDF parsing with inline tables
 import redis
 import structlog
 from agents.api.data_types import APIKeys
+from agents.storage.keys import user_scope
 from agents.api.utils import to_agent_thinking
 from agents.api.websocket_interface import WebSocketInterface
+from agents.rag.ingestion_jobs import ingestion_events_channel
 from agents.components.compound.code_execution_subgraph import (
     create_code_execution_graph,
 )
@@ -25,9 +25,11 @@ from agents.components.compound.financial_analysis_subgraph import (
 )
 from agents.components.datagen.tools.persistent_daytona import PersistentDaytonaManager
 from agents.components.open_deep_research.graph import create_deep_research_graph
+from agents.storage.message_buffer import MessageWriteBuffer
 from agents.storage.redis_service import SecureRedisService
 from agents.storage.redis_storage import RedisStorage
 from agents.tools.langgraph_tools import RETRIEVAL_DESCRIPTION, load_static_tools
+from agents.utils.dataset_sketch import render_sketch
 from fastapi import WebSocket, WebSocketDisconnect
 from langchain_core.messages import AIMessage, HumanMessage
 from langgraph.graph import END
@@ -50,6 +52,8 @@ class WebSocketConnectionManager(WebSocketInterface):
         self.redis_client = redis_client
         self.sync_redis_client = sync_redis_client
         self.message_storage = RedisStorage(redis_client)
+        # Write-behind buffer for streamed events, flushed in pipelined batches
+        self.message_buffer = MessageWriteBuffer(redis_client)
         # Add state storage for active connections
         self.active_sessions: Dict[str, dict] = {}
         self.daytona_managers: Dict[str, PersistentDaytonaManager] = {}
@@ -215,6 +219,16 @@ class WebSocketConnectionManager(WebSocketInterface):
             del self.active_sessions[session_key]
             self.session_last_active.pop(session_key, None)
 
+            user_id, _, conversation_id = session_key.partition(":")
+            try:
+                await self.message_buffer.close_conversation(user_id, conversation_id)
+            except Exception as e:
+                logger.error(
+                    "Error flushing messages for session",
+                    session_key=session_key,
+                    error=str(e),
+                )
+
     async def start_cleanup_task(self):
         """Start the background task for cleaning up inactive sessions"""
         if self.cleanup_task is None or self.cleanup_task.done():
@@ -240,13 +254,15 @@ class WebSocketConnectionManager(WebSocketInterface):
         background_task = None
         session_key = f"{user_id}:{conversation_id}"
         channel = f"agent_thoughts:{user_id}:{conversation_id}"
+        # Background document indexing reports progress on a per-user channel
+        ingestion_channel = ingestion_events_channel(user_id)
 
         try:
             # Initialize or update session state
             if session_key not in self.active_sessions:
                 # Create new pubsub instance for new session
                 pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
-                await pubsub.subscribe(channel)
+                await pubsub.subscribe(channel, ingestion_channel)
                 self.pubsub_instances[session_key] = pubsub
 
                 self.active_sessions[session_key] = {
@@ -261,7 +277,7 @@ class WebSocketConnectionManager(WebSocketInterface):
                 if not pubsub:
                     # Create new pubsub if somehow missing
                     pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
-                    await pubsub.subscribe(channel)
+                    await pubsub.subscribe(channel, ingestion_channel)
                     self.active_sessions[session_key]["pubsub"] = pubsub
                     self.pubsub_instances[session_key] = pubsub
 
@@ -276,7 +292,9 @@ class WebSocketConnectionManager(WebSocketInterface):
             background_task = session.get("background_task")
             pubsub = session["pubsub"]  # We know this exists now
 
-            redis_api_keys = await self.message_storage.get_user_api_key(user_id)
+            redis_api_keys = await self.message_storage.get_user_api_key(
+                user_id, allow_stale=True
+            )
 
             if redis_api_keys.sambanova_key == "":
                 await websocket.close(code=4006, reason="No API keys found")
@@ -285,6 +303,9 @@ class WebSocketConnectionManager(WebSocketInterface):
             # Accept connection
             self.add_connection(websocket, user_id, conversation_id)
 
+            # Bring an archived conversation back before anything is appended
+            await self.message_storage.ensure_conversation_hot(user_id, conversation_id)
+
             if os.getenv("ENABLE_USER_KEYS") == "true":
                 api_keys = redis_api_keys
             else:
@@ -425,8 +446,8 @@ class WebSocketConnectionManager(WebSocketInterface):
                         config_manager = get_config_manager()
 
                         # Check if config exists in Redis
-                        config_key = f"llm_config:{user_id}"
-                        stored_config = await self.message_storage.redis_client.get(config_key, user_id=user_id)
+                        config_key = f"llm_config:{user_scope(user_id)}"
+                        stored_config = await self.message_storage.get_cached_record(config_key, user_id=user_id)
 
                         if stored_config:
                             # Load config from Redis into config manager
@@ -552,7 +573,6 @@ class WebSocketConnectionManager(WebSocketInterface):
         """
         Background task to handle Redis pub/sub messages.
         """
-        message_key = f"messages:{user_id}:{conversation_id}"
         session_key = f"{user_id}:{conversation_id}"
         BATCH_SIZE = 25
 
@@ -581,6 +601,11 @@ class WebSocketConnectionManager(WebSocketInterface):
 
                             data_str = message["data"]
                             data_parsed = json.loads(data_str)
+                            if message["channel"].startswith("ingestion_events:"):
+                                # Transient status, not part of the conversation
+                                await self._safe_send(websocket, data_parsed)
+                                continue
+
                             message_data = {
                                 "event": "think",
                                 "data": data_str,
@@ -590,11 +615,9 @@ class WebSocketConnectionManager(WebSocketInterface):
                                 "message_id": data_parsed["message_id"],
                             }
 
-                            # Store in Redis first
-                            await self.redis_client.rpush(
-                                message_key,
-                                json.dumps(message_data),
-                                user_id,
+                            # Queue for persistence, the write-behind buffer flushes it
+                            self.message_buffer.enqueue(
+                                user_id, conversation_id, [message_data]
                             )
 
                             # Then try to send via WebSocket if still active
@@ -672,15 +695,15 @@ class WebSocketConnectionManager(WebSocketInterface):
                                         },
                                     }
 
-                                    # Save to Redis for persistence using message_storage
-                                    await self.message_storage.save_message(
+                                    # Queue for persistence with the think event
+                                    self.message_buffer.enqueue(
                                         user_id,
                                         conversation_id,
-                                        model_tracking_event
+                                        [model_tracking_event],
                                     )
 
                                     logger.info(
-                                        "Saved CrewAI model tracking event to Redis",
+                                        "Queued CrewAI model tracking event for Redis",
                                         model_name=data_parsed["metadata"]["llm_name"],
                                         message_id=data_parsed["message_id"],
                                     )
@@ -761,7 +784,9 @@ class WebSocketConnectionManager(WebSocketInterface):
                     if data["id"] is None:
                         pass  # Skip deduplication if no id
                     else:
-                        is_new = await self.message_storage.is_message_new(
+                        # Claimed before usage is counted, so a duplicate
+                        # from any replica is dropped here
+                        is_new = await self.message_buffer.claim_message_id(
                             user_id, conversation_id, data["id"]
                         )
 
@@ -780,15 +805,19 @@ class WebSocketConnectionManager(WebSocketInterface):
 
                 content = to_agent_thinking(data)
                 if content:
-                    # Map to old format persist it and send it
-                    await self.message_storage.save_message(
-                        user_id,
-                        conversation_id,
-                        content,
-                    )
+                    # Map to old format, send it and persist it with the event
                     await self._safe_send(websocket, content)
 
-                await self.message_storage.save_message(user_id, conversation_id, data)
+                # Persisted off the send path
+                self.message_buffer.enqueue(
+                    user_id,
+                    conversation_id,
+                    [content, data] if content else [data],
+                )
+
+                if data["event"] == "stream_complete":
+                    # Make the finished run durable before reporting completion
+                    await self.message_buffer.flush(user_id, conversation_id)
 
             if not websocket:
                 logger.info(
@@ -1017,6 +1046,7 @@ class WebSocketConnectionManager(WebSocketInterface):
     async def _load_file_context_for_analysis(self, user_id: str, doc_ids: list) -> str:
         """Load file contents to provide as context for multi-file analysis with smart context management."""
         file_context = "## UPLOADED FILES CONTEXT:\n\n"
+        file_text = self.message_storage.file_text
         
         # Context limits (approximate token estimation: ~4 chars per token for 32K context)
         MAX_CONTEXT_LENGTH = 120000  # Leave room for system prompt and user message
@@ -1024,19 +1054,34 @@ class WebSocketConnectionManager(WebSocketInterface):
         
         for doc_id in doc_ids:
             try:
-                file_data, metadata = await self.message_storage.get_file(user_id, doc_id["id"])
-                if file_data and metadata:
+                metadata = await self.message_storage.get_file_metadata(user_id, doc_id["id"])
+                if metadata:
                     filename = metadata.get("filename", f"file_{doc_id['id']}")
                     file_format = metadata.get("format", "unknown")
+                    file_size = metadata.get("file_size", 0)
+                    # Extracted once per file and cached, not re-extracted per message
+                    extracted = None
+                    if file_text.supports(file_format):
+                        extracted = await file_text.get_or_extract(
+                            self.message_storage, user_id, doc_id["id"], metadata
+                        )
+                        if extracted is None:
+                            continue
                     
                     file_context += f"### File: {filename} (Format: {file_format})\n"
                     
                     # Handle different file types with smart context management
                     if file_format == "text/csv":
                         # For CSV files, check size first
-                        try:
-                            content = file_data.decode('utf-8')
-                            if current_context_length + len(content) < MAX_CONTEXT_LENGTH:
+                        if not extracted.get("binary"):
+                            content = extracted["text"]
+                            if extracted.get("sketch"):
+                                # Large CSV - profiled at upload, describe it instead of inlining rows
+                                sketch = render_sketch(extracted["sketch"], filename)
+                                file_context += f"**Large CSV file - Dataset sketch:**\n```\n{sketch}\n```\n"
+                                file_context += f"**Full file available in sandbox as '{filename}'.**\n\n"
+                                current_context_length += len(sketch) + 200
+                            elif current_context_length + len(content) < MAX_CONTEXT_LENGTH:
                                 # Provide complete CSV content for comprehensive analysis
                                 file_context += f"```csv\n{content}\n```\n\n"
                                 current_context_length += len(content)
@@ -1049,13 +1094,13 @@ class WebSocketConnectionManager(WebSocketInterface):
                                 file_context += f"**Large CSV file - Sample content:**\n```csv\n{sample_content}\n```\n"
                                 file_context += f"**Full file available in sandbox as '{filename}' with {len(lines)} total rows.**\n\n"
                                 current_context_length += len(sample_content) + 200
-                        except UnicodeDecodeError:
+                        else:
                             file_context += "Binary CSV file content (use pandas to read in analysis)\n\n"
                     
                     elif file_format == "application/pdf":
-                        # For PDFs, extract and provide the actual text content
-                        try:
-                            pdf_text = await self._extract_pdf_text(file_data)
+                        # For PDFs, provide the actual text content
+                        if not extracted.get("error"):
+                            pdf_text = extracted["text"]
                             if pdf_text.strip():
                                 if current_context_length + len(pdf_text) < MAX_CONTEXT_LENGTH:
                                     # Provide complete PDF content for comprehensive analysis
@@ -1069,15 +1114,13 @@ class WebSocketConnectionManager(WebSocketInterface):
                                     current_context_length += 2500
                             else:
                                 file_context += "PDF document - Could not extract readable text content.\n\n"
-                        except Exception as e:
-                            logger.warning(f"Could not extract PDF text for {filename}: {str(e)}")
-                            file_size = len(file_data)
+                        else:
                             file_context += f"PDF document ({file_size} bytes) - Could not extract text, but file is available for analysis.\n\n"
                     
                     elif file_format in ["text/plain", "text/markdown"]:
                         # For text files, show content with size check
-                        try:
-                            content = file_data.decode('utf-8')
+                        if not extracted.get("binary"):
+                            content = extracted["text"]
                             if current_context_length + len(content) < MAX_CONTEXT_LENGTH:
                                 file_context += f"```\n{content}\n```\n\n"
                                 current_context_length += len(content)
@@ -1086,45 +1129,46 @@ class WebSocketConnectionManager(WebSocketInterface):
                                 file_context += f"**Large text file - Content preview:**\n```\n{content_sample}\n```\n"
                                 file_context += f"**Full file available in sandbox as '{filename}'.**\n\n"
                                 current_context_length += 2500
-                        except UnicodeDecodeError:
+                        else:
                             file_context += "Binary text file content\n\n"
                     
                     elif file_format in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]:
                         # For Word documents, provide basic info and note they're available
-                        file_size = len(file_data)
                         file_context += f"Word document ({file_size} bytes) - Available for text extraction and analysis.\n"
                         file_context += "Use document processing tools to extract content if needed.\n\n"
                     
                     elif file_format in ["application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
                         # For XLSX files, use intelligent approach based on size
                         try:
-                            # First try to get full content
-                            xlsx_content = await self._extract_xlsx_content(file_data)
-                            if xlsx_content.strip():
-                                # Check if full content fits in context
-                                if current_context_length + len(xlsx_content) < MAX_CONTEXT_LENGTH:
+                            xlsx_content = extracted["text"]
+                            if extracted.get("error"):
+                                file_context += f"Excel spreadsheet ({file_size} bytes) - Could not extract content, but file is available for analysis.\n\n"
+                            elif xlsx_content.strip():
+                                if extracted.get("sketch"):
+                                    # Large spreadsheet - profiled at upload, describe it instead of inlining rows
+                                    xlsx_summary = render_sketch(extracted["sketch"], filename)
+                                    file_context += f"**XLSX File Analysis Summary (Large File):**\n```\n{xlsx_summary}\n```\n"
+                                    file_context += f"**Complete spreadsheet data available in sandbox as '{filename}' for detailed analysis.**\n\n"
+                                    current_context_length += len(xlsx_summary) + 200
+                                elif current_context_length + len(xlsx_content) < MAX_CONTEXT_LENGTH:
                                     # Small enough - provide complete XLSX content
                                     file_context += f"```xlsx\n{xlsx_content}\n```\n\n"
                                     current_context_length += len(xlsx_content)
                                 else:
-                                    # Too large - provide intelligent summary instead
-                                    logger.info(f"XLSX file {filename} too large ({len(xlsx_content)} chars), creating summary")
-                                    xlsx_summary = await self._create_xlsx_summary(file_data, filename)
-                                    file_context += f"**XLSX File Analysis Summary (Large File):**\n```\n{xlsx_summary}\n```\n"
+                                    # Does not fit next to the other files - provide a preview
+                                    xlsx_sample = xlsx_content[:2000] + "..."
+                                    file_context += f"**Large XLSX file - Content preview:**\n```\n{xlsx_sample}\n```\n"
                                     file_context += f"**Complete spreadsheet data available in sandbox as '{filename}' for detailed analysis.**\n\n"
-                                    current_context_length += len(xlsx_summary) + 200
+                                    current_context_length += 2500
                             else:
-                                file_size = len(file_data)
                                 file_context += f"Excel spreadsheet ({file_size} bytes) - Available for data analysis.\n"
                                 file_context += "Use pandas or similar tools to read and analyze the data.\n\n"
                         except Exception as e:
                             logger.warning(f"Could not extract XLSX content for {filename}: {str(e)}")
-                            file_size = len(file_data)
                             file_context += f"Excel spreadsheet ({file_size} bytes) - Could not extract content, but file is available for analysis.\n\n"
                     
                     else:
                         # For other file types, provide basic info
-                        file_size = len(file_data)
                         file_context += f"File format: {file_format}, Size: {file_size} bytes\n"
                         file_context += "File is available for processing in the analysis environment.\n\n"
                         
@@ -1135,259 +1179,6 @@ class WebSocketConnectionManager(WebSocketInterface):
         logger.info(f"Generated context with {current_context_length} characters for {len(doc_ids)} files")
         return file_context
 
-    async def _extract_pdf_text(self, file_data: bytes) -> str:
-        """Extract text content from PDF file data using PyMuPDF."""
-        try:
-            # Create a temporary file to write the PDF data
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                temp_file.write(file_data)
-                temp_path = temp_file.name
-
-            try:
-                # Extract text using PyMuPDF in a separate thread to avoid blocking
-                text = await asyncio.to_thread(self._extract_pdf_text_sync, temp_path)
-                return text
-            finally:
-                # Clean up the temporary file
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-                    
-        except Exception as e:
-            logger.error(f"Error extracting PDF text: {str(e)}")
-            raise
-
-    def _extract_pdf_text_sync(self, file_path: str) -> str:
-        """Unified PDF extraction using pdfplumber with inline table formatting."""
-        text = ""
-        
-        try:
-            with pdfplumber.open(file_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    text += f"--- Page {page_num + 1} ---\n"
-                    
-                    # Extract tables from this page
-                    tables = page.extract_tables()
-                    
-                    if tables:
-                        # Extract regular text first
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n\n"
-                        
-                        # Add clean HTML tables inline for better LLM parsing
-                        for table_idx, table in enumerate(tables):
-                            if table and len(table) > 1:  # Valid table with data
-                                # Convert table to DataFrame for clean HTML output
-                                import pandas as pd
-                                
-                                # Use first row as headers if it looks like headers
-                                headers = table[0] if table[0] else [f"Column_{i}" for i in range(len(table[0]) if table[0] else 0)]
-                                data_rows = table[1:] if len(table) > 1 else []
-                                
-                                if data_rows:
-                                    # Clean headers and data
-                                    clean_headers = []
-                                    for i, h in enumerate(headers):
-                                        if h and str(h).strip():
-                                            clean_headers.append(str(h).strip())
-                                        else:
-                                            clean_headers.append(f"Column_{i}")
-                                    
-                                    # Create DataFrame with proper data cleaning
-                                    clean_data = []
-                                    for row in data_rows:
-                                        clean_row = []
-                                        for cell in row:
-                                            if cell:
-                                                cell_text = str(cell).strip().replace('\n', ' ').replace('\r', ' ')
-                                                cell_text = cell_text.replace('  ', ' ').strip()
-                                                clean_row.append(cell_text)
-                                            else:
-                                                clean_row.append("")
-                                        clean_data.append(clean_row)
-                                    
-                                    # Ensure data rows match header length
-                                    max_cols = len(clean_headers)
-                                    for row in clean_data:
-                                        while len(row) < max_cols:
-                                            row.append("")
-                                        if len(row) > max_cols:
-                                            row = row[:max_cols]
-                                    
-                                    df = pd.DataFrame(clean_data, columns=clean_headers)
-                                    
-                                    # Remove completely empty rows and columns
-                                    df = df.dropna(how='all').dropna(axis=1, how='all')
-                                    
-                                    if not df.empty:
-                                        # Convert to clean HTML
-                                        html_table = df.to_html(
-                                            index=False,
-                                            na_rep='',
-                                            classes="extracted-table",
-                                            escape=False,
-                                            border=1
-                                        )
-                                        
-                                        text += f"\n[TABLE {table_idx+1} - Page {page_num+1}]\n"
-                                        text += html_table + "\n"
-                                        text += f"[END TABLE {table_idx+1}]\n\n"
-                    
-                    else:
-                        # No tables, just extract text
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n\n"
-                            
-        except Exception as e:
-            logger.error(f"Error in pdfplumber extraction: {str(e)}")
-            # Fallback to basic text extraction
-            try:
-                with pdfplumber.open(file_path) as pdf:
-                    for page_num, page in enumerate(pdf.pages):
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += f"--- Page {page_num + 1} ---\n{page_text}\n\n"
-            except Exception as fallback_error:
-                logger.error(f"Fallback extraction failed: {str(fallback_error)}")
-                raise
-                
-        return text.strip()
-
-    async def _extract_xlsx_content(self, file_data: bytes) -> str:
-        """Extract content from XLSX file data directly from bytes using pandas and openpyxl."""
-        try:
-            # Extract content using pandas in a separate thread to avoid blocking
-            content = await asyncio.to_thread(self._extract_xlsx_content_sync, file_data)
-            return content
-        except Exception as e:
-            logger.error(f"Error extracting XLSX content: {str(e)}")
-            raise
-
-    def _extract_xlsx_content_sync(self, file_data: bytes) -> str:
-        """Synchronous XLSX extraction using pandas directly from bytes."""
-        import pandas as pd
-        from io import BytesIO
-        
-        content = ""
-        
-        try:
-            # Create BytesIO object from file data - no temp file needed
-            bytes_io = BytesIO(file_data)
-            
-            # Read all sheets from the XLSX file
-            xlsx_file = pd.ExcelFile(bytes_io)
-            
-            for sheet_num, sheet_name in enumerate(xlsx_file.sheet_names):
-                content += f"--- Sheet: {sheet_name} ---\n"
-                
-                try:
-                    # Read the sheet data directly from BytesIO
-                    df = pd.read_excel(bytes_io, sheet_name=sheet_name)
-                    
-                    # Convert dataframe to string representation for context
-                    if not df.empty:
-                        # Provide complete sheet content for comprehensive analysis
-                        sheet_content = df.to_string(index=False, max_rows=None, max_cols=None)
-                        content += f"{sheet_content}\n\n"
-                    else:
-                        content += "Empty sheet\n\n"
-                        
-                except Exception as sheet_error:
-                    logger.warning(f"Could not read sheet '{sheet_name}': {str(sheet_error)}")
-                    content += f"Could not read sheet '{sheet_name}'\n\n"
-                    
-        except Exception as e:
-            logger.error(f"Error in XLSX extraction: {str(e)}")
-            raise
-            
-        return content.strip()
-
-    async def _create_xlsx_summary(self, file_data: bytes, filename: str) -> str:
-        """Create an intelligent summary of XLSX file content for large files."""
-        try:
-            content = await asyncio.to_thread(self._create_xlsx_summary_sync, file_data, filename)
-            return content
-        except Exception as e:
-            logger.error(f"Error creating XLSX summary: {str(e)}")
-            raise
-
-    def _create_xlsx_summary_sync(self, file_data: bytes, filename: str) -> str:
-        """Synchronous XLSX summarization for large files."""
-        import pandas as pd
-        from io import BytesIO
-        
-        summary = f"XLSX File Summary: {filename}\n\n"
-        
-        try:
-            # Create BytesIO object from file data
-            bytes_io = BytesIO(file_data)
-            
-            # Read all sheets from the XLSX file
-            xlsx_file = pd.ExcelFile(bytes_io)
-            
-            summary += f"Number of sheets: {len(xlsx_file.sheet_names)}\n"
-            summary += f"Sheet names: {', '.join(xlsx_file.sheet_names)}\n\n"
-            
-            for sheet_num, sheet_name in enumerate(xlsx_file.sheet_names):
-                summary += f"### Sheet: {sheet_name}\n"
-                
-                try:
-                    # Read the sheet data directly from BytesIO
-                    df = pd.read_excel(bytes_io, sheet_name=sheet_name)
-                    
-                    if not df.empty:
-                        # Basic statistics
-                        summary += f"- Dimensions: {df.shape[0]} rows × {df.shape[1]} columns\n"
-                        
-                        # Column information
-                        summary += f"- Columns: {', '.join(df.columns.tolist())}\n"
-                        
-                        # Data types
-                        dtype_summary = df.dtypes.value_counts().to_dict()
-                        summary += f"- Data types: {dtype_summary}\n"
-                        
-                        # Sample of first few rows for context
-                        if len(df) > 0:
-                            summary += f"- First 3 rows sample:\n"
-                            sample_df = df.head(3)
-                            summary += sample_df.to_string(index=False) + "\n"
-                        
-                        # Numeric column statistics
-                        numeric_cols = df.select_dtypes(include=['number']).columns
-                        if len(numeric_cols) > 0:
-                            summary += f"- Numeric columns ({len(numeric_cols)}): {', '.join(numeric_cols)}\n"
-                            desc = df[numeric_cols].describe()
-                            summary += f"- Key statistics:\n{desc.to_string()}\n"
-                        
-                        # Categorical columns info
-                        categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-                        if len(categorical_cols) > 0:
-                            summary += f"- Text/Categorical columns ({len(categorical_cols)}): {', '.join(categorical_cols)}\n"
-                            for col in categorical_cols[:3]:  # Show unique values for first 3 categorical columns
-                                unique_vals = df[col].unique()[:10]  # First 10 unique values
-                                summary += f"  - {col}: {len(df[col].unique())} unique values, sample: {list(unique_vals)}\n"
-                        
-                        # Missing data info
-                        missing_data = df.isnull().sum()
-                        missing_cols = missing_data[missing_data > 0]
-                        if len(missing_cols) > 0:
-                            summary += f"- Missing data: {missing_cols.to_dict()}\n"
-                    else:
-                        summary += "- Empty sheet\n"
-                        
-                    summary += "\n"
-                        
-                except Exception as sheet_error:
-                    logger.warning(f"Could not analyze sheet '{sheet_name}': {str(sheet_error)}")
-                    summary += f"- Could not analyze sheet '{sheet_name}'\n\n"
-                    
-        except Exception as e:
-            logger.error(f"Error in XLSX summarization: {str(e)}")
-            raise
-            
-        return summary.strip()
-
     async def _auto_approve_interrupt(
         self,
         user_id: str,
@@ -1581,7 +1372,9 @@ class WebSocketConnectionManager(WebSocketInterface):
                 )
 
             # Load user's API keys and provider settings
-            redis_api_keys = await self.message_storage.get_user_api_key(user_id)
+            redis_api_keys = await self.message_storage.get_user_api_key(
+                user_id, allow_stale=True
+            )
 
             if redis_api_keys.sambanova_key == "":
                 logger.error("No API keys found for voice message injection")
@@ -1742,16 +1535,18 @@ class WebSocketConnectionManager(WebSocketInterface):
 
         for doc_id in doc_ids:
             all_file_ids.append(doc_id["id"])
-            logger.info(f"[DOCUMENT_TRACE] Processing doc_id: {doc_id['id']}, indexed: {doc_id.get('indexed', False)}, format: {doc_id.get('format', 'unknown')}")
-            if doc_id["indexed"]:
-                indexed_doc_ids.append(doc_id["id"])
-                logger.info(f"[DOCUMENT_TRACE] Added {doc_id['id']} to indexed_doc_ids")
-            else:
-                logger.warning(f"[DOCUMENT_TRACE] Skipping {doc_id['id']} - NOT INDEXED!")
+            logger.info(f"[DOCUMENT_TRACE] Processing doc_id: {doc_id['id']}, format: {doc_id.get('format', 'unknown')}")
             if doc_id["format"] in ["text/csv", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel"]:
                 data_analysis_doc_ids.append(doc_id["id"])
                 directory_content.append(doc_id["filename"])
 
+        # Indexing finishes in the background after upload, so the indexed
+        # state comes from the file metadata rather than the client
+        if all_file_ids:
+            indexed_doc_ids = await self.message_storage.get_indexed_document_ids(
+                user_id, all_file_ids
+            )
+
         logger.info(f"[DOCUMENT_TRACE] Final indexed_doc_ids: {indexed_doc_ids}")
         logger.info(f"[DOCUMENT_TRACE] Final all_file_ids: {all_file_ids}")
 
@@ -1820,8 +1615,11 @@ class WebSocketConnectionManager(WebSocketInterface):
                 redis_storage=self.message_storage,
                 snapshot="data-analysis:0.0.10",
                 file_ids=daytona_file_ids,
+                conversation_id=thread_id,
             )
             self.daytona_managers[f"{user_id}:{thread_id}"] = daytona_manager
+        else:
+            daytona_manager.add_file_ids(daytona_file_ids)
 
         tools_config = [
             {
@@ -6,7 +6,7 @@ import time
 import uuid
 from datetime import datetime
 from operator import add
-from typing import Annotated, Dict, List, Optional, TypedDict
+from typing import Annotated, Dict, List, Optional, Tuple, TypedDict
 
 import langsmith as ls
 import structlog
@@ -155,6 +155,25 @@ class CorrectingExecutorState(TypedDict):
     workflow_timing: Optional[Dict]
 
 
+def _artifact_mime_type(filename: str) -> Optional[str]:
+    """MIME type of a file the code produced; None for files not kept as artifacts."""
+    mime_type, _ = mimetypes.guess_type(filename)
+    if mime_type is not None:
+        return mime_type
+    name = filename.lower()
+    if name.endswith(".md"):
+        return "text/markdown"
+    if name.endswith(".pptx"):
+        return "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+    if name.endswith(".ppt"):
+        return "application/vnd.ms-powerpoint"
+    if name.endswith(".pdf"):
+        return "application/pdf"
+    if name.endswith((".docx", ".doc")):
+        return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    return None
+
+
 def create_code_execution_graph(
     user_id: str,
     sambanova_api_key: str,
@@ -255,7 +274,9 @@ def create_code_execution_graph(
         files = []
         try:
             response = None
-            list_of_files = await daytona_manager.list_files(".")
+            # Lazily uploaded inputs must not look like outputs of the run
+            await daytona_manager.materialize_files(state["code"])
+            files_before = await daytona_manager.snapshot_files()
             response, execution_successful = await daytona_manager.execute_code(
                 state["code"]
             )
@@ -268,87 +289,68 @@ def create_code_execution_graph(
                 )
 
                 generation_timestamp = time.time()
-                list_of_files_after_execution = (
-                    await daytona_manager.get_all_files_recursive()
-                )
-                for file_info in list_of_files_after_execution:
-                    file = file_info["file"]
-                    file_path = file_info["path"]
-                    mime_type, _ = mimetypes.guess_type(file.name)
-
-                    if mime_type is None:
-                        if file.name.lower().endswith(".md"):
-                            mime_type = "text/markdown"
-                        elif file.name.lower().endswith((".pptx", ".ppt")):
-                            mime_type = (
-                                "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                                if file.name.lower().endswith(".pptx")
-                                else "application/vnd.ms-powerpoint"
-                            )
-                        elif file.name.lower().endswith(".pdf"):
-                            mime_type = "application/pdf"
-                        elif file.name.lower().endswith((".docx", ".doc")):
-                            mime_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
 
-                    if file.name not in list_of_files and mime_type is not None:
-                        file_id = str(uuid.uuid4())
+                async def store_artifact(
+                    file_path: str, content: bytes
+                ) -> Tuple[str, Optional[str]]:
+                    """Store a created or modified file; returns its reference and file ID."""
+                    filename = os.path.basename(file_path)
+                    mime_type = _artifact_mime_type(filename)
+                    file_id = str(uuid.uuid4())
+                    reference = f"\n\n![{filename}](attachment:{file_id})"
+                    if mime_type == "text/html":
                         try:
-                            content = await daytona_manager.download_file(file_path)
-                            if mime_type == "text/html":
-                                try:
-                                    content_str = (
-                                        content.decode("utf-8")
-                                        if isinstance(content, bytes)
-                                        else str(content)
-                                    )
-                                    fixed_content = validate_and_fix_html_content(
-                                        content_str, file.name
-                                    )
-                                    if fixed_content != content_str:
-                                        content = (
-                                            fixed_content.encode("utf-8")
-                                            if isinstance(fixed_content, str)
-                                            else fixed_content
-                                        )
-                                    if not (
-                                        "<html" in fixed_content.lower()
-                                        or "<body" in fixed_content.lower()
-                                    ):
-                                        result_str += f"\n\n**Note**: {file.name} may not contain complete HTML structure"
-                                    else:
-                                        result_str += (
-                                            f"\n\n![{file.name}](attachment:{file_id})"
-                                        )
-                                except Exception as html_check_error:
-                                    logger.warning(
-                                        f"Could not validate HTML content: {html_check_error}"
-                                    )
-                            elif mime_type in images_formats:
-                                result_str += f"\n\n![{file.name}](redis-chart:{file_id}:{user_id})"
-                            else:
-                                result_str += (
-                                    f"\n\n![{file.name}](attachment:{file_id})"
-                                )
-
-                            if redis_storage:
-                                files.append(file_id)
-                                await redis_storage.put_file(
-                                    user_id,
-                                    file_id,
-                                    data=content,
-                                    filename=file.name,
-                                    format=mime_type,
-                                    upload_timestamp=generation_timestamp,
-                                    indexed=False,
-                                    source="daytona",
+                            content_str = (
+                                content.decode("utf-8")
+                                if isinstance(content, bytes)
+                                else str(content)
+                            )
+                            fixed_content = validate_and_fix_html_content(
+                                content_str, filename
+                            )
+                            if fixed_content != content_str:
+                                content = (
+                                    fixed_content.encode("utf-8")
+                                    if isinstance(fixed_content, str)
+                                    else fixed_content
                                 )
-                        except Exception as e:
-                            logger.error(
-                                "Error downloading file from sandbox",
-                                filename=file.name,
-                                error=str(e),
-                                exc_info=True,
+                            if not (
+                                "<html" in fixed_content.lower()
+                                or "<body" in fixed_content.lower()
+                            ):
+                                reference = f"\n\n**Note**: {filename} may not contain complete HTML structure"
+                        except Exception as html_check_error:
+                            logger.warning(
+                                f"Could not validate HTML content: {html_check_error}"
                             )
+                            reference = ""
+                    elif mime_type in images_formats:
+                        reference = f"\n\n![{filename}](redis-chart:{file_id}:{user_id})"
+
+                    if redis_storage:
+                        await redis_storage.put_file(
+                            user_id,
+                            file_id,
+                            data=content,
+                            filename=filename,
+                            format=mime_type,
+                            upload_timestamp=generation_timestamp,
+                            indexed=False,
+                            source="daytona",
+                        )
+                        return reference, file_id
+                    return reference, None
+
+                # Files created or modified by the run, in any directory
+                harvested = await daytona_manager.harvest_files(
+                    files_before,
+                    store_artifact,
+                    include=lambda path: _artifact_mime_type(path) is not None,
+                )
+                for reference, file_id in harvested.values():
+                    result_str += reference
+                    if file_id:
+                        files.append(file_id)
 
                 result = {
                     "current_retry": state["current_retry"] + 1,
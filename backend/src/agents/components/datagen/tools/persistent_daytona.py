@@ -1,11 +1,27 @@
+import asyncio
+import json
 import mimetypes
 import os
 import time
 import uuid
-from ast import Tuple
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import structlog
+from agents.components.datagen.tools.sandbox_pool import SandboxPool, get_sandbox_pool
+from agents.components.datagen.tools.sandbox_sessions import (
+    SandboxSessions,
+    get_sandbox_sessions,
+)
 from agents.storage.redis_storage import RedisStorage
 from agents.utils.code_validator import patch_plot_code_str, strip_markdown_code_blocks
 from agents.utils.sandbox_security import (
@@ -15,17 +31,43 @@ from agents.utils.sandbox_security import (
     validate_filename,
     validate_shell_command,
 )
-
-# Import Daytona SDK components - using sync versions
-from daytona_sdk import AsyncDaytona as DaytonaClient
-from daytona_sdk import CreateSandboxFromSnapshotParams
-from daytona_sdk import DaytonaConfig as DaytonaSDKConfig
 from langchain.tools import tool
 from pydantic import BaseModel, Field
 from typing_extensions import Annotated
 
 logger = structlog.get_logger(__name__)
 
+# Concurrent directory listings and downloads when harvesting artifacts
+HARVEST_CONCURRENCY = int(os.getenv("DAYTONA_HARVEST_CONCURRENCY", "8"))
+
+# Concurrent input file uploads into a sandbox
+UPLOAD_CONCURRENCY = int(os.getenv("DAYTONA_UPLOAD_CONCURRENCY", "8"))
+
+# Upload input files only once code references them by name
+LAZY_UPLOADS = os.getenv("DAYTONA_LAZY_UPLOADS", "false").lower() == "true"
+
+T = TypeVar("T")
+
+
+class FileState(NamedTuple):
+    """What a snapshot records of a sandbox file to tell whether it changed."""
+
+    size: int
+    mod_time: str
+
+
+def _manifest_entry(content_hash: str, state: FileState) -> str:
+    return json.dumps([content_hash, state.size, state.mod_time])
+
+
+def _parse_manifest_entry(entry: str) -> Optional[Tuple[str, FileState]]:
+    """Content hash and uploaded file state; None for unreadable entries."""
+    try:
+        content_hash, size, mod_time = json.loads(entry)
+    except (TypeError, ValueError):
+        return None
+    return content_hash, FileState(size, mod_time)
+
 
 class PersistentDaytonaManager:
     """
@@ -39,144 +81,314 @@ class PersistentDaytonaManager:
         redis_storage: RedisStorage,
         snapshot: str = "data-analysis:0.0.10",
         file_ids: Optional[List[str]] = None,
+        sandbox_pool: Optional[SandboxPool] = None,
+        conversation_id: Optional[str] = None,
+        sandbox_sessions: Optional[SandboxSessions] = None,
+        lazy_uploads: Optional[bool] = None,
     ):
         """
-        Initialize the persistent Daytona manager. The client and sandbox will be created on first use.
+        Initialize the persistent Daytona manager. The sandbox will be leased on first use.
 
         Args:
             user_id: User identifier for the session
             redis_storage: Redis storage instance for file management
             snapshot: Daytona snapshot to use for the sandbox
             file_ids: List of file IDs stored in Redis to upload to sandbox root folder
+            sandbox_pool: Pool to lease the sandbox from, the process-wide one by default
+            conversation_id: Conversation to keep the sandbox for between runs
+            sandbox_sessions: Session store binding sandboxes to conversations,
+                the process-wide one by default
+            lazy_uploads: Upload files only once code references them,
+                DAYTONA_LAZY_UPLOADS by default
         """
         self._sandbox: Optional[Any] = None
-        self._client: Optional[DaytonaClient] = None
+        self._pool = sandbox_pool or get_sandbox_pool()
+        self._conversation_id = conversation_id
+        # Without a conversation the sandbox is leased per run
+        self._sessions = (
+            (sandbox_sessions or get_sandbox_sessions()) if conversation_id else None
+        )
         self._user_id = user_id
         self._redis_storage = redis_storage
         self._snapshot = snapshot
         self._file_ids = file_ids
+        # Content hash and state of each file uploaded to the sandbox, by path
+        self._manifest: Dict[str, str] = {}
+        # Lazy uploads not yet materialized: path to (file ID, content hash)
+        self._pending_uploads: Dict[str, Tuple[str, str]] = {}
+        self._lazy_uploads = LAZY_UPLOADS if lazy_uploads is None else lazy_uploads
 
     async def _get_sandbox(self):
         """Get the sandbox instance, creating it if it doesn't exist."""
         if self._sandbox is None:
-            if self._client is None:
-                api_key = os.getenv("DAYTONA_API_KEY")
-                if not api_key:
-                    raise ValueError("DAYTONA_API_KEY environment variable not set")
-
+            manifest: Dict[str, str] = {}
+            if self._sessions:
+                # Reattach to the conversation's sandbox, from any replica
+                self._sandbox, manifest = await self._sessions.attach(
+                    self._user_id, self._conversation_id, self._snapshot
+                )
+            else:
                 logger.info(
-                    "Initializing persistent Daytona client on first use",
+                    "Leasing persistent Daytona sandbox on first use",
                     user_id=self._user_id,
                 )
 
-                config = DaytonaSDKConfig(api_key=api_key)
-                self._client = DaytonaClient(config)
-
-            logger.info(
-                "Creating persistent Daytona sandbox on first use",
-                user_id=self._user_id,
-            )
-
-            params = CreateSandboxFromSnapshotParams(
-                snapshot=self._snapshot,
-            )
-            self._sandbox = await self._client.create(params=params)
+                # Pre-warmed by the pool; only created here when none is idle
+                self._sandbox = await self._pool.acquire(self._snapshot, self._user_id)
 
             logger.info(
-                "Persistent Daytona sandbox created",
-                sandbox_id=self._sandbox,
+                "Persistent Daytona sandbox ready",
+                sandbox_id=self._sandbox.id,
                 user_id=self._user_id,
             )
 
-            # Upload files to sandbox root folder if provided
+            self._manifest = manifest
             if self._file_ids:
                 await self._upload_files(self._file_ids)
+        elif self._sessions:
+            # Keep a long run's session from looking idle to the reaper
+            await self._sessions.touch(
+                self._user_id, self._conversation_id, self._sandbox.id
+            )
 
         return self._sandbox
 
+    def add_file_ids(self, file_ids: List[str]) -> None:
+        """Files to upload from the next run on, e.g. attached to a new message."""
+        self._file_ids = list(dict.fromkeys([*(self._file_ids or []), *file_ids]))
+
     async def _upload_files(self, file_ids: List[str]) -> None:
-        """Upload files to the sandbox root folder."""
+        """
+        Upload files to the sandbox root folder, skipping those already there.
+
+        A file is skipped if the manifest shows the same content at its path
+        and the file still has the size and modification time it was
+        uploaded with, i.e. code has not since changed or deleted it. The
+        rest are uploaded concurrently, or with lazy uploads only noted until
+        ``materialize_files`` finds code referencing them.
+        """
+        metadata = await asyncio.gather(
+            *(
+                self._redis_storage.get_file_metadata(self._user_id, file_id)
+                for file_id in file_ids
+            )
+        )
+        candidates: Dict[str, Tuple[str, str]] = {}
+        for file_id, file_metadata in zip(file_ids, metadata):
+            if not file_metadata:
+                logger.warning("File not found in Redis, skipping", file_id=file_id)
+                continue
+            filename = file_metadata.get("filename", file_id)
+            candidates[filename] = (file_id, file_metadata.get("content_hash") or "")
+
+        uploaded: Dict[str, FileState] = {}
+        for filename, (_, content_hash) in candidates.items():
+            entry = _parse_manifest_entry(self._manifest.get(filename))
+            if content_hash and entry and entry[0] == content_hash:
+                uploaded[filename] = entry[1]
+        current = await self._stat_files(list(uploaded)) if uploaded else {}
+        pending = {
+            filename: entry
+            for filename, entry in candidates.items()
+            if filename not in uploaded or current.get(filename) != uploaded[filename]
+        }
+
         logger.info(
             "Uploading files to sandbox",
-            file_count=len(file_ids),
+            file_count=len(pending),
+            skipped=len(file_ids) - len(pending),
+            lazy=self._lazy_uploads,
         )
+        if self._lazy_uploads:
+            self._pending_uploads.update(pending)
+        else:
+            await self._upload_pending(pending)
 
-        try:
-            for file_id in file_ids:
-                await self._upload_file_to_sandbox(file_id)
+    async def _upload_pending(self, pending: Dict[str, Tuple[str, str]]) -> None:
+        """Upload files concurrently and record them in the manifest."""
+        slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
 
-            logger.info("Files uploaded successfully")
+        async def upload(filename: str, file_id: str, content_hash: str):
+            async with slots:
+                if await self._upload_file_to_sandbox(file_id, filename):
+                    return filename, content_hash
+                return None
 
+        try:
+            hashes = dict(
+                entry
+                for entry in await asyncio.gather(
+                    *(upload(filename, *entry) for filename, entry in pending.items())
+                )
+                if entry is not None
+            )
         except Exception as e:
             logger.error("Error uploading files", error=str(e), exc_info=True)
             raise
 
-    async def _upload_file_to_sandbox(self, file_id: str) -> None:
+        # Files whose state cannot be read are left out and uploaded again
+        states = await self._stat_files(list(hashes)) if hashes else {}
+        uploaded = {
+            filename: _manifest_entry(content_hash, states[filename])
+            for filename, content_hash in hashes.items()
+            if filename in states
+        }
+        self._manifest.update(uploaded)
+        if self._sessions and uploaded:
+            await self._sessions.mark_uploaded(
+                self._user_id, self._conversation_id, uploaded
+            )
+        logger.info("Files uploaded successfully", file_count=len(hashes))
+
+    async def _stat_files(self, paths: List[str]) -> Dict[str, FileState]:
+        """Current state of the given files, listing each directory once."""
+        directories: Dict[str, List[str]] = {}
+        for path in paths:
+            directory, _, name = path.rpartition("/")
+            directories.setdefault(directory or ".", []).append(name)
+
+        async def listing(directory: str) -> List[Any]:
+            try:
+                return await self._sandbox.fs.list_files(directory)
+            except Exception as e:
+                logger.warning("Error listing files", directory=directory, error=str(e))
+                return []
+
+        listings = await asyncio.gather(*(listing(d) for d in directories))
+        states: Dict[str, FileState] = {}
+        for directory, entries in zip(directories, listings):
+            wanted = set(directories[directory])
+            for entry in entries:
+                if entry.name in wanted and not entry.is_dir:
+                    path = entry.name if directory == "." else f"{directory}/{entry.name}"
+                    states[path] = FileState(entry.size, str(entry.mod_time))
+        return states
+
+    async def _upload_file_to_sandbox(self, file_id: str, filename: str) -> bool:
         """Upload a single file to the sandbox root folder."""
         try:
-            # Get file data and metadata from Redis
             file_data, file_metadata = await self._redis_storage.get_file(
                 self._user_id, file_id
             )
 
             if not file_data or not file_metadata:
                 logger.warning("File not found in Redis, skipping", file_id=file_id)
-                return
-
-            # Extract the original filename from metadata
-            filename = file_metadata.get("filename", file_id)
+                return False
 
             await self._sandbox.fs.upload_file(file_data, filename)
             logger.info("Uploaded file", filename=filename, file_id=file_id)
+            return True
 
         except Exception as e:
             logger.error("Error uploading file", file_id=file_id, error=str(e))
             raise
 
+    async def materialize_files(self, code: Optional[str] = None) -> None:
+        """
+        Upload lazily deferred files that ``code`` references by name, or all
+        of them without ``code``. Nothing to do unless uploads are lazy.
+        """
+        await self._get_sandbox()
+        referenced = {
+            filename: entry
+            for filename, entry in self._pending_uploads.items()
+            if code is None or filename in code
+        }
+        if referenced:
+            for filename in referenced:
+                del self._pending_uploads[filename]
+            await self._upload_pending(referenced)
+
     async def download_file(self, file_path: str) -> bytes:
         """Download a file from the sandbox."""
         sandbox = await self._get_sandbox()
         if not sandbox:
             raise RuntimeError("Daytona sandbox not initialized.")
+        await self.materialize_files(file_path)
         return await sandbox.fs.download_file(file_path)
 
-    # Recursively get all files from all directories
-    async def get_all_files_recursive(self, directory: str = "."):
+    async def snapshot_files(self, directory: str = ".") -> Dict[str, FileState]:
+        """
+        Size and modification time of every file under ``directory``, by path.
+
+        Directories are listed level by level, each level concurrently.
+        Hidden files and directories are skipped.
+        """
         sandbox = await self._get_sandbox()
         if not sandbox:
-            logger.error("Daytona sandbox not initialized. Call initialize() first.")
-            raise RuntimeError(
-                "Daytona sandbox not initialized. Call initialize() first."
-            )
-        all_files = []
-        try:
-            files = await sandbox.fs.list_files(directory)
-            for file in files:
-                if file.name.startswith("."):
-                    continue
-                if file.is_dir:
-                    # Build the full path for the subdirectory
-                    subdir_path = (
-                        file.name if directory == "." else f"{directory}/{file.name}"
-                    )
-                    subdir_files = await self.get_all_files_recursive(subdir_path)
-                    all_files.extend(subdir_files)
-                else:
-                    all_files.append(
-                        {
-                            "file": file,
-                            "path": (
-                                file.name
-                                if directory == "."
-                                else f"{directory}/{file.name}"
-                            ),
-                        }
+            raise RuntimeError("Daytona sandbox not initialized.")
+        slots = asyncio.Semaphore(HARVEST_CONCURRENCY)
+
+        async def listing(path: str) -> List[Any]:
+            async with slots:
+                try:
+                    return await sandbox.fs.list_files(path)
+                except Exception as e:
+                    logger.warning("Error listing files", directory=path, error=str(e))
+                    return []
+
+        snapshot: Dict[str, FileState] = {}
+        level = [directory]
+        while level:
+            listings = await asyncio.gather(*(listing(path) for path in level))
+            subdirs = []
+            for parent, entries in zip(level, listings):
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    path = entry.name if parent == "." else f"{parent}/{entry.name}"
+                    if entry.is_dir:
+                        subdirs.append(path)
+                    else:
+                        snapshot[path] = FileState(entry.size, str(entry.mod_time))
+            level = subdirs
+        return snapshot
+
+    async def harvest_files(
+        self,
+        before: Dict[str, FileState],
+        store: Callable[[str, bytes], Awaitable[T]],
+        include: Optional[Callable[[str], bool]] = None,
+    ) -> Dict[str, T]:
+        """
+        Download the files created or modified since the ``before`` snapshot.
+
+        Changed files are downloaded concurrently, at most
+        ``HARVEST_CONCURRENCY`` at a time, and each is passed to ``store`` as
+        soon as it arrives, so no more than that many are held in memory.
+        ``include`` filters changed paths before downloading. Returns what
+        ``store`` returned, by path, in path order; files that failed to
+        download or store are left out.
+        """
+        after = await self.snapshot_files()
+        changed = sorted(
+            path
+            for path, state in after.items()
+            if before.get(path) != state and (include is None or include(path))
+        )
+        slots = asyncio.Semaphore(HARVEST_CONCURRENCY)
+
+        async def harvest(path: str) -> Tuple[str, Optional[T]]:
+            async with slots:
+                try:
+                    content = await self._sandbox.fs.download_file(path)
+                    return path, await store(path, content)
+                except Exception as e:
+                    logger.error(
+                        "Error harvesting file from sandbox",
+                        path=path,
+                        error=str(e),
+                        exc_info=True,
                     )
-        except Exception as e:
-            logger.warning(f"Error listing files in {directory}: {e}")
-            return all_files
+                    return path, None
 
-        return all_files
+        harvested = await asyncio.gather(*(harvest(path) for path in changed))
+        logger.info(
+            "Harvested sandbox files",
+            scanned=len(after),
+            changed=len(changed),
+        )
+        return {path: result for path, result in harvested if result is not None}
 
     async def execute_code(self, code: str) -> tuple[str, bool]:
         """Execute code in the persistent sandbox."""
@@ -209,6 +421,7 @@ class PersistentDaytonaManager:
             )
 
             patched_code, expected_filenames = patch_plot_code_str(clean_code)
+            await self.materialize_files(clean_code)
 
             # Execute the code with timeout and error handling
             try:
@@ -283,6 +496,7 @@ class PersistentDaytonaManager:
         try:
             logger.info("Executing command in persistent sandbox", command=command)
 
+            await self.materialize_files(command)
             response = await sandbox.process.exec(command, timeout=timeout)
 
             # Ensure result is a string, even if None or other types
@@ -325,6 +539,7 @@ class PersistentDaytonaManager:
 
         try:
             # Use actual Daytona SDK call to list files
+            await self.materialize_files()
             files = await sandbox.fs.list_files(directory)
             file_names = [f.name for f in files]
 
@@ -344,6 +559,7 @@ class PersistentDaytonaManager:
             return False, "Error reading file: Daytona sandbox not initialized."
 
         try:
+            await self.materialize_files(filename)
             content = await sandbox.fs.download_file(filename)
             mime_type = mimetypes.guess_type(filename)[0]
             if mime_type == "text/html" or filename.endswith(".md"):
@@ -398,29 +614,36 @@ class PersistentDaytonaManager:
         return code.strip()
 
     async def cleanup(self):
-        """Clean up the persistent Daytona client and sandbox."""
+        """
+        End the run's use of the sandbox. A conversation's sandbox is kept for
+        its next run (the session reaper deletes it once idle); otherwise it
+        goes back to the pool, which scrubs it for reuse.
+        """
         try:
-            if self._sandbox:
+            if self._sandbox and self._sessions:
+                await self._sessions.touch(
+                    self._user_id, self._conversation_id, self._sandbox.id, force=True
+                )
                 logger.info(
-                    "Deleting persistent Daytona sandbox", sandbox_id=self._sandbox
+                    "Keeping Daytona sandbox for the conversation",
+                    sandbox_id=self._sandbox.id,
+                    conversation_id=self._conversation_id,
                 )
-                await self._sandbox.delete()
-                logger.info("Persistent Daytona sandbox deleted successfully")
-
-            # Close the client to properly close HTTP sessions
-            if self._client:
-                logger.info("Closing persistent Daytona client")
-                await self._client.close()
-                logger.info("Persistent Daytona client closed successfully")
+            elif self._sandbox:
+                logger.info(
+                    "Releasing persistent Daytona sandbox", sandbox_id=self._sandbox.id
+                )
+                await self._pool.release(
+                    self._snapshot, self._sandbox, user_id=self._user_id
+                )
+                logger.info("Persistent Daytona sandbox released successfully")
 
             # Reset the instance variables
-            self._client = None
             self._sandbox = None
             logger.info("Persistent Daytona manager cleaned up successfully")
         except Exception as e:
             logger.error("Error during cleanup", error=str(e), exc_info=True)
             # Still reset variables even if cleanup failed
-            self._client = None
             self._sandbox = None
 
 
@@ -0,0 +1,508 @@
+"""
+Pool of pre-warmed Daytona sandboxes.
+
+Creating a sandbox from a snapshot dominates the latency of the code tools,
+so sandboxes are created ahead of time and leased to runs instead. Each
+snapshot keeps ``DAYTONA_POOL_MIN_IDLE`` idle sandboxes, plus one more for
+every cold creation in the last ``DAYTONA_POOL_DEMAND_WINDOW`` seconds, so
+the pool grows with demand and shrinks back once idle sandboxes pass
+``DAYTONA_POOL_IDLE_TTL``. At most ``DAYTONA_POOL_MAX_SIZE`` sandboxes per
+snapshot exist at once; further leases wait for a release.
+
+Released sandboxes are scrubbed (their working directory emptied) and
+returned to the pool, or deleted if scrubbing fails. A scrub cannot undo
+everything a run may leave behind (background processes, files outside the
+working directory), so a used sandbox is only leased again to the user who
+released it; fresh sandboxes go to anyone, and another user's idle
+sandboxes are deleted to make room when the pool is full. Idle sandboxes are
+health-checked every ``DAYTONA_POOL_HEALTH_INTERVAL`` seconds. A pool that
+was not started (``DAYTONA_POOL_ENABLED=false``) creates a sandbox per
+lease and deletes it on release.
+
+The Daytona API sits behind ``SandboxBackend``; ``FakeSandboxBackend``
+keeps sandboxes in memory so the pool can be exercised offline.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import structlog
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+# Touched at creation: hidden files older than it belong to the snapshot
+BASELINE_FILE = ".sandbox_pool_baseline"
+# Empty the working directory and /tmp, keeping the snapshot's dotfiles
+SCRUB_COMMAND = (
+    f"find . /tmp -mindepth 1 -maxdepth 1 ! -name {BASELINE_FILE} "
+    f"\\( ! -name '.*' -o -newer {BASELINE_FILE} \\) -exec rm -rf {{}} +"
+)
+
+
+class SandboxBackend(ABC):
+    """Creates, checks and deletes sandboxes."""
+
+    @abstractmethod
+    async def create(self, snapshot: str) -> Any: ...
+
+    @abstractmethod
+    async def delete(self, sandbox: Any) -> None: ...
+
+    @abstractmethod
+    async def scrub(self, sandbox: Any) -> bool:
+        """Remove what a run left behind; False if the sandbox is unusable."""
+
+    @abstractmethod
+    async def healthy(self, sandbox: Any) -> bool: ...
+
+    @abstractmethod
+    async def get(self, sandbox_id: str) -> Optional[Any]:
+        """A running sandbox by ID, started if stopped; None if it is gone."""
+
+    async def close(self) -> None:
+        pass
+
+
+class DaytonaSandboxBackend(SandboxBackend):
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("DAYTONA_API_KEY")
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            if not self.api_key:
+                raise ValueError("DAYTONA_API_KEY environment variable not set")
+            from daytona_sdk import AsyncDaytona, DaytonaConfig
+
+            self._client = AsyncDaytona(DaytonaConfig(api_key=self.api_key))
+        return self._client
+
+    async def create(self, snapshot: str) -> Any:
+        from daytona_sdk import CreateSandboxFromSnapshotParams
+
+        sandbox = await self.client().create(
+            params=CreateSandboxFromSnapshotParams(snapshot=snapshot)
+        )
+        await sandbox.process.exec(f"touch {BASELINE_FILE}", timeout=30)
+        return sandbox
+
+    async def delete(self, sandbox: Any) -> None:
+        await sandbox.delete()
+
+    async def scrub(self, sandbox: Any) -> bool:
+        try:
+            response = await sandbox.process.exec(SCRUB_COMMAND, timeout=30)
+            return response.exit_code == 0
+        except Exception as e:
+            logger.warning("Could not scrub sandbox", sandbox_id=sandbox.id, error=str(e))
+            return False
+
+    async def healthy(self, sandbox: Any) -> bool:
+        try:
+            response = await sandbox.process.exec("true", timeout=10)
+            return response.exit_code == 0
+        except Exception:
+            return False
+
+    async def get(self, sandbox_id: str) -> Optional[Any]:
+        try:
+            sandbox = await self.client().get(sandbox_id)
+            if str(getattr(sandbox.state, "value", sandbox.state)).lower() != "started":
+                # Daytona stops idle sandboxes; starting one beats creating one
+                await sandbox.start()
+            return sandbox
+        except Exception as e:
+            logger.info("Sandbox is no longer available", sandbox_id=sandbox_id, error=str(e))
+            return None
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def _relative(path: str) -> str:
+    return path[2:] if path.startswith("./") else path
+
+
+class _FakeFileSystem:
+    def __init__(self):
+        self.files: Dict[str, Tuple[bytes, float]] = {}
+
+    async def upload_file(self, data: bytes, path: str, timeout: int = 0) -> None:
+        self.files[_relative(path)] = (data, time.time())
+
+    async def download_file(self, path: str, timeout: int = 0) -> bytes:
+        return self.files[_relative(path)][0]
+
+    async def list_files(self, directory: str) -> List[SimpleNamespace]:
+        prefix = "" if directory in (".", "") else directory.strip("/") + "/"
+        entries = {}
+        for path, (data, modified) in self.files.items():
+            if not path.startswith(prefix):
+                continue
+            name, _, rest = path[len(prefix) :].partition("/")
+            entries[name] = SimpleNamespace(
+                name=name,
+                is_dir=bool(rest),
+                size=0 if rest else len(data),
+                mod_time=str(modified),
+            )
+        return list(entries.values())
+
+
+class FakeSandbox:
+    """In-memory stand-in for a Daytona sandbox.
+
+    ``run`` is called with the sandbox and the code of each ``code_run``
+    and returns ``(exit_code, output)``; it can write files via ``fs``.
+    """
+
+    def __init__(self, snapshot: str, run: Optional[Callable] = None):
+        self.id = uuid.uuid4().hex
+        self.snapshot = snapshot
+        self.state = "started"
+        self.fs = _FakeFileSystem()
+        self.process = SimpleNamespace(code_run=self._code_run, exec=self._exec)
+        self.healthy = True
+        self._run = run
+
+    async def _code_run(self, code: str, *args, **kwargs) -> SimpleNamespace:
+        exit_code, result = self._run(self, code) if self._run else (0, "")
+        return SimpleNamespace(exit_code=exit_code, result=result, artifacts=None)
+
+    async def _exec(self, command: str, *args, **kwargs) -> SimpleNamespace:
+        if command == SCRUB_COMMAND:
+            self.fs.files.clear()
+        return SimpleNamespace(exit_code=0 if self.healthy else 1, result="")
+
+    async def start(self, timeout: float = 60) -> None:
+        self.state = "started"
+
+    async def delete(self) -> None:
+        self.state = "destroyed"
+
+
+class FakeSandboxBackend(SandboxBackend):
+    def __init__(self, run: Optional[Callable] = None, create_delay: float = 0.0):
+        self.run = run
+        self.create_delay = create_delay
+        self.sandboxes: Dict[str, FakeSandbox] = {}
+        self.created = 0
+        self.deleted = 0
+
+    async def create(self, snapshot: str) -> FakeSandbox:
+        await asyncio.sleep(self.create_delay)
+        sandbox = FakeSandbox(snapshot, self.run)
+        self.sandboxes[sandbox.id] = sandbox
+        self.created += 1
+        return sandbox
+
+    async def delete(self, sandbox: FakeSandbox) -> None:
+        await sandbox.delete()
+        self.sandboxes.pop(sandbox.id, None)
+        self.deleted += 1
+
+    async def scrub(self, sandbox: FakeSandbox) -> bool:
+        response = await sandbox.process.exec(SCRUB_COMMAND)
+        return response.exit_code == 0
+
+    async def healthy(self, sandbox: FakeSandbox) -> bool:
+        return sandbox.healthy and sandbox.state == "started"
+
+    async def get(self, sandbox_id: str) -> Optional[FakeSandbox]:
+        sandbox = self.sandboxes.get(sandbox_id)
+        if sandbox is not None:
+            await sandbox.start()
+        return sandbox
+
+
+@dataclass(eq=False)
+class _Idle:
+    sandbox: Any
+    since: float
+    checked: float
+    # The user whose runs used it; None for a fresh sandbox
+    owner: Optional[str] = None
+
+    def leasable_by(self, user_id: Optional[str]) -> bool:
+        return self.owner is None or self.owner == user_id
+
+
+@dataclass
+class _SnapshotPool:
+    idle: Deque[_Idle] = field(default_factory=deque)
+    leased: Dict[str, float] = field(default_factory=dict)
+    creating: int = 0
+    # Times of leases that had to wait for a new sandbox
+    misses: Deque[float] = field(default_factory=deque)
+    available: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+    @property
+    def size(self) -> int:
+        return len(self.idle) + len(self.leased) + self.creating
+
+
+def _setting(value, name: str, default: str, cast=int):
+    return cast(os.getenv(name, default)) if value is None else value
+
+
+class SandboxPool:
+    """Leases pre-warmed sandboxes per snapshot."""
+
+    def __init__(
+        self,
+        backend: SandboxBackend,
+        snapshots: Optional[List[str]] = None,
+        min_idle: Optional[int] = None,
+        max_size: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        health_interval: Optional[float] = None,
+        demand_window: Optional[float] = None,
+    ):
+        self.backend = backend
+        # Snapshots kept warm from startup; others warm up after their first lease
+        if snapshots is None:
+            default = os.getenv("DAYTONA_SNAPSHOT", "data-analysis:0.0.10")
+            snapshots = [
+                snapshot.strip()
+                for snapshot in os.getenv("DAYTONA_POOL_SNAPSHOTS", default).split(",")
+                if snapshot.strip()
+            ]
+        self.snapshots = snapshots
+        self.min_idle = _setting(min_idle, "DAYTONA_POOL_MIN_IDLE", "1")
+        self.max_size = _setting(max_size, "DAYTONA_POOL_MAX_SIZE", "20")
+        self.idle_ttl = _setting(idle_ttl, "DAYTONA_POOL_IDLE_TTL", "600", float)
+        self.health_interval = _setting(
+            health_interval, "DAYTONA_POOL_HEALTH_INTERVAL", "60", float
+        )
+        self.demand_window = _setting(
+            demand_window, "DAYTONA_POOL_DEMAND_WINDOW", "300", float
+        )
+        self._pools: Dict[str, _SnapshotPool] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = get_metrics_registry()
+
+    def _pool(self, snapshot: str) -> _SnapshotPool:
+        if snapshot not in self._pools:
+            # More recent misses than this could not raise the target further
+            self._pools[snapshot] = _SnapshotPool(misses=deque(maxlen=self.max_size))
+        return self._pools[snapshot]
+
+    def target_idle(self, snapshot: str) -> int:
+        """Idle sandboxes to keep: the minimum plus recent cold starts."""
+        pool = self._pool(snapshot)
+        cutoff = time.monotonic() - self.demand_window
+        while pool.misses and pool.misses[0] < cutoff:
+            pool.misses.popleft()
+        return min(self.min_idle + len(pool.misses), self.max_size)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            snapshot: {
+                "idle": len(pool.idle),
+                "leased": len(pool.leased),
+                "creating": pool.creating,
+            }
+            for snapshot, pool in self._pools.items()
+        }
+
+    async def _create(self, snapshot: str) -> Any:
+        """Create a sandbox; the caller has counted it in ``creating``."""
+        pool = self._pool(snapshot)
+        start = time.perf_counter()
+        try:
+            sandbox = await self.backend.create(snapshot)
+        finally:
+            pool.creating -= 1
+        self._metrics.observe("sandbox_pool.create_ms", (time.perf_counter() - start) * 1000)
+        return sandbox
+
+    async def acquire(self, snapshot: str, user_id: Optional[str] = None) -> Any:
+        """
+        Lease a sandbox, warm if one is idle; release it with ``release``.
+
+        Only fresh sandboxes and ones last used by ``user_id`` are leased.
+        """
+        pool = self._pool(snapshot)
+        start = time.perf_counter()
+        while True:
+            evicted = None
+            async with pool.available:
+                entry = next(
+                    (entry for entry in pool.idle if entry.leasable_by(user_id)), None
+                )
+                if entry is not None:
+                    pool.idle.remove(entry)
+                    sandbox = entry.sandbox
+                    pool.leased[sandbox.id] = time.monotonic()
+                    self._metrics.incr("sandbox_pool.hits")
+                    break
+                if pool.size >= self.max_size and pool.idle:
+                    # Only other users' sandboxes are idle; replace one
+                    evicted = pool.idle.popleft().sandbox
+                    self._metrics.incr("sandbox_pool.evictions")
+                if pool.size < self.max_size:
+                    pool.creating += 1
+                else:
+                    await pool.available.wait()
+                    continue
+
+            if evicted is not None:
+                await self._delete(evicted)
+
+            pool.misses.append(time.monotonic())
+            self._metrics.incr("sandbox_pool.misses")
+            try:
+                sandbox = await self._create(snapshot)
+            except Exception:
+                async with pool.available:
+                    pool.available.notify()
+                raise
+            pool.leased[sandbox.id] = time.monotonic()
+            break
+
+        self._metrics.observe("sandbox_pool.acquire_ms", (time.perf_counter() - start) * 1000)
+        return sandbox
+
+    async def release(
+        self,
+        snapshot: str,
+        sandbox: Any,
+        recycle: bool = False,
+        user_id: Optional[str] = None,
+    ) -> None:
+        """
+        Return a leased sandbox; scrubbed for reuse by ``user_id`` or, if
+        ``recycle`` or no user is given, deleted.
+        """
+        pool = self._pool(snapshot)
+        pool.leased.pop(sandbox.id, None)
+        # Without maintenance (pool not started) idle sandboxes would never expire
+        reusable = (
+            self._task is not None
+            and not recycle
+            and user_id is not None
+            and await self.backend.scrub(sandbox)
+        )
+        if reusable:
+            now = time.monotonic()
+            pool.idle.append(_Idle(sandbox, now, now, owner=user_id))
+        else:
+            await self._delete(sandbox)
+        async with pool.available:
+            pool.available.notify()
+
+    async def detach(self, snapshot: str, sandbox: Any) -> None:
+        """Hand a leased sandbox over to its new owner, freeing its pool slot."""
+        pool = self._pool(snapshot)
+        pool.leased.pop(sandbox.id, None)
+        async with pool.available:
+            pool.available.notify()
+
+    @asynccontextmanager
+    async def lease(self, snapshot: str, user_id: Optional[str] = None):
+        sandbox = await self.acquire(snapshot, user_id)
+        try:
+            yield sandbox
+        finally:
+            await self.release(snapshot, sandbox, user_id=user_id)
+
+    async def _delete(self, sandbox: Any) -> None:
+        try:
+            await self.backend.delete(sandbox)
+        except Exception as e:
+            logger.warning("Could not delete sandbox", sandbox_id=sandbox.id, error=str(e))
+
+    async def maintain(self, snapshot: str) -> None:
+        """Drop surplus and unhealthy idle sandboxes, then top up to the target."""
+        pool = self._pool(snapshot)
+        now = time.monotonic()
+        target = self.target_idle(snapshot)
+
+        # Entries leased while this runs are no longer in ``idle`` and are skipped
+        surplus = len(pool.idle) - target
+        for entry in list(pool.idle):
+            if surplus <= 0:
+                break
+            if now - entry.since > self.idle_ttl and entry in pool.idle:
+                pool.idle.remove(entry)
+                surplus -= 1
+                await self._delete(entry.sandbox)
+
+        for entry in list(pool.idle):
+            if now - entry.checked < self.health_interval:
+                continue
+            if await self.backend.healthy(entry.sandbox):
+                entry.checked = time.monotonic()
+            elif entry in pool.idle:
+                logger.info("Replacing unhealthy pooled sandbox", sandbox_id=entry.sandbox.id)
+                pool.idle.remove(entry)
+                await self._delete(entry.sandbox)
+
+        missing = min(target - len(pool.idle) - pool.creating, self.max_size - pool.size)
+        if missing <= 0:
+            return
+        pool.creating += missing
+        results = await asyncio.gather(
+            *(self._create(snapshot) for _ in range(missing)), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Could not pre-warm sandbox", snapshot=snapshot, error=str(result))
+            else:
+                created = time.monotonic()
+                pool.idle.append(_Idle(result, created, created))
+        async with pool.available:
+            pool.available.notify_all()
+
+    async def _run(self) -> None:
+        interval = max(min(self.health_interval, 30.0), 1.0)
+        while True:
+            for snapshot in set(self.snapshots) | set(self._pools):
+                try:
+                    await self.maintain(snapshot)
+                except Exception as e:
+                    logger.warning("Sandbox pool maintenance failed", snapshot=snapshot, error=str(e))
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for pool in self._pools.values():
+            while pool.idle:
+                await self._delete(pool.idle.popleft().sandbox)
+        await self.backend.close()
+
+
+_sandbox_pool: Optional[SandboxPool] = None
+
+
+def get_sandbox_pool() -> SandboxPool:
+    global _sandbox_pool
+    if _sandbox_pool is None:
+        _sandbox_pool = SandboxPool(DaytonaSandboxBackend())
+    return _sandbox_pool
+
+
+def set_sandbox_pool(pool: Optional[SandboxPool]) -> None:
+    global _sandbox_pool
+    _sandbox_pool = pool
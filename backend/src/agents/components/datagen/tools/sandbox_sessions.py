@@ -0,0 +1,322 @@
+"""
+Daytona sandboxes bound to conversations.
+
+A conversation keeps its sandbox between runs, so the next message neither
+waits for a new sandbox nor re-uploads the conversation's files. The
+binding lives in Redis, so whichever replica handles the next message
+reattaches to the same sandbox:
+
+- ``sandbox_session:<user>:<conversation>``: hash with the sandbox ID,
+  snapshot, last use, and a ``file:<path>`` field with the content hash of
+  each uploaded file (the sandbox's upload manifest)
+- ``sandbox_sessions:<user>``: the user's sessions by last use, to cap
+  them at ``SANDBOX_SESSION_MAX_PER_USER`` (least recently used evicted)
+- ``sandbox_sessions_idle``: every session by last use, for the reaper
+
+A background reaper deletes the sandboxes of sessions unused for
+``SANDBOX_SESSION_IDLE_TTL`` seconds; one replica reaps per interval.
+Sessions whose keys were erased with their user are reaped from the idle
+index alone.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import structlog
+from agents.components.datagen.tools.sandbox_pool import SandboxPool, get_sandbox_pool
+from agents.storage.keys import user_scope
+from agents.storage.redis_service import SecureRedisService
+from agents.storage.sweep_lock import acquire_sweep_lock
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+IDLE_INDEX_KEY = "sandbox_sessions_idle"
+
+# Only touch a session's last use this often while a run is using it
+TOUCH_INTERVAL_SECONDS = 60
+
+# Bind a sandbox unless another replica bound one first; returns the
+# sandbox ID now bound to the conversation
+_BIND_LUA = """
+local current = redis.call('HGET', KEYS[1], 'sandbox_id')
+if current then
+    return current
+end
+redis.call('HSET', KEYS[1], 'sandbox_id', ARGV[1], 'snapshot', ARGV[2], 'last_used', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[4])
+return ARGV[1]
+"""
+
+# Unbind a session if it still holds the given sandbox and was not used
+# after the cutoff; returns 1 if the sandbox may be deleted
+_UNBIND_LUA = """
+local current = redis.call('HGET', KEYS[1], 'sandbox_id')
+if current and current == ARGV[1] then
+    local last_used = tonumber(redis.call('HGET', KEYS[1], 'last_used') or '0')
+    if last_used > tonumber(ARGV[2]) then
+        return 0
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[2], ARGV[3])
+end
+return 1
+"""
+
+
+class SandboxSessions:
+    """Per-conversation sandboxes kept in Redis, with an idle reaper."""
+
+    def __init__(
+        self,
+        redis_client: SecureRedisService,
+        pool: Optional[SandboxPool] = None,
+        idle_ttl: Optional[float] = None,
+        max_per_user: Optional[int] = None,
+        reap_interval: Optional[float] = None,
+    ):
+        self.redis_client = redis_client
+        self.pool = pool or get_sandbox_pool()
+        self.idle_ttl = (
+            idle_ttl
+            if idle_ttl is not None
+            else float(os.getenv("SANDBOX_SESSION_IDLE_TTL", "1800"))
+        )
+        self.max_per_user = (
+            max_per_user
+            if max_per_user is not None
+            else int(os.getenv("SANDBOX_SESSION_MAX_PER_USER", "3"))
+        )
+        self.reap_interval = (
+            reap_interval
+            if reap_interval is not None
+            else float(os.getenv("SANDBOX_SESSION_REAP_INTERVAL", "60"))
+        )
+        self._bind_script = redis_client.register_script(_BIND_LUA)
+        self._unbind_script = redis_client.register_script(_UNBIND_LUA)
+        self._touched: Dict[Tuple[str, str], float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = get_metrics_registry()
+
+    @staticmethod
+    def _session_key(user_id: str, conversation_id: str) -> str:
+        return f"sandbox_session:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"sandbox_sessions:{user_scope(user_id)}"
+
+    @staticmethod
+    def _idle_member(user_id: str, conversation_id: str, sandbox_id: str) -> str:
+        return json.dumps([user_id, conversation_id, sandbox_id])
+
+    async def _session(self, user_id: str, conversation_id: str) -> Dict[str, str]:
+        # Session fields are plain text; pipelines bypass decryption
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._session_key(user_id, conversation_id))
+            (session,) = await pipe.execute()
+        return {
+            (k.decode() if isinstance(k, bytes) else k): (
+                v.decode() if isinstance(v, bytes) else v
+            )
+            for k, v in session.items()
+        }
+
+    async def attach(
+        self, user_id: str, conversation_id: str, snapshot: str
+    ) -> Tuple[Any, Dict[str, str]]:
+        """
+        The conversation's sandbox, reattached or newly bound.
+
+        Returns the sandbox and the content hashes of the files already
+        uploaded to it, by path.
+        """
+        session = await self._session(user_id, conversation_id)
+        sandbox_id = session.get("sandbox_id")
+        if sandbox_id and session.get("snapshot") == snapshot:
+            sandbox = await self.pool.backend.get(sandbox_id)
+            if sandbox is not None:
+                self._metrics.incr("sandbox_sessions.reattached")
+                await self.touch(user_id, conversation_id, sandbox_id, force=True)
+                return sandbox, _uploaded_files(session)
+        if sandbox_id:
+            # Gone (deleted outside the reaper) or for another snapshot
+            await self._unbind(user_id, conversation_id, sandbox_id, cutoff=float("inf"))
+
+        await self._enforce_user_cap(user_id)
+        sandbox = await self.pool.acquire(snapshot, user_id)
+        now = time.time()
+        bound_id = await self._bind_script(
+            keys=[self._session_key(user_id, conversation_id), self._user_key(user_id)],
+            args=[sandbox.id, snapshot, now, conversation_id],
+        )
+        bound_id = bound_id.decode() if isinstance(bound_id, bytes) else bound_id
+        if bound_id != sandbox.id:
+            # Another replica bound a sandbox to this conversation meanwhile
+            await self.pool.release(snapshot, sandbox, user_id=user_id)
+            return await self.attach(user_id, conversation_id, snapshot)
+
+        await self.pool.detach(snapshot, sandbox)
+        await self.redis_client.zadd(
+            IDLE_INDEX_KEY, {self._idle_member(user_id, conversation_id, sandbox.id): now}
+        )
+        self._touched[(user_id, conversation_id)] = now
+        self._metrics.incr("sandbox_sessions.bound")
+        logger.info(
+            "Bound sandbox to conversation",
+            sandbox_id=sandbox.id,
+            conversation_id=conversation_id,
+        )
+        return sandbox, {}
+
+    async def touch(
+        self, user_id: str, conversation_id: str, sandbox_id: str, force: bool = False
+    ) -> None:
+        """Record a use of the session, at most every TOUCH_INTERVAL_SECONDS."""
+        now = time.time()
+        key = (user_id, conversation_id)
+        if not force and now - self._touched.get(key, 0) < TOUCH_INTERVAL_SECONDS:
+            return
+        self._touched[key] = now
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hset(self._session_key(user_id, conversation_id), "last_used", now)
+            pipe.zadd(self._user_key(user_id), {conversation_id: now}, xx=True)
+            pipe.zadd(
+                IDLE_INDEX_KEY,
+                {self._idle_member(user_id, conversation_id, sandbox_id): now},
+                xx=True,
+            )
+            await pipe.execute()
+
+    async def mark_uploaded(
+        self, user_id: str, conversation_id: str, files: Dict[str, str]
+    ) -> None:
+        """Record files uploaded to the session's sandbox (path to manifest entry)."""
+        if files:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(
+                    self._session_key(user_id, conversation_id),
+                    mapping={f"file:{path}": value for path, value in files.items()},
+                )
+                await pipe.execute()
+
+    async def _unbind(
+        self, user_id: str, conversation_id: str, sandbox_id: str, cutoff: float
+    ) -> bool:
+        """Unbind and delete a session's sandbox unless it was used after ``cutoff``."""
+        unbound = await self._unbind_script(
+            keys=[self._session_key(user_id, conversation_id), self._user_key(user_id)],
+            # Lua numbers are doubles; a huge cutoff stands in for "always"
+            args=[sandbox_id, min(cutoff, 1e300), conversation_id],
+        )
+        if not unbound:
+            return False
+        await self.redis_client.zrem(
+            IDLE_INDEX_KEY, self._idle_member(user_id, conversation_id, sandbox_id)
+        )
+        self._touched.pop((user_id, conversation_id), None)
+        sandbox = await self.pool.backend.get(sandbox_id)
+        if sandbox is not None:
+            try:
+                await self.pool.backend.delete(sandbox)
+            except Exception as e:
+                logger.warning("Could not delete session sandbox", sandbox_id=sandbox_id, error=str(e))
+        return True
+
+    async def close(self, user_id: str, conversation_id: str) -> None:
+        """Delete a conversation's sandbox, e.g. when the conversation is deleted."""
+        session = await self._session(user_id, conversation_id)
+        if session.get("sandbox_id"):
+            await self._unbind(
+                user_id, conversation_id, session["sandbox_id"], cutoff=float("inf")
+            )
+
+    async def _enforce_user_cap(self, user_id: str) -> None:
+        """Evict the user's least recently used sessions to make room for one more."""
+        excess = await self.redis_client.zcard(self._user_key(user_id)) - self.max_per_user + 1
+        if excess <= 0:
+            return
+        for conversation_id in await self.redis_client.zrange(
+            self._user_key(user_id), 0, excess - 1
+        ):
+            if isinstance(conversation_id, bytes):
+                conversation_id = conversation_id.decode()
+            session = await self._session(user_id, conversation_id)
+            if session.get("sandbox_id"):
+                self._metrics.incr("sandbox_sessions.evicted")
+                await self._unbind(
+                    user_id, conversation_id, session["sandbox_id"], cutoff=float("inf")
+                )
+            else:
+                await self.redis_client.zrem(self._user_key(user_id), conversation_id)
+
+    async def reap(self) -> int:
+        """Delete the sandboxes of sessions idle past the TTL; returns how many."""
+        cutoff = time.time() - self.idle_ttl
+        self._touched = {
+            key: touched for key, touched in self._touched.items() if touched > cutoff
+        }
+        reaped = 0
+        for member in await self.redis_client.zrangebyscore(IDLE_INDEX_KEY, "-inf", cutoff):
+            user_id, conversation_id, sandbox_id = json.loads(member)
+            try:
+                if await self._unbind(user_id, conversation_id, sandbox_id, cutoff):
+                    reaped += 1
+            except Exception as e:
+                logger.warning(
+                    "Could not reap sandbox session",
+                    conversation_id=conversation_id,
+                    error=str(e),
+                )
+        if reaped:
+            self._metrics.incr("sandbox_sessions.reaped", reaped)
+            logger.info("Reaped idle sandbox sessions", count=reaped)
+        return reaped
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                if await acquire_sweep_lock(
+                    self.redis_client, "sandbox_sessions", self.reap_interval
+                ):
+                    await self.reap()
+            except Exception as e:
+                logger.error("Sandbox session reaping failed", error=str(e))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _uploaded_files(session: Dict[str, str]) -> Dict[str, str]:
+    return {
+        field[len("file:") :]: value
+        for field, value in session.items()
+        if field.startswith("file:")
+    }
+
+
+_sandbox_sessions: Optional[SandboxSessions] = None
+
+
+def get_sandbox_sessions() -> Optional[SandboxSessions]:
+    """The process-wide sessions, if the app set them up."""
+    return _sandbox_sessions
+
+
+def set_sandbox_sessions(sessions: Optional[SandboxSessions]) -> None:
+    global _sandbox_sessions
+    _sandbox_sessions = sessions
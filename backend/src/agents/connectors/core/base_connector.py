@@ -22,6 +22,7 @@ from authlib.integrations.httpx_client import AsyncOAuth2Client
 from authlib.oauth2.rfc7636 import create_s256_code_challenge
 from authlib.common.security import generate_token
 from pydantic import BaseModel, Field
+from agents.storage.keys import user_scope
 
 logger = structlog.get_logger(__name__)
 
@@ -196,7 +197,7 @@ class UserConnectorConfig(BaseModel):
     
     def redis_key(self) -> str:
         """Generate Redis key for this user connector config"""
-        return f"user:{self.user_id}:connector:{self.provider_id}:config"
+        return f"user:{user_scope(self.user_id)}:connector:{self.provider_id}:config"
 
 
 class ConnectorTool(BaseModel):
@@ -257,7 +258,7 @@ class BaseOAuthConnector(ABC):
     async def get_user_connector_status(self, user_id: str) -> ConnectorStatus:
         """Get the connection status for a specific user"""
         # Check if user has token stored
-        token_key = f"user:{user_id}:connector:{self.config.provider_id}:token"
+        token_key = f"user:{user_scope(user_id)}:connector:{self.config.provider_id}:token"
         token_data = await self.redis_storage.redis_client.hgetall(token_key, user_id)
         
         if not token_data:
@@ -289,8 +290,8 @@ class BaseOAuthConnector(ABC):
     
     async def get_user_enabled_tools(self, user_id: str) -> List[ConnectorTool]:
         """Get tools enabled by a specific user for this connector"""
-        config_key = f"user:{user_id}:connector:{self.config.provider_id}:config"
-        config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+        config_key = f"user:{user_scope(user_id)}:connector:{self.config.provider_id}:config"
+        config_data = await self.redis_storage.get_cached_record(config_key, user_id)
         
         if not config_data:
             return []
@@ -306,8 +307,8 @@ class BaseOAuthConnector(ABC):
     
     async def set_user_enabled_tools(self, user_id: str, tool_ids: Set[str]) -> None:
         """Set which tools a user has enabled for this connector"""
-        config_key = f"user:{user_id}:connector:{self.config.provider_id}:config"
-        config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+        config_key = f"user:{user_scope(user_id)}:connector:{self.config.provider_id}:config"
+        config_data = await self.redis_storage.get_cached_record(config_key, user_id)
         
         if config_data:
             config_dict = json.loads(config_data)
@@ -330,7 +331,7 @@ class BaseOAuthConnector(ABC):
         config_data = user_config.model_dump(mode='json')
         config_json = json.dumps(config_data)
         
-        await self.redis_storage.redis_client.set(
+        await self.redis_storage.set_cached_record(
             config_key, 
             config_json, 
             user_id
@@ -526,7 +527,7 @@ class BaseOAuthConnector(ABC):
         user_id = token.user_id.decode() if isinstance(token.user_id, bytes) else token.user_id
         provider_id = token.provider_id.decode() if isinstance(token.provider_id, bytes) else token.provider_id
         
-        token_key = f"user:{user_id}:connector:{provider_id}:token"
+        token_key = f"user:{user_scope(user_id)}:connector:{provider_id}:token"
         token_data = token.to_redis_dict()
         
         logger.info(
@@ -557,7 +558,7 @@ class BaseOAuthConnector(ABC):
         Returns:
             Valid token or None
         """
-        token_key = f"user:{user_id}:connector:{self.config.provider_id}:token"
+        token_key = f"user:{user_scope(user_id)}:connector:{self.config.provider_id}:token"
         token_data = await self.redis_storage.redis_client.hgetall(token_key, user_id)
         
         if not token_data:
@@ -634,7 +635,7 @@ class BaseOAuthConnector(ABC):
                 )
         
         # Delete from Redis
-        token_key = f"user:{user_id}:connector:{self.config.provider_id}:token"
+        token_key = f"user:{user_scope(user_id)}:connector:{self.config.provider_id}:token"
         await self.redis_storage.redis_client.delete(token_key)
         
         # Update connector status
@@ -682,8 +683,8 @@ class BaseOAuthConnector(ABC):
     
     async def _update_user_connector_status(self, user_id: str, status: ConnectorStatus) -> None:
         """Update user's connector status"""
-        config_key = f"user:{user_id}:connector:{self.config.provider_id}:config"
-        config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+        config_key = f"user:{user_scope(user_id)}:connector:{self.config.provider_id}:config"
+        config_data = await self.redis_storage.get_cached_record(config_key, user_id)
         
         if config_data:
             config_dict = json.loads(config_data)
@@ -708,7 +709,7 @@ class BaseOAuthConnector(ABC):
         config_data = user_config.model_dump(mode='json')
         config_json = json.dumps(config_data)
         
-        await self.redis_storage.redis_client.set(
+        await self.redis_storage.set_cached_record(
             config_key, 
             config_json, 
             user_id
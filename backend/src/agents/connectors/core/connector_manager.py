@@ -23,6 +23,7 @@ from agents.connectors.core.base_connector import (
     UserOAuthToken,
 )
 from agents.storage.redis_storage import RedisStorage
+from agents.storage.keys import user_scope
 from langchain.tools import BaseTool
 
 logger = structlog.get_logger(__name__)
@@ -65,8 +66,8 @@ class ConnectorManager:
         # Get all system connectors
         for provider_id, connector in self.connectors.items():
             # Get user-specific configuration
-            config_key = f"user:{user_id}:connector:{provider_id}:config"
-            config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+            config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+            config_data = await self.redis_storage.get_cached_record(config_key, user_id)
             
             if config_data:
                 user_config = UserConnectorConfig(**json.loads(config_data))
@@ -116,8 +117,8 @@ class ConnectorManager:
         if user_id in self._user_custom_connectors:
             for provider_id, connector in self._user_custom_connectors[user_id].items():
                 # Get user-specific configuration
-                config_key = f"user:{user_id}:connector:{provider_id}:config"
-                config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+                config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+                config_data = await self.redis_storage.get_cached_record(config_key, user_id)
                 
                 if config_data:
                     user_config = UserConnectorConfig(**json.loads(config_data))
@@ -197,8 +198,8 @@ class ConnectorManager:
             raise ValueError("Connector not authenticated. Please complete OAuth flow first.")
         
         # Update user config
-        config_key = f"user:{user_id}:connector:{provider_id}:config"
-        config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+        config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+        config_data = await self.redis_storage.get_cached_record(config_key, user_id)
         config_dict = json.loads(config_data) if config_data else {}
         
         # Remove user_id and provider_id from config_dict to avoid duplicate keyword arguments
@@ -213,7 +214,7 @@ class ConnectorManager:
         user_config.enabled = True
         user_config.status = status
         
-        await self.redis_storage.redis_client.set(
+        await self.redis_storage.set_cached_record(
             config_key, 
             json.dumps(user_config.model_dump(mode='json')), 
             user_id
@@ -236,8 +237,8 @@ class ConnectorManager:
             raise ValueError(f"Unknown connector: {provider_id}")
         
         # Update user config
-        config_key = f"user:{user_id}:connector:{provider_id}:config"
-        config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+        config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+        config_data = await self.redis_storage.get_cached_record(config_key, user_id)
         config_dict = json.loads(config_data) if config_data else {}
         
         # Remove user_id and provider_id from config_dict to avoid duplicate keyword arguments
@@ -251,7 +252,7 @@ class ConnectorManager:
         )
         user_config.enabled = False
         
-        await self.redis_storage.redis_client.set(
+        await self.redis_storage.set_cached_record(
             config_key, 
             json.dumps(user_config.model_dump(mode='json')), 
             user_id
@@ -279,8 +280,8 @@ class ConnectorManager:
         await connector.revoke_user_token(user_id)
         
         # Clear user config
-        config_key = f"user:{user_id}:connector:{provider_id}:config"
-        await self.redis_storage.redis_client.delete(config_key)
+        config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+        await self.redis_storage.delete_cached_record(config_key)
         
         # Invalidate cache
         self._invalidate_user_cache(user_id, provider_id)
@@ -356,8 +357,8 @@ class ConnectorManager:
         for provider_id, connector in self.connectors.items():
             try:
                 # Check if connector is enabled for user
-                config_key = f"user:{user_id}:connector:{provider_id}:config"
-                config_data = await self.redis_storage.redis_client.get(config_key, user_id)
+                config_key = f"user:{user_scope(user_id)}:connector:{provider_id}:config"
+                config_data = await self.redis_storage.get_cached_record(config_key, user_id)
 
                 if not config_data:
                     logger.info(
@@ -526,7 +527,7 @@ class ConnectorManager:
         """
         try:
             # Get all custom MCP connectors for this user
-            pattern = f"user:{user_id}:custom_mcp:*"
+            pattern = f"user:{user_scope(user_id)}:custom_mcp:*"
             keys = []
             cursor = 0
             while True:
@@ -12,6 +12,7 @@ from typing import Any, Dict, Optional, Protocol
 
 import structlog
 from agents.connectors.core.base_connector import UserOAuthToken
+from agents.storage.keys import user_scope
 from agents.storage.redis_storage import RedisStorage
 
 logger = structlog.get_logger(__name__)
@@ -227,7 +228,7 @@ class TokenManager:
             Valid token or None if not available
         """
         # Get current token
-        token_key = f"user:{user_id}:connector:{provider_id}:token"
+        token_key = f"user:{user_scope(user_id)}:connector:{provider_id}:token"
         token_data = await self.redis_storage.get_encrypted_dict(token_key, user_id)
         
         if not token_data:
@@ -268,7 +269,7 @@ class TokenManager:
     
     async def store_token(self, token: UserOAuthToken) -> None:
         """Store token in Redis"""
-        token_key = f"user:{token.user_id}:connector:{token.provider_id}:token"
+        token_key = f"user:{user_scope(token.user_id)}:connector:{token.provider_id}:token"
         await self.redis_storage.set_encrypted_dict(
             token_key,
             token.model_dump(mode='json'),
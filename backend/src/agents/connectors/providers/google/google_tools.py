@@ -16,6 +16,7 @@ from googleapiclient.errors import HttpError
 from langchain.callbacks.manager import CallbackManagerForToolRun
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
+from agents.storage.keys import user_scope
 
 logger = structlog.get_logger(__name__)
 
@@ -37,9 +38,9 @@ def get_file_from_redis_sync(user_id: str, file_id: str) -> Tuple[Optional[bytes
         encryption = EncryptionService()
 
         # Build Redis keys (same pattern as RedisStorage class)
-        file_data_key = f"file_data:{user_id}:{file_id}"
-        file_metadata_key = f"file_metadata:{user_id}:{file_id}"
-        user_files_key = f"user_files:{user_id}"
+        file_data_key = f"file_data:{user_scope(user_id)}:{file_id}"
+        file_metadata_key = f"file_metadata:{user_scope(user_id)}:{file_id}"
+        user_files_key = f"user_files:{user_scope(user_id)}"
 
         # Verify file belongs to user (this is not encrypted)
         if not redis_client.sismember(user_files_key, file_id):
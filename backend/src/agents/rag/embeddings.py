@@ -0,0 +1,288 @@
+"""
+Process-wide embedding service for RAG.
+
+The sentence-transformers model is loaded once per process and shared by
+ingestion and retrieval. Async callers are micro-batched: requests that
+arrive within ``EMBEDDING_BATCH_WAIT_MS`` of each other are encoded in one
+model call of up to ``EMBEDDING_MAX_BATCH_SIZE`` texts, on a pool of
+``EMBEDDING_WORKER_THREADS`` threads, so the event loop never runs the model
+and concurrent queries share forward passes.
+
+Query embeddings of a user's retrievals (``EmbeddingService.for_user``) are
+cached per user across replicas (see ``agents.rag.query_cache``) unless
+``QUERY_EMBEDDING_CACHE_ENABLED`` is false.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Set, Tuple
+
+import structlog
+from agents.rag.query_cache import QueryEmbeddingCache
+from agents.utils.metrics import get_metrics_registry
+from langchain_core.embeddings import Embeddings
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Output dimensions of common models, so index schemas can be built without
+# loading the model; EMBEDDING_DIMENSIONS covers any other model
+_MODEL_DIMENSIONS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "sentence-transformers/multi-qa-MiniLM-L6-cos-v1": 384,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+    "BAAI/bge-large-en-v1.5": 1024,
+}
+
+_global_embedding_service: Optional["EmbeddingService"] = None
+_global_lock = threading.Lock()
+
+
+def _embedding_model_name() -> str:
+    return os.getenv("EMBEDDING_MODEL_NAME", DEFAULT_EMBEDDING_MODEL)
+
+
+def _load_huggingface_model() -> Embeddings:
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=_embedding_model_name())
+
+
+class EmbeddingService(Embeddings):
+    """
+    One shared embedding model behind an async micro-batching queue.
+
+    Implements the LangChain ``Embeddings`` interface, so it can be handed to
+    vector stores directly. Synchronous calls go straight to the model and
+    are meant for worker threads only.
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[], Embeddings] = _load_huggingface_model,
+        max_batch_size: Optional[int] = None,
+        batch_wait_ms: Optional[float] = None,
+        worker_threads: Optional[int] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        dimensions: Optional[int] = None,
+    ):
+        self.model_factory = model_factory
+        self._dimensions = dimensions
+        self.query_cache = query_cache
+        self.max_batch_size = max_batch_size or int(
+            os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64")
+        )
+        self.batch_wait = (
+            batch_wait_ms
+            if batch_wait_ms is not None
+            else float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+        ) / 1000
+        self.worker_threads = worker_threads or int(
+            os.getenv("EMBEDDING_WORKER_THREADS", "2")
+        )
+        self._model: Optional[Embeddings] = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.worker_threads, thread_name_prefix="embedding"
+        )
+        # Batching state belongs to the event loop that created it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._metrics = get_metrics_registry()
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = self.model_factory()
+                    logger.info(
+                        "Loaded embedding model",
+                        duration_ms=round((time.perf_counter() - start) * 1000, 2),
+                    )
+        return self._model
+
+    @property
+    def dimensions(self) -> int:
+        """
+        Length of the model's vectors.
+
+        Taken from ``EMBEDDING_DIMENSIONS`` or the known model table when
+        possible; otherwise read from the loaded model, embedding a probe
+        text only if the model does not report it.
+        """
+        if self._dimensions is None:
+            configured = os.getenv("EMBEDDING_DIMENSIONS")
+            if configured:
+                self._dimensions = int(configured)
+            elif _embedding_model_name() in _MODEL_DIMENSIONS:
+                self._dimensions = _MODEL_DIMENSIONS[_embedding_model_name()]
+            else:
+                client = getattr(self.model, "_client", None)
+                reported = getattr(client, "get_sentence_embedding_dimension", None)
+                self._dimensions = (reported and reported()) or len(
+                    # A document embedding bypasses the query cache
+                    self.embed_documents(["dimensions"])[0]
+                )
+        return self._dimensions
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return await self._submit(list(texts))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # Queries and documents share the encoder for sentence-transformers
+        return (await self._submit([text]))[0]
+
+    def for_user(self, user_id: str) -> Embeddings:
+        """The service as seen by one user's retrievals, with their query cache."""
+        if self.query_cache is None:
+            return self
+        return UserQueryEmbeddings(self, user_id)
+
+    def _ensure_batcher(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._batcher is None or self._batcher.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.worker_threads)
+            self._batcher = loop.create_task(self._run_batcher())
+        return self._queue
+
+    async def _submit(self, texts: List[str]) -> List[List[float]]:
+        queue = self._ensure_batcher()
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((texts, future, time.perf_counter()))
+        self._metrics.incr("embedding.requests")
+        return await future
+
+    async def _run_batcher(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.batch_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            # Bound in-flight batches to the worker threads; later requests
+            # keep queueing and form the next, larger batch
+            await self._slots.acquire()
+            task = asyncio.create_task(self._encode(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _encode(self, batch: List[Tuple[List[str], asyncio.Future, float]]) -> None:
+        try:
+            texts = [text for request in batch for text in request[0]]
+            now = time.perf_counter()
+            for _, _, queued_at in batch:
+                self._metrics.observe("embedding.queue_wait_ms", (now - queued_at) * 1000)
+
+            start = time.perf_counter()
+            try:
+                # The model itself is loaded on the worker thread on first use
+                vectors = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.embed_documents, texts
+                )
+            except Exception as e:
+                self._metrics.incr("embedding.errors")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            self._metrics.observe("embedding.batch_ms", (time.perf_counter() - start) * 1000)
+            self._metrics.observe("embedding.batch_size", len(texts))
+
+            offset = 0
+            for request_texts, future, _ in batch:
+                if not future.done():
+                    future.set_result(vectors[offset : offset + len(request_texts)])
+                offset += len(request_texts)
+        finally:
+            self._slots.release()
+
+    async def aclose(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+        self._executor.shutdown(wait=False)
+
+
+class UserQueryEmbeddings(Embeddings):
+    """Embeds one user's queries through their entries of the query cache."""
+
+    def __init__(self, service: EmbeddingService, user_id: str):
+        self.service = service
+        self.user_id = user_id
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.service.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.service.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.service.query_cache.get_or_embed(
+            text, self.service.embed_query, self.user_id
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.service.query_cache.aget_or_embed(
+            text, self.service.aembed_query, self.user_id
+        )
+
+
+def user_embeddings(embeddings: Embeddings, user_id: str) -> Embeddings:
+    """Scope a store's embeddings to a user, if they cache queries."""
+    for_user = getattr(embeddings, "for_user", None)
+    return for_user(user_id) if for_user is not None else embeddings
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Get the process-wide embedding service; the model loads on first use."""
+    global _global_embedding_service
+
+    if _global_embedding_service is None:
+        with _global_lock:
+            if _global_embedding_service is None:
+                query_cache = None
+                if os.getenv("QUERY_EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+                    query_cache = QueryEmbeddingCache(_embedding_model_name())
+                _global_embedding_service = EmbeddingService(query_cache=query_cache)
+    return _global_embedding_service
+
+
+def set_embedding_service(service: EmbeddingService) -> None:
+    global _global_embedding_service
+    _global_embedding_service = service
@@ -5,18 +5,108 @@ into a vector store.
 
 This code should be agnostic to how the blob got generated; i.e., it does not
 know about server/uploading etc.
+
+Ingestion is a pipeline of four stages connected by bounded queues, so a
+document is parsed, split, embedded and written concurrently:
+
+- parse: PDF pages are extracted and cleaned in a process pool
+  (``INGEST_PARSE_PROCESSES``), ``INGEST_PAGES_PER_PARSE_TASK`` pages per
+  task; other formats are parsed on a thread.
+- split: pages are split into chunks on ``INGEST_SPLIT_THREADS`` threads.
+- embed: chunk batches go to the shared embedding service,
+  ``INGEST_EMBED_CONCURRENCY`` batches at a time.
+- write: embedded batches are written to Redis in one pipeline each.
+
+Each queue holds at most ``INGEST_QUEUE_DEPTH`` items, which bounds memory
+for large documents and lets a slow stage hold back the faster ones.
 """
 
 import asyncio
+import multiprocessing
+import os
 import re
-from typing import List
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import aclosing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
 
-import ftfy
+import structlog
+from agents.rag.pdf_pages import clean_page_text, count_pdf_pages, parse_pdf_pages
+from agents.rag.vector_index import ChunkLayout
+from agents.utils.metrics import get_metrics_registry
 from langchain.text_splitter import TextSplitter
 from langchain_community.document_loaders import Blob
 from langchain_community.document_loaders.base import BaseBlobParser
+from langchain_community.document_loaders.parsers import PDFMinerParser
+from langchain_community.document_loaders.parsers.generic import MimeTypeBasedParser
 from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStore
+from langchain_redis import RedisVectorStore
+
+logger = structlog.get_logger(__name__)
+
+PDF_MIMETYPE = "application/pdf"
+
+PARSE_PROCESSES = int(
+    os.getenv("INGEST_PARSE_PROCESSES", str(min(4, os.cpu_count() or 1)))
+)
+PAGES_PER_PARSE_TASK = int(os.getenv("INGEST_PAGES_PER_PARSE_TASK", "8"))
+SPLIT_THREADS = int(os.getenv("INGEST_SPLIT_THREADS", "4"))
+EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "2"))
+QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_split_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+
+    with _pool_lock:
+        if _parse_pool is None:
+            # Forking a process that runs an event loop and threads is unsafe
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def _get_split_pool() -> ThreadPoolExecutor:
+    global _split_pool
+
+    with _pool_lock:
+        if _split_pool is None:
+            _split_pool = ThreadPoolExecutor(
+                max_workers=SPLIT_THREADS, thread_name_prefix="ingest-split"
+            )
+        return _split_pool
+
+
+def _discard_parse_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died so the next document gets a fresh one."""
+    global _parse_pool
+
+    with _pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_ingest_pools() -> None:
+    """Stop the parse processes and split threads."""
+    global _parse_pool, _split_pool
+
+    with _pool_lock:
+        pools, _parse_pool, _split_pool = (_parse_pool, _split_pool), None, None
+    for pool in pools:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
 
 
 def _update_document_metadata(
@@ -27,18 +117,125 @@ def _update_document_metadata(
     document.metadata["document_id"] = document_id
 
 
-def _sanitize_document_content(document: Document):
-    """Sanitize the document."""
-    # Without this, PDF ingestion fails with
-    # "A string literal cannot contain NUL (0x00) characters".
-    document.page_content = document.page_content.replace("\x00", "x")
-
-
 def _clean_text(document: Document):
-    document.page_content = ftfy.fix_text(document.page_content)
     document.page_content = re.sub(r"\s+", " ", document.page_content).strip()
 
 
+def _parses_with_pdfminer(parser: BaseBlobParser, blob: Blob) -> bool:
+    """Whether ``parser`` would hand this blob to ``PDFMinerParser``."""
+    if blob.mimetype != PDF_MIMETYPE:
+        return False
+    if isinstance(parser, MimeTypeBasedParser):
+        parser = parser.handlers.get(PDF_MIMETYPE)
+    return isinstance(parser, PDFMinerParser) and not parser.extract_images
+
+
+async def _parse_pdf(blob: Blob) -> AsyncIterator[List[Document]]:
+    """Yield groups of pages, in order, parsed by the process pool."""
+    loop = asyncio.get_running_loop()
+    pool = _get_parse_pool()
+    # Workers read the file themselves instead of receiving it per task
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        await asyncio.to_thread(pdf_file.write, blob.as_bytes())
+        await asyncio.to_thread(pdf_file.flush)
+
+        pending = deque()
+        try:
+            page_count = await loop.run_in_executor(
+                pool, count_pdf_pages, pdf_file.name
+            )
+            for start in range(0, page_count, PAGES_PER_PARSE_TASK):
+                stop = min(start + PAGES_PER_PARSE_TASK, page_count)
+                pending.append(
+                    loop.run_in_executor(
+                        pool, parse_pdf_pages, pdf_file.name, start, stop
+                    )
+                )
+                # Keep every process busy without parsing far ahead
+                if len(pending) > PARSE_PROCESSES:
+                    yield _page_documents(blob, await pending.popleft())
+            while pending:
+                yield _page_documents(blob, await pending.popleft())
+        except BrokenProcessPool:
+            _discard_parse_pool(pool)
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _page_documents(blob: Blob, pages) -> List[Document]:
+    return [
+        Document(page_content=text, metadata={"source": blob.source, "page": number})
+        for number, text in pages
+    ]
+
+
+async def parse_pages(
+    blob: Blob, parser: BaseBlobParser
+) -> AsyncIterator[List[Document]]:
+    """Parse a blob into cleaned pages, yielded in groups without blocking the loop."""
+    if _parses_with_pdfminer(parser, blob):
+        async with aclosing(_parse_pdf(blob)) as groups:
+            async for pages in groups:
+                yield pages
+        return
+
+    def parse() -> List[Document]:
+        documents = list(parser.lazy_parse(blob))
+        for document in documents:
+            document.page_content = clean_page_text(document.page_content)
+        return documents
+
+    documents = await asyncio.to_thread(parse)
+    for start in range(0, len(documents), PAGES_PER_PARSE_TASK):
+        yield documents[start : start + PAGES_PER_PARSE_TASK]
+
+
+def split_pages(
+    pages: List[Document], text_splitter: TextSplitter, user_id: str, document_id: str
+) -> List[Document]:
+    """Split cleaned pages into chunks, dropping chunks without text."""
+    chunks = []
+    for doc in text_splitter.split_documents(pages):
+        _update_document_metadata(doc, user_id, document_id)
+        _clean_text(doc)
+        # Skip documents with no text content
+        if doc.page_content:
+            chunks.append(doc)
+    return chunks
+
+
+def write_redis_chunks(
+    vectorstore: RedisVectorStore, docs: List[Document], vectors: List[List[float]]
+) -> List[str]:
+    """
+    Write embedded chunks in the layout of the live index without embedding
+    them again; the index loads them in one pipeline.
+    """
+    layout = ChunkLayout.from_schema(vectorstore._index.schema)
+    records = [
+        layout.record(doc.page_content, vector, doc.metadata)
+        for doc, vector in zip(docs, vectors)
+    ]
+    result = vectorstore._index.load(
+        records, ttl=vectorstore.ttl, batch_size=len(records)
+    )
+    return list(result) if result is not None else []
+
+
+async def _run_stages(*stages: Awaitable[None]) -> None:
+    """Run pipeline stages; if one fails, cancel the rest and re-raise."""
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
 async def ingest_blob(
     blob: Blob,
     parser: BaseBlobParser,
@@ -48,35 +245,128 @@ async def ingest_blob(
     document_id: str,
     *,
     batch_size: int = 100,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
 ) -> List[str]:
-    """Ingest a document into the vectorstore."""
-    docs_to_index = []
-    ids = []
+    """
+    Ingest a document into the vectorstore.
+
+    ``on_progress`` is awaited after every indexed batch with the number of
+    parsed pages and indexed chunks so far.
+    """
+    loop = asyncio.get_running_loop()
+    pages_queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_DEPTH)
+    chunks_queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_DEPTH)
+    vectors_queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_DEPTH)
+    # Other vector stores embed inside aadd_documents
+    direct_write = isinstance(vectorstore, RedisVectorStore)
+    ids: List[str] = []
+    started = time.perf_counter()
+
+    async def parse() -> None:
+        # Closed explicitly so a cancelled pipeline stops the parse tasks
+        async with aclosing(parse_pages(blob, parser)) as groups:
+            async for pages in groups:
+                await pages_queue.put(pages)
+        await pages_queue.put(None)
+
+    async def split() -> None:
+        pending = deque()
+        batch: List[Document] = []
+        pages_done = 0
+
+        async def collect() -> None:
+            nonlocal batch, pages_done
+            future, page_count = pending.popleft()
+            batch.extend(await future)
+            pages_done += page_count
+            while len(batch) >= batch_size:
+                await chunks_queue.put((batch[:batch_size], pages_done))
+                batch = batch[batch_size:]
 
-    # Parse documents lazily without loading all into memory
-    lazy_documents = parser.lazy_parse(blob)
+        try:
+            while (pages := await pages_queue.get()) is not None:
+                pending.append(
+                    (
+                        loop.run_in_executor(
+                            _get_split_pool(),
+                            split_pages,
+                            pages,
+                            text_splitter,
+                            user_id,
+                            document_id,
+                        ),
+                        len(pages),
+                    )
+                )
+                if len(pending) >= SPLIT_THREADS:
+                    await collect()
+            while pending:
+                await collect()
+        finally:
+            for future, _ in pending:
+                future.cancel()
+        if batch:
+            await chunks_queue.put((batch, pages_done))
+        await chunks_queue.put(None)
 
-    for i, document in enumerate(lazy_documents):
-        # Split documents in a separate thread to avoid blocking
-        docs = await asyncio.to_thread(text_splitter.split_documents, [document])
+    async def embed() -> None:
+        embeddings = vectorstore.embeddings
+        pending = deque()
 
-        for doc in docs:
-            _sanitize_document_content(doc)
-            _update_document_metadata(doc, user_id, document_id)
-            _clean_text(doc)
-            # Skip documents with no text content
-            if doc.page_content.strip():
-                docs_to_index.append(doc)
+        async def collect() -> None:
+            future, docs, pages_done = pending.popleft()
+            await vectors_queue.put((docs, await future, pages_done))
 
-        if len(docs_to_index) >= batch_size:
-            ids.extend(await vectorstore.aadd_documents(docs_to_index))
-            docs_to_index = []
+        try:
+            while (item := await chunks_queue.get()) is not None:
+                docs, pages_done = item
+                if not direct_write:
+                    await vectors_queue.put((docs, None, pages_done))
+                    continue
+                pending.append(
+                    (
+                        asyncio.ensure_future(
+                            embeddings.aembed_documents(
+                                [doc.page_content for doc in docs]
+                            )
+                        ),
+                        docs,
+                        pages_done,
+                    )
+                )
+                if len(pending) >= EMBED_CONCURRENCY:
+                    await collect()
+            while pending:
+                await collect()
+        finally:
+            for future, _, _ in pending:
+                future.cancel()
+        await vectors_queue.put(None)
 
-        # Periodically yield control back to the event loop
-        if i % 10 == 0:
-            await asyncio.sleep(0)
+    async def write() -> None:
+        while (item := await vectors_queue.get()) is not None:
+            docs, vectors, pages_done = item
+            if vectors is None:
+                ids.extend(await vectorstore.aadd_documents(docs))
+            else:
+                ids.extend(
+                    await asyncio.to_thread(
+                        write_redis_chunks, vectorstore, docs, vectors
+                    )
+                )
+            if on_progress is not None:
+                await on_progress(pages_done, len(ids))
 
-    if docs_to_index:
-        ids.extend(await vectorstore.aadd_documents(docs_to_index))
+    await _run_stages(parse(), split(), embed(), write())
 
+    elapsed = time.perf_counter() - started
+    metrics = get_metrics_registry()
+    metrics.observe("ingest.duration_ms", elapsed * 1000)
+    metrics.observe("ingest.chunks", len(ids))
+    logger.info(
+        "Ingested document",
+        document_id=document_id,
+        chunks=len(ids),
+        duration_ms=round(elapsed * 1000, 2),
+    )
     return ids
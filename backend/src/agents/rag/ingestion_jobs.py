@@ -0,0 +1,534 @@
+"""
+Background ingestion of uploaded documents.
+
+Uploads store the file and enqueue a job on the ``ingestion_jobs`` Redis
+stream instead of parsing, embedding and indexing inside the request.
+Workers in any number of processes consume the stream through one consumer
+group and report progress on ``ingestion_events:<user>``, which every
+WebSocket of that user forwards to the client.
+
+Jobs are idempotent per file ID: a file that is already indexed is
+skipped, and chunks left by an interrupted attempt are removed before
+ingesting again. A lock per content hash keeps redeliveries, and duplicate
+uploads of the same content, from ingesting concurrently; a duplicate
+waits for the first copy and then reuses its vectors.
+
+Jobs that must wait (retries backing off, content locked by another
+worker) are acknowledged and parked in a sorted set by due time, then
+moved back onto the stream when due, so they never hold a worker slot.
+Failed jobs are retried with exponential backoff up to
+``INGESTION_MAX_ATTEMPTS``; jobs of a worker that died are claimed by
+another one after ``INGESTION_JOB_TIMEOUT_SECONDS``.
+
+Run standalone workers with ``python -m agents.rag.ingestion_jobs``.
+"""
+
+import asyncio
+import json
+import os
+import re
+import socket
+import time
+import uuid
+from typing import Dict, Optional, Set
+
+import redis.exceptions
+import structlog
+from agents.rag.ingest import ingest_blob, shutdown_ingest_pools
+from agents.rag.parsing import MIMETYPE_BASED_PARSER
+from agents.rag.upload import (
+    DEFAULT_TEXT_SPLITTER,
+    convert_ingestion_input_to_blob,
+    create_user_vector_store,
+)
+from agents.storage.redis_storage import RedisStorage
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+STREAM_KEY = "ingestion_jobs"
+# Hash-tagged with the stream's name so both live in one cluster slot
+DELAYED_KEY = "{ingestion_jobs}:delayed"
+CONSUMER_GROUP = "ingestion_workers"
+LOCK_KEY_PREFIX = "ingestion_lock"
+VECTOR_INDEX_NAME = "rag-index"
+
+# Entries kept on the stream; acknowledged jobs are deleted right away
+STREAM_MAX_LENGTH = 100_000
+
+# Progress events are sent at most this often per job
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+# Due delayed jobs are moved onto the stream at most this often, this many
+# at a time
+PROMOTE_INTERVAL_SECONDS = 1.0
+PROMOTE_BATCH_SIZE = 100
+
+# KEYS[1] = lock; ARGV[1] = holder. Deletes the lock only if still held.
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS[1] = delayed jobs, KEYS[2] = stream
+# ARGV[1] = now, ARGV[2] = batch size, ARGV[3] = stream max length
+_PROMOTE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    local job = cjson.decode(member)
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*',
+        'user_id', job.user_id, 'file_id', job.file_id, 'attempt', job.attempt,
+        'enqueued_at', job.enqueued_at, 'not_before', job.not_before)
+end
+return #due
+"""
+
+_TAG_ESCAPE_RE = re.compile(r"([,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\ ])")
+
+
+def _escape_tag(value: str) -> str:
+    return _TAG_ESCAPE_RE.sub(r"\\\1", value)
+
+
+class _JobLocked(Exception):
+    """Another worker is ingesting the same content; the job is retried later."""
+
+
+def ingestion_events_channel(user_id: str) -> str:
+    """Pub/sub channel carrying a user's ingestion progress events."""
+    return f"ingestion_events:{user_id}"
+
+
+async def enqueue_ingestion(
+    redis_client,
+    user_id: str,
+    file_id: str,
+    attempt: int = 1,
+    delay: float = 0.0,
+    enqueued_at: Optional[float] = None,
+) -> Optional[str]:
+    """
+    Queue a stored file for ingestion.
+
+    Returns the stream entry ID, or None for a delayed job, which reaches
+    the stream once due.
+    """
+    now = time.time()
+    job = {
+        "user_id": user_id,
+        "file_id": file_id,
+        "attempt": attempt,
+        "enqueued_at": repr(enqueued_at or now),
+        "not_before": repr(now + delay),
+    }
+    if delay > 0:
+        # A job ID keeps identical jobs apart in the sorted set
+        member = json.dumps({**job, "attempt": str(attempt), "job": uuid.uuid4().hex})
+        await redis_client.zadd(DELAYED_KEY, {member: now + delay})
+        get_metrics_registry().incr("ingestion.jobs_delayed")
+        return None
+    job_id = await redis_client.xadd(
+        STREAM_KEY, job, maxlen=STREAM_MAX_LENGTH, approximate=True
+    )
+    get_metrics_registry().incr("ingestion.jobs_enqueued")
+    return job_id
+
+
+class IngestionWorker:
+    """Consumes ingestion jobs with bounded concurrency."""
+
+    def __init__(
+        self,
+        redis_storage: RedisStorage,
+        sync_redis_client,
+        concurrency: Optional[int] = None,
+        job_timeout: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        retry_base_delay: Optional[float] = None,
+        lock_retry_delay: Optional[float] = None,
+    ):
+        self.redis_storage = redis_storage
+        self.redis_client = redis_storage.redis_client
+        # The vector store writes through the sync client
+        self.sync_redis_client = sync_redis_client
+        self.concurrency = concurrency or int(
+            os.getenv("INGESTION_WORKER_CONCURRENCY", "2")
+        )
+        self.job_timeout = job_timeout or float(
+            os.getenv("INGESTION_JOB_TIMEOUT_SECONDS", "900")
+        )
+        self.max_attempts = max_attempts or int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+        self.retry_base_delay = (
+            retry_base_delay
+            if retry_base_delay is not None
+            else float(os.getenv("INGESTION_RETRY_BASE_SECONDS", "5"))
+        )
+        self.lock_retry_delay = (
+            lock_retry_delay
+            if lock_retry_delay is not None
+            else float(os.getenv("INGESTION_LOCK_RETRY_SECONDS", "15"))
+        )
+        self._promote_script = self.redis_client.register_script(_PROMOTE_LUA)
+        self._release_lock_script = self.redis_client.register_script(
+            _RELEASE_LOCK_LUA
+        )
+        self._last_promote = 0.0
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._claim_cursor = "0-0"
+        self._last_claim = 0.0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._jobs: Set[asyncio.Task] = set()
+        self._metrics = get_metrics_registry()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _ensure_group(self) -> None:
+        try:
+            await self.redis_client.xgroup_create(
+                STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True
+            )
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _publish(self, user_id: str, file_id: str, status: str, **fields) -> None:
+        event = {
+            "event": "ingestion_progress",
+            "file_id": file_id,
+            "status": status,
+            "timestamp": time.time(),
+            **fields,
+        }
+        try:
+            await self.redis_client.publish(
+                ingestion_events_channel(user_id), json.dumps(event)
+            )
+        except Exception as e:
+            logger.warning("Failed to publish ingestion event", error=str(e))
+
+    async def _acquire_lock(self, lock_id: str) -> bool:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(
+                f"{LOCK_KEY_PREFIX}:{lock_id}",
+                self.consumer,
+                nx=True,
+                ex=int(self.job_timeout),
+            )
+            (acquired,) = await pipe.execute()
+        return bool(acquired)
+
+    async def _release_lock(self, lock_id: str) -> None:
+        # A job that outran the lock TTL must not release another worker's lock
+        await self._release_lock_script(
+            keys=[f"{LOCK_KEY_PREFIX}:{lock_id}"], args=[self.consumer]
+        )
+
+    async def _reuse_indexed_content(
+        self, user_id: str, file_id: str, metadata: Dict
+    ) -> bool:
+        """Point a duplicate upload at the vectors of its content; False if none yet."""
+        content_hash = metadata.get("content_hash")
+        if not content_hash:
+            return False
+        entry = await self.redis_storage.get_file_content_entry(user_id, content_hash)
+        if not entry or not entry.get("indexed") or entry.get("document_id") == file_id:
+            return False
+        await self.redis_storage.update_file_metadata(
+            user_id,
+            file_id,
+            indexed=True,
+            vector_ids=entry.get("vector_ids", []),
+            vector_document_id=entry["document_id"],
+            ingestion_status="completed",
+        )
+        await self._publish(
+            user_id, file_id, "completed", chunks=len(entry.get("vector_ids", []))
+        )
+        self._metrics.incr("ingestion.jobs_deduplicated")
+        return True
+
+    async def _purge_vectors(self, document_id: str) -> int:
+        """Remove chunks an interrupted attempt indexed for this document."""
+        from redis.commands.search.query import Query
+
+        query = (
+            Query(f"@document_id:{{{_escape_tag(document_id)}}}")
+            .no_content()
+            .paging(0, 1000)
+        )
+        removed = 0
+        while True:
+            try:
+                result = await self.redis_client.ft(VECTOR_INDEX_NAME).search(query)
+            except redis.exceptions.ResponseError:
+                # No index yet means nothing was ingested
+                return removed
+            doc_ids = [doc.id for doc in result.docs]
+            if not doc_ids:
+                return removed
+            unlinked = await self.redis_client.unlink(*doc_ids)
+            if not unlinked:
+                return removed
+            removed += unlinked
+
+    async def _ingest(self, user_id: str, file_id: str, attempt: int) -> None:
+        storage = self.redis_storage
+        metadata = await storage.get_file_metadata(user_id, file_id)
+        if metadata is None:
+            logger.info("File deleted before ingestion", file_id=file_id)
+            return
+        if metadata.get("indexed"):
+            # Redelivered after the job already finished
+            await self._publish(user_id, file_id, "completed", chunks=len(metadata.get("vector_ids", [])))
+            return
+        # Content hashes are per user, so the lock is too
+        lock_id = metadata.get("content_hash") or file_id
+        if not await self._acquire_lock(lock_id):
+            raise _JobLocked(file_id)
+
+        try:
+            # Another upload of the same content may have finished meanwhile
+            if await self._reuse_indexed_content(user_id, file_id, metadata):
+                return
+
+            await storage.update_file_metadata(
+                user_id, file_id, ingestion_status="running", ingestion_attempts=attempt
+            )
+            await self._publish(user_id, file_id, "running", attempt=attempt, pages=0, chunks=0)
+
+            if attempt > 1 or metadata.get("ingestion_status") == "running":
+                removed = await self._purge_vectors(file_id)
+                if removed:
+                    logger.info("Removed chunks of an earlier attempt", file_id=file_id, removed=removed)
+
+            data, _ = await storage.get_file(user_id, file_id)
+            if not data:
+                logger.info("File data missing, skipping ingestion", file_id=file_id)
+                return
+            blob = await convert_ingestion_input_to_blob(data, metadata.get("filename", file_id))
+            api_keys = await storage.get_user_api_key(user_id)
+            vectorstore = create_user_vector_store(api_keys.sambanova_key, self.sync_redis_client)
+
+            last_event = time.monotonic()
+
+            async def on_progress(pages: int, chunks: int) -> None:
+                nonlocal last_event
+                if time.monotonic() - last_event >= PROGRESS_INTERVAL_SECONDS:
+                    last_event = time.monotonic()
+                    await self._publish(user_id, file_id, "running", pages=pages, chunks=chunks)
+
+            vector_ids = await ingest_blob(
+                blob=blob,
+                parser=MIMETYPE_BASED_PARSER,
+                text_splitter=DEFAULT_TEXT_SPLITTER,
+                vectorstore=vectorstore,
+                user_id=user_id,
+                document_id=file_id,
+                on_progress=on_progress,
+            )
+
+            metadata = await storage.update_file_metadata(
+                user_id,
+                file_id,
+                indexed=True,
+                vector_ids=vector_ids,
+                ingestion_status="completed",
+            )
+            if metadata is None:
+                # Deleted while ingesting; nothing references the chunks
+                await storage.delete_vectors(vector_ids)
+                return
+            if metadata.get("content_hash"):
+                await storage.record_indexed_content(
+                    user_id, metadata["content_hash"], file_id, vector_ids
+                )
+            await self._publish(user_id, file_id, "completed", chunks=len(vector_ids))
+        finally:
+            await self._release_lock(lock_id)
+
+    async def _fail(self, fields: Dict[str, str], error: Exception) -> None:
+        user_id, file_id = fields["user_id"], fields["file_id"]
+        attempt = int(fields.get("attempt", 1))
+        if attempt < self.max_attempts:
+            delay = self.retry_base_delay * 2 ** (attempt - 1)
+            await enqueue_ingestion(
+                self.redis_client, user_id, file_id, attempt=attempt + 1, delay=delay
+            )
+            await self.redis_storage.update_file_metadata(
+                user_id, file_id, ingestion_status="queued"
+            )
+            await self._publish(user_id, file_id, "retrying", attempt=attempt, retry_in=delay)
+            self._metrics.incr("ingestion.jobs_retried")
+            return
+
+        await self.redis_storage.update_file_metadata(
+            user_id, file_id, ingestion_status="failed", ingestion_error=str(error)[:500]
+        )
+        await self._publish(user_id, file_id, "failed", error="Document indexing failed")
+        self._metrics.incr("ingestion.jobs_failed")
+
+    async def _requeue(self, fields: Dict[str, str], delay: float) -> None:
+        """Park a job until it is due again, keeping its attempt and age."""
+        await enqueue_ingestion(
+            self.redis_client,
+            fields["user_id"],
+            fields["file_id"],
+            attempt=int(fields.get("attempt", 1)),
+            delay=delay,
+            enqueued_at=float(fields.get("enqueued_at", time.time())),
+        )
+
+    async def _handle(self, entry_id: str, fields: Dict[str, str]) -> None:
+        start = time.perf_counter()
+        try:
+            delay = float(fields.get("not_before", 0)) - time.time()
+            if delay > 0:
+                # Entries queued with a due time by earlier versions
+                await self._requeue(fields, delay)
+            else:
+                await self._run_job(fields)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.xack(STREAM_KEY, CONSUMER_GROUP, entry_id)
+                pipe.xdel(STREAM_KEY, entry_id)
+                await pipe.execute()
+        except Exception as e:
+            # Left pending; claimed again after the job timeout
+            logger.error("Error handling ingestion job", entry_id=entry_id, error=str(e))
+        finally:
+            self._metrics.observe("ingestion.job_ms", (time.perf_counter() - start) * 1000)
+            self._slots.release()
+
+    async def _run_job(self, fields: Dict[str, str]) -> None:
+        self._metrics.observe(
+            "ingestion.queue_wait_ms",
+            (time.time() - float(fields.get("enqueued_at", time.time()))) * 1000,
+        )
+        try:
+            await asyncio.wait_for(
+                self._ingest(fields["user_id"], fields["file_id"], int(fields.get("attempt", 1))),
+                self.job_timeout,
+            )
+            self._metrics.incr("ingestion.jobs_completed")
+        except _JobLocked:
+            # Checked again once the other worker is likely done; its lock
+            # expires with the job timeout if it died
+            logger.info("Content is being ingested by another worker", file_id=fields["file_id"])
+            await self._requeue(fields, self.lock_retry_delay)
+            self._metrics.incr("ingestion.jobs_locked")
+        except Exception as e:
+            logger.error(
+                "Ingestion job failed",
+                file_id=fields.get("file_id"),
+                attempt=fields.get("attempt"),
+                error=str(e),
+                exc_info=True,
+            )
+            await self._fail(fields, e)
+
+    async def _promote_due(self) -> None:
+        """Move delayed jobs that are due onto the stream."""
+        if time.monotonic() - self._last_promote < PROMOTE_INTERVAL_SECONDS:
+            return
+        self._last_promote = time.monotonic()
+        promoted = await self._promote_script(
+            keys=[DELAYED_KEY, STREAM_KEY],
+            args=[repr(time.time()), PROMOTE_BATCH_SIZE, STREAM_MAX_LENGTH],
+        )
+        if promoted:
+            self._metrics.incr("ingestion.jobs_promoted", promoted)
+
+    async def _next_entry(self):
+        await self._promote_due()
+
+        # Reclaim jobs of workers that died mid-ingestion
+        if time.monotonic() - self._last_claim > self.job_timeout / 10:
+            self._last_claim = time.monotonic()
+            result = await self.redis_client.xautoclaim(
+                STREAM_KEY,
+                CONSUMER_GROUP,
+                self.consumer,
+                min_idle_time=int(self.job_timeout * 1000),
+                start_id=self._claim_cursor,
+                count=1,
+            )
+            self._claim_cursor, claimed = result[0], result[1]
+            if claimed and claimed[0][1]:
+                self._metrics.incr("ingestion.jobs_reclaimed")
+                return claimed[0]
+
+        response = await self.redis_client.xreadgroup(
+            CONSUMER_GROUP,
+            self.consumer,
+            {STREAM_KEY: ">"},
+            count=1,
+            block=int(PROMOTE_INTERVAL_SECONDS * 1000),
+        )
+        for _, entries in response or []:
+            for entry in entries:
+                return entry
+        return None
+
+    async def _run(self) -> None:
+        self._slots = asyncio.Semaphore(self.concurrency)
+        await self._ensure_group()
+        logger.info("Ingestion worker started", consumer=self.consumer, concurrency=self.concurrency)
+        while True:
+            await self._slots.acquire()
+            try:
+                entry = await self._next_entry()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._slots.release()
+                logger.warning("Error reading ingestion jobs", error=str(e))
+                if "NOGROUP" in str(e):
+                    await self._ensure_group()
+                await asyncio.sleep(1)
+                continue
+            if entry is None:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._handle(*entry))
+            self._jobs.add(task)
+            task.add_done_callback(self._jobs.discard)
+
+    def start(self) -> None:
+        """Start consuming jobs in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop consuming; running jobs are cancelled and redelivered later."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._jobs):
+            task.cancel()
+        await asyncio.gather(*self._jobs, return_exceptions=True)
+
+
+async def _run_worker() -> None:
+    from agents.storage.global_services import (
+        get_secure_redis_client,
+        get_sync_redis_client,
+    )
+
+    worker = IngestionWorker(
+        RedisStorage(get_secure_redis_client()), get_sync_redis_client()
+    )
+    worker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker.stop()
+        shutdown_ingest_pools()
+
+
+if __name__ == "__main__":
+    asyncio.run(_run_worker())
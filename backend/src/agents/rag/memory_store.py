@@ -0,0 +1,308 @@
+"""
+In-process vector store and hybrid retriever.
+
+Stands in for RediSearch where Redis Stack is not available: benchmarks,
+tests and local development (``RAG_VECTOR_BACKEND=memory``). Chunks live in
+a float32 matrix of unit vectors searched by brute-force cosine similarity,
+with a BM25 index over their text for the keyword part of hybrid search.
+
+Scoring follows redisvl's ``HybridQuery``: the ``k`` nearest chunks that
+pass the user and document filter are ranked by
+``alpha * (1 + cosine) / 2 + (1 - alpha) * bm25``. Tokens are lowercased
+words without English stopwords; unlike RediSearch they are not stemmed.
+Nothing is persisted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from agents.utils.metrics import get_metrics_registry
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# RediSearch's default English stopwords
+STOPWORDS = frozenset(
+    "a is the an and are as at be but by for if in into it no not of on or "
+    "such that their then there these they this to was will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Term statistics of the stored chunks, scored like RediSearch's BM25STD."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_counts: List[Counter] = []
+        self._lengths: List[int] = []
+        self._document_frequency: Counter = Counter()
+        self._total_length = 0
+
+    def add(self, text: str) -> None:
+        terms = Counter(tokenize(text))
+        self._term_counts.append(terms)
+        self._lengths.append(sum(terms.values()))
+        self._total_length += self._lengths[-1]
+        self._document_frequency.update(terms.keys())
+
+    def scores(self, query: str, rows: Sequence[int]) -> np.ndarray:
+        """BM25 score of ``query`` for each of the given rows."""
+        scores = np.zeros(len(rows), dtype=np.float32)
+        count = len(self._lengths)
+        if not count:
+            return scores
+        average_length = max(self._total_length / count, 1.0)
+        for term in set(tokenize(query)):
+            frequency = self._document_frequency.get(term, 0)
+            if not frequency:
+                continue
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for i, row in enumerate(rows):
+                tf = self._term_counts[row].get(term, 0)
+                if tf:
+                    norm = 1 - self.b + self.b * self._lengths[row] / average_length
+                    scores[i] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Chunks in a float32 matrix, grouped by ``(user_id, document_id)`` so
+    filtered searches only touch the rows of the requested documents.
+    """
+
+    def __init__(self, embedding: Embeddings, initial_capacity: int = 1024):
+        self.embedding = embedding
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._initial_capacity = initial_capacity
+        self._count = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._rows_by_document: Dict[Tuple[Any, Any], List[int]] = defaultdict(list)
+        self._bm25 = BM25Index()
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _reserve(self, rows: int, dims: int) -> None:
+        if self._matrix.shape[1] not in (0, dims):
+            raise ValueError(
+                f"Expected {self._matrix.shape[1]}-dimensional vectors, got {dims}"
+            )
+        needed = self._count + rows
+        if needed <= self._matrix.shape[0]:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], self._initial_capacity)
+        matrix = np.zeros((capacity, dims), dtype=np.float32)
+        if self._count:
+            matrix[: self._count] = self._matrix[: self._count]
+        self._matrix = matrix
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """Store chunks that are already embedded."""
+        if not texts:
+            return []
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+
+        with self._lock:
+            self._reserve(len(texts), vectors.shape[1])
+            self._matrix[self._count : self._count + len(texts)] = vectors
+            for text, metadata, chunk_id in zip(texts, metadatas, ids):
+                row = self._count
+                self._ids.append(chunk_id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata))
+                self._rows_by_document[
+                    (metadata.get("user_id"), metadata.get("document_id"))
+                ].append(row)
+                self._bm25.add(text)
+                self._count += 1
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(
+            texts, self.embedding.embed_documents(texts), metadatas, ids
+        )
+
+    async def aadd_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        embeddings = await self.embedding.aembed_documents(texts)
+        return await asyncio.to_thread(
+            self.add_embeddings, texts, embeddings, metadatas, ids
+        )
+
+    def _rows(self, user_id: Optional[str], document_ids: Optional[Sequence[str]]) -> np.ndarray:
+        with self._lock:
+            if user_id is None and document_ids is None:
+                return np.arange(self._count)
+            rows = [
+                row
+                for (user, document), document_rows in self._rows_by_document.items()
+                if (user_id is None or user == user_id)
+                and (document_ids is None or document in document_ids)
+                for row in document_rows
+            ]
+        return np.asarray(rows, dtype=np.int64)
+
+    def knn(
+        self,
+        vector: Sequence[float],
+        k: int,
+        user_id: Optional[str] = None,
+        document_ids: Optional[Sequence[str]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and cosine similarities of the ``k`` nearest filtered chunks."""
+        rows = self._rows(user_id, document_ids)
+        if not len(rows):
+            return rows, np.zeros(0, dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        similarities = self._matrix[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return rows[top], similarities[top]
+
+    def hybrid_search(
+        self,
+        query: str,
+        vector: Sequence[float],
+        k: int = 10,
+        alpha: float = 0.7,
+        user_id: Optional[str] = None,
+        document_ids: Optional[Sequence[str]] = None,
+    ) -> List[Document]:
+        rows, similarities = self.knn(vector, k, user_id, document_ids)
+        if not len(rows):
+            return []
+        text_scores = self._bm25.scores(query, rows)
+        hybrid = alpha * (1 + similarities) / 2 + (1 - alpha) * text_scores
+        return [self._document(rows[i]) for i in np.argsort(-hybrid, kind="stable")]
+
+    def _document(self, row: int) -> Document:
+        return Document(
+            id=self._ids[row], page_content=self._texts[row], metadata=self._metadatas[row]
+        )
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        rows, _ = self.knn(
+            embedding, k, kwargs.get("user_id"), kwargs.get("document_ids")
+        )
+        return [self._document(row) for row in rows]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding.embed_query(query), k, **kwargs
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, kwargs.get("ids"))
+        return store
+
+
+class InMemoryHybridRetriever(BaseRetriever):
+    """Hybrid retriever over a ``NumpyVectorStore``, filtered like the Redis one."""
+
+    store: NumpyVectorStore
+    embedding_model: Embeddings
+    user_id: str
+    document_ids: Tuple[str, ...]
+    k: int = 10
+    alpha: float = 0.7
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _search(self, query: str, embedding: List[float]) -> List[Document]:
+        return self.store.hybrid_search(
+            query,
+            embedding,
+            k=self.k,
+            alpha=self.alpha,
+            user_id=self.user_id,
+            document_ids=self.document_ids,
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._search(query, self.embedding_model.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        metrics = get_metrics_registry()
+        start = time.perf_counter()
+        embedding = await self.embedding_model.aembed_query(query)
+        embedded = time.perf_counter()
+        metrics.observe("retrieval.embed_ms", (embedded - start) * 1000)
+
+        docs = await asyncio.to_thread(self._search, query, embedding)
+        metrics.observe("retrieval.search_ms", (time.perf_counter() - embedded) * 1000)
+        metrics.observe("retrieval.total_ms", (time.perf_counter() - start) * 1000)
+        metrics.observe("retrieval.documents", len(docs))
+        return docs
@@ -0,0 +1,65 @@
+"""
+PDF text extraction for the ingestion parse workers.
+
+These functions run in a process pool, so this module only imports
+pdfminer and ftfy: spawned workers start without loading LangChain or the
+application.
+"""
+
+import io
+import os
+from typing import List, Optional, Tuple
+
+import ftfy
+
+# Each task parses a few pages of the same file; walking the page tree for
+# every task would cost as much as parsing, so a worker keeps the last
+# document it opened
+_open_document: Optional[Tuple[tuple, io.BufferedReader, list]] = None
+
+
+def clean_page_text(text: str) -> str:
+    """Repair a page's text; NUL characters are rejected by the vector store."""
+    return ftfy.fix_text(text.replace("\x00", "x"))
+
+
+def _document_pages(path: str) -> list:
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+
+    global _open_document
+
+    stat = os.stat(path)
+    # Temporary file names are reused, so identify the file by inode as well
+    identity = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _open_document is None or _open_document[0] != identity:
+        if _open_document is not None:
+            _open_document[1].close()
+            _open_document = None
+        fp = open(path, "rb")
+        document = PDFDocument(PDFParser(fp))
+        _open_document = (identity, fp, list(PDFPage.create_pages(document)))
+    return _open_document[2]
+
+
+def count_pdf_pages(path: str) -> int:
+    return len(_document_pages(path))
+
+
+def parse_pdf_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract and clean the text of pages ``start`` to ``stop`` (exclusive)."""
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+
+    pages = []
+    resources = PDFResourceManager(caching=True)
+    for page_number, page in enumerate(_document_pages(path)[start:stop], start):
+        # Same layout analysis as pdfminer's extract_text
+        output = io.StringIO()
+        device = TextConverter(resources, output, laparams=LAParams())
+        PDFPageInterpreter(resources, device).process_page(page)
+        device.close()
+        pages.append((page_number, clean_page_text(output.getvalue())))
+    return pages
@@ -0,0 +1,200 @@
+"""
+Cache of retrieval query embeddings.
+
+Agents repeat the same retrieval queries within a conversation and across
+conversations about the same document. Query vectors are kept in a
+per-process LRU (``QUERY_EMBEDDING_CACHE_ENTRIES``) in front of Redis, where
+they are stored as float32 bytes under
+``query_embedding:<user>:<model>:<fingerprint>`` for
+``QUERY_EMBEDDING_CACHE_TTL_SECONDS`` and shared by all replicas.
+
+Entries are per user: the fingerprint is an HMAC of the query keyed on the
+master salt and the user ID (see ``EncryptionService.fingerprint``), so a
+key reveals nothing about the query, users never share or probe each
+other's entries, and user erasure removes them by prefix.
+
+Queries are normalized (Unicode NFKC, collapsed whitespace) before hashing,
+so trivially different spellings of a query share an entry. Keys include
+the embedding model, so changing ``EMBEDDING_MODEL_NAME`` never serves
+vectors of another model.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import structlog
+from agents.storage.keys import user_key
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+KEY_PREFIX = "query_embedding"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class QueryEmbeddingCache:
+    """In-process LRU and Redis cache of (user, normalized query) -> embedding."""
+
+    def __init__(
+        self,
+        model_name: str,
+        redis_client=None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[int] = None,
+        encryption=None,
+    ):
+        # Needs a client without decode_responses: vectors are stored as bytes
+        self.redis_client = redis_client
+        self.encryption = encryption
+        self.model_name = model_name
+        self.max_entries = max_entries or int(
+            os.getenv("QUERY_EMBEDDING_CACHE_ENTRIES", "4096")
+        )
+        self.ttl = ttl or int(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "604800"))
+        self._model_slug = hashlib.sha256(model_name.encode()).hexdigest()[:12]
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Concurrent misses for one query share a single embedding call
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lookups = 0
+        self._hits = 0
+        self._metrics = get_metrics_registry()
+
+    def _key(self, text: str, user_id: str) -> str:
+        if self.encryption is None:
+            from agents.storage.encryption_service import EncryptionService
+
+            self.encryption = EncryptionService()
+        digest = self.encryption.fingerprint(normalize_query(text).encode("utf-8"), user_id)
+        return user_key(KEY_PREFIX, user_id, f"{self._model_slug}:{digest[:32]}")
+
+    def _client(self):
+        if self.redis_client is None:
+            from agents.storage.global_services import get_binary_redis_client
+
+            self.redis_client = get_binary_redis_client()
+        return self.redis_client
+
+    def _record_lookup(self, source: Optional[str]) -> None:
+        with self._lock:
+            self._lookups += 1
+            if source is not None:
+                self._hits += 1
+            hit_rate = round(self._hits / self._lookups, 4)
+        self._metrics.incr(f"query_embedding_cache.{source or 'misses'}")
+        self._metrics.set_gauge("query_embedding_cache.hit_rate", hit_rate)
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def _put_local(self, key: str, vector: bytes) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            size = len(self._entries)
+        self._metrics.set_gauge("query_embedding_cache.size", size)
+
+    @staticmethod
+    def _pack(embedding: List[float]) -> bytes:
+        return np.asarray(embedding, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _unpack(vector: bytes) -> List[float]:
+        return np.frombuffer(vector, dtype=np.float32).tolist()
+
+    def get_or_embed(
+        self, text: str, embed: Callable[[str], List[float]], user_id: str
+    ) -> List[float]:
+        """Synchronous lookup for worker threads; uses the in-process LRU only."""
+        key = self._key(text, user_id)
+        vector = self._get_local(key)
+        if vector is not None:
+            self._record_lookup("hits")
+            return self._unpack(vector)
+
+        self._record_lookup(None)
+        vector = self._pack(embed(text))
+        self._put_local(key, vector)
+        return self._unpack(vector)
+
+    async def aget_or_embed(
+        self, text: str, embed: Callable[[str], Awaitable[List[float]]], user_id: str
+    ) -> List[float]:
+        """Return the user's cached embedding of ``text``, embedding it on a miss."""
+        key = self._key(text, user_id)
+        vector = self._get_local(key)
+        if vector is not None:
+            self._record_lookup("hits")
+            return self._unpack(vector)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is asyncio.get_running_loop():
+            try:
+                vector = await asyncio.shield(inflight)
+                self._record_lookup("coalesced")
+                return self._unpack(vector)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The caller that was embedding it went away; embed here
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            vector = await self._load(key, text, embed)
+            future.set_result(vector)
+            return self._unpack(vector)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; nobody else needs to retrieve it
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _load(
+        self, key: str, text: str, embed: Callable[[str], Awaitable[List[float]]]
+    ) -> bytes:
+        try:
+            vector = await self._client().get(key)
+        except Exception as e:
+            self._metrics.incr("query_embedding_cache.redis_errors")
+            logger.warning("Query embedding cache read failed", error=str(e))
+            vector = None
+
+        if vector is not None:
+            self._record_lookup("redis_hits")
+            self._put_local(key, vector)
+            return vector
+
+        self._record_lookup(None)
+        vector = self._pack(await embed(text))
+        self._put_local(key, vector)
+        try:
+            await self._client().set(key, vector, ex=self.ttl)
+        except Exception as e:
+            self._metrics.incr("query_embedding_cache.redis_errors")
+            logger.warning("Query embedding cache write failed", error=str(e))
+        return vector
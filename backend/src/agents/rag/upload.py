@@ -1,28 +1,46 @@
 from __future__ import annotations
 
+import asyncio
 import mimetypes
+import time
 from functools import lru_cache
 from typing import BinaryIO, List, Optional
 
-import numpy as np
 import redis
 import structlog
+from agents.rag.embeddings import get_embedding_service
 from agents.rag.ingest import ingest_blob
 from agents.rag.parsing import MIMETYPE_BASED_PARSER
+from agents.rag.vector_backends import get_vector_backend
+from agents.rag.vector_index import (
+    COMPRESSED_TEXT_FIELD,
+    EMBEDDING_FIELD,
+    TAG_FIELDS,
+    TEXT_FIELD,
+    ChunkLayout,
+    VectorIndexSettings,
+    load_index_schema,
+)
+from agents.utils.metrics import get_metrics_registry
 from langchain.schema import Document
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
 from langchain_core.document_loaders.blob_loaders import Blob
+from langchain_core.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.runnables import (
     ConfigurableField,
     RunnableConfig,
     RunnableSerializable,
 )
+from langchain_core.vectorstores import VectorStore
 from langchain_redis import RedisVectorStore
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_text_splitters import TextSplitter, TokenTextSplitter
 from pydantic import BaseModel, ConfigDict
-from redisvl.index import SearchIndex
-from redisvl.query import HybridQuery
+from redisvl.index import AsyncSearchIndex, SearchIndex
+from redisvl.query import HybridQuery, VectorQuery
 from redisvl.query.filter import FilterExpression
 
 logger = structlog.get_logger(__name__)
@@ -32,51 +50,125 @@ class RedisHybridRetriever(BaseRetriever, BaseModel):
     """
     Hybrid retriever combining vector similarity with keyword filtering
     via RediSearch KNN + BM25 keyword search.
+
+    The async path embeds the query on the embedding service's worker
+    threads and searches through ``async_search_index``, so it never blocks
+    the event loop. Indexes that do not store chunk text (see
+    ``agents.rag.vector_index``) are searched by vector similarity only.
     """
 
     search_index: SearchIndex
-    embedding_model: HuggingFaceEmbeddings
+    embedding_model: Embeddings
     filter_expr: FilterExpression
+    async_search_index: Optional[AsyncSearchIndex] = None
+    k: int = 10
 
     class Config:
         arbitrary_types_allowed = True
 
-    def get_relevant_documents(self, query: str) -> List[Document]:
-        embedding = self.embedding_model.embed_query(query)
-        vector = np.array(embedding, dtype=np.float32).tobytes()
-
-        hybrid_query = HybridQuery(
+    @property
+    def layout(self) -> ChunkLayout:
+        return ChunkLayout.from_schema(self.search_index.schema)
+
+    def _build_query(self, query: str, embedding: List[float]):
+        layout = self.layout
+        if not layout.store_text:
+            return VectorQuery(
+                vector=layout.pack_vector(embedding),
+                vector_field_name=EMBEDDING_FIELD,
+                return_fields=[COMPRESSED_TEXT_FIELD, *TAG_FIELDS],
+                filter_expression=self.filter_expr,
+                dtype=layout.datatype,
+                num_results=self.k,
+            )
+        return HybridQuery(
             text=query,
-            text_field_name="text",
-            vector=vector,
-            vector_field_name="embedding",
-            return_fields=["text", "user_id", "document_id"],
+            text_field_name=TEXT_FIELD,
+            vector=layout.pack_vector(embedding),
+            vector_field_name=EMBEDDING_FIELD,
+            return_fields=[TEXT_FIELD, *TAG_FIELDS],
             filter_expression=self.filter_expr,
+            dtype=layout.datatype,
+            num_results=self.k,
         )
 
-        results = self.search_index.query(hybrid_query)
-
+    @staticmethod
+    def _to_documents(results: List[dict]) -> List[Document]:
         docs: List[Document] = []
         for doc in results:
-            content = doc.get("text", "")
-            metadata = {k: v for k, v in doc.items() if k not in ("text",)}
+            content = ChunkLayout.chunk_text(doc)
+            metadata = {
+                k: v
+                for k, v in doc.items()
+                if k not in (TEXT_FIELD, COMPRESSED_TEXT_FIELD)
+            }
             docs.append(Document(page_content=content, metadata=metadata))
         return docs
 
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = self.embedding_model.embed_query(query)
+        results = self.search_index.query(self._build_query(query, embedding))
+        return self._to_documents(results)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        metrics = get_metrics_registry()
+        start = time.perf_counter()
+        embedding = await self.embedding_model.aembed_query(query)
+        embedded = time.perf_counter()
+        metrics.observe("retrieval.embed_ms", (embedded - start) * 1000)
+
+        hybrid_query = self._build_query(query, embedding)
+        if self.async_search_index is not None:
+            results = await self.async_search_index.query(hybrid_query)
+        else:
+            results = await asyncio.to_thread(self.search_index.query, hybrid_query)
+        searched = time.perf_counter()
+        metrics.observe("retrieval.search_ms", (searched - embedded) * 1000)
+
+        docs = self._to_documents(results)
+        metrics.observe("retrieval.total_ms", (time.perf_counter() - start) * 1000)
+        metrics.observe("retrieval.documents", len(docs))
+        return docs
+
 
-@lru_cache(maxsize=100)
 def create_user_vector_store(
     api_key: str, redis_client: redis.Redis
-) -> RedisVectorStore:
+) -> VectorStore:
+    """
+    Get the vector store for the RAG index of the configured backend.
+
+    Embeddings are computed locally by the shared embedding service, so the
+    store does not depend on the user's API key.
+    """
+    return get_vector_backend().vector_store(redis_client)
+
+
+@lru_cache(maxsize=8)
+def _create_vector_store(redis_client: redis.Redis) -> RedisVectorStore:
+    embeddings = get_embedding_service()
+    settings = VectorIndexSettings.from_env()
+    # Chunks are written and searched in the layout of the live index; a
+    # changed setting only applies once the index is migrated
+    schema = load_index_schema(redis_client)
+    if schema is None:
+        schema = settings.schema(embeddings.dimensions)
+    elif not settings.matches(schema):
+        logger.warning(
+            "rag-index layout differs from its settings; "
+            "run `python -m agents.rag.vector_index` to migrate it",
+            settings=settings.describe(),
+        )
+
+    vector = schema.fields[EMBEDDING_FIELD].attrs
     vstore = RedisVectorStore(
-        embeddings=HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-        ),
-        index_name="rag-index",
-        metadata_schema=[
-            {"name": "user_id", "type": "tag"},
-            {"name": "document_id", "type": "tag"},
-        ],
+        embeddings=embeddings,
+        schema=schema,
+        embedding_dimensions=vector.dims,
+        vector_datatype=ChunkLayout.from_schema(schema).datatype.upper(),
         redis_client=redis_client,
     )
     return vstore
@@ -179,8 +271,10 @@ class IngestRunnable(RunnableSerializable[BinaryIO, List[str]]):
             raise ValueError("API key is required")
 
 
+DEFAULT_TEXT_SPLITTER = TokenTextSplitter(chunk_size=512, chunk_overlap=128)
+
 ingest_runnable = IngestRunnable(
-    text_splitter=TokenTextSplitter(chunk_size=512, chunk_overlap=128),
+    text_splitter=DEFAULT_TEXT_SPLITTER,
 ).configurable_fields(
     user_id=ConfigurableField(
         id="user_id",
@@ -0,0 +1,141 @@
+"""
+Vector store backends for RAG.
+
+``RAG_VECTOR_BACKEND`` selects where ingested chunks are stored and how the
+retrieval tool searches them:
+
+- ``redis`` (the default): the ``rag-index`` RediSearch index, searched by
+  ``RedisHybridRetriever``. Requires Redis Stack.
+- ``memory``: a per-process ``NumpyVectorStore`` (see
+  ``agents.rag.memory_store``), for benchmarks, tests and local development
+  without Redis Stack. Chunks are not shared between processes, so the
+  ingestion worker must run in the API process, and they are only removed
+  by a restart.
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+import redis
+import structlog
+from agents.rag.embeddings import get_embedding_service, user_embeddings
+from agents.rag.memory_store import InMemoryHybridRetriever, NumpyVectorStore
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+logger = structlog.get_logger(__name__)
+
+_global_vector_backend: Optional["VectorBackend"] = None
+_global_lock = threading.Lock()
+
+
+class VectorBackend(ABC):
+    """Stores chunks for ingestion and builds retrievers over them."""
+
+    name: str
+
+    @abstractmethod
+    def vector_store(self, redis_client: Optional[redis.Redis]) -> VectorStore:
+        """The store ingestion writes chunks to."""
+
+    @abstractmethod
+    def retriever(
+        self,
+        vector_store: VectorStore,
+        user_id: str,
+        document_ids: Sequence[str],
+        k: int = 10,
+    ) -> BaseRetriever:
+        """Hybrid retriever over the chunks of ``document_ids`` of one user."""
+
+
+class RedisVectorBackend(VectorBackend):
+    name = "redis"
+
+    def __init__(self, async_redis_client=None):
+        # Retrieval uses the shared async pool unless given a client
+        self.async_redis_client = async_redis_client
+
+    def vector_store(self, redis_client: Optional[redis.Redis]) -> VectorStore:
+        from agents.rag.upload import _create_vector_store
+
+        return _create_vector_store(redis_client)
+
+    def retriever(
+        self,
+        vector_store: VectorStore,
+        user_id: str,
+        document_ids: Sequence[str],
+        k: int = 10,
+    ) -> BaseRetriever:
+        from agents.rag.upload import RedisHybridRetriever
+        from agents.storage.global_services import get_redis_client
+        from redisvl.index import AsyncSearchIndex
+        from redisvl.query.filter import Tag
+
+        filter_expr = (Tag("user_id") == user_id) & (
+            Tag("document_id") == list(document_ids)
+        )
+        return RedisHybridRetriever(
+            search_index=vector_store._index,
+            embedding_model=user_embeddings(vector_store._embeddings, user_id),
+            filter_expr=filter_expr,
+            async_search_index=AsyncSearchIndex(
+                vector_store._index.schema,
+                redis_client=self.async_redis_client or get_redis_client(),
+            ),
+            k=k,
+        )
+
+
+class MemoryVectorBackend(VectorBackend):
+    name = "memory"
+
+    def __init__(self, store: Optional[NumpyVectorStore] = None):
+        self.store = store or NumpyVectorStore(get_embedding_service())
+
+    def vector_store(self, redis_client: Optional[redis.Redis] = None) -> VectorStore:
+        return self.store
+
+    def retriever(
+        self,
+        vector_store: VectorStore,
+        user_id: str,
+        document_ids: Sequence[str],
+        k: int = 10,
+    ) -> BaseRetriever:
+        return InMemoryHybridRetriever(
+            store=vector_store,
+            embedding_model=user_embeddings(vector_store.embeddings, user_id),
+            user_id=user_id,
+            document_ids=tuple(document_ids),
+            k=k,
+        )
+
+
+_BACKENDS = {
+    RedisVectorBackend.name: RedisVectorBackend,
+    MemoryVectorBackend.name: MemoryVectorBackend,
+}
+
+
+def get_vector_backend() -> VectorBackend:
+    """Get the process-wide vector backend selected by ``RAG_VECTOR_BACKEND``."""
+    global _global_vector_backend
+
+    if _global_vector_backend is None:
+        with _global_lock:
+            if _global_vector_backend is None:
+                name = os.getenv("RAG_VECTOR_BACKEND", "redis").lower()
+                if name not in _BACKENDS:
+                    raise ValueError(f"Unsupported RAG_VECTOR_BACKEND: {name}")
+                _global_vector_backend = _BACKENDS[name]()
+                logger.info("Using vector backend", backend=name)
+    return _global_vector_backend
+
+
+def set_vector_backend(backend: VectorBackend) -> None:
+    global _global_vector_backend
+    _global_vector_backend = backend
@@ -0,0 +1,400 @@
+"""
+Layout of the ``rag-index`` vector index and its migration.
+
+New indexes are built from the ``RAG_INDEX_*`` settings:
+
+- ``RAG_INDEX_ALGORITHM``: ``flat`` (exact, the default) or ``hnsw``, tuned
+  with ``RAG_INDEX_HNSW_M``, ``RAG_INDEX_HNSW_EF_CONSTRUCTION`` and
+  ``RAG_INDEX_HNSW_EF_RUNTIME``.
+- ``RAG_INDEX_VECTOR_DATATYPE``: ``float32`` (the default) or ``float16``,
+  which halves vector memory.
+- ``RAG_INDEX_STORE_TEXT``: ``false`` stores each chunk zlib-compressed in a
+  ``text_z`` field instead of an indexed ``text`` field. Retrieval becomes
+  vector-only, as there is no text to run BM25 over.
+
+Chunks hold only the fields the retriever reads: no per-chunk copy of the
+metadata as JSON, unlike LangChain's default layout.
+
+Writers and readers follow the layout of the live index, never the
+settings, so changing the settings has no effect on an existing index
+until it is rebuilt:
+
+    python -m agents.rag.vector_index [--dry-run]
+
+The migration drops the index definition (not the chunks), rewrites every
+chunk in place in the target layout, recreates the index and waits for it
+to finish indexing. Chunk keys do not change, so file metadata stays
+valid. Retrieval fails while it runs; restart API processes and ingestion
+workers afterwards, as they keep the layout they started with.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import redis.asyncio as aioredis
+import redis.exceptions
+import structlog
+from redisvl.schema import IndexSchema
+
+logger = structlog.get_logger(__name__)
+
+INDEX_NAME = "rag-index"
+KEY_PREFIX = "rag-index"
+
+TEXT_FIELD = "text"
+COMPRESSED_TEXT_FIELD = "text_z"
+EMBEDDING_FIELD = "embedding"
+TAG_FIELDS = ("user_id", "document_id")
+# Written by LangChain's RedisVectorStore but not indexed; nothing reads them
+LEGACY_FIELDS = ("_index_name", "_metadata_json")
+
+SCAN_COUNT = 1000
+MIGRATION_BATCH_SIZE = 500
+# Dimensions of an interrupted migration, whose index is already dropped
+MIGRATION_STATE_KEY = "vector_index_migration"
+
+_DATATYPE_SIZES = {4: "float32", 2: "float16", 8: "float64"}
+
+
+def compress_text(text: str) -> str:
+    # Base64 keeps the field readable by clients that decode responses
+    return base64.b64encode(zlib.compress(text.encode("utf-8"), 6)).decode("ascii")
+
+
+def decompress_text(value: str) -> str:
+    return zlib.decompress(base64.b64decode(value)).decode("utf-8")
+
+
+@dataclass(frozen=True)
+class VectorIndexSettings:
+    """Target layout for newly built indexes."""
+
+    algorithm: str = "flat"
+    datatype: str = "float32"
+    m: int = 16
+    ef_construction: int = 200
+    ef_runtime: int = 10
+    store_text: bool = True
+
+    @classmethod
+    def from_env(cls) -> "VectorIndexSettings":
+        algorithm = os.getenv("RAG_INDEX_ALGORITHM", "flat").lower()
+        datatype = os.getenv("RAG_INDEX_VECTOR_DATATYPE", "float32").lower()
+        if algorithm not in ("flat", "hnsw"):
+            raise ValueError(f"Unsupported RAG_INDEX_ALGORITHM: {algorithm}")
+        if datatype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported RAG_INDEX_VECTOR_DATATYPE: {datatype}")
+        return cls(
+            algorithm=algorithm,
+            datatype=datatype,
+            m=int(os.getenv("RAG_INDEX_HNSW_M", "16")),
+            ef_construction=int(os.getenv("RAG_INDEX_HNSW_EF_CONSTRUCTION", "200")),
+            ef_runtime=int(os.getenv("RAG_INDEX_HNSW_EF_RUNTIME", "10")),
+            store_text=os.getenv("RAG_INDEX_STORE_TEXT", "true").lower() == "true",
+        )
+
+    def schema(
+        self, dims: int, name: str = INDEX_NAME, prefix: str = KEY_PREFIX
+    ) -> IndexSchema:
+        vector_attrs: Dict[str, Any] = {
+            "dims": dims,
+            "distance_metric": "cosine",
+            "algorithm": self.algorithm,
+            "datatype": self.datatype,
+        }
+        if self.algorithm == "hnsw":
+            vector_attrs.update(
+                m=self.m,
+                ef_construction=self.ef_construction,
+                ef_runtime=self.ef_runtime,
+            )
+
+        fields: List[Dict[str, Any]] = []
+        if self.store_text:
+            fields.append({"name": TEXT_FIELD, "type": "text"})
+        fields.append({"name": EMBEDDING_FIELD, "type": "vector", "attrs": vector_attrs})
+        fields.extend(
+            {"name": name, "type": "tag", "attrs": {"separator": "|"}}
+            for name in TAG_FIELDS
+        )
+        return IndexSchema.from_dict(
+            {
+                "index": {"name": name, "prefix": f"{prefix}:", "storage_type": "hash"},
+                "fields": fields,
+            }
+        )
+
+    def matches(self, schema: IndexSchema) -> bool:
+        """Whether an existing index already has this layout."""
+        attrs = schema.fields[EMBEDDING_FIELD].attrs
+        algorithm = str(getattr(attrs.algorithm, "value", attrs.algorithm)).lower()
+        layout = ChunkLayout.from_schema(schema)
+        if (algorithm, layout.datatype, layout.store_text) != (
+            self.algorithm,
+            self.datatype,
+            self.store_text,
+        ):
+            return False
+        if algorithm == "hnsw":
+            return (attrs.m, attrs.ef_construction, attrs.ef_runtime) == (
+                self.m,
+                self.ef_construction,
+                self.ef_runtime,
+            )
+        return True
+
+    def describe(self) -> str:
+        if self.algorithm == "hnsw":
+            algorithm = (
+                f"hnsw (m={self.m}, ef_construction={self.ef_construction}, "
+                f"ef_runtime={self.ef_runtime})"
+            )
+        else:
+            algorithm = "flat"
+        text = "text" if self.store_text else "compressed text"
+        return f"{algorithm}, {self.datatype}, {text}"
+
+
+@dataclass(frozen=True)
+class ChunkLayout:
+    """How chunks of a given index are stored."""
+
+    datatype: str
+    store_text: bool
+
+    @classmethod
+    def from_schema(cls, schema: IndexSchema) -> "ChunkLayout":
+        vector = schema.fields[EMBEDDING_FIELD]
+        return cls(
+            datatype=str(getattr(vector.attrs.datatype, "value", vector.attrs.datatype)).lower(),
+            store_text=TEXT_FIELD in schema.fields,
+        )
+
+    def pack_vector(self, vector) -> bytes:
+        return np.asarray(vector, dtype=self.datatype).tobytes()
+
+    def record(self, text: str, vector, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Hash fields of one chunk."""
+        record: Dict[str, Any] = {EMBEDDING_FIELD: self.pack_vector(vector)}
+        if self.store_text:
+            record[TEXT_FIELD] = text
+        else:
+            record[COMPRESSED_TEXT_FIELD] = compress_text(text)
+        record.update(
+            (field, metadata[field])
+            for field in TAG_FIELDS
+            if metadata.get(field) is not None
+        )
+        return record
+
+    @staticmethod
+    def chunk_text(fields: Dict[str, Any]) -> str:
+        """Text of a chunk from its stored or returned fields."""
+        if fields.get(TEXT_FIELD) is not None:
+            return fields[TEXT_FIELD]
+        if fields.get(COMPRESSED_TEXT_FIELD):
+            return decompress_text(fields[COMPRESSED_TEXT_FIELD])
+        return ""
+
+
+def load_index_schema(redis_client) -> Optional[IndexSchema]:
+    """Schema of the live index, or None if it does not exist yet."""
+    from redisvl.index import SearchIndex
+
+    try:
+        redis_client.ft(INDEX_NAME).info()
+    except redis.exceptions.ResponseError:
+        return None
+    return SearchIndex.from_existing(INDEX_NAME, redis_client=redis_client).schema
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class VectorIndexMigrator:
+    """Rebuilds ``rag-index`` in the layout of the given settings."""
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        settings: VectorIndexSettings,
+        dry_run: bool = False,
+    ):
+        # Needs a client without decode_responses: vectors are binary
+        self.redis_client = redis_client
+        self.settings = settings
+        self.dry_run = dry_run
+        self.stats = Counter()
+
+    async def _live_index(self):
+        from redisvl.index import AsyncSearchIndex
+
+        try:
+            await self.redis_client.ft(INDEX_NAME).info()
+        except redis.exceptions.ResponseError:
+            return None
+        return await AsyncSearchIndex.from_existing(
+            INDEX_NAME, redis_client=self.redis_client
+        )
+
+    async def _scan_keys(self):
+        batch = []
+        async for key in self.redis_client.scan_iter(
+            match=f"{KEY_PREFIX}:*", count=SCAN_COUNT, _type="hash"
+        ):
+            batch.append(key)
+            if len(batch) >= MIGRATION_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _rewrite(self, stored: Dict[bytes, bytes], dims: int, target: ChunkLayout):
+        """Fields to set and delete to move one chunk to the target layout."""
+        fields = {_decode(name): value for name, value in stored.items()}
+        if EMBEDDING_FIELD not in fields:
+            return None
+        # Chunks of a resumed migration may already be in the target layout
+        source_datatype = _DATATYPE_SIZES.get(len(fields[EMBEDDING_FIELD]) // dims)
+        if source_datatype is None:
+            return None
+
+        if fields.get(TEXT_FIELD) is not None:
+            text = _decode(fields[TEXT_FIELD])
+        elif fields.get(COMPRESSED_TEXT_FIELD):
+            text = decompress_text(_decode(fields[COMPRESSED_TEXT_FIELD]))
+        else:
+            text = ""
+        vector = np.frombuffer(fields[EMBEDDING_FIELD], dtype=source_datatype)
+        metadata = {
+            name: _decode(value)
+            for name, value in fields.items()
+            if name not in (TEXT_FIELD, COMPRESSED_TEXT_FIELD, EMBEDDING_FIELD)
+            and name not in LEGACY_FIELDS
+        }
+
+        record = target.record(text, vector, metadata)
+        stale = [name for name in fields if name not in record]
+        return record, stale
+
+    async def migrate(self) -> Counter:
+        from redisvl.index import AsyncSearchIndex
+
+        live = await self._live_index()
+        state = await self.redis_client.get(MIGRATION_STATE_KEY)
+        if live is not None:
+            dims = live.schema.fields[EMBEDDING_FIELD].attrs.dims
+            source = self._describe_layout(live.schema)
+        elif state is not None:
+            dims = json.loads(state)["dims"]
+            source = "interrupted migration"
+        else:
+            raise RuntimeError(f"Index {INDEX_NAME} does not exist; nothing to migrate")
+
+        target_schema = self.settings.schema(dims)
+        target = ChunkLayout.from_schema(target_schema)
+        logger.info(
+            "Migrating vector index",
+            source=source,
+            target=self.settings.describe(),
+            dry_run=self.dry_run,
+        )
+
+        if not self.dry_run:
+            await self.redis_client.set(MIGRATION_STATE_KEY, json.dumps({"dims": dims}))
+            if live is not None:
+                # Keeps the chunks; stops the index from reindexing every rewrite
+                await live.delete(drop=False)
+
+        async for keys in self._scan_keys():
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+                stored = await pipe.execute()
+
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, fields in zip(keys, stored):
+                    rewrite = self._rewrite(fields, dims, target)
+                    if rewrite is None:
+                        self.stats["skipped"] += 1
+                        continue
+                    record, stale = rewrite
+                    self.stats["chunks"] += 1
+                    if not self.dry_run:
+                        pipe.hset(key, mapping=record)
+                        if stale:
+                            pipe.hdel(key, *stale)
+                if not self.dry_run:
+                    await pipe.execute()
+
+        if self.dry_run:
+            return self.stats
+
+        index = AsyncSearchIndex(target_schema, redis_client=self.redis_client)
+        await index.create(overwrite=False)
+        await self.redis_client.delete(MIGRATION_STATE_KEY)
+        await self._wait_until_indexed(index)
+        return self.stats
+
+    @staticmethod
+    def _describe_layout(schema: IndexSchema) -> str:
+        layout = ChunkLayout.from_schema(schema)
+        algorithm = schema.fields[EMBEDDING_FIELD].attrs.algorithm
+        text = "text" if layout.store_text else "compressed text"
+        return f"{getattr(algorithm, 'value', algorithm).lower()}, {layout.datatype}, {text}"
+
+    async def _wait_until_indexed(self, index) -> None:
+        started = time.monotonic()
+        while True:
+            info = await index.info()
+            if float(info.get("percent_indexed", 1)) >= 1:
+                break
+            await asyncio.sleep(1)
+        self.stats["indexing_seconds"] = round(time.monotonic() - started)
+
+
+def _create_client() -> aioredis.Redis:
+    return aioredis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=0,
+    )
+
+
+async def _run(args: argparse.Namespace) -> int:
+    client = _create_client()
+    try:
+        settings = VectorIndexSettings.from_env()
+        print(f"target layout: {settings.describe()}")
+        stats = await VectorIndexMigrator(client, settings, dry_run=args.dry_run).migrate()
+        for outcome, count in sorted(stats.items()):
+            print(f"{outcome:<28}{count:>10}")
+        if not args.dry_run:
+            print("Restart API processes and ingestion workers to pick up the new layout.")
+        return 0
+    finally:
+        await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Count chunks to rewrite without changing the index",
+    )
+    raise SystemExit(asyncio.run(_run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from typing import Any, Dict, List, Optional, Tuple
 import requests
 import structlog
 from agents.auth.auth0_config import get_auth0_config
+from agents.storage.keys import user_scope
 from agents.storage.redis_storage import RedisStorage
 
 logger = structlog.get_logger(__name__)
@@ -85,7 +86,7 @@ class ExportService:
         """Gather all conversations for a user"""
         try:
             # Get user's conversation list from Redis
-            user_chats_key = f"user_chats:{user_id}"
+            user_chats_key = f"user_chats:{user_scope(user_id)}"
             conversation_ids = await self.redis_storage.redis_client.zrevrange(user_chats_key, 0, -1)
             
             conversations = []
@@ -95,7 +96,7 @@ class ExportService:
                     conv_id = conv_id.decode('utf-8')
                 
                 # Get conversation metadata
-                meta_key = f"chat_metadata:{user_id}:{conv_id}"
+                meta_key = f"chat_metadata:{user_scope(user_id)}:{conv_id}"
                 metadata_raw = await self.redis_storage.redis_client.get(meta_key, user_id)
                 
                 if metadata_raw:
@@ -10,6 +10,7 @@ import redis
 import requests
 import structlog
 from agents.api.websocket_interface import WebSocketInterface
+from agents.storage.keys import user_scope
 from agents.registry.model_registry import model_registry
 from agents.utils.json_utils import extract_json_from_string
 from fastapi import WebSocket
@@ -894,7 +895,7 @@ class QueryRouterServiceChat:
             "message_id": self.message_id,
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
-        message_key = f"messages:{self.user_id}:{self.conversation_id}"
+        message_key = f"messages:{user_scope(self.user_id)}:{self.conversation_id}"
         self.redis_client.rpush(
             message_key, json.dumps(final_message_data), self.user_id
         )
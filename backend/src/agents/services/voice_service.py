@@ -7,6 +7,7 @@ import structlog
 import httpx
 from hume import AsyncHumeClient
 from agents.storage.redis_storage import RedisStorage
+from agents.storage.keys import user_scope
 
 logger = structlog.get_logger(__name__)
 
@@ -287,7 +288,7 @@ class HumeVoiceService:
 
         try:
             # Try to load from Redis
-            config_key = f"voice_config:{user_id}"
+            config_key = f"voice_config:{user_scope(user_id)}"
             stored_config = await self.redis_storage.redis_client.get(
                 config_key, user_id
             )
@@ -321,7 +322,7 @@ class HumeVoiceService:
         try:
             import json
 
-            config_key = f"voice_config:{user_id}"
+            config_key = f"voice_config:{user_scope(user_id)}"
             await self.redis_storage.redis_client.set(
                 config_key, json.dumps(config), user_id
             )
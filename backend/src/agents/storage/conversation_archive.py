@@ -0,0 +1,541 @@
+"""
+Cold-conversation tiering.
+
+Conversations that have not been touched for ``CONVERSATION_ARCHIVE_AFTER_DAYS``
+are moved out of Redis into one encrypted, compressed segment per
+conversation on a blob store. Redis keeps the chat metadata, so the chat
+still shows up in the list, plus a small stub pointing at the segment.
+Loading the conversation rehydrates it transparently.
+
+Archiving is off unless ``CONVERSATION_ARCHIVE_AFTER_DAYS`` is set. Segments
+must be readable by every replica, so with ``BACKEND_REPLICAS`` above one
+the blob store has to be shared: an object store set with
+``set_blob_store``, or a directory on a volume mounted by all replicas and
+marked with ``CONVERSATION_ARCHIVE_PATH_SHARED=true``.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+import structlog
+from agents.storage.redis_service import SecureRedisService
+from agents.storage.keys import split_user_key, user_scope
+from agents.storage.sweep_lock import acquire_sweep_lock
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+SEGMENT_FORMAT_VERSION = 1
+
+# KEYS = message list, dedup hash, usage totals, stub, compaction state
+# ARGV[1] = stub, ARGV[2] = list length read, ARGV[3] = last record read,
+# ARGV[4] = dedup hash length read, ARGV[5..] = usage field/value pairs read
+# Lists and dedup hashes only grow, so unchanged lengths and tail mean the
+# segment written to the blob store is still complete.
+_ARCHIVE_LUA = """
+if redis.call('EXISTS', KEYS[4]) == 1
+    or redis.call('LLEN', KEYS[1]) ~= tonumber(ARGV[2])
+    or redis.call('LINDEX', KEYS[1], -1) ~= ARGV[3]
+    or redis.call('HLEN', KEYS[2]) ~= tonumber(ARGV[4])
+    or redis.call('HLEN', KEYS[3]) ~= (#ARGV - 4) / 2 then
+    return 0
+end
+for i = 5, #ARGV, 2 do
+    if redis.call('HGET', KEYS[3], ARGV[i]) ~= ARGV[i + 1] then
+        return 0
+    end
+end
+redis.call('SET', KEYS[4], ARGV[1])
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[5])
+return 1
+"""
+
+# KEYS = stub, message list, dedup hash, usage totals, rehydrated marker
+# ARGV[1] = stub read, ARGV[2] = marker TTL (0 for none), ARGV[3] = now,
+# ARGV[4] = message count, ARGV[5] = message ID count, ARGV[6] = dedup
+# marker, then the messages in reverse order, the message IDs and the usage
+# field/value pairs
+_REHYDRATE_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+local first = 7
+local last = first + tonumber(ARGV[4]) - 1
+for i = first, last, 1000 do
+    redis.call('LPUSH', KEYS[2], unpack(ARGV, i, math.min(i + 999, last)))
+end
+first = last + 1
+last = first + tonumber(ARGV[5]) - 1
+for i = first, last do
+    redis.call('HSET', KEYS[3], ARGV[i], ARGV[6])
+end
+for i = last + 1, #ARGV, 2 do
+    redis.call('HINCRBYFLOAT', KEYS[4], ARGV[i], ARGV[i + 1])
+end
+redis.call('DEL', KEYS[1])
+if tonumber(ARGV[2]) > 0 then
+    redis.call('SET', KEYS[5], ARGV[3], 'EX', ARGV[2])
+end
+return 1
+"""
+
+
+class BlobStore(ABC):
+    """Minimal blob storage interface for archived conversation segments."""
+
+    # Whether every replica reads and writes the same blobs
+    shared = True
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        pass
+
+
+class LocalBlobStore(BlobStore):
+    """Blob store backed by a local (or mounted) directory."""
+
+    def __init__(self, root: str, shared: bool = False):
+        self.root = root
+        self.shared = shared
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, key, data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+
+_global_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Get or create the blob store used for archived conversations."""
+    global _global_blob_store
+
+    if _global_blob_store is None:
+        backend = os.getenv("CONVERSATION_ARCHIVE_BACKEND", "local")
+        if backend != "local":
+            raise ValueError(f"Unsupported conversation archive backend: {backend}")
+        _global_blob_store = LocalBlobStore(
+            os.getenv("CONVERSATION_ARCHIVE_PATH", "/var/lib/agents/conversation_archive"),
+            shared=os.getenv("CONVERSATION_ARCHIVE_PATH_SHARED", "false").lower()
+            == "true",
+        )
+
+    return _global_blob_store
+
+
+def set_blob_store(blob_store: BlobStore) -> None:
+    """Replace the blob store, e.g. with an object storage implementation."""
+    global _global_blob_store
+    _global_blob_store = blob_store
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class ConversationArchiver:
+    """
+    Moves idle conversations between Redis and the blob store.
+
+    A conversation's message list, dedup hash and usage totals are archived.
+    Rehydration prepends the archived messages to anything written since, so
+    a write that races with rehydration is never lost.
+    """
+
+    def __init__(
+        self,
+        redis_client: SecureRedisService,
+        blob_store: Optional[BlobStore] = None,
+        archive_after_days: Optional[float] = None,
+        interval: Optional[float] = None,
+    ):
+        self.redis_client = redis_client
+        self._blob_store = blob_store
+        self.archive_after_days = (
+            archive_after_days
+            if archive_after_days is not None
+            else float(os.getenv("CONVERSATION_ARCHIVE_AFTER_DAYS", "0"))
+        )
+        self.interval = (
+            interval
+            if interval is not None
+            else float(os.getenv("CONVERSATION_ARCHIVE_INTERVAL_SECONDS", "21600"))
+        )
+        self._metrics = get_metrics_registry()
+        self._archive_script = redis_client.register_script(_ARCHIVE_LUA)
+        self._rehydrate_script = redis_client.register_script(_REHYDRATE_LUA)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def blob_store(self) -> BlobStore:
+        if self._blob_store is None:
+            self._blob_store = get_blob_store()
+        return self._blob_store
+
+    @staticmethod
+    def _message_key(user_id: str, conversation_id: str) -> str:
+        return f"messages:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _dedup_key(user_id: str, conversation_id: str) -> str:
+        return f"message_ids:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _usage_totals_key(user_id: str, conversation_id: str) -> str:
+        return f"cumulative_usage_totals:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _compaction_key(user_id: str, conversation_id: str) -> str:
+        return f"message_compaction:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _chat_metadata_key(user_id: str, conversation_id: str) -> str:
+        return f"chat_metadata:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _stub_key(user_id: str, conversation_id: str) -> str:
+        return f"conversation_archive:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _rehydrated_key(user_id: str, conversation_id: str) -> str:
+        return f"conversation_rehydrated:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _segment_key(user_id: str, conversation_id: str) -> str:
+        # Raw user IDs stay out of blob paths
+        user_hash = hashlib.sha256(user_id.encode()).hexdigest()
+        return f"{user_hash}/{conversation_id}.seg"
+
+    async def is_archived(self, user_id: str, conversation_id: str) -> bool:
+        return bool(await self.redis_client.exists(self._stub_key(user_id, conversation_id)))
+
+    async def _last_activity(self, user_id: str, conversation_id: str) -> Optional[float]:
+        """Most recent of the last message timestamp and the chat metadata."""
+        candidates = []
+
+        last_raw = await self.redis_client.lindex(
+            self._message_key(user_id, conversation_id), -1
+        )
+        if last_raw is not None:
+            last_message = json.loads(self.redis_client.encryption.decrypt(last_raw, user_id))
+            candidates.append(_parse_timestamp(last_message.get("timestamp")))
+
+        metadata_raw = await self.redis_client.get(
+            self._chat_metadata_key(user_id, conversation_id), user_id
+        )
+        if metadata_raw:
+            metadata = json.loads(metadata_raw)
+            candidates.append(_parse_timestamp(metadata.get("updated_at")))
+            candidates.append(_parse_timestamp(metadata.get("created_at")))
+
+        candidates = [c for c in candidates if c is not None]
+        return max(candidates) if candidates else None
+
+    async def archive_conversation(self, user_id: str, conversation_id: str) -> bool:
+        """
+        Move a conversation to the blob store, leaving a stub in Redis.
+
+        Returns False if there was nothing to archive or the conversation
+        changed while it was being archived.
+        """
+        message_key = self._message_key(user_id, conversation_id)
+        dedup_key = self._dedup_key(user_id, conversation_id)
+        usage_key = self._usage_totals_key(user_id, conversation_id)
+        stub_key = self._stub_key(user_id, conversation_id)
+        segment_key = self._segment_key(user_id, conversation_id)
+        encryption = self.redis_client.encryption
+
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.exists(stub_key)
+            pipe.lrange(message_key, 0, -1)
+            pipe.hgetall(dedup_key)
+            pipe.hgetall(usage_key)
+            archived, raw_messages, raw_dedup, usage_totals = await pipe.execute()
+        if archived or not raw_messages:
+            return False
+
+        segment = {
+            "version": SEGMENT_FORMAT_VERSION,
+            "messages": [encryption.decrypt(raw, user_id).decode() for raw in raw_messages],
+            "message_ids": list(raw_dedup.keys()),
+            "usage_totals": usage_totals,
+        }
+        # One encrypted payload per segment, compressed as a whole
+        segment_data = encryption.encrypt(json.dumps(segment), user_id)
+        await self.blob_store.put(segment_key, segment_data)
+
+        hot_bytes = sum(len(raw) for raw in raw_messages) + sum(
+            len(k) + len(v) for k, v in raw_dedup.items()
+        )
+        stub = {
+            "segment": segment_key,
+            "archived_at": time.time(),
+            "message_count": len(raw_messages),
+            "segment_bytes": len(segment_data),
+            "hot_bytes": hot_bytes,
+        }
+
+        args = [
+            encryption.encrypt(json.dumps(stub), user_id),
+            len(raw_messages),
+            raw_messages[-1],
+            len(raw_dedup),
+        ]
+        for field, value in usage_totals.items():
+            args.extend([field, value])
+        if not await self._archive_script(
+            keys=[
+                message_key,
+                dedup_key,
+                usage_key,
+                stub_key,
+                self._compaction_key(user_id, conversation_id),
+            ],
+            args=args,
+        ):
+            # Written to while archiving; it is not cold after all
+            await self.blob_store.delete(segment_key)
+            return False
+
+        self._metrics.incr("archive.conversations_archived")
+        self._metrics.incr("archive.hot_bytes_freed", hot_bytes)
+        self._metrics.incr("archive.cold_bytes_written", len(segment_data))
+        logger.info(
+            "Archived conversation",
+            conversation_id=conversation_id,
+            message_count=len(raw_messages),
+            hot_bytes=hot_bytes,
+            segment_bytes=len(segment_data),
+        )
+        return True
+
+    async def rehydrate(self, user_id: str, conversation_id: str) -> bool:
+        """
+        Restore an archived conversation into Redis.
+
+        Returns True if the conversation was archived and is now hot again.
+        """
+        stub_key = self._stub_key(user_id, conversation_id)
+        message_key = self._message_key(user_id, conversation_id)
+        dedup_key = self._dedup_key(user_id, conversation_id)
+        usage_key = self._usage_totals_key(user_id, conversation_id)
+        encryption = self.redis_client.encryption
+        start = time.perf_counter()
+
+        raw_stub = await self.redis_client.get_plain(stub_key)
+        if raw_stub is None:
+            return False
+        stub = json.loads(encryption.decrypt(raw_stub, user_id))
+
+        segment_data = await self.blob_store.get(stub["segment"])
+        if segment_data is None:
+            logger.error(
+                "Archived conversation segment is missing",
+                conversation_id=conversation_id,
+                segment=stub["segment"],
+            )
+            self._metrics.incr("archive.rehydrate_errors")
+            return False
+        segment = json.loads(encryption.decrypt(segment_data, user_id))
+
+        # Opening the chat counts as activity
+        marker_ttl = int(self.archive_after_days * 86400) if self.archive_after_days > 0 else 0
+        args = [
+            raw_stub,
+            marker_ttl,
+            int(time.time()),
+            len(segment["messages"]),
+            len(segment["message_ids"]),
+            encryption.encrypt("1", user_id),
+        ]
+        # Archived messages predate anything written since
+        args.extend(
+            encryption.encrypt(message, user_id) for message in reversed(segment["messages"])
+        )
+        args.extend(segment["message_ids"])
+        for field, value in segment["usage_totals"].items():
+            args.extend([field, float(value)])
+        if not await self._rehydrate_script(
+            keys=[
+                stub_key,
+                message_key,
+                dedup_key,
+                usage_key,
+                self._rehydrated_key(user_id, conversation_id),
+            ],
+            args=args,
+        ):
+            # Another request rehydrated it first
+            return False
+
+        await self.blob_store.delete(stub["segment"])
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        self._metrics.incr("archive.conversations_rehydrated")
+        self._metrics.observe("archive.rehydrate_latency_ms", duration_ms)
+        logger.info(
+            "Rehydrated archived conversation",
+            conversation_id=conversation_id,
+            message_count=stub.get("message_count"),
+            duration_ms=round(duration_ms, 2),
+        )
+        return True
+
+    async def discard(self, user_id: str, conversation_id: str) -> None:
+        """Drop the archived copy of a deleted conversation."""
+        stub_key = self._stub_key(user_id, conversation_id)
+        await self.redis_client.delete(
+            stub_key, self._rehydrated_key(user_id, conversation_id)
+        )
+        await self.blob_store.delete(self._segment_key(user_id, conversation_id))
+
+    async def archive_idle(
+        self, is_active: Optional[Callable[[str, str], bool]] = None
+    ) -> int:
+        """
+        Archive every conversation idle for longer than ``archive_after_days``.
+
+        ``is_active`` lets the caller exclude conversations with open sessions.
+        """
+        cutoff = time.time() - self.archive_after_days * 86400
+        archived = 0
+        hot_conversations = 0
+        hot_records = 0
+        cold_conversations = 0
+        cold_bytes = 0
+
+        async for key in self.redis_client.scan_iter(match="chat_metadata:*", count=500):
+            _, user_id, conversation_id = split_user_key(key)
+            if not user_id or not conversation_id:
+                continue
+
+            try:
+                raw_stub = await self.redis_client.get(
+                    self._stub_key(user_id, conversation_id), user_id
+                )
+                if raw_stub:
+                    cold_conversations += 1
+                    cold_bytes += json.loads(raw_stub).get("segment_bytes", 0)
+                    continue
+
+                if (is_active and is_active(user_id, conversation_id)) or (
+                    await self.redis_client.exists(
+                        self._rehydrated_key(user_id, conversation_id)
+                    )
+                ):
+                    last_activity = None
+                else:
+                    last_activity = await self._last_activity(user_id, conversation_id)
+
+                if last_activity is not None and last_activity < cutoff:
+                    if await self.archive_conversation(user_id, conversation_id):
+                        archived += 1
+                        cold_conversations += 1
+                        continue
+
+                hot_conversations += 1
+                hot_records += await self.redis_client.llen(
+                    self._message_key(user_id, conversation_id)
+                )
+            except Exception as e:
+                self._metrics.incr("archive.errors")
+                logger.error(
+                    "Error archiving conversation",
+                    conversation_id=conversation_id,
+                    error=str(e),
+                )
+
+        self._metrics.set_gauge("archive.hot_conversations", hot_conversations)
+        self._metrics.set_gauge("archive.hot_message_records", hot_records)
+        self._metrics.set_gauge("archive.cold_conversations", cold_conversations)
+        self._metrics.set_gauge("archive.cold_bytes", cold_bytes)
+        return archived
+
+    async def _run(self, is_active: Optional[Callable[[str, str], bool]]) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await acquire_sweep_lock(
+                    self.redis_client, "conversation_archive", self.interval
+                ):
+                    await self.archive_idle(is_active)
+            except Exception as e:
+                logger.error("Conversation archive pass failed", error=str(e))
+
+    def start(self, is_active: Optional[Callable[[str, str], bool]] = None) -> None:
+        """
+        Start the periodic archive loop; 0 days or 0 interval disables it.
+
+        Refuses to start with a blob store other replicas cannot read.
+        """
+        if self.archive_after_days <= 0 or self.interval <= 0 or self._task is not None:
+            return
+        replicas = int(os.getenv("BACKEND_REPLICAS", "1"))
+        if replicas > 1 and not self.blob_store.shared:
+            raise ValueError(
+                f"Conversation archiving needs a blob store shared by all {replicas} "
+                "replicas; configure an object store or a shared volume with "
+                "CONVERSATION_ARCHIVE_PATH_SHARED=true, or disable archiving"
+            )
+        self._task = asyncio.create_task(self._run(is_active))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,6 +1,7 @@
 import base64
 import hmac
 import os
+import zlib
 from typing import Any, Dict, Optional, TypeVar
 
 import structlog
@@ -12,6 +13,14 @@ logger = structlog.get_logger(__name__)
 
 T = TypeVar("T")
 
+# Header byte prepended to the Fernet token of compressed values. Fernet
+# tokens always start with "g" (base64 of the 0x80 version byte), so values
+# written before compression existed are read back unchanged. Replicas
+# running older code cannot read compressed values, so compression is off
+# by default and only turned on (REDIS_COMPRESSION_ENABLED=true) once every
+# replica runs a version that reads them.
+COMPRESSED_ZLIB_V1 = b"\x01"
+
 
 class EncryptionService:
     def __init__(self):
@@ -29,6 +38,14 @@ class EncryptionService:
 
         self._fernet_instances = {}
 
+        self.compression_enabled = (
+            os.getenv("REDIS_COMPRESSION_ENABLED", "false").lower() == "true"
+        )
+        self.compression_min_bytes = int(
+            os.getenv("REDIS_COMPRESSION_MIN_BYTES", "1024")
+        )
+        self.compression_level = int(os.getenv("REDIS_COMPRESSION_LEVEL", "6"))
+
     def _derive_key(self, user_id: str) -> bytes:
         """
         Derive an encryption key from the user_id using PBKDF2.
@@ -63,10 +80,40 @@ class EncryptionService:
             self._fernet_instances[user_id] = Fernet(key)
         return self._fernet_instances[user_id]
 
+    def fingerprint(self, data: bytes, user_id: str) -> str:
+        """
+        Compute a keyed content fingerprint for deduplication.
+
+        The digest is an HMAC-SHA256 keyed on the master salt and user_id, so
+        identical content only maps to the same fingerprint for the same user
+        and plaintext hashes of user content never reach Redis.
+
+        Args:
+            data: Raw content bytes
+            user_id: The user's ID
+
+        Returns:
+            str: Hex-encoded fingerprint
+        """
+        key = self.master_salt + user_id.encode()
+        return hmac.new(key, data, "sha256").hexdigest()
+
+    def _compress(self, data: bytes) -> Optional[bytes]:
+        """Compress data if it is large enough and compression pays off."""
+        if not self.compression_enabled or len(data) < self.compression_min_bytes:
+            return None
+        compressed = zlib.compress(data, self.compression_level)
+        if len(compressed) >= len(data):
+            return None
+        return compressed
+
     def encrypt(self, data: Any, user_id: str) -> Optional[bytes]:
         """
         Encrypt data using a key derived from the user_id.
 
+        Payloads of at least ``compression_min_bytes`` are zlib-compressed
+        before encryption and tagged with a header byte.
+
         Args:
             data: Data to encrypt
             user_id: The user's ID
@@ -82,6 +129,9 @@ class EncryptionService:
             data = str(data).encode()
 
         fernet = self._get_fernet(user_id)
+        compressed = self._compress(data)
+        if compressed is not None:
+            return COMPRESSED_ZLIB_V1 + fernet.encrypt(compressed)
         return fernet.encrypt(data)
 
     def decrypt(self, encrypted_data: Optional[bytes], user_id: str) -> Any:
@@ -98,7 +148,12 @@ class EncryptionService:
         if encrypted_data is None:
             return None
 
+        if isinstance(encrypted_data, str):
+            encrypted_data = encrypted_data.encode()
+
         fernet = self._get_fernet(user_id)
+        if encrypted_data[:1] == COMPRESSED_ZLIB_V1:
+            return zlib.decompress(fernet.decrypt(encrypted_data[1:]))
         return fernet.decrypt(encrypted_data)
 
     def encrypt_dict(self, data: Dict[str, Any], user_id: str) -> Dict[str, bytes]:
@@ -0,0 +1,233 @@
+"""
+Extracted text of uploaded files, cached for chat context.
+
+Files selected in a conversation are added as context to every message.
+Rather than fetching, decrypting and re-extracting them each time, their
+text is extracted once, in the background right after upload or on first
+use, and stored under ``file_text:<user>:<file_id>``, compressed and
+encrypted like the file data itself. An entry records the content hash of
+the file it was extracted from and is ignored if the file no longer
+matches, or if it was written by an older extraction version. Entries are
+only written while the file's metadata exists, so an extraction finishing
+after the file was deleted leaves nothing behind.
+
+CSV and XLSX files larger than ``FILE_CONTEXT_INLINE_TABLE_CHARS`` also get
+a dataset sketch (``agents.utils.dataset_sketch``) per table, which chat
+context includes instead of the raw rows.
+"""
+
+import asyncio
+import json
+import os
+from typing import List, Optional, Set, Tuple
+
+import structlog
+from agents.storage.keys import user_scope
+from agents.storage.redis_service import SecureRedisService
+from agents.utils.dataset_sketch import sketch_csv, sketch_sheets
+from agents.utils.file_text import (
+    extract_pdf_bytes,
+    read_xlsx_sheets,
+    render_xlsx_sheets,
+)
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+# Bump when extraction output changes, so stale entries are re-extracted
+EXTRACTION_VERSION = 2
+
+TEXT_FORMATS = {"text/csv", "text/plain", "text/markdown"}
+PDF_FORMATS = {"application/pdf"}
+XLSX_FORMATS = {
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.ms-excel",
+}
+
+# KEYS[1] = text entry, KEYS[2] = file metadata; ARGV[1] = encrypted entry.
+# Returns 1 if written.
+_PUT_IF_FILE_EXISTS_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('SET', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+def _extract_xlsx(file_data: bytes, inline_chars: int) -> Tuple[str, Optional[List[dict]]]:
+    sheets = read_xlsx_sheets(file_data)
+    text = render_xlsx_sheets(sheets)
+    if len(text) <= inline_chars:
+        return text, None
+    try:
+        return text, sketch_sheets(sheets)
+    except Exception as e:
+        logger.warning("Could not sketch spreadsheet", error=str(e))
+        return text, None
+
+
+def _sketch_csv(text: str) -> Optional[List[dict]]:
+    try:
+        return sketch_csv(text)
+    except Exception as e:
+        # Malformed or ragged CSV; chat context falls back to the first rows
+        logger.warning("Could not sketch CSV", error=str(e))
+        return None
+
+
+class FileTextCache:
+    """Per-file cache of extracted text, kept next to the file in Redis."""
+
+    def __init__(self, redis_client: SecureRedisService):
+        self.redis_client = redis_client
+        self.extract_concurrency = int(os.getenv("FILE_TEXT_EXTRACT_CONCURRENCY", "2"))
+        # Larger tables are sketched rather than included row by row
+        self.inline_table_chars = int(
+            os.getenv("FILE_CONTEXT_INLINE_TABLE_CHARS", "20000")
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Upload-time extractions; referenced so they are not collected
+        self._tasks: Set[asyncio.Task] = set()
+        self._put_script = redis_client.register_script(_PUT_IF_FILE_EXISTS_LUA)
+        self._metrics = get_metrics_registry()
+
+    @staticmethod
+    def _key(user_id: str, file_id: str) -> str:
+        return f"file_text:{user_scope(user_id)}:{file_id}"
+
+    @staticmethod
+    def _metadata_key(user_id: str, file_id: str) -> str:
+        return f"file_metadata:{user_scope(user_id)}:{file_id}"
+
+    @staticmethod
+    def supports(file_format: str) -> bool:
+        return file_format in TEXT_FORMATS | PDF_FORMATS | XLSX_FORMATS
+
+    async def get(
+        self, user_id: str, file_id: str, content_hash: Optional[str]
+    ) -> Optional[dict]:
+        raw = await self.redis_client.get(self._key(user_id, file_id), user_id)
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+        if (
+            entry.get("version") != EXTRACTION_VERSION
+            or entry.get("content_hash") != content_hash
+        ):
+            return None
+        return entry
+
+    async def put(self, user_id: str, file_id: str, entry: dict) -> bool:
+        """Store an entry unless the file was deleted; True if stored."""
+        # Encrypted here since scripts bypass SecureRedisService
+        stored = await self._put_script(
+            keys=[self._key(user_id, file_id), self._metadata_key(user_id, file_id)],
+            args=[self.redis_client.encryption.encrypt(json.dumps(entry), user_id)],
+        )
+        return bool(stored)
+
+    async def delete(self, user_id: str, file_id: str) -> None:
+        await self.redis_client.delete(self._key(user_id, file_id))
+
+    async def extract(
+        self, data: bytes, file_format: str, content_hash: Optional[str]
+    ) -> dict:
+        """Extract the text of a file; failures are recorded, not raised."""
+        entry = {
+            "version": EXTRACTION_VERSION,
+            "content_hash": content_hash,
+            "text": None,
+        }
+        if file_format in TEXT_FORMATS:
+            try:
+                entry["text"] = data.decode("utf-8")
+            except UnicodeDecodeError:
+                entry["binary"] = True
+                return entry
+            if file_format == "text/csv" and len(entry["text"]) > self.inline_table_chars:
+                async with self._extract_slot():
+                    entry["sketch"] = await asyncio.to_thread(_sketch_csv, entry["text"])
+            return entry
+
+        async with self._extract_slot():
+            try:
+                if file_format in PDF_FORMATS:
+                    entry["text"] = await asyncio.to_thread(extract_pdf_bytes, data)
+                else:
+                    entry["text"], entry["sketch"] = await asyncio.to_thread(
+                        _extract_xlsx, data, self.inline_table_chars
+                    )
+            except Exception as e:
+                logger.warning(
+                    "Could not extract file text", format=file_format, error=str(e)
+                )
+                entry["error"] = str(e)
+        return entry
+
+    def _extract_slot(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.extract_concurrency)
+        return self._semaphore
+
+    async def populate(
+        self,
+        user_id: str,
+        file_id: str,
+        data: bytes,
+        file_format: str,
+        content_hash: Optional[str],
+    ) -> Optional[dict]:
+        if not self.supports(file_format):
+            return None
+        entry = await self.extract(data, file_format, content_hash)
+        self._metrics.incr("file_text_cache.extractions")
+        if not await self.put(user_id, file_id, entry):
+            logger.info("File deleted during text extraction", file_id=file_id)
+        return entry
+
+    def populate_in_background(
+        self,
+        user_id: str,
+        file_id: str,
+        data: bytes,
+        file_format: str,
+        content_hash: Optional[str],
+    ) -> None:
+        """Extract a just uploaded file without delaying the upload response."""
+        if not self.supports(file_format):
+            return
+
+        async def run() -> None:
+            try:
+                await self.populate(user_id, file_id, data, file_format, content_hash)
+            except Exception as e:
+                # The first message using the file extracts it instead
+                logger.warning(
+                    "Upload-time text extraction failed", file_id=file_id, error=str(e)
+                )
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_or_extract(
+        self, storage, user_id: str, file_id: str, metadata: dict
+    ) -> Optional[dict]:
+        """Cached text of a stored file, extracting it on a miss."""
+        content_hash = metadata.get("content_hash")
+        entry = await self.get(user_id, file_id, content_hash)
+        if entry is not None:
+            self._metrics.incr("file_text_cache.hits")
+            return entry
+
+        self._metrics.incr("file_text_cache.misses")
+        data, _ = await storage.get_file(user_id, file_id)
+        if not data:
+            return None
+        return await self.populate(
+            user_id, file_id, data, metadata.get("format", ""), content_hash
+        )
@@ -3,16 +3,45 @@ from typing import Optional
 
 import redis
 import redis.asyncio as aioredis
-from agents.storage.redis_service import SecureRedisService
+from agents.storage.keys import HASHTAG_SCHEME, KEY_SCHEME
+from agents.storage.redis_service import SecureRedisClusterService, SecureRedisService
 from agents.storage.redis_storage import RedisStorage
 
 # Global storage for shared services
 _global_redis_storage_service: Optional[RedisStorage] = None
 _global_redis_pool: Optional[aioredis.ConnectionPool] = None
 _global_sync_redis_pool: Optional[redis.ConnectionPool] = None
+_global_redis_replica_pool: Optional[aioredis.ConnectionPool] = None
+_global_binary_redis_pool: Optional[aioredis.ConnectionPool] = None
 
+# Cluster clients own one connection pool per node, so they are shared whole
+_global_secure_cluster_client: Optional[SecureRedisClusterService] = None
+_global_cluster_client: Optional[aioredis.RedisCluster] = None
+_global_sync_cluster_client: Optional[redis.RedisCluster] = None
+_global_binary_cluster_client: Optional[aioredis.RedisCluster] = None
 
 
+def is_cluster_mode() -> bool:
+    """Whether Redis runs as a cluster (REDIS_CLUSTER_MODE=true)."""
+    return os.getenv("REDIS_CLUSTER_MODE", "false").lower() == "true"
+
+
+def _cluster_kwargs() -> dict:
+    if KEY_SCHEME != HASHTAG_SCHEME:
+        # Without hash tags a user's keys spread over slots and the
+        # multi-key scripts of the storage layer fail with CROSSSLOT
+        raise ValueError("REDIS_CLUSTER_MODE requires REDIS_KEY_SCHEME=hashtag")
+
+    return dict(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        decode_responses=True,
+        max_connections=100,
+        socket_timeout=30,
+        socket_connect_timeout=10,
+        health_check_interval=30,
+    )
+
 
 def get_redis_pool() -> aioredis.ConnectionPool:
     """Get or create the async Redis connection pool.
@@ -40,6 +69,35 @@ def get_redis_pool() -> aioredis.ConnectionPool:
     return _global_redis_pool
 
 
+def get_redis_replica_pool() -> Optional[aioredis.ConnectionPool]:
+    """Get or create the async pool for the read replica (REDIS_REPLICA_HOST).
+
+    Returns None when no replica is configured or Redis runs as a cluster.
+    """
+    global _global_redis_replica_pool
+
+    replica_host = os.getenv("REDIS_REPLICA_HOST")
+    if not replica_host or is_cluster_mode():
+        return None
+
+    if _global_redis_replica_pool is None:
+        replica_port = int(os.getenv("REDIS_REPLICA_PORT", os.getenv("REDIS_PORT", "6379")))
+
+        _global_redis_replica_pool = aioredis.ConnectionPool(
+            host=replica_host,
+            port=replica_port,
+            db=0,
+            decode_responses=True,
+            max_connections=int(os.getenv("REDIS_REPLICA_MAX_CONNECTIONS", "100")),
+            socket_timeout=5,
+            socket_connect_timeout=2,
+            health_check_interval=30,
+            retry_on_timeout=False,
+        )
+
+    return _global_redis_replica_pool
+
+
 def get_sync_redis_pool() -> redis.ConnectionPool:
     """Get or create the synchronous Redis connection pool."""
     global _global_sync_redis_pool
@@ -65,19 +123,75 @@ def get_sync_redis_pool() -> redis.ConnectionPool:
 
 def get_redis_client() -> aioredis.Redis:
     """Get an async Redis client using the shared connection pool."""
+    global _global_cluster_client
+
+    if is_cluster_mode():
+        if _global_cluster_client is None:
+            _global_cluster_client = aioredis.RedisCluster(**_cluster_kwargs())
+        return _global_cluster_client
+
     return aioredis.Redis(connection_pool=get_redis_pool())
 
 
 def get_sync_redis_client() -> redis.Redis:
     """Get a synchronous Redis client using the shared connection pool."""
+    global _global_sync_cluster_client
+
+    if is_cluster_mode():
+        if _global_sync_cluster_client is None:
+            _global_sync_cluster_client = redis.RedisCluster(**_cluster_kwargs())
+        return _global_sync_cluster_client
+
     return redis.Redis(connection_pool=get_sync_redis_pool())
 
 
+def get_binary_redis_client() -> aioredis.Redis:
+    """Get an async Redis client that returns raw bytes, for binary values."""
+    global _global_binary_redis_pool, _global_binary_cluster_client
+
+    if is_cluster_mode():
+        if _global_binary_cluster_client is None:
+            _global_binary_cluster_client = aioredis.RedisCluster(
+                **{**_cluster_kwargs(), "decode_responses": False}
+            )
+        return _global_binary_cluster_client
+
+    if _global_binary_redis_pool is None:
+        _global_binary_redis_pool = aioredis.ConnectionPool(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            db=0,
+            max_connections=20,
+            socket_timeout=30,
+            socket_connect_timeout=10,
+            health_check_interval=30,
+            retry_on_timeout=True,
+        )
+    return aioredis.Redis(connection_pool=_global_binary_redis_pool)
+
+
 def get_secure_redis_client() -> SecureRedisService:
     """Get a secure Redis client using the shared connection pool."""
+    global _global_secure_cluster_client
+
+    if is_cluster_mode():
+        if _global_secure_cluster_client is None:
+            _global_secure_cluster_client = SecureRedisClusterService(
+                **_cluster_kwargs()
+            )
+        return _global_secure_cluster_client
+
     return SecureRedisService(connection_pool=get_redis_pool())
 
 
+def get_secure_redis_replica_client() -> Optional[SecureRedisService]:
+    """Get a secure client for the read replica, or None if there is none."""
+    pool = get_redis_replica_pool()
+    if pool is None:
+        return None
+    return SecureRedisService(connection_pool=pool)
+
+
 def set_global_redis_storage_service(storage_service: RedisStorage) -> None:
     """Set the global Redis storage service for the application to use."""
     global _global_redis_storage_service
@@ -0,0 +1,252 @@
+"""
+Online migration of user-owned Redis keys between key schemes.
+
+Moves every key of the families in ``USER_KEY_PREFIXES`` to its name under
+the target scheme, e.g. ``messages:<user>:<conv>`` to
+``messages:{<user>}:<conv>``:
+
+    python -m agents.storage.key_migration --to hashtag [--dry-run]
+    python -m agents.storage.key_migration --to hashtag --verify
+
+Deploy the application with the target ``REDIS_KEY_SCHEME`` first and run
+the migration right after. Until a user's keys are moved, that user's older
+data is not visible; keys written under both names in the meantime are
+merged. The tool keeps no state of its own: it is idempotent and resumes
+from scratch, skipping keys that are already in place.
+
+On a standalone server keys are moved with ``RENAMENX``, which keeps TTLs
+and is atomic. Source and target names hash to different cluster slots, so
+on a cluster (``REDIS_CLUSTER_MODE=true``) a key is copied with
+``DUMP``/``RESTORE`` and the source is deleted only if it did not change in
+between.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Optional
+
+import redis.asyncio as aioredis
+import structlog
+from agents.storage.keys import (
+    HASHTAG_SCHEME,
+    LEGACY_SCHEME,
+    USER_KEY_PREFIXES,
+    split_user_key,
+    user_key,
+)
+
+logger = structlog.get_logger(__name__)
+
+SCAN_COUNT = 1000
+
+# Attempts at moving a key that keeps changing while it is copied
+MAX_MOVE_ATTEMPTS = 3
+
+# Hashes of counters; values are added up when both names exist
+_COUNTER_HASH_PREFIXES = {"cumulative_usage_totals"}
+
+# KEYS[1] = source; ARGV[1] = DUMP of the source taken before copying
+_DELETE_IF_UNCHANGED_LUA = """
+if redis.call('DUMP', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def target_key(key: str, scheme: str) -> Optional[str]:
+    """Name of a user-owned key under ``scheme``, or None if not user-owned."""
+    prefix, user_id, rest = split_user_key(key)
+    if prefix not in USER_KEY_PREFIXES or not user_id:
+        return None
+    return user_key(prefix, user_id, rest, scheme)
+
+
+class KeyMigrator:
+    """Moves user-owned keys to their names under a target key scheme."""
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        scheme: str,
+        cluster: bool = False,
+        dry_run: bool = False,
+    ):
+        # Needs a client without decode_responses: DUMP payloads are binary
+        self.redis_client = redis_client
+        self.scheme = scheme
+        self.cluster = cluster
+        self.dry_run = dry_run
+        self.stats = Counter()
+        self._delete_if_unchanged = redis_client.register_script(
+            _DELETE_IF_UNCHANGED_LUA
+        )
+
+    async def _scan(self, prefix: str):
+        async for key in self.redis_client.scan_iter(
+            match=f"{prefix}:*", count=SCAN_COUNT
+        ):
+            yield key.decode() if isinstance(key, bytes) else key
+
+    async def _merge(self, prefix: str, source: str, target: str) -> None:
+        """Fold a source key into a target written under the new name."""
+        client = self.redis_client
+        key_type = (await client.type(source)).decode()
+
+        if key_type == "list":
+            # The source holds the older records
+            values = await client.lrange(source, 0, -1)
+            if values:
+                await client.lpush(target, *reversed(values))
+        elif key_type == "hash":
+            for field, value in (await client.hgetall(source)).items():
+                if prefix in _COUNTER_HASH_PREFIXES:
+                    await client.hincrbyfloat(target, field, float(value))
+                else:
+                    await client.hsetnx(target, field, value)
+        elif key_type == "set":
+            members = await client.smembers(source)
+            if members:
+                await client.sadd(target, *members)
+        elif key_type == "zset":
+            members = await client.zrange(source, 0, -1, withscores=True)
+            if members:
+                await client.zadd(target, dict(members), nx=True)
+        # Strings: the value written under the new name is the newer one
+
+    async def _move_standalone(self, prefix: str, source: str, target: str) -> str:
+        if await self.redis_client.renamenx(source, target):
+            return "moved"
+        if not await self.redis_client.exists(source):
+            return "skipped"
+        await self._merge(prefix, source, target)
+        await self.redis_client.delete(source)
+        return "merged"
+
+    async def _move_cluster(self, prefix: str, source: str, target: str) -> str:
+        for _ in range(MAX_MOVE_ATTEMPTS):
+            dump = await self.redis_client.dump(source)
+            if dump is None:
+                return "skipped"
+
+            if await self.redis_client.exists(target):
+                await self._merge(prefix, source, target)
+                outcome = "merged"
+            else:
+                ttl = await self.redis_client.pttl(source)
+                try:
+                    await self.redis_client.restore(
+                        target, max(ttl, 0), dump, replace=False
+                    )
+                except aioredis.ResponseError as e:
+                    if "BUSYKEY" not in str(e):
+                        raise
+                    # Created under the new name meanwhile; merge next round
+                    continue
+                outcome = "moved"
+
+            if await self._delete_if_unchanged(keys=[source], args=[dump]):
+                return outcome
+            if outcome == "moved":
+                # Written to while copying; copy again over the stale copy
+                await self.redis_client.delete(target)
+
+        raise RuntimeError(f"Key kept changing during migration: {source}")
+
+    async def migrate(self) -> Counter:
+        """Move every user-owned key not yet named under the target scheme."""
+        start = time.perf_counter()
+        for prefix in USER_KEY_PREFIXES:
+            async for key in self._scan(prefix):
+                target = target_key(key, self.scheme)
+                if target is None or target == key:
+                    continue
+                if self.dry_run:
+                    self.stats["pending"] += 1
+                    continue
+                try:
+                    if self.cluster:
+                        outcome = await self._move_cluster(prefix, key, target)
+                    else:
+                        outcome = await self._move_standalone(prefix, key, target)
+                except Exception as e:
+                    outcome = "failed"
+                    logger.error("Error migrating key", prefix=prefix, error=str(e))
+                self.stats[outcome] += 1
+
+                processed = sum(self.stats.values())
+                if processed % 1000 == 0:
+                    logger.info("Key migration progress", **self.stats)
+
+        logger.info(
+            "Key migration finished",
+            scheme=self.scheme,
+            dry_run=self.dry_run,
+            duration_s=round(time.perf_counter() - start, 2),
+            **self.stats,
+        )
+        return self.stats
+
+    async def verify(self) -> Counter:
+        """Count user-owned keys per family still named under another scheme."""
+        remaining = Counter()
+        for prefix in USER_KEY_PREFIXES:
+            async for key in self._scan(prefix):
+                target = target_key(key, self.scheme)
+                if target is not None and target != key:
+                    remaining[prefix] += 1
+        return remaining
+
+
+def _create_client(cluster: bool) -> aioredis.Redis:
+    host = os.getenv("REDIS_HOST", "localhost")
+    port = int(os.getenv("REDIS_PORT", "6379"))
+    if cluster:
+        return aioredis.RedisCluster(host=host, port=port)
+    return aioredis.Redis(host=host, port=port, db=0)
+
+
+async def _run(args: argparse.Namespace) -> int:
+    cluster = os.getenv("REDIS_CLUSTER_MODE", "false").lower() == "true"
+    client = _create_client(cluster)
+    try:
+        migrator = KeyMigrator(client, args.to, cluster=cluster, dry_run=args.dry_run)
+        if args.verify:
+            remaining = await migrator.verify()
+            for prefix, count in sorted(remaining.items()):
+                print(f"{prefix:<28}{count:>10}")
+            print(f"{'total':<28}{sum(remaining.values()):>10}")
+            return 1 if remaining else 0
+
+        stats = await migrator.migrate()
+        for outcome, count in sorted(stats.items()):
+            print(f"{outcome:<28}{count:>10}")
+        return 1 if stats["failed"] else 0
+    finally:
+        await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--to",
+        choices=[HASHTAG_SCHEME, LEGACY_SCHEME],
+        default=HASHTAG_SCHEME,
+        help="Target key scheme",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Count keys to move without moving them"
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Report keys not yet under the target scheme; exits 1 if any remain",
+    )
+    raise SystemExit(asyncio.run(_run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Redis key scheme.
+
+Every user-owned key embeds the user ID as its second segment, e.g.
+``messages:<user>:<conversation>``. With ``REDIS_KEY_SCHEME=hashtag`` the
+user segment is wrapped in a hash tag (``messages:{<user>}:<conversation>``)
+so all keys of a user map to the same Redis Cluster slot, and multi-key
+pipelines and Lua scripts over one user's data stay single-slot.
+
+The default ``legacy`` scheme keeps the historical layout. Existing data is
+moved between the two with ``python -m agents.storage.key_migration``.
+"""
+
+import os
+
+LEGACY_SCHEME = "legacy"
+HASHTAG_SCHEME = "hashtag"
+
+KEY_SCHEME = os.getenv("REDIS_KEY_SCHEME", LEGACY_SCHEME).lower()
+
+if KEY_SCHEME not in (LEGACY_SCHEME, HASHTAG_SCHEME):
+    raise ValueError(f"Unsupported REDIS_KEY_SCHEME: {KEY_SCHEME}")
+
+# Key families whose second segment is the owning user ID. Shares, documents,
+# vector chunks and checkpoints are addressed by their own IDs and are not
+# user-scoped.
+USER_KEY_PREFIXES = (
+    "user_chats",
+    "chat_metadata",
+    "messages",
+    "message_ids",
+    "message_compaction",
+    "cumulative_usage",
+    "cumulative_usage_totals",
+    "conversation_files",
+    "conversation_archive",
+    "conversation_rehydrated",
+    "user_files",
+    "file_metadata",
+    "file_data",
+    "file_text",
+    "file_blob",
+    "file_content_index",
+    "file_content_refs",
+    "user_documents",
+    "user_shares",
+    "api_keys",
+    "llm_config",
+    "voice_config",
+    "voice_session",
+    "export",
+    "export_meta",
+    "user_erasure",
+    "sandbox_session",
+    "sandbox_sessions",
+    "query_embedding",
+    # Connector configs, tokens and custom MCP servers
+    "user",
+)
+
+
+def user_scope(user_id: str, scheme: str = None) -> str:
+    """The user segment of a key under the active (or given) scheme."""
+    if (scheme or KEY_SCHEME) == HASHTAG_SCHEME:
+        return "{" + user_id + "}"
+    return user_id
+
+
+def parse_user_scope(segment: str) -> str:
+    """Recover the user ID from a key's user segment under either scheme."""
+    if segment.startswith("{") and segment.endswith("}"):
+        return segment[1:-1]
+    return segment
+
+
+def user_key(prefix: str, user_id: str, rest: str = "", scheme: str = None) -> str:
+    """Build a user-owned key from its parts under the active (or given) scheme."""
+    key = f"{prefix}:{user_scope(user_id, scheme)}"
+    return f"{key}:{rest}" if rest else key
+
+
+def split_user_key(key: str):
+    """
+    Split a user-owned key into (prefix, user_id, rest).
+
+    ``rest`` is the part after the user segment without its leading colon,
+    or an empty string. Hash-tagged user segments are recognised by their
+    braces, so user IDs containing colons survive the round trip.
+    """
+    prefix, _, remainder = key.partition(":")
+    if remainder.startswith("{"):
+        end = remainder.find("}")
+        if end != -1:
+            user_id = remainder[1:end]
+            return prefix, user_id, remainder[end + 2 :]
+    user_id, _, rest = remainder.partition(":")
+    return prefix, user_id, rest
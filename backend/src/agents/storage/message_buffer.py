@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+import structlog
+from agents.storage.redis_service import SecureRedisService
+from agents.storage.keys import user_scope
+from agents.storage.redis_storage import referenced_file_ids
+from agents.storage.replica_router import get_replica_router
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+# KEYS[1] = message list, KEYS[2] = conversation file set
+# ARGV = groups of: count, file_count, payload_1..payload_count,
+#        file_id_1..file_id_file_count
+_FLUSH_LUA = """
+local pushed = 0
+local i = 1
+while i <= #ARGV do
+    local count = tonumber(ARGV[i])
+    local file_count = tonumber(ARGV[i + 1])
+    for j = 1, count do
+        redis.call('RPUSH', KEYS[1], ARGV[i + 1 + j])
+    end
+    for j = 1, file_count do
+        redis.call('SADD', KEYS[2], ARGV[i + 1 + count + j])
+    end
+    pushed = pushed + count
+    i = i + 2 + count + file_count
+end
+return pushed
+"""
+
+# Delay before a failed background flush is retried
+RETRY_DELAY_SECONDS = 1.0
+
+
+@dataclass
+class _PendingGroup:
+    """Messages that are persisted together, indexing their files."""
+
+    messages: List[Dict[str, Any]]
+
+
+@dataclass
+class _ConversationBuffer:
+    user_id: str
+    conversation_id: str
+    pending: List[_PendingGroup] = field(default_factory=list)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    flush_task: Optional[asyncio.Task] = None
+    immediate_flush_scheduled: bool = False
+
+
+class MessageWriteBuffer:
+    """
+    Per-conversation write-behind buffer for streamed events.
+
+    Events are queued in memory and persisted by a background flush that
+    pipelines the RPUSH of a whole batch into one round trip, so persistence
+    no longer sits in front of the WebSocket send. Message IDs are claimed
+    up front with ``claim_message_id``, so duplicates are never queued. A batch is
+    flushed after ``flush_interval`` seconds or once ``max_batch`` messages
+    are pending; ``flush`` and ``flush_all`` persist synchronously for stream
+    completion and shutdown.
+    """
+
+    def __init__(
+        self,
+        redis_client: SecureRedisService,
+        flush_interval: Optional[float] = None,
+        max_batch: Optional[int] = None,
+    ):
+        self.redis_client = redis_client
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else int(os.getenv("MESSAGE_BUFFER_FLUSH_INTERVAL_MS", "25")) / 1000
+        )
+        self.max_batch = max_batch or int(os.getenv("MESSAGE_BUFFER_MAX_BATCH", "50"))
+        self._buffers: Dict[str, _ConversationBuffer] = {}
+        self._inflight: Set[asyncio.Task] = set()
+        self._flush_script = redis_client.register_script(_FLUSH_LUA)
+        self._metrics = get_metrics_registry()
+
+    @staticmethod
+    def _message_key(user_id: str, conversation_id: str) -> str:
+        return f"messages:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _dedup_key(user_id: str, conversation_id: str) -> str:
+        return f"message_ids:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _files_key(user_id: str, conversation_id: str) -> str:
+        return f"conversation_files:{user_scope(user_id)}:{conversation_id}"
+
+    def _get_buffer(self, user_id: str, conversation_id: str) -> _ConversationBuffer:
+        key = f"{user_id}:{conversation_id}"
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = _ConversationBuffer(user_id, conversation_id)
+            self._buffers[key] = buffer
+        return buffer
+
+    async def claim_message_id(
+        self, user_id: str, conversation_id: str, message_id: str
+    ) -> bool:
+        """
+        Record a message ID in this conversation's dedup hash.
+
+        Returns True if the ID is new. The HSETNX is atomic across replicas,
+        so a duplicate is rejected before its usage is counted.
+        """
+        get_replica_router().note_write(user_id)
+        return await self.redis_client.hsetnx(
+            self._dedup_key(user_id, conversation_id), message_id, "1", user_id
+        )
+
+    def enqueue(
+        self,
+        user_id: str,
+        conversation_id: str,
+        messages: List[Dict[str, Any]],
+    ) -> None:
+        """Queue messages for persistence; they are written in order."""
+        if not messages:
+            return
+
+        buffer = self._get_buffer(user_id, conversation_id)
+        buffer.pending.append(_PendingGroup(messages=messages))
+
+        pending_count = sum(len(group.messages) for group in buffer.pending)
+        if pending_count >= self.max_batch and not buffer.immediate_flush_scheduled:
+            # A full batch shouldn't wait for the timer
+            buffer.immediate_flush_scheduled = True
+            self._track(asyncio.create_task(self._background_flush(buffer)))
+        elif buffer.flush_task is None or buffer.flush_task.done():
+            buffer.flush_task = asyncio.create_task(
+                self._background_flush(buffer, delay=self.flush_interval)
+            )
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _background_flush(
+        self, buffer: _ConversationBuffer, delay: float = 0
+    ) -> None:
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await self._flush_buffer(buffer)
+        except Exception:
+            # Batch was re-queued and the error logged; retry later
+            await asyncio.sleep(RETRY_DELAY_SECONDS)
+            if buffer.pending:
+                self._track(asyncio.create_task(self._background_flush(buffer)))
+
+    async def _flush_buffer(self, buffer: _ConversationBuffer) -> int:
+        async with buffer.lock:
+            buffer.immediate_flush_scheduled = False
+            if not buffer.pending:
+                return 0
+
+            groups, buffer.pending = buffer.pending, []
+            user_id = buffer.user_id
+            encryption = self.redis_client.encryption
+
+            args: List[Any] = []
+            message_count = 0
+            for group in groups:
+                file_ids: Set[str] = set()
+                for message in group.messages:
+                    file_ids.update(referenced_file_ids(message))
+                args.extend([len(group.messages), len(file_ids)])
+                for message in group.messages:
+                    args.append(encryption.encrypt(json.dumps(message), user_id))
+                args.extend(file_ids)
+                message_count += len(group.messages)
+
+            get_replica_router().note_write(user_id)
+            start = time.perf_counter()
+            try:
+                pushed = await self._flush_script(
+                    keys=[
+                        self._message_key(user_id, buffer.conversation_id),
+                        self._files_key(user_id, buffer.conversation_id),
+                    ],
+                    args=args,
+                )
+            except Exception as e:
+                # Put the batch back so the next flush retries it in order
+                buffer.pending = groups + buffer.pending
+                self._metrics.incr("message_buffer.flush_errors")
+                logger.error(
+                    "Error flushing message buffer",
+                    conversation_id=buffer.conversation_id,
+                    batch_size=message_count,
+                    error=str(e),
+                )
+                raise
+
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._metrics.observe("message_buffer.flush_latency_ms", duration_ms)
+            self._metrics.observe("message_buffer.batch_size", message_count)
+            self._metrics.incr("message_buffer.messages_flushed", pushed)
+            return message_count
+
+    async def flush(self, user_id: str, conversation_id: str) -> int:
+        """Persist everything pending for a conversation before returning."""
+        buffer = self._buffers.get(f"{user_id}:{conversation_id}")
+        if buffer is None:
+            return 0
+        return await self._flush_buffer(buffer)
+
+    async def flush_all(self) -> None:
+        """Persist all pending messages, e.g. on shutdown."""
+        for buffer in list(self._buffers.values()):
+            try:
+                await self._flush_buffer(buffer)
+            except Exception:
+                # Already logged; keep flushing other conversations
+                continue
+
+    async def close_conversation(self, user_id: str, conversation_id: str) -> None:
+        """Flush and forget the local state of a conversation."""
+        await self.flush(user_id, conversation_id)
+        self._buffers.pop(f"{user_id}:{conversation_id}", None)
+
+    def pending_conversations(self) -> Set[str]:
+        """Session keys that still have unflushed messages."""
+        return {key for key, buffer in self._buffers.items() if buffer.pending}
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+from agents.storage.redis_service import SecureRedisService
+from agents.storage.keys import split_user_key, user_scope
+from agents.storage.sweep_lock import acquire_sweep_lock
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+# Tracking-only records; history loads already ignore them because the
+# think events they accompany carry the same model information
+_TRACKING_AGENT_TYPES = {"crewai_llm_call"}
+
+# Attempts at rewriting a list that keeps changing underneath the compactor
+MAX_REWRITE_ATTEMPTS = 3
+
+# KEYS[1] = message list, KEYS[2] = compaction state
+# ARGV[1] = length read, ARGV[2] = last record read, ARGV[3] = compacted
+# length, ARGV[4] = "1" to replace the list, ARGV[5..] = compacted records
+# The list only grows by appends or is rewritten wholesale, so an unchanged
+# length and tail mean nothing was written since it was read.
+_REWRITE_LUA = """
+if redis.call('LLEN', KEYS[1]) ~= tonumber(ARGV[1])
+    or redis.call('LINDEX', KEYS[1], -1) ~= ARGV[2] then
+    return 0
+end
+if ARGV[4] == '1' then
+    redis.call('DEL', KEYS[1])
+    for i = 5, #ARGV, 1000 do
+        redis.call('RPUSH', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+    end
+end
+redis.call('SET', KEYS[2], ARGV[3])
+return 1
+"""
+
+
+def _agent_type(message: Dict[str, Any]) -> Optional[str]:
+    additional_kwargs = message.get("additional_kwargs")
+    if isinstance(additional_kwargs, dict):
+        return additional_kwargs.get("agent_type")
+    return None
+
+
+def _think_key(message: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    """
+    Identity of a think event: its run, agent step and text. Replayed
+    events share it; distinct outputs of the same step do not.
+    """
+    data = message.get("data")
+    try:
+        parsed = json.loads(data) if isinstance(data, str) else data
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    metadata = parsed.get("metadata") or {}
+    return (
+        message.get("message_id"),
+        parsed.get("agent_name"),
+        parsed.get("task") or metadata.get("task"),
+        parsed.get("text"),
+    )
+
+
+def compact_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rewrite the events of completed runs into their canonical form.
+
+    A run is the set of events sharing a ``message_id``; it is completed once
+    a ``stream_complete`` was recorded for it. Events of runs that are still
+    streaming, and events without a ``message_id``, are kept untouched. For
+    completed runs:
+
+    - ``crewai_llm_call`` tracking completions are dropped
+    - only the first ``stream_start`` and the last ``stream_complete`` are kept
+    - records repeating an ``id`` already seen are dropped
+    - think events repeating the same text for the same agent step are
+      dropped; each event is a complete agent output, so distinct texts of
+      a step are all kept
+
+    The relative order of the remaining events is preserved.
+    """
+    completed_runs = {
+        message.get("message_id")
+        for message in messages
+        if message.get("event") == "stream_complete" and message.get("message_id")
+    }
+    if not completed_runs:
+        return messages
+
+    last_complete_index: Dict[str, int] = {}
+    for index, message in enumerate(messages):
+        if message.get("event") == "stream_complete":
+            last_complete_index[message.get("message_id")] = index
+
+    compacted: List[Dict[str, Any]] = []
+    started_runs = set()
+    seen_ids = set()
+    seen_thinks = set()
+
+    for index, message in enumerate(messages):
+        run_id = message.get("message_id")
+        if run_id not in completed_runs:
+            compacted.append(message)
+            continue
+
+        event = message.get("event")
+
+        if event == "agent_completion" and _agent_type(message) in _TRACKING_AGENT_TYPES:
+            continue
+
+        if event == "stream_start":
+            if run_id in started_runs:
+                continue
+            started_runs.add(run_id)
+        elif event == "stream_complete" and last_complete_index[run_id] != index:
+            continue
+
+        record_id = message.get("id")
+        if record_id is not None:
+            if record_id in seen_ids:
+                continue
+            seen_ids.add(record_id)
+
+        if event == "think":
+            think_key = _think_key(message)
+            if think_key is not None:
+                if think_key in seen_thinks:
+                    continue
+                seen_thinks.add(think_key)
+
+        compacted.append(message)
+
+    return compacted
+
+
+class MessageCompactor:
+    """
+    Background compaction of the ``messages:{user_id}:{conversation_id}`` lists.
+
+    Each list is read, compacted with ``compact_messages`` and written back
+    by a compare-and-set script, so events appended concurrently by the
+    write-behind buffer abort the rewrite instead of being lost. The list
+    length after the last pass is remembered to skip unchanged conversations.
+    Every replica runs the loop, but one pass per interval scans the keyspace.
+    """
+
+    def __init__(
+        self,
+        redis_client: SecureRedisService,
+        interval: Optional[float] = None,
+    ):
+        self.redis_client = redis_client
+        self.interval = (
+            interval
+            if interval is not None
+            else float(os.getenv("MESSAGE_COMPACTION_INTERVAL_SECONDS", "3600"))
+        )
+        self._metrics = get_metrics_registry()
+        self._rewrite_script = redis_client.register_script(_REWRITE_LUA)
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _message_key(user_id: str, conversation_id: str) -> str:
+        return f"messages:{user_scope(user_id)}:{conversation_id}"
+
+    @staticmethod
+    def _state_key(user_id: str, conversation_id: str) -> str:
+        return f"message_compaction:{user_scope(user_id)}:{conversation_id}"
+
+    async def compact_conversation(self, user_id: str, conversation_id: str) -> int:
+        """
+        Compact one conversation's event list.
+
+        Returns the number of records removed.
+        """
+        message_key = self._message_key(user_id, conversation_id)
+        state_key = self._state_key(user_id, conversation_id)
+        encryption = self.redis_client.encryption
+
+        for _ in range(MAX_REWRITE_ATTEMPTS):
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.lrange(message_key, 0, -1)
+                pipe.get(state_key)
+                raw_messages, compacted_length = await pipe.execute()
+            if not raw_messages:
+                return 0
+            if compacted_length and int(compacted_length) == len(raw_messages):
+                return 0
+
+            decrypted = [encryption.decrypt(raw, user_id) for raw in raw_messages]
+            messages = [json.loads(message) for message in decrypted]
+
+            compacted = compact_messages(messages)
+            removed = len(messages) - len(compacted)
+            changed = compacted != messages
+            serialized = (
+                [json.dumps(message) for message in compacted] if changed else decrypted
+            )
+
+            args = [len(raw_messages), raw_messages[-1], len(compacted), int(changed)]
+            if changed:
+                args.extend(encryption.encrypt(message, user_id) for message in serialized)
+            if not await self._rewrite_script(keys=[message_key, state_key], args=args):
+                # New events arrived while compacting; retry on the fresh list
+                continue
+
+            self._metrics.incr("message_compaction.conversations_checked")
+            if changed:
+                before_bytes = sum(len(message) for message in decrypted)
+                after_bytes = sum(len(message) for message in serialized)
+                self._metrics.incr("message_compaction.conversations_compacted")
+                self._metrics.incr("message_compaction.records_removed", removed)
+                self._metrics.observe("message_compaction.records_before", len(messages))
+                self._metrics.observe("message_compaction.records_after", len(compacted))
+                self._metrics.observe("message_compaction.bytes_before", before_bytes)
+                self._metrics.observe("message_compaction.bytes_after", after_bytes)
+                logger.info(
+                    "Compacted conversation events",
+                    conversation_id=conversation_id,
+                    records_before=len(messages),
+                    records_after=len(compacted),
+                    bytes_before=before_bytes,
+                    bytes_after=after_bytes,
+                )
+            return removed
+
+        self._metrics.incr("message_compaction.conflicts")
+        logger.info(
+            "Skipping compaction of busy conversation",
+            conversation_id=conversation_id,
+        )
+        return 0
+
+    async def compact_all(self) -> int:
+        """Run one compaction pass over every conversation."""
+        removed = 0
+        async for key in self.redis_client.scan_iter(match="messages:*", count=500):
+            _, user_id, conversation_id = split_user_key(key)
+            if not user_id or not conversation_id:
+                continue
+            try:
+                removed += await self.compact_conversation(user_id, conversation_id)
+            except Exception as e:
+                self._metrics.incr("message_compaction.errors")
+                logger.error(
+                    "Error compacting conversation events",
+                    conversation_id=conversation_id,
+                    error=str(e),
+                )
+        return removed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await acquire_sweep_lock(
+                    self.redis_client, "message_compaction", self.interval
+                ):
+                    await self.compact_all()
+            except Exception as e:
+                logger.error("Message compaction pass failed", error=str(e))
+
+    def start(self) -> None:
+        """Start the periodic compaction loop; an interval of 0 disables it."""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
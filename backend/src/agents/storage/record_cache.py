@@ -0,0 +1,268 @@
+"""
+Process-local cache for small, hot per-user records.
+
+API keys, connector configs and LLM config overrides are read on every
+WebSocket connect or message but change rarely. They are cached in memory,
+decrypted, and evicted when Redis reports the key changed:
+
+- ``tracking`` (default): Redis server-assisted client-side caching. A
+  dedicated connection enables ``CLIENT TRACKING ... BCAST`` for the cached
+  key prefixes and redirects invalidations to a connection subscribed to
+  ``__redis__:invalidate``, so writes from any client evict the entry.
+- ``pubsub``: writers in this code base publish changed keys on
+  ``record_cache:invalidate``. Used on clusters and on servers without
+  client tracking.
+
+While invalidations cannot be received the cache is bypassed, and entries
+expire after ``REDIS_RECORD_CACHE_TTL_SECONDS`` regardless.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import redis.exceptions
+import structlog
+from agents.storage.redis_service import SecureRedisService
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+# Key families served from the cache; BCAST prefixes must not overlap
+CACHED_KEY_PREFIXES = ("api_keys:", "llm_config:", "user:")
+
+TRACKING_CHANNEL = "__redis__:invalidate"
+PUBSUB_CHANNEL = "record_cache:invalidate"
+
+# How often the tracking redirect is checked for a broken subscriber
+TRACKING_CHECK_INTERVAL_SECONDS = 5.0
+
+RECONNECT_DELAY_SECONDS = 1.0
+
+_MISSING = object()
+
+_global_record_cache: Optional["RecordCache"] = None
+
+
+class RecordCache:
+    """Bounded LRU of decrypted records with Redis-driven invalidation."""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        mode: Optional[str] = None,
+    ):
+        self.max_entries = max_entries or int(
+            os.getenv("REDIS_RECORD_CACHE_MAX_ENTRIES", "10000")
+        )
+        self.ttl = (
+            ttl
+            if ttl is not None
+            else float(os.getenv("REDIS_RECORD_CACHE_TTL_SECONDS", "300"))
+        )
+        self.mode = (mode or os.getenv("REDIS_RECORD_CACHE_INVALIDATION", "tracking")).lower()
+        if self.mode not in ("tracking", "pubsub"):
+            raise ValueError(f"Unsupported REDIS_RECORD_CACHE_INVALIDATION: {self.mode}")
+
+        self.redis_client: Optional[SecureRedisService] = None
+        # Only serve entries while invalidations are being received
+        self.active = False
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # Bumped on every invalidation; loads racing an invalidation are not stored
+        self._epoch = 0
+        self._hits = 0
+        self._lookups = 0
+        self._metrics = get_metrics_registry()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def is_cached_key(key: str) -> bool:
+        return key.startswith(CACHED_KEY_PREFIXES)
+
+    def _record_lookup(self, hit: bool) -> None:
+        self._lookups += 1
+        if hit:
+            self._hits += 1
+            self._metrics.incr("record_cache.hits")
+        else:
+            self._metrics.incr("record_cache.misses")
+        self._metrics.set_gauge(
+            "record_cache.hit_rate", round(self._hits / self._lookups, 4)
+        )
+
+    async def get(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached record for ``key``, loading it on a miss."""
+        if not self.active:
+            self._metrics.incr("record_cache.bypassed")
+            return await load()
+
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(key)
+            self._record_lookup(hit=True)
+            value = entry[1]
+            return None if value is _MISSING else value
+
+        self._record_lookup(hit=False)
+        epoch = self._epoch
+        value = await load()
+        if self.active and epoch == self._epoch:
+            # Absent records are cached too; most users have no overrides
+            self._entries[key] = (time.monotonic(), _MISSING if value is None else value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics.incr("record_cache.evictions")
+            self._metrics.set_gauge("record_cache.size", len(self._entries))
+        return value
+
+    def _evict(self, keys) -> None:
+        self._epoch += 1
+        if keys is None:
+            self._entries.clear()
+        else:
+            for key in keys:
+                self._entries.pop(key, None)
+        self._metrics.incr("record_cache.invalidations")
+        self._metrics.set_gauge("record_cache.size", len(self._entries))
+
+    async def invalidate(self, key: str) -> None:
+        """
+        Evict a record after writing it.
+
+        Local eviction gives read-your-writes on this instance right away;
+        other instances are notified by Redis (tracking) or by publishing
+        the key (pubsub).
+        """
+        self._evict([key])
+        if self.mode == "pubsub" and self.redis_client is not None:
+            try:
+                await self.redis_client.publish(PUBSUB_CHANNEL, key)
+            except Exception as e:
+                logger.warning("Failed to publish record cache invalidation", error=str(e))
+
+    def _deactivate(self) -> None:
+        self.active = False
+        self._evict(None)
+
+    async def _enable_tracking(self, pubsub) -> Any:
+        """Subscribe to invalidations and enable broadcast tracking."""
+        await pubsub.connect()
+        await pubsub.connection.send_command("CLIENT", "ID")
+        subscriber_id = await pubsub.connection.read_response()
+        await pubsub.subscribe(TRACKING_CHANNEL)
+
+        tracker = await self.redis_client.connection_pool.get_connection("CLIENT")
+        args = ["CLIENT", "TRACKING", "ON", "REDIRECT", subscriber_id, "BCAST"]
+        for prefix in CACHED_KEY_PREFIXES:
+            args.extend(["PREFIX", prefix])
+        try:
+            await tracker.send_command(*args)
+            await tracker.read_response()
+        except Exception:
+            await self.redis_client.connection_pool.release(tracker)
+            raise
+        return tracker
+
+    async def _tracking_broken(self, tracker) -> bool:
+        await tracker.send_command("CLIENT", "TRACKINGINFO")
+        info = await tracker.read_response()
+        if isinstance(info, list):
+            info = dict(zip(info[::2], info[1::2]))
+        flags = info.get("flags") or []
+        return "broken_redirect" in flags or "off" in flags
+
+    async def _listen(self) -> None:
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        tracker = None
+        try:
+            if self.mode == "tracking":
+                try:
+                    tracker = await self._enable_tracking(pubsub)
+                except redis.exceptions.ResponseError as e:
+                    # Redis < 6 or a proxy without client tracking
+                    logger.warning(
+                        "Client tracking unavailable, using pub/sub invalidation",
+                        error=str(e),
+                    )
+                    self.mode = "pubsub"
+                    await pubsub.aclose()
+                    pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            if self.mode == "pubsub":
+                await pubsub.subscribe(PUBSUB_CHANNEL)
+
+            self._evict(None)
+            self.active = True
+            logger.info("Record cache invalidation listener started", mode=self.mode)
+
+            last_check = time.monotonic()
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    data = message.get("data")
+                    if data is None:
+                        # FLUSHALL/FLUSHDB
+                        self._evict(None)
+                    else:
+                        self._evict(data if isinstance(data, list) else [data])
+
+                if (
+                    tracker is not None
+                    and time.monotonic() - last_check > TRACKING_CHECK_INTERVAL_SECONDS
+                ):
+                    last_check = time.monotonic()
+                    if await self._tracking_broken(tracker):
+                        raise ConnectionError("Client tracking redirect is broken")
+        finally:
+            self._deactivate()
+            await pubsub.aclose()
+            if tracker is not None:
+                # Tracking state lives on the connection; do not reuse it
+                await tracker.disconnect()
+                await self.redis_client.connection_pool.release(tracker)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics.incr("record_cache.listener_errors")
+                logger.warning("Record cache invalidation listener failed", error=str(e))
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def start(self, redis_client: SecureRedisService) -> None:
+        """Start receiving invalidations; a size of 0 disables the cache."""
+        self.redis_client = redis_client
+        if getattr(redis_client, "is_cluster", False):
+            # Tracking redirects are per node; cluster pub/sub reaches all nodes
+            self.mode = "pubsub"
+        if self.max_entries > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def get_record_cache() -> RecordCache:
+    """Get the process-wide record cache (bypassed until started)."""
+    global _global_record_cache
+
+    if _global_record_cache is None:
+        _global_record_cache = RecordCache()
+    return _global_record_cache
+
+
+def set_record_cache(cache: RecordCache) -> None:
+    global _global_record_cache
+    _global_record_cache = cache
@@ -1,10 +1,16 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import redis.asyncio as redis
 from agents.storage.encryption_service import EncryptionService
+from redis.asyncio.cluster import RedisCluster
 
 
-class SecureRedisService(redis.Redis):
+class SecureRedisMixin:
+    """Per-user encryption of values on top of a standalone or cluster client."""
+
+    # Cluster clients cannot run MULTI/EXEC pipelines or cross-slot commands
+    is_cluster = False
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.encryption = EncryptionService()
@@ -45,9 +51,9 @@ class SecureRedisService(redis.Redis):
         encrypted_value = self.encryption.encrypt(value, user_id)
         return await super().rpush(name, encrypted_value)
 
-    async def set_plain(self, key: str, value: str) -> bool:
+    async def set_plain(self, key: str, value: str, ex: Optional[int] = None) -> bool:
         """Store a value without encryption (for non-sensitive index keys)."""
-        return await super().set(key, value)
+        return await super().set(key, value, ex=ex)
 
     async def get_plain(self, key: str) -> Any:
         """Retrieve a value without decryption (for non-sensitive index keys)."""
@@ -57,3 +63,45 @@ class SecureRedisService(redis.Redis):
         """Set hash field only if it doesn't exist. Returns True if set, False if already existed."""
         encrypted_value = self.encryption.encrypt(value, user_id)
         return bool(await super().hsetnx(name, key, encrypted_value))
+
+
+class SecureRedisService(SecureRedisMixin, redis.Redis):
+    pass
+
+
+class SecureRedisClusterService(SecureRedisMixin, RedisCluster):
+    """
+    Encrypting client for Redis Cluster deployments.
+
+    Keys of one user share a slot under the ``hashtag`` key scheme, so the
+    multi-key scripts and pipelines of the storage layer work unchanged.
+    """
+
+    is_cluster = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pubsub_client: Optional[redis.Redis] = None
+
+    def pubsub(self, **kwargs):
+        """
+        Pub/sub over a single node connection.
+
+        Cluster PUBLISH messages are propagated to every node, so any node
+        can serve subscriptions.
+        """
+        if self._pubsub_client is None:
+            node = self.get_default_node() or next(
+                iter(self.nodes_manager.startup_nodes.values())
+            )
+            self._pubsub_client = redis.Redis(
+                host=node.host,
+                port=node.port,
+                decode_responses=True,
+                **{
+                    k: v
+                    for k, v in self.connection_kwargs.items()
+                    if k in ("username", "password")
+                },
+            )
+        return self._pubsub_client.pubsub(**kwargs)
@@ -1,51 +1,296 @@
 import base64
 import json
+import math
+import re
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
 
 import structlog
+from agents.storage.conversation_archive import ConversationArchiver
+from agents.storage.file_text_cache import FileTextCache
+from agents.storage.keys import user_scope
+from agents.storage.record_cache import RecordCache, get_record_cache
 from agents.storage.redis_service import SecureRedisService
+from agents.storage.share_snapshots import ShareSnapshot, ShareSnapshotStore
+from agents.utils.metrics import get_metrics_registry
+from agents.storage.replica_router import REPLICA_ERRORS, ReplicaRouter, get_replica_router
 
 logger = structlog.get_logger(__name__)
 
+T = TypeVar("T")
+
+# Sentinel returned by the usage script when a legacy encrypted blob must be
+# migrated before counters can be incremented.
+_USAGE_NEEDS_MIGRATION = -1
+
+# KEYS[1] = counter hash, KEYS[2] = legacy encrypted blob
+# ARGV = field1, increment1, field2, increment2, ...
+_CUMULATIVE_USAGE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 and redis.call('EXISTS', KEYS[2]) == 1 then
+    return -1
+end
+for i = 1, #ARGV, 2 do
+    redis.call('HINCRBYFLOAT', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# KEYS[1] = counter hash, KEYS[2] = legacy encrypted blob
+# ARGV = field1, value1, field2, value2, ...
+# Applies the migrated counters only if no concurrent call migrated first.
+_MIGRATE_USAGE_LUA = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 2 do
+    redis.call('HINCRBYFLOAT', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('DEL', KEYS[2])
+return 1
+"""
+
+
+# KEYS[1] = content reference counts, KEYS[2] = content index, KEYS[3] = blob
+# ARGV[1] = content hash, ARGV[2] = encrypted data, ARGV[3] = encrypted entry
+# Takes a reference, storing the blob on first use (or if it went missing)
+# and the index entry if there is none; returns the new reference count.
+_ACQUIRE_FILE_CONTENT_LUA = """
+local refs = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+if refs == 1 or redis.call('EXISTS', KEYS[3]) == 0 then
+    redis.call('SET', KEYS[3], ARGV[2])
+end
+redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[3])
+return refs
+"""
+
+# KEYS as for acquiring; ARGV[1] = content hash, ARGV[2] = encrypted entry.
+# Takes a reference only if the content is already stored, so duplicates
+# need not send the data; returns the new reference count, or 0 if the
+# content must be acquired with its data.
+_ADD_FILE_CONTENT_REF_LUA = """
+local refs = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if refs < 1 or redis.call('EXISTS', KEYS[3]) == 0 then
+    return 0
+end
+redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2])
+return redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+"""
+
+# KEYS[1] = content index; ARGV[1] = content hash, ARGV[2] = expected
+# encrypted entry, ARGV[3] = replacement. Returns 1 if replaced.
+_REPLACE_FILE_CONTENT_ENTRY_LUA = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] = key; ARGV[1] = expected encrypted value, ARGV[2] = replacement.
+# Returns 1 if replaced; a deleted key is never recreated.
+_REPLACE_VALUE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'KEEPTTL')
+    return 1
+end
+return 0
+"""
+
+# KEYS as for acquiring; ARGV[1] = content hash. Drops a reference and with
+# the last one removes the blob, count and index entry; returns
+# {remaining} or {0, removed encrypted entry}.
+_RELEASE_FILE_CONTENT_LUA = """
+local remaining = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+if remaining > 0 then
+    return {remaining}
+end
+local entry = redis.call('HGET', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[3])
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+return {0, entry}
+"""
+
+# Share tokens (and their snapshots) expire after 30 days
+SHARE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Member marking a conversation's file set as complete, so conversations
+# without files are not rescanned
+CONVERSATION_FILES_INDEXED = "__indexed__"
+
+# Inline references to stored files in rendered message content
+_FILE_REFERENCE_RE = re.compile(
+    r"\((?:redis-chart|attachment):([0-9a-fA-F-]{36})[:)]"
+)
+
+
+def referenced_file_ids(message: Dict[str, Any]) -> Set[str]:
+    """Collect the IDs of stored files a persisted message refers to."""
+    file_ids: Set[str] = set()
+
+    additional_kwargs = message.get("additional_kwargs")
+    if isinstance(additional_kwargs, dict):
+        files = additional_kwargs.get("files") or []
+        if isinstance(files, list):
+            file_ids.update(f for f in files if isinstance(f, str))
+        pdf_report = additional_kwargs.get("pdf_report")
+        if isinstance(pdf_report, str):
+            file_ids.add(pdf_report)
+
+    content = message.get("content")
+    if isinstance(content, str) and "(" in content:
+        file_ids.update(_FILE_REFERENCE_RE.findall(content))
+
+    return file_ids
+
+
+def _is_usage_counter(value: Any) -> bool:
+    """Whether a usage value can be summed (bools are ints but not counters)."""
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and math.isfinite(value)
+    )
+
+
+def _parse_usage_totals(flat: List[Any]) -> Dict[str, Any]:
+    """Convert a flat HGETALL reply of usage counters into numbers."""
+    totals: Dict[str, Any] = {}
+    for field, raw in zip(flat[::2], flat[1::2]):
+        if isinstance(field, bytes):
+            field = field.decode("utf-8")
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        value = float(raw)
+        totals[field] = int(value) if value.is_integer() else value
+    return totals
+
 
 class RedisStorage:
     """Service for handling all message storage operations"""
 
     def __init__(self, redis_client: SecureRedisService):
         self.redis_client = redis_client
+        self._cumulative_usage_script = redis_client.register_script(
+            _CUMULATIVE_USAGE_LUA
+        )
+        self._migrate_usage_script = redis_client.register_script(_MIGRATE_USAGE_LUA)
+        self._acquire_content_script = redis_client.register_script(
+            _ACQUIRE_FILE_CONTENT_LUA
+        )
+        self._add_content_ref_script = redis_client.register_script(
+            _ADD_FILE_CONTENT_REF_LUA
+        )
+        self._replace_content_entry_script = redis_client.register_script(
+            _REPLACE_FILE_CONTENT_ENTRY_LUA
+        )
+        self._release_content_script = redis_client.register_script(
+            _RELEASE_FILE_CONTENT_LUA
+        )
+        self._replace_value_script = redis_client.register_script(_REPLACE_VALUE_LUA)
+        self.archive = ConversationArchiver(redis_client)
+        self.file_text = FileTextCache(redis_client)
+        self.share_snapshots = ShareSnapshotStore(redis_client)
+
+    @property
+    def replicas(self) -> ReplicaRouter:
+        return get_replica_router()
+
+    @property
+    def record_cache(self) -> RecordCache:
+        return get_record_cache()
+
+    async def get_cached_record(self, key: str, user_id: str) -> Optional[str]:
+        """Read a small per-user string record (connector or LLM config) through the record cache."""
+        return await self.record_cache.get(
+            key, lambda: self.redis_client.get(key, user_id)
+        )
+
+    async def set_cached_record(self, key: str, value: str, user_id: str) -> None:
+        """Write a record served by ``get_cached_record`` and evict the cached copy."""
+        self.replicas.note_write(user_id)
+        await self.redis_client.set(key, value, user_id)
+        await self.record_cache.invalidate(key)
+
+    async def delete_cached_record(self, key: str) -> None:
+        await self.redis_client.delete(key)
+        await self.record_cache.invalidate(key)
+
+    async def _read_stale_ok(
+        self,
+        user_id: Optional[str],
+        read: Callable[[SecureRedisService], Awaitable[T]],
+    ) -> T:
+        """
+        Run a read that tolerates replication lag, on a replica if allowed.
+
+        Empty results are confirmed on the primary, so data created within
+        the lag window is never reported missing.
+        """
+        replica = self.replicas.replica_for(user_id)
+        if replica is not None:
+            try:
+                result = await read(replica)
+                if result:
+                    return result
+                get_metrics_registry().incr("replica.empty_reads_confirmed")
+            except REPLICA_ERRORS as e:
+                self.replicas.mark_unavailable(e)
+        return await read(self.redis_client)
 
     def _get_message_key(self, user_id: str, conversation_id: str) -> str:
         """Get the Redis key for storing messages"""
-        return f"messages:{user_id}:{conversation_id}"
+        return f"messages:{user_scope(user_id)}:{conversation_id}"
 
     def _get_dedup_key(self, user_id: str, conversation_id: str) -> str:
         """Get the Redis key for message deduplication"""
-        return f"message_ids:{user_id}:{conversation_id}"
+        return f"message_ids:{user_scope(user_id)}:{conversation_id}"
+
+    def _get_message_compaction_key(self, user_id: str, conversation_id: str) -> str:
+        """Get the Redis key for the message list length after the last compaction"""
+        return f"message_compaction:{user_scope(user_id)}:{conversation_id}"
 
     def _get_chat_metadata_key(self, user_id: str, conversation_id: str) -> str:
         """Get the Redis key for chat metadata"""
-        return f"chat_metadata:{user_id}:{conversation_id}"
+        return f"chat_metadata:{user_scope(user_id)}:{conversation_id}"
 
     def _get_file_metadata_key(self, user_id: str, file_id: str) -> str:
         """Get the Redis key for file metadata"""
-        return f"file_metadata:{user_id}:{file_id}"
+        return f"file_metadata:{user_scope(user_id)}:{file_id}"
 
     def _get_user_files_key(self, user_id: str) -> str:
         """Get the Redis key for user files"""
-        return f"user_files:{user_id}"
+        return f"user_files:{user_scope(user_id)}"
 
     def _get_file_data_key(self, user_id: str, file_id: str) -> str:
         """Get the Redis key for file data"""
-        return f"file_data:{user_id}:{file_id}"
+        return f"file_data:{user_scope(user_id)}:{file_id}"
+
+    def _get_file_blob_key(self, user_id: str, content_hash: str) -> str:
+        """Get the Redis key for content-addressed file data"""
+        return f"file_blob:{user_scope(user_id)}:{content_hash}"
+
+    def _get_file_content_index_key(self, user_id: str) -> str:
+        """Get the Redis key for the user's content hash -> file index"""
+        return f"file_content_index:{user_scope(user_id)}"
+
+    def _get_file_content_refs_key(self, user_id: str) -> str:
+        """Get the Redis key for the user's content hash reference counts"""
+        return f"file_content_refs:{user_scope(user_id)}"
 
     def _get_api_key_key(self, user_id: str) -> str:
         """Get the Redis key for user API keys"""
-        return f"api_keys:{user_id}"
+        return f"api_keys:{user_scope(user_id)}"
 
     def _get_cumulative_usage_key(self, user_id: str, conversation_id: str) -> str:
         """Get the Redis key for cumulative usage data"""
-        return f"cumulative_usage:{user_id}:{conversation_id}"
+        return f"cumulative_usage:{user_scope(user_id)}:{conversation_id}"
+
+    def _get_cumulative_usage_totals_key(
+        self, user_id: str, conversation_id: str
+    ) -> str:
+        """Get the Redis key for the cumulative usage counter hash"""
+        return f"cumulative_usage_totals:{user_scope(user_id)}:{conversation_id}"
 
     def _get_share_key(self, share_token: str) -> str:
         """Get the Redis key for share token data"""
@@ -53,7 +298,11 @@ class RedisStorage:
 
     def _get_user_shares_key(self, user_id: str) -> str:
         """Get the Redis key for user's created shares"""
-        return f"user_shares:{user_id}"
+        return f"user_shares:{user_scope(user_id)}"
+
+    def _get_conversation_files_key(self, user_id: str, conversation_id: str) -> str:
+        """Get the Redis key for the set of file IDs a conversation references"""
+        return f"conversation_files:{user_scope(user_id)}:{conversation_id}"
 
     async def is_message_new(
         self, user_id: str, conversation_id: str, message_id: str
@@ -75,6 +324,7 @@ class RedisStorage:
         Save a message if it doesn't already exist (based on message ID).
         Returns True if message was saved, False if it was a duplicate.
         """
+        self.replicas.note_write(user_id)
         message_key = self._get_message_key(user_id, conversation_id)
 
         # Check for duplicates if message has an ID
@@ -95,6 +345,9 @@ class RedisStorage:
             json.dumps(message_data),
             user_id,
         )
+        await self.index_conversation_files(
+            user_id, conversation_id, referenced_file_ids(message_data)
+        )
         return True
 
     async def save_message(
@@ -103,6 +356,7 @@ class RedisStorage:
         """
         Save a message.
         """
+        self.replicas.note_write(user_id)
         message_key = self._get_message_key(user_id, conversation_id)
 
         # Save the message
@@ -111,17 +365,91 @@ class RedisStorage:
             json.dumps(message_data),
             user_id,
         )
+        await self.index_conversation_files(
+            user_id, conversation_id, referenced_file_ids(message_data)
+        )
+
+    async def index_conversation_files(
+        self, user_id: str, conversation_id: str, file_ids: Set[str]
+    ) -> None:
+        """Record file IDs referenced by a conversation's messages"""
+        if file_ids:
+            await self.redis_client.sadd(
+                self._get_conversation_files_key(user_id, conversation_id), *file_ids
+            )
+
+    async def mark_conversation_files_indexed(
+        self, user_id: str, conversation_id: str
+    ) -> None:
+        """Mark a new conversation's file set as complete"""
+        await self.redis_client.sadd(
+            self._get_conversation_files_key(user_id, conversation_id),
+            CONVERSATION_FILES_INDEXED,
+        )
+
+    async def get_conversation_file_ids(
+        self, user_id: str, conversation_id: str
+    ) -> Set[str]:
+        """
+        Get the IDs of all files referenced in a conversation.
+
+        Conversations created before the file set existed are indexed from
+        their message history on first access.
+        """
+        files_key = self._get_conversation_files_key(user_id, conversation_id)
+        file_ids = set(await self.redis_client.smembers(files_key))
+        if CONVERSATION_FILES_INDEXED in file_ids:
+            file_ids.discard(CONVERSATION_FILES_INDEXED)
+            return file_ids
+
+        for message in await self.get_messages(user_id, conversation_id):
+            file_ids.update(referenced_file_ids(message))
+        await self.redis_client.sadd(files_key, CONVERSATION_FILES_INDEXED, *file_ids)
+        return file_ids
+
+    async def conversation_references_file(
+        self, user_id: str, conversation_id: str, file_id: str
+    ) -> bool:
+        """Check whether a file is referenced in a conversation"""
+        files_key = self._get_conversation_files_key(user_id, conversation_id)
+        indexed, referenced = await self.redis_client.smismember(
+            files_key, [CONVERSATION_FILES_INDEXED, file_id]
+        )
+        if indexed:
+            return bool(referenced)
+        return file_id in await self.get_conversation_file_ids(
+            user_id, conversation_id
+        )
 
     async def get_messages(
-        self, user_id: str, conversation_id: str, start: int = 0, end: int = -1
+        self,
+        user_id: str,
+        conversation_id: str,
+        start: int = 0,
+        end: int = -1,
+        allow_stale: bool = False,
     ) -> List[Dict[str, Any]]:
         """
         Get messages for a conversation.
         start and end work like Redis LRANGE (0-based, -1 means last element)
+        allow_stale lets a read replica within the configured lag serve the read
         """
         message_key = self._get_message_key(user_id, conversation_id)
 
-        messages_raw = await self.redis_client.lrange(message_key, start, end, user_id)
+        if allow_stale:
+            messages_raw = await self._read_stale_ok(
+                user_id, lambda client: client.lrange(message_key, start, end, user_id)
+            )
+        else:
+            messages_raw = await self.redis_client.lrange(
+                message_key, start, end, user_id
+            )
+
+        # Archived conversations have no message list until they are rehydrated
+        if not messages_raw and await self.archive.rehydrate(user_id, conversation_id):
+            messages_raw = await self.redis_client.lrange(
+                message_key, start, end, user_id
+            )
 
         if not messages_raw:
             return []
@@ -137,6 +465,10 @@ class RedisStorage:
 
         return messages
 
+    async def ensure_conversation_hot(self, user_id: str, conversation_id: str) -> None:
+        """Rehydrate an archived conversation before new events are written to it"""
+        await self.archive.rehydrate(user_id, conversation_id)
+
     async def get_last_message(
         self, user_id: str, conversation_id: str
     ) -> Optional[Dict[str, Any]]:
@@ -155,12 +487,20 @@ class RedisStorage:
         self, user_id: str, conversation_id: str
     ) -> bool:
         """Delete all messages for a conversation"""
+        self.replicas.note_write(user_id)
         message_key = self._get_message_key(user_id, conversation_id)
         dedup_key = self._get_dedup_key(user_id, conversation_id)
 
         # Delete both the message list and deduplication hash
         deleted_messages = await self.redis_client.delete(message_key)
         deleted_dedup = await self.redis_client.delete(dedup_key)
+        await self.redis_client.delete(
+            self._get_message_compaction_key(user_id, conversation_id)
+        )
+        await self.archive.discard(user_id, conversation_id)
+        await self.redis_client.delete(
+            self._get_conversation_files_key(user_id, conversation_id)
+        )
 
         return deleted_messages > 0 or deleted_dedup > 0
 
@@ -170,25 +510,55 @@ class RedisStorage:
         return await self.redis_client.llen(message_key)
 
     async def verify_conversation_exists(
-        self, user_id: str, conversation_id: str
+        self, user_id: str, conversation_id: str, allow_stale: bool = False
     ) -> bool:
         """
         Verify if a conversation's metadata exists for the given user.
         """
         meta_key = self._get_chat_metadata_key(user_id, conversation_id)
+        if allow_stale:
+            return bool(
+                await self._read_stale_ok(user_id, lambda client: client.exists(meta_key))
+            )
         return bool(await self.redis_client.exists(meta_key))
 
+    async def get_user_chat_ids(self, user_id: str, allow_stale: bool = False) -> List[str]:
+        """Get the user's conversation IDs, most recent first."""
+        user_chats_key = f"user_chats:{user_scope(user_id)}"
+        if allow_stale:
+            return await self._read_stale_ok(
+                user_id, lambda client: client.zrevrange(user_chats_key, 0, -1)
+            )
+        return await self.redis_client.zrevrange(user_chats_key, 0, -1)
+
     async def delete_all_user_data(self, user_id: str, conversation_id: str) -> int:
         """
         Delete the metadata for a given conversation.
         """
+        self.replicas.note_write(user_id)
         meta_key = self._get_chat_metadata_key(user_id, conversation_id)
-        message_key = f"messages:{user_id}:{conversation_id}"
-        user_chats_key = f"user_chats:{user_id}"
+        message_key = f"messages:{user_scope(user_id)}:{conversation_id}"
+        user_chats_key = f"user_chats:{user_scope(user_id)}"
 
         # Execute all deletions
         await self.redis_client.delete(meta_key)
         await self.redis_client.delete(message_key)
+        await self.redis_client.delete(
+            self._get_message_compaction_key(user_id, conversation_id)
+        )
+        await self.archive.discard(user_id, conversation_id)
+        await self.redis_client.delete(
+            self._get_conversation_files_key(user_id, conversation_id)
+        )
+        await self.redis_client.delete(
+            self._get_dedup_key(user_id, conversation_id),
+            self._get_cumulative_usage_key(user_id, conversation_id),
+            self._get_cumulative_usage_totals_key(user_id, conversation_id),
+        )
+        # Shares serve a frozen snapshot; it must not outlive the conversation
+        for share in await self.get_user_shares(user_id):
+            if share["conversation_id"] == conversation_id:
+                await self.delete_share(user_id, share["share_token"])
         return await self.redis_client.zrem(user_chats_key, conversation_id)
 
     async def put_file(
@@ -203,16 +573,34 @@ class RedisStorage:
         indexed: bool,
         source: str,
         vector_ids: Optional[List[str]] = None,
+        content_hash: Optional[str] = None,
+        vector_document_id: Optional[str] = None,
+        ingestion_status: Optional[str] = None,
     ):
-        """Put a file in Redis storage."""
+        """Put a file in Redis storage.
+
+        When ``content_hash`` is given the data is stored content-addressed and
+        shared with any other file of the same user holding the same content.
+        """
         try:
             # Ensure data is bytes
             if isinstance(data, str):
                 data = data.encode("utf-8")
 
-            # Store file data with user-namespaced key
-            file_data_key = f"file_data:{user_id}:{file_id}"
-            await self.redis_client.set(file_data_key, data, user_id)
+            if content_hash:
+                await self._acquire_file_content(
+                    user_id,
+                    content_hash,
+                    data=data,
+                    file_id=file_id,
+                    indexed=indexed,
+                    vector_ids=vector_ids,
+                    vector_document_id=vector_document_id or file_id,
+                )
+            else:
+                # Store file data with user-namespaced key
+                file_data_key = self._get_file_data_key(user_id, file_id)
+                await self.redis_client.set(file_data_key, data, user_id)
 
             await self.store_file_metadata(
                 user_id,
@@ -224,6 +612,9 @@ class RedisStorage:
                 indexed=indexed,
                 source=source,
                 vector_ids=vector_ids,
+                content_hash=content_hash,
+                vector_document_id=vector_document_id,
+                ingestion_status=ingestion_status,
             )
 
             await self.add_file_to_user_list(user_id, file_id)
@@ -258,8 +649,12 @@ class RedisStorage:
             if not file_metadata:
                 return None, None
 
-            # Get file data
-            file_data_key = self._get_file_data_key(user_id, file_id)
+            # Get file data, shared content lives under its content hash
+            content_hash = file_metadata.get("content_hash")
+            if content_hash:
+                file_data_key = self._get_file_blob_key(user_id, content_hash)
+            else:
+                file_data_key = self._get_file_data_key(user_id, file_id)
             file_data = await self.redis_client.get(file_data_key, user_id)
 
             if isinstance(file_data, str):
@@ -279,17 +674,7 @@ class RedisStorage:
     async def get_file_metadata(self, user_id: str, file_id: str) -> Optional[dict]:
         """Get file metadata from Redis storage."""
         try:
-
-            if not await self.verify_file_belongs_to_user(user_id, file_id):
-                return None
-
-            file_metadata_key = self._get_file_metadata_key(user_id, file_id)
-            metadata_str = await self.redis_client.get(file_metadata_key, user_id)
-
-            if not metadata_str:
-                return None
-
-            return json.loads(metadata_str)
+            return await self._read_file_metadata(self.redis_client, user_id, file_id)
 
         except Exception as e:
             logger.error(
@@ -300,6 +685,20 @@ class RedisStorage:
             )
             return None
 
+    async def _read_file_metadata(
+        self, client: SecureRedisService, user_id: str, file_id: str
+    ) -> Optional[dict]:
+        if not await client.sismember(self._get_user_files_key(user_id), file_id):
+            return None
+
+        file_metadata_key = self._get_file_metadata_key(user_id, file_id)
+        metadata_str = await client.get(file_metadata_key, user_id)
+
+        if not metadata_str:
+            return None
+
+        return json.loads(metadata_str)
+
     async def get_file_as_base64(self, user_id: str, file_id: str) -> Optional[str]:
         """Get a file as base64 string."""
         data, _ = await self.get_file(user_id, file_id)
@@ -343,19 +742,29 @@ class RedisStorage:
 
     async def delete_file(self, user_id: str, file_id: str) -> bool:
         """Delete a file from Redis storage."""
+        self.replicas.note_write(user_id)
         try:
 
             if not await self.verify_file_belongs_to_user(user_id, file_id):
                 return False
 
+            metadata = await self.get_file_metadata(user_id, file_id)
+            content_hash = metadata.get("content_hash") if metadata else None
+
             # Delete file data and metadata
             file_data_key = self._get_file_data_key(user_id, file_id)
             file_metadata_key = self._get_file_metadata_key(user_id, file_id)
             user_files_key = self._get_user_files_key(user_id)
 
+            # Shared content is only removed once its last reference is gone
+            if content_hash:
+                await self._release_file_content(user_id, content_hash)
+            else:
+                await self.redis_client.delete(file_data_key)
+
             # Remove from all locations
-            await self.redis_client.delete(file_data_key)
             await self.redis_client.delete(file_metadata_key)
+            await self.file_text.delete(user_id, file_id)
             await self.redis_client.srem(user_files_key, file_id)
 
             logger.info("File deleted from Redis", file_id=file_id, user_id=user_id)
@@ -370,94 +779,107 @@ class RedisStorage:
             )
             return False
 
-    async def list_user_files(self, user_id: str) -> list:
+    async def list_user_files(self, user_id: str, allow_stale: bool = False) -> list:
         """List all files for a user."""
         try:
-            import asyncio
-            import os
+            if allow_stale:
+                return await self._read_stale_ok(
+                    user_id, lambda client: self._list_user_files(client, user_id)
+                )
+            return await self._list_user_files(self.redis_client, user_id)
 
-            user_files_key = self._get_user_files_key(user_id)
-            file_ids = await self.redis_client.smembers(user_files_key)
+        except Exception as e:
+            logger.error(
+                "Error listing files for user",
+                user_id=user_id,
+                error=str(e),
+                exc_info=True,
+            )
+            return []
+
+    async def _list_user_files(self, client: SecureRedisService, user_id: str) -> list:
+        import asyncio
+        import os
 
-            if not file_ids:
-                return []
+        user_files_key = self._get_user_files_key(user_id)
+        file_ids = await client.smembers(user_files_key)
+
+        if not file_ids:
+            return []
 
-            # Optimize: Use controlled concurrent Redis calls to avoid connection pool exhaustion
-            # Limit concurrent connections to prevent pool exhaustion
-            max_concurrent_connections = int(
-                os.getenv("REDIS_MAX_CONCURRENT_CONNECTIONS", "5")
+        # Optimize: Use controlled concurrent Redis calls to avoid connection pool exhaustion
+        # Limit concurrent connections to prevent pool exhaustion
+        max_concurrent_connections = int(
+            os.getenv("REDIS_MAX_CONCURRENT_CONNECTIONS", "5")
+        )
+        semaphore = asyncio.Semaphore(max_concurrent_connections)
+
+        async def get_metadata_with_semaphore(file_id):
+            async with semaphore:
+                if isinstance(file_id, bytes):
+                    file_id = file_id.decode("utf-8")
+                metadata = await self._read_file_metadata(client, user_id, file_id)
+                if metadata:
+                    metadata["file_id"] = file_id
+                return metadata
+
+        # Try concurrent approach first
+        try:
+            # Execute metadata retrieval calls with controlled concurrency
+            metadata_tasks = [
+                get_metadata_with_semaphore(file_id) for file_id in file_ids
+            ]
+            metadata_results = await asyncio.gather(
+                *metadata_tasks, return_exceptions=True
             )
-            semaphore = asyncio.Semaphore(max_concurrent_connections)
 
-            async def get_metadata_with_semaphore(file_id):
-                async with semaphore:
+            # Check if we got connection errors
+            connection_errors = [
+                r
+                for r in metadata_results
+                if isinstance(r, Exception) and "Too many connections" in str(r)
+            ]
+            if connection_errors:
+                logger.warning(
+                    f"Connection pool exhausted, falling back to sequential calls for user {user_id}"
+                )
+                raise Exception("Connection pool exhausted")
+
+        except Exception as e:
+            # Fallback to sequential calls if concurrent approach fails
+            logger.info(f"Using sequential Redis calls for user {user_id}")
+            metadata_results = []
+            for file_id in file_ids:
+                try:
                     if isinstance(file_id, bytes):
                         file_id = file_id.decode("utf-8")
-                    metadata = await self.get_file_metadata(user_id, file_id)
+                    metadata = await self._read_file_metadata(client, user_id, file_id)
                     if metadata:
                         metadata["file_id"] = file_id
-                    return metadata
-
-            # Try concurrent approach first
-            try:
-                # Execute metadata retrieval calls with controlled concurrency
-                metadata_tasks = [
-                    get_metadata_with_semaphore(file_id) for file_id in file_ids
-                ]
-                metadata_results = await asyncio.gather(
-                    *metadata_tasks, return_exceptions=True
-                )
-
-                # Check if we got connection errors
-                connection_errors = [
-                    r
-                    for r in metadata_results
-                    if isinstance(r, Exception) and "Too many connections" in str(r)
-                ]
-                if connection_errors:
-                    logger.warning(
-                        f"Connection pool exhausted, falling back to sequential calls for user {user_id}"
+                    metadata_results.append(metadata)
+                except Exception as get_error:
+                    logger.error(
+                        f"Failed to get metadata for file {file_id}: {get_error}"
                     )
-                    raise Exception("Connection pool exhausted")
-
-            except Exception as e:
-                # Fallback to sequential calls if concurrent approach fails
-                logger.info(f"Using sequential Redis calls for user {user_id}")
-                metadata_results = []
-                for file_id in file_ids:
-                    try:
-                        if isinstance(file_id, bytes):
-                            file_id = file_id.decode("utf-8")
-                        metadata = await self.get_file_metadata(user_id, file_id)
-                        if metadata:
-                            metadata["file_id"] = file_id
-                        metadata_results.append(metadata)
-                    except Exception as get_error:
-                        logger.error(
-                            f"Failed to get metadata for file {file_id}: {get_error}"
-                        )
-                        metadata_results.append(None)
-
-            # Process results
-            files = []
-            for metadata in metadata_results:
-                if isinstance(metadata, Exception):
-                    logger.error(f"Failed to get file metadata: {metadata}")
-                    continue
-
-                if metadata:
-                    files.append(metadata)
+                    metadata_results.append(None)
+
+        # A failing replica must not yield a partial list
+        if client is not self.redis_client:
+            for result in metadata_results:
+                if isinstance(result, REPLICA_ERRORS):
+                    raise result
+
+        # Process results
+        files = []
+        for metadata in metadata_results:
+            if isinstance(metadata, Exception):
+                logger.error(f"Failed to get file metadata: {metadata}")
+                continue
 
-            return files
+            if metadata:
+                files.append(metadata)
 
-        except Exception as e:
-            logger.error(
-                "Error listing files for user",
-                user_id=user_id,
-                error=str(e),
-                exc_info=True,
-            )
-            return []
+        return files
 
     # Document storage methods
     async def store_file_metadata(
@@ -472,8 +894,12 @@ class RedisStorage:
         indexed: bool,
         source: str,
         vector_ids: Optional[List[str]] = None,
+        content_hash: Optional[str] = None,
+        vector_document_id: Optional[str] = None,
+        ingestion_status: Optional[str] = None,
     ) -> None:
         """Store document metadata in Redis."""
+        self.replicas.note_write(user_id)
         metadata = {
             "user_id": user_id,
             "filename": filename,
@@ -485,11 +911,196 @@ class RedisStorage:
         }
         if vector_ids:
             metadata["vector_ids"] = vector_ids
+        if content_hash:
+            metadata["content_hash"] = content_hash
+        if vector_document_id and vector_document_id != file_id:
+            metadata["vector_document_id"] = vector_document_id
+        if ingestion_status:
+            metadata["ingestion_status"] = ingestion_status
         file_metadata_key = self._get_file_metadata_key(user_id, file_id)
         await self.redis_client.set(file_metadata_key, json.dumps(metadata), user_id)
 
+    async def update_file_metadata(
+        self, user_id: str, file_id: str, **fields: Any
+    ) -> Optional[dict]:
+        """
+        Merge fields into a file's metadata; returns None if the file is gone.
+
+        The write is a compare-and-set on the stored value, so a file deleted
+        meanwhile is not recreated and concurrent updates are not lost.
+        """
+        self.replicas.note_write(user_id)
+        encryption = self.redis_client.encryption
+        file_metadata_key = self._get_file_metadata_key(user_id, file_id)
+        while True:
+            # Read the ciphertext to compare against, bypassing decryption
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(file_metadata_key)
+                (current,) = await pipe.execute()
+            if current is None:
+                return None
+            metadata = json.loads(encryption.decrypt(current, user_id))
+            metadata.update(fields)
+            if await self._replace_value_script(
+                keys=[file_metadata_key],
+                args=[current, encryption.encrypt(json.dumps(metadata), user_id)],
+            ):
+                return metadata
+
+    async def record_indexed_content(
+        self, user_id: str, content_hash: str, document_id: str, vector_ids: List[str]
+    ) -> None:
+        """Point the content index at vectors ingested after the upload."""
+        entry = await self.get_file_content_entry(user_id, content_hash)
+        if entry is None or entry.get("indexed"):
+            return
+        entry = {"document_id": document_id, "indexed": True, "vector_ids": vector_ids}
+        await self.redis_client.hset(
+            self._get_file_content_index_key(user_id),
+            mapping={content_hash: json.dumps(entry)},
+            user_id=user_id,
+        )
+
+    def compute_content_hash(self, user_id: str, data: bytes) -> str:
+        """Compute the per-user content fingerprint used for deduplication."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return self.redis_client.encryption.fingerprint(data, user_id)
+
+    async def get_file_content_entry(
+        self, user_id: str, content_hash: str
+    ) -> Optional[dict]:
+        """
+        Look up previously stored content by hash.
+
+        Returns the index entry (``document_id``, ``indexed``, ``vector_ids``)
+        of the file that first stored this content, or None if unknown.
+        """
+        index_key = self._get_file_content_index_key(user_id)
+        entry = await self.redis_client.hget(index_key, content_hash, user_id)
+        if not entry:
+            return None
+        try:
+            return json.loads(entry)
+        except json.JSONDecodeError:
+            logger.error("Failed to parse file content index entry", user_id=user_id)
+            return None
+
+    async def get_indexed_document_ids(
+        self, user_id: str, file_ids: List[str]
+    ) -> List[str]:
+        """
+        The document IDs to retrieve from for the given files.
+
+        Whether a file is indexed is read from its metadata, not taken from
+        the client: uploads are indexed in the background, so the flag the
+        client got at upload time is stale. Deduplicated uploads reuse the
+        vectors of the file that first ingested the content, so their chunks
+        carry that file's document ID.
+        """
+        document_ids = []
+        for file_id in file_ids:
+            metadata = await self.get_file_metadata(user_id, file_id)
+            if not metadata or not metadata.get("indexed"):
+                continue
+            document_id = metadata.get("vector_document_id", file_id)
+            if document_id not in document_ids:
+                document_ids.append(document_id)
+        return document_ids
+
+    async def _acquire_file_content(
+        self,
+        user_id: str,
+        content_hash: str,
+        *,
+        data: bytes,
+        file_id: str,
+        indexed: bool,
+        vector_ids: Optional[List[str]],
+        vector_document_id: str,
+    ) -> int:
+        """Take a reference on shared content, storing it on first use."""
+        refs_key = self._get_file_content_refs_key(user_id)
+        index_key = self._get_file_content_index_key(user_id)
+        encryption = self.redis_client.encryption
+
+        entry = {
+            "document_id": vector_document_id,
+            "indexed": indexed,
+            "vector_ids": vector_ids or [],
+        }
+        keys = [refs_key, index_key, self._get_file_blob_key(user_id, content_hash)]
+        # Values are encrypted here since scripts bypass SecureRedisService
+        encrypted_entry = encryption.encrypt(json.dumps(entry), user_id)
+        # Duplicates only take a reference; the data is encrypted and sent
+        # only when the blob is not stored yet
+        refs = await self._add_content_ref_script(
+            keys=keys, args=[content_hash, encrypted_entry]
+        )
+        if not refs:
+            refs = await self._acquire_content_script(
+                keys=keys,
+                args=[content_hash, encryption.encrypt(data, user_id), encrypted_entry],
+            )
+
+        # Record the first indexed copy so later uploads can reuse its vectors
+        while indexed:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hget(index_key, content_hash)
+                (current,) = await pipe.execute()
+            if current is None:
+                break
+            try:
+                if json.loads(encryption.decrypt(current, user_id)).get("indexed"):
+                    break
+            except json.JSONDecodeError:
+                pass
+            if await self._replace_content_entry_script(
+                keys=[index_key],
+                args=[
+                    content_hash,
+                    current,
+                    encryption.encrypt(json.dumps(entry), user_id),
+                ],
+            ):
+                break
+
+        logger.info(
+            "Acquired file content reference",
+            file_id=file_id,
+            user_id=user_id,
+            references=refs,
+        )
+        return refs
+
+    async def _release_file_content(self, user_id: str, content_hash: str) -> int:
+        """Drop a reference on shared content, removing it with the last one."""
+        result = await self._release_content_script(
+            keys=[
+                self._get_file_content_refs_key(user_id),
+                self._get_file_content_index_key(user_id),
+                self._get_file_blob_key(user_id, content_hash),
+            ],
+            args=[content_hash],
+        )
+        if result[0] > 0:
+            return result[0]
+
+        entry = None
+        if len(result) > 1 and result[1]:
+            try:
+                entry = json.loads(self.redis_client.encryption.decrypt(result[1], user_id))
+            except json.JSONDecodeError:
+                logger.error("Failed to parse file content index entry", user_id=user_id)
+        if entry and entry.get("vector_ids"):
+            await self.delete_vectors(entry["vector_ids"])
+
+        logger.info("Released last file content reference", user_id=user_id)
+        return 0
+
     async def add_file_to_user_list(self, user_id: str, file_id: str) -> None:
         """Add file to user's file list."""
+        self.replicas.note_write(user_id)
         user_files_key = self._get_user_files_key(user_id)
         await self.redis_client.sadd(user_files_key, file_id)
 
@@ -498,12 +1109,23 @@ class RedisStorage:
         user_files_key = self._get_user_files_key(user_id)
         return await self.redis_client.sismember(user_files_key, file_id)
 
-    async def get_user_api_key(self, user_id: str) -> "APIKeys":
+    async def get_user_api_key(self, user_id: str, allow_stale: bool = False) -> "APIKeys":
         """Get a user's API key."""
         from agents.api.data_types import APIKeys
 
         user_api_key_key = self._get_api_key_key(user_id)
-        api_keys = await self.redis_client.hgetall(user_api_key_key, user_id)
+        if self.record_cache.active:
+            # Kept fresh by invalidations, so always loaded from the primary
+            api_keys = await self.record_cache.get(
+                user_api_key_key,
+                lambda: self.redis_client.hgetall(user_api_key_key, user_id),
+            )
+        elif allow_stale:
+            api_keys = await self._read_stale_ok(
+                user_id, lambda client: client.hgetall(user_api_key_key, user_id)
+            )
+        else:
+            api_keys = await self.redis_client.hgetall(user_api_key_key, user_id)
         return APIKeys(
             sambanova_key=api_keys.get("sambanova_key", ""),
             serper_key=api_keys.get("serper_key", ""),
@@ -515,6 +1137,7 @@ class RedisStorage:
 
     async def set_user_api_key(self, user_id: str, keys: "APIKeys") -> None:
         """Set a user's API key."""
+        self.replicas.note_write(user_id)
 
         # Store keys in Redis with user-specific prefix
         key_prefix = self._get_api_key_key(user_id)
@@ -530,11 +1153,13 @@ class RedisStorage:
             },
             user_id=user_id,
         )
+        await self.record_cache.invalidate(key_prefix)
 
     async def update_metadata(
         self, message_data: str, user_id: str, conversation_id: str
     ):
         """Helper method to update metadata asynchronously"""
+        self.replicas.note_write(user_id)
         try:
             meta_key = self._get_chat_metadata_key(user_id, conversation_id)
             meta_data = await self.redis_client.get(meta_key, user_id)
@@ -568,37 +1193,69 @@ class RedisStorage:
     ) -> Dict[str, Any]:
         """
         Updates and retrieves the cumulative usage for a session.
+
+        Counters live in a plain Redis hash and are incremented server-side by
+        a Lua script, so concurrent runs can't lose updates and the steady
+        state costs a single round trip.
         """
-        cumulative_usage_key = self._get_cumulative_usage_key(user_id, conversation_id)
-        # Fetch existing cumulative usage
-        existing_cumulative_usage_str = await self.redis_client.get(
-            cumulative_usage_key, user_id
-        )
+        totals_key = self._get_cumulative_usage_totals_key(user_id, conversation_id)
+        legacy_key = self._get_cumulative_usage_key(user_id, conversation_id)
 
-        if existing_cumulative_usage_str:
-            try:
-                cumulative_usage = json.loads(existing_cumulative_usage_str)
-            except json.JSONDecodeError:
-                cumulative_usage = {}
-        else:
-            cumulative_usage = {}
+        increments = []
+        for key, value in (current_usage or {}).items():
+            if _is_usage_counter(value):
+                increments.extend([key, repr(value)])
 
-        if current_usage:
-            for key, value in current_usage.items():
-                if isinstance(value, (int, float)):
-                    cumulative_usage[key] = cumulative_usage.get(key, 0) + value
+        result = await self._cumulative_usage_script(
+            keys=[totals_key, legacy_key], args=increments
+        )
 
-            # Store the updated cumulative usage back to Redis
-            await self.redis_client.set(
-                cumulative_usage_key, json.dumps(cumulative_usage), user_id
+        if result == _USAGE_NEEDS_MIGRATION:
+            await self._migrate_cumulative_usage(user_id, conversation_id)
+            result = await self._cumulative_usage_script(
+                keys=[totals_key, legacy_key], args=increments
             )
 
-        return cumulative_usage
+        return _parse_usage_totals(result)
+
+    async def _migrate_cumulative_usage(
+        self, user_id: str, conversation_id: str
+    ) -> None:
+        """Move a legacy encrypted usage blob into the counter hash."""
+        totals_key = self._get_cumulative_usage_totals_key(user_id, conversation_id)
+        legacy_key = self._get_cumulative_usage_key(user_id, conversation_id)
+
+        legacy_usage_str = await self.redis_client.get(legacy_key, user_id)
+        try:
+            legacy_usage = json.loads(legacy_usage_str) if legacy_usage_str else {}
+        except json.JSONDecodeError:
+            legacy_usage = {}
+
+        counters = {
+            key: repr(value)
+            for key, value in legacy_usage.items()
+            if _is_usage_counter(value)
+        }
+
+        args = []
+        for key, value in counters.items():
+            args.extend([key, value])
+        if not await self._migrate_usage_script(
+            keys=[totals_key, legacy_key], args=args
+        ):
+            return
+
+        logger.info(
+            "Migrated legacy cumulative usage",
+            conversation_id=conversation_id,
+            num_counters=len(counters),
+        )
 
     async def create_share(
         self, user_id: str, conversation_id: str, title: Optional[str] = None
     ) -> str:
         """Create a new share token for a conversation"""
+        self.replicas.note_write(user_id)
         import uuid
         from datetime import datetime
 
@@ -628,11 +1285,13 @@ class RedisStorage:
             "created_at": datetime.utcnow().isoformat(),
         }
 
+        # Freeze the conversation as shared now; the share serves this copy
+        await self._materialize_share(share_token, share_data, SHARE_TTL_SECONDS)
+
         # Store the mapping with dummy user ID for encryption
         await self.redis_client.set(share_key, json.dumps(share_data), "public_shared")
 
         # 30-day expiry for share tokens
-        SHARE_TTL_SECONDS = 30 * 24 * 60 * 60
         await super(type(self.redis_client), self.redis_client).expire(share_key, SHARE_TTL_SECONDS)
 
         # Add to user's shares list for management
@@ -641,30 +1300,69 @@ class RedisStorage:
 
         return share_token
 
-    async def get_shared_conversation(self, share_token: str) -> Optional[dict]:
-        """Get full shared conversation data by reading original user data"""
+    async def get_share_info(
+        self, share_token: str, allow_stale: bool = False
+    ) -> Optional[dict]:
+        """Get the share mapping (owner, conversation, title) for a share token"""
         share_key = self._get_share_key(share_token)
-        share_data = await self.redis_client.get(share_key, "public_shared")
+        if allow_stale:
+            share_data = await self._read_stale_ok(
+                None, lambda client: client.get(share_key, "public_shared")
+            )
+        else:
+            share_data = await self.redis_client.get(share_key, "public_shared")
 
         if not share_data:
             return None
 
-        share_info = json.loads(share_data)
+        return json.loads(share_data)
+
+    async def _materialize_share(
+        self, share_token: str, share_info: dict, ttl: int
+    ) -> ShareSnapshot:
         user_id = share_info["user_id"]
         conversation_id = share_info["conversation_id"]
-
-        # Read the original conversation data directly
         messages = await self.get_messages(user_id, conversation_id)
+        file_ids: Set[str] = set()
+        for message in messages:
+            file_ids.update(referenced_file_ids(message))
+        return await self.share_snapshots.save(
+            share_token, share_info, messages, file_ids, ttl
+        )
 
-        return {
-            "share_token": share_token,
-            "title": share_info["title"],
-            "messages": messages,
-            "created_at": share_info["created_at"],
-        }
+    async def get_share_snapshot(self, share_token: str) -> Optional[ShareSnapshot]:
+        """
+        Get the frozen, ready-to-serve copy of a shared conversation.
+
+        Shares created before snapshots existed are materialized on first
+        access, for the remaining lifetime of their token.
+        """
+        snapshot = await self.share_snapshots.get(share_token)
+        if snapshot is not None:
+            return snapshot
+
+        share_info = await self.get_share_info(share_token)
+        if not share_info:
+            return None
+        ttl = await super(type(self.redis_client), self.redis_client).ttl(
+            self._get_share_key(share_token)
+        )
+        if ttl == -2:
+            return None
+        return await self._materialize_share(
+            share_token, share_info, ttl if ttl > 0 else SHARE_TTL_SECONDS
+        )
+
+    async def get_shared_conversation(self, share_token: str) -> Optional[dict]:
+        """Get the shared conversation as frozen when the share was created"""
+        snapshot = await self.get_share_snapshot(share_token)
+        if snapshot is None:
+            return None
+        return json.loads(snapshot.body)
 
     async def delete_share(self, user_id: str, share_token: str) -> bool:
         """Delete a share, verifying ownership first."""
+        self.replicas.note_write(user_id)
         share_key = self._get_share_key(share_token)
         share_data = await self.redis_client.get(share_key, "public_shared")
 
@@ -679,6 +1377,7 @@ class RedisStorage:
 
         # Delete the share key
         await self.redis_client.delete(share_key)
+        await self.share_snapshots.delete(share_token)
 
         # Remove from user's shares set (sadd stored share_token and user_id as members)
         user_shares_key = self._get_user_shares_key(user_id)
@@ -0,0 +1,193 @@
+"""
+Read routing between the Redis primary and an optional read replica.
+
+Reads that tolerate a little staleness (chat list, history, file list,
+shared conversations, API keys) are sent to the replica while its measured
+replication lag stays within ``REDIS_REPLICA_MAX_LAG_SECONDS``. Everything
+else, and every read by a user who wrote within the last
+``REDIS_READ_YOUR_WRITES_SECONDS`` on this instance, stays on the primary.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+import redis.exceptions
+import structlog
+from agents.storage.redis_service import SecureRedisService
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+HEARTBEAT_KEY_PREFIX = "replica_heartbeat"
+
+# Heartbeat keys of stopped instances expire on their own
+HEARTBEAT_TTL_SECONDS = 60
+
+# Users tracked for read-your-writes; the oldest are dropped beyond this
+MAX_TRACKED_WRITERS = 100_000
+
+# Errors after which the replica is considered unavailable until the next probe
+REPLICA_ERRORS = (
+    redis.exceptions.ConnectionError,
+    redis.exceptions.TimeoutError,
+    redis.exceptions.ReadOnlyError,
+)
+
+_global_replica_router: Optional["ReplicaRouter"] = None
+
+
+class ReplicaRouter:
+    """
+    Decides per read whether a replica may serve it.
+
+    Lag is measured by writing a timestamped heartbeat to the primary every
+    ``probe_interval`` seconds and reading it back from the replica: the
+    replica is as stale as the oldest heartbeat it has not seen yet. Until
+    the first probe succeeds, or after a replica error, all reads go to the
+    primary.
+    """
+
+    def __init__(
+        self,
+        primary: Optional[SecureRedisService] = None,
+        replica: Optional[SecureRedisService] = None,
+        max_lag: Optional[float] = None,
+        read_your_writes: Optional[float] = None,
+        probe_interval: Optional[float] = None,
+    ):
+        self.primary = primary
+        self.replica = replica
+        if primary is not None and replica is not None:
+            # Share the derived per-user keys instead of deriving them twice
+            replica.encryption = primary.encryption
+        self.max_lag = (
+            max_lag
+            if max_lag is not None
+            else float(os.getenv("REDIS_REPLICA_MAX_LAG_SECONDS", "1.0"))
+        )
+        self.read_your_writes = (
+            read_your_writes
+            if read_your_writes is not None
+            else float(os.getenv("REDIS_READ_YOUR_WRITES_SECONDS", "5.0"))
+        )
+        self.probe_interval = (
+            probe_interval
+            if probe_interval is not None
+            else float(os.getenv("REDIS_REPLICA_PROBE_INTERVAL_SECONDS", "1.0"))
+        )
+        self.lag: Optional[float] = None
+        self._heartbeat_key = f"{HEARTBEAT_KEY_PREFIX}:{uuid.uuid4().hex}"
+        self._heartbeats = deque(maxlen=64)
+        self._last_writes: "OrderedDict[str, float]" = OrderedDict()
+        self._metrics = get_metrics_registry()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica is not None and self.primary is not None
+
+    def note_write(self, user_id: str) -> None:
+        """Pin the user's reads to the primary for the read-your-writes window."""
+        if not self.enabled or not user_id:
+            return
+        self._last_writes[user_id] = time.monotonic()
+        self._last_writes.move_to_end(user_id)
+        while len(self._last_writes) > MAX_TRACKED_WRITERS:
+            self._last_writes.popitem(last=False)
+
+    def _wrote_recently(self, user_id: Optional[str]) -> bool:
+        last_write = self._last_writes.get(user_id) if user_id else None
+        if last_write is None:
+            return False
+        if time.monotonic() - last_write <= self.read_your_writes:
+            return True
+        del self._last_writes[user_id]
+        return False
+
+    def replica_for(self, user_id: Optional[str] = None) -> Optional[SecureRedisService]:
+        """The replica if it may serve a stale-tolerant read, else None."""
+        if not self.enabled:
+            return None
+        if self._wrote_recently(user_id):
+            self._metrics.incr("replica.reads_primary.read_your_writes")
+            return None
+        if self.lag is None or self.lag > self.max_lag:
+            self._metrics.incr("replica.reads_primary.lag")
+            return None
+        self._metrics.incr("replica.reads_replica")
+        return self.replica
+
+    def mark_unavailable(self, error: Exception) -> None:
+        """Stop routing to the replica until the next successful probe."""
+        self.lag = None
+        self._metrics.incr("replica.errors")
+        logger.warning("Redis replica read failed, using primary", error=str(error))
+
+    async def probe(self) -> Optional[float]:
+        """Measure the replica's lag behind the primary."""
+        if not self.enabled:
+            return None
+        try:
+            seen = await self.replica.get_plain(self._heartbeat_key)
+            now = time.time()
+            seen = float(seen) if seen else 0.0
+            pending = [written for written in self._heartbeats if written > seen]
+            if pending:
+                lag = now - pending[0]
+            else:
+                # Nothing to compare against before the first heartbeat
+                lag = 0.0 if self._heartbeats else None
+
+            written = time.time()
+            await self.primary.set_plain(
+                self._heartbeat_key, repr(written), ex=HEARTBEAT_TTL_SECONDS
+            )
+            self._heartbeats.append(written)
+        except Exception as e:
+            self.lag = None
+            self._metrics.incr("replica.probe_errors")
+            logger.warning("Redis replica lag probe failed", error=str(e))
+            return None
+
+        self.lag = lag
+        if lag is not None:
+            self._metrics.set_gauge("replica.lag_ms", round(lag * 1000, 2))
+            self._metrics.observe("replica.lag_ms", lag * 1000)
+        return lag
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.probe_interval)
+
+    def start(self) -> None:
+        """Start the periodic lag probe when a replica is configured."""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def get_replica_router() -> ReplicaRouter:
+    """Get the process-wide replica router (primary-only until configured)."""
+    global _global_replica_router
+
+    if _global_replica_router is None:
+        _global_replica_router = ReplicaRouter()
+    return _global_replica_router
+
+
+def set_replica_router(router: ReplicaRouter) -> None:
+    global _global_replica_router
+    _global_replica_router = router
@@ -0,0 +1,202 @@
+"""
+Materialized snapshots of shared conversations.
+
+A share is frozen when it is created: the response body of
+``GET /share/{token}`` and the set of files it may serve are stored once
+under ``share_snapshot:<token>``, next to the share mapping and with the
+same expiry. Reads never touch the owner's conversation again, and each
+process keeps recently served snapshots in memory, already serialized and
+gzipped, so a popular link costs neither Redis round trips nor decryption.
+
+Snapshots are immutable, so their ETag is a hash of the body and responses
+can be cached by browsers and CDNs for ``SHARE_CACHE_MAX_AGE_SECONDS``.
+Deleting a share removes the snapshot; processes notice within
+``SHARE_SNAPSHOT_CACHE_TTL_SECONDS`` when they revalidate the ETag.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from agents.storage.redis_service import SecureRedisService
+from agents.utils.metrics import get_metrics_registry
+
+# Shares are not owned by the reader; encrypted under a fixed pseudo-user
+SHARE_ENCRYPTION_SCOPE = "public_shared"
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class ShareSnapshot:
+    """A serialized shared conversation ready to be served."""
+
+    etag: str
+    body: bytes
+    gzipped: bytes
+    file_ids: FrozenSet[str]
+    user_id: str
+    conversation_id: str
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an ``If-None-Match`` header names either representation."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        return "*" in tags or bool(tags & {self.etag, self.gzip_etag})
+
+    @property
+    def gzip_etag(self) -> str:
+        # Strong validators must differ per content encoding
+        return self.etag[:-1] + '-gz"'
+
+
+def serialize_share(
+    share_token: str, share_info: Dict[str, Any], messages: List[Dict[str, Any]]
+) -> bytes:
+    """Response body of a shared conversation."""
+    return json.dumps(
+        {
+            "share_token": share_token,
+            "title": share_info["title"],
+            "messages": messages,
+            "created_at": share_info["created_at"],
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class ShareSnapshotStore:
+    """Stores share snapshots in Redis and caches them per process."""
+
+    def __init__(
+        self,
+        redis_client: SecureRedisService,
+        max_entries: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+    ):
+        self.redis_client = redis_client
+        self.max_entries = max_entries or int(
+            os.getenv("SHARE_SNAPSHOT_CACHE_ENTRIES", "256")
+        )
+        self.cache_ttl = (
+            cache_ttl
+            if cache_ttl is not None
+            else float(os.getenv("SHARE_SNAPSHOT_CACHE_TTL_SECONDS", "60"))
+        )
+        self._cache: "OrderedDict[str, Tuple[float, ShareSnapshot]]" = OrderedDict()
+        self._metrics = get_metrics_registry()
+
+    @staticmethod
+    def _snapshot_key(share_token: str) -> str:
+        return f"share_snapshot:{share_token}"
+
+    def _remember(self, share_token: str, snapshot: ShareSnapshot) -> None:
+        self._cache[share_token] = (time.monotonic(), snapshot)
+        self._cache.move_to_end(share_token)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def save(
+        self,
+        share_token: str,
+        share_info: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        file_ids: Set[str],
+        ttl: int,
+    ) -> ShareSnapshot:
+        """Freeze a shared conversation and the files it may serve."""
+        body = serialize_share(share_token, share_info, messages)
+        snapshot = ShareSnapshot(
+            etag=_etag(body),
+            body=body,
+            gzipped=gzip.compress(body, mtime=0),
+            file_ids=frozenset(file_ids),
+            user_id=share_info["user_id"],
+            conversation_id=share_info["conversation_id"],
+        )
+        encryption = self.redis_client.encryption
+        owner = json.dumps(
+            {"user_id": snapshot.user_id, "conversation_id": snapshot.conversation_id}
+        )
+        key = self._snapshot_key(share_token)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hset(
+                key,
+                mapping={
+                    "version": SNAPSHOT_FORMAT_VERSION,
+                    "etag": snapshot.etag,
+                    "files": json.dumps(sorted(file_ids)),
+                    "owner": encryption.encrypt(owner, SHARE_ENCRYPTION_SCOPE),
+                    # Compressed as a whole by the encryption layer
+                    "body": encryption.encrypt(body, SHARE_ENCRYPTION_SCOPE),
+                },
+            )
+            pipe.expire(key, ttl)
+            await pipe.execute()
+
+        self._remember(share_token, snapshot)
+        self._metrics.incr("share_snapshot.materialized")
+        self._metrics.observe("share_snapshot.body_bytes", len(body))
+        return snapshot
+
+    async def _read(self, share_token: str) -> Optional[ShareSnapshot]:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._snapshot_key(share_token))
+            (stored,) = await pipe.execute()
+        if not stored or "body" not in stored:
+            return None
+
+        encryption = self.redis_client.encryption
+        body = encryption.decrypt(stored["body"], SHARE_ENCRYPTION_SCOPE)
+        owner = json.loads(encryption.decrypt(stored["owner"], SHARE_ENCRYPTION_SCOPE))
+        return ShareSnapshot(
+            etag=stored["etag"],
+            body=body,
+            gzipped=gzip.compress(body, mtime=0),
+            file_ids=frozenset(json.loads(stored.get("files") or "[]")),
+            user_id=owner["user_id"],
+            conversation_id=owner["conversation_id"],
+        )
+
+    async def _stored_etag(self, share_token: str) -> Optional[str]:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hget(self._snapshot_key(share_token), "etag")
+            (etag,) = await pipe.execute()
+        return etag
+
+    async def get(self, share_token: str) -> Optional[ShareSnapshot]:
+        """The snapshot of a share, or None if it has none (or is gone)."""
+        cached = self._cache.get(share_token)
+        if cached is not None:
+            cached_at, snapshot = cached
+            if time.monotonic() - cached_at < self.cache_ttl:
+                self._cache.move_to_end(share_token)
+                self._metrics.incr("share_snapshot.cache_hits")
+                return snapshot
+            # Snapshots never change; only check the share still exists
+            if await self._stored_etag(share_token) == snapshot.etag:
+                self._remember(share_token, snapshot)
+                self._metrics.incr("share_snapshot.revalidated")
+                return snapshot
+            self._cache.pop(share_token, None)
+
+        self._metrics.incr("share_snapshot.cache_misses")
+        snapshot = await self._read(share_token)
+        if snapshot is not None:
+            self._remember(share_token, snapshot)
+        return snapshot
+
+    async def delete(self, share_token: str) -> None:
+        self._cache.pop(share_token, None)
+        await self.redis_client.delete(self._snapshot_key(share_token))
@@ -0,0 +1,34 @@
+"""
+One-replica-per-interval locks for periodic background sweeps.
+
+Every replica runs the same background loops. A sweep that scans shared
+state (conversation archiving, event compaction, sandbox reaping) only
+needs to run once per interval, so each pass first claims
+``sweep_lock:<name>`` for the length of the interval; replicas that find it
+taken skip that pass. The lock is never released early: it expires, and
+whichever replica wakes up next takes the following pass.
+"""
+
+import os
+import socket
+
+from agents.storage.redis_service import SecureRedisService
+
+# Identifies the holder when inspecting the lock by hand
+REPLICA_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_sweep_lock(
+    redis_client: SecureRedisService, name: str, ttl_seconds: float
+) -> bool:
+    """Claim this interval's pass of a sweep; False if another replica has it."""
+    # Pipelines bypass SecureRedisService's encrypting SET
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(
+            f"sweep_lock:{name}",
+            REPLICA_ID,
+            nx=True,
+            ex=max(int(ttl_seconds), 1),
+        )
+        (acquired,) = await pipe.execute()
+    return bool(acquired)
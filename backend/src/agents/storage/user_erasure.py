@@ -0,0 +1,318 @@
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import structlog
+from agents.storage.conversation_archive import ConversationArchiver
+from agents.storage.keys import user_scope
+from agents.storage.record_cache import RecordCache, get_record_cache
+from agents.storage.redis_service import SecureRedisService
+from agents.utils.metrics import get_metrics_registry
+
+logger = structlog.get_logger(__name__)
+
+# Keys per UNLINK command; UNLINK frees large values in a background thread
+UNLINK_BATCH_SIZE = 500
+
+# Documents fetched per vector index search
+VECTOR_SEARCH_BATCH_SIZE = 1000
+
+# Progress is kept for a day so it can be polled after the erasure finished
+PROGRESS_TTL_SECONDS = 24 * 60 * 60
+
+VECTOR_INDEX_NAME = "rag-index"
+
+_TAG_ESCAPE_RE = re.compile(r"([,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\ ])")
+_GLOB_ESCAPE_RE = re.compile(r"([*?\[\]\\])")
+
+
+def _escape_tag(value: str) -> str:
+    return _TAG_ESCAPE_RE.sub(r"\\\1", value)
+
+
+def _escape_glob(value: str) -> str:
+    return _GLOB_ESCAPE_RE.sub(r"\\\1", value)
+
+
+class UserDataEraser:
+    """
+    Erases every Redis key family owned by a user.
+
+    Keys are enumerated from the user's indexes (chat list, file set, share
+    set, content index) rather than by scanning, and removed with pipelined
+    ``UNLINK`` batches. Only families without an index, connector state,
+    cached query embeddings and LangGraph checkpoints, need a ``SCAN`` pass. Vector chunks are removed by
+    their ``user_id`` tag in the RediSearch index. Progress is written to
+    ``user_erasure:{user_id}`` so large accounts can be followed.
+    """
+
+    def __init__(
+        self,
+        redis_client: SecureRedisService,
+        checkpointer: Optional[Any] = None,
+        archive: Optional[ConversationArchiver] = None,
+    ):
+        self.redis_client = redis_client
+        self.checkpointer = checkpointer
+        self.archive = archive or ConversationArchiver(redis_client)
+        self._metrics = get_metrics_registry()
+
+    @staticmethod
+    def _progress_key(user_id: str) -> str:
+        return f"user_erasure:{user_scope(user_id)}"
+
+    async def get_progress(self, user_id: str) -> Dict[str, str]:
+        """Current erasure progress for a user (empty if none ran recently)."""
+        # Progress fields are plain text; pipelines bypass decryption
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._progress_key(user_id))
+            (progress,) = await pipe.execute()
+        return progress
+
+    async def _report(self, user_id: str, **fields: Any) -> None:
+        progress_key = self._progress_key(user_id)
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.hset(progress_key, mapping={k: str(v) for k, v in fields.items()})
+            pipe.expire(progress_key, PROGRESS_TTL_SECONDS)
+            await pipe.execute()
+
+    async def _unlink(self, keys: Iterable[str]) -> int:
+        """UNLINK keys in pipelined batches; returns the number removed."""
+        keys = list(dict.fromkeys(keys))
+        removed = 0
+        if self.redis_client.is_cluster:
+            # Cluster pipelines reject multi-key commands spanning slots; the
+            # cluster client splits UNLINK per slot itself
+            for start in range(0, len(keys), UNLINK_BATCH_SIZE):
+                removed += await self.redis_client.unlink(
+                    *keys[start : start + UNLINK_BATCH_SIZE]
+                )
+            return removed
+        for start in range(0, len(keys), UNLINK_BATCH_SIZE * 10):
+            window = keys[start : start + UNLINK_BATCH_SIZE * 10]
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for batch_start in range(0, len(window), UNLINK_BATCH_SIZE):
+                    pipe.unlink(*window[batch_start : batch_start + UNLINK_BATCH_SIZE])
+                removed += sum(await pipe.execute())
+        return removed
+
+    async def _invalidate_cached_records(self, keys: Iterable[str]) -> None:
+        record_cache = get_record_cache()
+        for key in keys:
+            if RecordCache.is_cached_key(key):
+                await record_cache.invalidate(key)
+
+    async def _scan(self, pattern: str) -> List[str]:
+        return [
+            key async for key in self.redis_client.scan_iter(match=pattern, count=1000)
+        ]
+
+    async def _conversation_keys(
+        self, user_id: str, conversation_ids: List[str]
+    ) -> List[str]:
+        keys = []
+        for conversation_id in conversation_ids:
+            scope = f"{user_scope(user_id)}:{conversation_id}"
+            keys.extend(
+                [
+                    f"chat_metadata:{scope}",
+                    f"messages:{scope}",
+                    f"message_ids:{scope}",
+                    f"message_compaction:{scope}",
+                    f"cumulative_usage:{scope}",
+                    f"cumulative_usage_totals:{scope}",
+                    f"conversation_files:{scope}",
+                    f"conversation_archive:{scope}",
+                    f"conversation_rehydrated:{scope}",
+                    f"voice_session:{scope}:voice",
+                    f"sandbox_session:{scope}",
+                ]
+            )
+        return keys
+
+    async def _file_keys(self, user_id: str) -> List[str]:
+        file_ids = await self.redis_client.smembers(f"user_files:{user_scope(user_id)}")
+        content_hashes = await self.redis_client.hkeys(f"file_content_index:{user_scope(user_id)}")
+        keys = []
+        for file_id in file_ids:
+            keys.extend(
+                [
+                    f"file_metadata:{user_scope(user_id)}:{file_id}",
+                    f"file_data:{user_scope(user_id)}:{file_id}",
+                    f"file_text:{user_scope(user_id)}:{file_id}",
+                ]
+            )
+        keys.extend(f"file_blob:{user_scope(user_id)}:{content_hash}" for content_hash in content_hashes)
+        keys.extend(
+            [
+                f"user_files:{user_scope(user_id)}",
+                f"file_content_index:{user_scope(user_id)}",
+                f"file_content_refs:{user_scope(user_id)}",
+            ]
+        )
+        return keys
+
+    async def _document_keys(self, user_id: str) -> List[str]:
+        doc_ids = await self.redis_client.smembers(f"user_documents:{user_scope(user_id)}")
+        keys = []
+        for doc_id in doc_ids:
+            keys.extend([f"document:{doc_id}", f"document_chunks:{doc_id}"])
+        keys.append(f"user_documents:{user_scope(user_id)}")
+        return keys
+
+    async def _share_keys(self, user_id: str) -> List[str]:
+        share_tokens = await self.redis_client.smembers(f"user_shares:{user_scope(user_id)}")
+        keys = [
+            key
+            for token in share_tokens
+            if token != user_id
+            for key in (f"share:{token}", f"share_snapshot:{token}")
+        ]
+        keys.append(f"user_shares:{user_scope(user_id)}")
+        return keys
+
+    def _account_keys(self, user_id: str) -> List[str]:
+        return [
+            f"user_chats:{user_scope(user_id)}",
+            f"api_keys:{user_scope(user_id)}",
+            f"llm_config:{user_scope(user_id)}",
+            f"voice_config:{user_scope(user_id)}",
+            f"export:{user_scope(user_id)}:latest",
+            f"export_meta:{user_scope(user_id)}:latest",
+            f"sandbox_sessions:{user_scope(user_id)}",
+        ]
+
+    async def _erase_vectors(self, user_id: str) -> int:
+        """Remove the user's chunks from the vector index by tag filter."""
+        from redis.commands.search.query import Query
+
+        query = (
+            Query(f"@user_id:{{{_escape_tag(user_id)}}}")
+            .no_content()
+            .paging(0, VECTOR_SEARCH_BATCH_SIZE)
+        )
+        removed = 0
+        while True:
+            try:
+                result = await self.redis_client.ft(VECTOR_INDEX_NAME).search(query)
+            except Exception as e:
+                # No index means nothing was ever ingested
+                message = str(e).lower()
+                if "no such index" in message or "unknown index" in message:
+                    return removed
+                raise
+            doc_ids = [doc.id for doc in result.docs]
+            if not doc_ids:
+                return removed
+            unlinked = await self._unlink(doc_ids)
+            if not unlinked:
+                # Index entries without documents; nothing left to remove
+                return removed
+            removed += unlinked
+
+    async def _erase_checkpoints(self, conversation_ids: Set[str]) -> int:
+        """Remove LangGraph checkpoints of the user's conversations."""
+        if not conversation_ids:
+            return 0
+
+        delete_thread = getattr(self.checkpointer, "adelete_thread", None)
+        if delete_thread is not None:
+            for conversation_id in conversation_ids:
+                await delete_thread(conversation_id)
+            return len(conversation_ids)
+
+        # Checkpoint keys are "<family>:<thread_id>:..." with the conversation
+        # ID as thread ID; one pass over all checkpoint families
+        keys = []
+        async for key in self.redis_client.scan_iter(match="checkpoint*", count=1000):
+            parts = key.split(":", 2)
+            if len(parts) > 1 and parts[1] in conversation_ids:
+                keys.append(key)
+        return await self._unlink(keys)
+
+    async def erase(self, user_id: str) -> Dict[str, int]:
+        """
+        Erase all data owned by a user.
+
+        Returns the number of removed keys per family.
+        """
+        start = time.perf_counter()
+        summary: Dict[str, int] = {}
+
+        conversation_ids = await self.redis_client.zrange(f"user_chats:{user_scope(user_id)}", 0, -1)
+        await self._report(
+            user_id,
+            status="running",
+            phase="conversations",
+            conversations=len(conversation_ids),
+            started_at=time.time(),
+        )
+
+        phases = [
+            ("conversations", lambda: self._conversation_keys(user_id, conversation_ids)),
+            ("files", lambda: self._file_keys(user_id)),
+            ("documents", lambda: self._document_keys(user_id)),
+            ("shares", lambda: self._share_keys(user_id)),
+            (
+                "connectors",
+                lambda: self._scan(f"user:{_escape_glob(user_scope(user_id))}:*"),
+            ),
+            (
+                "query_embeddings",
+                lambda: self._scan(
+                    f"query_embedding:{_escape_glob(user_scope(user_id))}:*"
+                ),
+            ),
+        ]
+
+        try:
+            deleted = 0
+            for phase, collect in phases:
+                await self._report(user_id, phase=phase)
+                keys = await collect()
+                summary[phase] = await self._unlink(keys)
+                await self._invalidate_cached_records(keys)
+                deleted += summary[phase]
+                await self._report(user_id, deleted_keys=deleted)
+
+            await self._report(user_id, phase="archive")
+            for conversation_id in conversation_ids:
+                await self.archive.blob_store.delete(
+                    self.archive._segment_key(user_id, conversation_id)
+                )
+
+            await self._report(user_id, phase="vectors")
+            summary["vectors"] = await self._erase_vectors(user_id)
+
+            await self._report(user_id, phase="checkpoints")
+            summary["checkpoints"] = await self._erase_checkpoints(set(conversation_ids))
+
+            # Account-level keys go last so a failed run can be retried
+            # from the chat list
+            await self._report(user_id, phase="account")
+            account_keys = self._account_keys(user_id)
+            summary["account"] = await self._unlink(account_keys)
+            await self._invalidate_cached_records(account_keys)
+        except Exception as e:
+            self._metrics.incr("user_erasure.errors")
+            await self._report(user_id, status="failed", error=str(e))
+            raise
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        self._metrics.incr("user_erasure.completed")
+        self._metrics.observe("user_erasure.duration_ms", duration_ms)
+        self._metrics.observe("user_erasure.keys_removed", sum(summary.values()))
+        await self._report(
+            user_id,
+            status="completed",
+            phase="done",
+            duration_ms=round(duration_ms, 2),
+            **{f"removed_{k}": v for k, v in summary.items()},
+        )
+        logger.info(
+            "Erased user data",
+            conversation_count=len(conversation_ids),
+            duration_ms=round(duration_ms, 2),
+            **summary,
+        )
+        return summary
@@ -7,6 +7,7 @@ from typing import Dict, Optional
 
 import structlog
 from agents.storage.redis_service import SecureRedisService
+from agents.storage.keys import user_scope
 
 logger = structlog.get_logger(__name__)
 
@@ -24,6 +25,14 @@ class VoiceSessionStorage:
         self.redis_client = redis_client
         self.session_timeout = timedelta(minutes=30)
 
+    @staticmethod
+    def _session_key(session_id: str, user_id: str) -> str:
+        """Redis key of a session; session IDs start with the owning user ID."""
+        prefix = f"{user_id}:"
+        if session_id.startswith(prefix):
+            return f"voice_session:{user_scope(user_id)}:{session_id[len(prefix):]}"
+        return f"voice_session:{session_id}"
+
     async def create_session(
         self,
         user_id: str,
@@ -56,7 +65,7 @@ class VoiceSessionStorage:
                 "last_notification_time": None,
             }
 
-            session_key = f"voice_session:{session_id}"
+            session_key = self._session_key(session_id, user_id)
             await self.redis_client.set(
                 session_key,
                 json.dumps(session_data),
@@ -93,7 +102,7 @@ class VoiceSessionStorage:
             Session data dict, or None if not found
         """
         try:
-            session_key = f"voice_session:{session_id}"
+            session_key = self._session_key(session_id, user_id)
             session_data = await self.redis_client.get(session_key, user_id)
 
             if session_data:
@@ -136,7 +145,7 @@ class VoiceSessionStorage:
             session_data["last_active"] = datetime.now(timezone.utc).isoformat()
 
             # Save back to Redis
-            session_key = f"voice_session:{session_id}"
+            session_key = self._session_key(session_id, user_id)
             await self.redis_client.set(
                 session_key,
                 json.dumps(session_data),
@@ -236,7 +245,7 @@ class VoiceSessionStorage:
         """
         try:
             # Search for all voice sessions for this user
-            pattern = f"voice_session:{user_id}:*:voice"
+            pattern = f"voice_session:{user_scope(user_id)}:*:voice"
             keys = await self.redis_client.scan_keys(pattern)
 
             sessions = []
@@ -5,20 +5,23 @@ import time
 import uuid
 from enum import Enum
 from functools import lru_cache
-from typing import Annotated, List, Literal, Sequence, Tuple, Union
+from typing import Annotated, List, Literal, Optional, Sequence, Tuple, Union
 
 import redis
 import structlog
-from agents.rag.upload import RedisHybridRetriever, create_user_vector_store
+from agents.components.datagen.tools.sandbox_pool import (
+    DaytonaSandboxBackend,
+    SandboxPool,
+    get_sandbox_pool,
+)
+from agents.rag.upload import create_user_vector_store
+from agents.rag.vector_backends import get_vector_backend
 from agents.storage.redis_storage import RedisStorage
 from agents.utils.code_validator import (
     patch_plot_code_str,
     strip_markdown_code_blocks,
     validate_and_fix_html_content,
 )
-from daytona_sdk import AsyncDaytona as DaytonaClient
-from daytona_sdk import CreateSandboxFromSnapshotParams
-from daytona_sdk import DaytonaConfig as DaytonaSDKConfig
 from langchain.tools.retriever import create_retriever_tool
 from langchain_community.agent_toolkits.connery import ConneryToolkit
 from langchain_community.retrievers.kay import KayAiRetriever
@@ -35,7 +38,6 @@ from langchain_community.utilities.dalle_image_generator import DallEAPIWrapper
 from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
 from langchain_core.tools import Tool
 from pydantic import BaseModel, ConfigDict, Field
-from redisvl.query.filter import Tag
 from typing_extensions import TypedDict
 
 logger = structlog.get_logger(__name__)
@@ -284,16 +286,7 @@ def _get_retrieval_tool(
     """
 
     vector_store = create_user_vector_store(api_key, redis_client)
-
-    user_filter = Tag("user_id") == user_id
-    doc_filter = Tag("document_id") == list(doc_ids)
-    filter_expr = user_filter & doc_filter
-
-    retriever = RedisHybridRetriever(
-        search_index=vector_store._index,
-        embedding_model=vector_store._embeddings,
-        filter_expr=filter_expr,
-    )
+    retriever = get_vector_backend().retriever(vector_store, user_id, doc_ids)
 
     def retrieval_search(query: str) -> str:
         """Search uploaded documents for the given query."""
@@ -301,16 +294,28 @@ def _get_retrieval_tool(
         if not query or not query.strip():
             return "Please provide a valid search query to search the uploaded documents."
         
-        docs = retriever.get_relevant_documents(query.strip())
+        docs = retriever.invoke(query.strip())
         if not docs:
             return "No relevant information found in the uploaded documents."
 
         # Return the documents directly
         return docs
 
+    async def aretrieval_search(query: str) -> str:
+        """Search uploaded documents without blocking the event loop."""
+        if not query or not query.strip():
+            return "Please provide a valid search query to search the uploaded documents."
+
+        docs = await retriever.ainvoke(query.strip())
+        if not docs:
+            return "No relevant information found in the uploaded documents."
+
+        return docs
+
     return Tool(
         name="Retriever",
         func=retrieval_search,
+        coroutine=aretrieval_search,
         description=description,
         args_schema=DDGInput,  # Reuse the same schema as DDG since it's just a query string
     )
@@ -496,285 +501,295 @@ def _get_daytona(user_id: str, redis_storage: RedisStorage):
     ]
     images_formats = ["image/png", "image/jpg", "image/jpeg", "image/gif", "image/svg"]
 
-    async def async_run_daytona_code(code_to_run: str) -> str:
-        try:
-            config = DaytonaSDKConfig(api_key=api_key)
-            daytona = DaytonaClient(config)
-
-            daytona_snapshot = os.getenv("DAYTONA_SNAPSHOT")
+    async def run_in_sandbox(
+        sandbox, code_to_run: str, patched_code: str, expected_filenames
+    ) -> str:
+        """Run code in a leased sandbox and collect the files it creates."""
+        list_of_files = [f.name for f in await sandbox.fs.list_files(".")]
 
-            params = CreateSandboxFromSnapshotParams(
-                snapshot=daytona_snapshot,
+        # Execute the code with timeout and error handling
+        try:
+            response = await sandbox.process.code_run(patched_code)
+        except Exception as exec_error:
+            logger.error(
+                "Code execution failed in sandbox",
+                error=str(exec_error),
+                exc_info=True,
             )
+            return f"Error during code execution: {str(exec_error)}"
 
-            # Strip markdown formatting before processing
-            clean_code = strip_markdown_code_blocks(code_to_run)
+        # Ensure result is a string, even if None or other types
+        result_str = str(response.result) if response.result is not None else ""
 
-            # Validate the cleaned code
-            if not clean_code or len(clean_code.strip()) < 3:
-                return "Error: No valid code found after processing input. Please provide valid Python code."
-
-            # Enhanced logging for debugging
-            logger.info(
-                "Processing code for execution",
-                original_length=len(code_to_run),
-                cleaned_length=len(clean_code),
-                first_100_chars=clean_code[:100],
+        if response.exit_code != 0:
+            # Ensure error detail is a string
+            error_detail = result_str
+            logger.error(
+                "Daytona code execution failed",
+                exit_code=response.exit_code,
+                error_detail=error_detail,
+                original_code_preview=code_to_run[:200],
             )
+            return f"Error (Exit Code {response.exit_code}): {error_detail}"
+
+        # Debug: Check what we got from the response
+        logger.info(
+            "Daytona response",
+            exit_code=response.exit_code,
+            result_preview=str(response.result)[:500],
+            artifacts=response.artifacts,
+        )
 
-            patched_code, expected_filenames = patch_plot_code_str(clean_code)
-            sandbox = await daytona.create(params=params)
-            list_of_files = [f.name for f in await sandbox.fs.list_files(".")]
+        generation_timestamp = time.time()
 
-            # Execute the code with timeout and error handling
+        # Process expected filenames first
+        for filename in expected_filenames:
+            mime_type, _ = mimetypes.guess_type(filename)
             try:
-                response = await sandbox.process.code_run(patched_code)
-            except Exception as exec_error:
-                await daytona.close()
-                logger.error(
-                    "Code execution failed in sandbox",
-                    error=str(exec_error),
-                    exc_info=True,
+                file_id = str(uuid.uuid4())
+                content = await sandbox.fs.download_file(filename)
+                logger.info(
+                    "Downloaded file from sandbox",
+                    filename=filename,
+                    size_bytes=len(content),
                 )
-                return f"Error during code execution: {str(exec_error)}"
 
-            # Ensure result is a string, even if None or other types
-            result_str = str(response.result) if response.result is not None else ""
+                # Store in Redis for backup/download purposes
+                if redis_storage:
+                    await redis_storage.put_file(
+                        user_id,
+                        file_id,
+                        data=content,
+                        filename=filename,
+                        format=mime_type,
+                        upload_timestamp=generation_timestamp,
+                        indexed=False,
+                        source="daytona",
+                    )
 
-            if response.exit_code != 0:
-                # Ensure error detail is a string
-                await daytona.close()
-                error_detail = result_str
+                # For image files, use compact Redis references instead of data URLs
+                if mime_type in images_formats:
+                    result_str += (
+                        f"\n\n![{filename}](redis-chart:{file_id}:{user_id})"
+                    )
+                else:
+                    # For non-image files, still use attachment reference
+                    result_str += f"\n\n![{filename}](attachment:{file_id})"
+            except Exception as e:
                 logger.error(
-                    "Daytona code execution failed",
-                    exit_code=response.exit_code,
-                    error_detail=error_detail,
-                    original_code_preview=code_to_run[:200],
+                    "Error downloading file from sandbox",
+                    filename=filename,
+                    error=str(e),
+                    exc_info=True,
                 )
-                return f"Error (Exit Code {response.exit_code}): {error_detail}"
-
-            # Debug: Check what we got from the response
-            logger.info(
-                "Daytona response",
-                exit_code=response.exit_code,
-                result_preview=str(response.result)[:500],
-                artifacts=response.artifacts,
-            )
 
-            generation_timestamp = time.time()
+        # Download all new files with enhanced HTML handling
+        list_of_files_after_execution = await sandbox.fs.list_files(".")
+        for file in list_of_files_after_execution:
+            mime_type, _ = mimetypes.guess_type(file.name)
+
+            # Markdown files are text/markdown
+            if mime_type is None:
+                if file.name.lower().endswith(".md"):
+                    mime_type = "text/markdown"
+                elif file.name.lower().endswith((".pptx", ".ppt")):
+                    # Fallback for PowerPoint files when system mimetypes are missing
+                    mime_type = (
+                        "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+                        if file.name.lower().endswith(".pptx")
+                        else "application/vnd.ms-powerpoint"
+                    )
+                elif file.name.lower().endswith(".pdf"):
+                    mime_type = "application/pdf"
+                elif file.name.lower().endswith((".docx", ".doc")):
+                    mime_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
 
-            # Process expected filenames first
-            for filename in expected_filenames:
-                mime_type, _ = mimetypes.guess_type(filename)
+            if file.name not in list_of_files and mime_type in supported_extensions:
+                file_id = str(uuid.uuid4())
                 try:
-                    file_id = str(uuid.uuid4())
-                    content = await sandbox.fs.download_file(filename)
+                    content = await sandbox.fs.download_file(file.name)
                     logger.info(
                         "Downloaded file from sandbox",
-                        filename=filename,
+                        filename=file.name,
                         size_bytes=len(content),
+                        mime_type=mime_type,
                     )
 
+                    if mime_type == "text/html":
+                        # Try to validate and fix HTML content
+                        try:
+                            content_str = (
+                                content.decode("utf-8")
+                                if isinstance(content, bytes)
+                                else str(content)
+                            )
+
+                            # Validate and potentially fix the HTML content
+                            fixed_content = validate_and_fix_html_content(
+                                content_str, file.name
+                            )
+
+                            # If content was modified, update the stored file
+                            if fixed_content != content_str:
+                                logger.info(
+                                    f"HTML content was enhanced for {file.name}"
+                                )
+                                content = (
+                                    fixed_content.encode("utf-8")
+                                    if isinstance(fixed_content, str)
+                                    else fixed_content
+                                )
+
+                            if not (
+                                "<html" in fixed_content.lower()
+                                or "<body" in fixed_content.lower()
+                            ):
+                                result_str += f"\n\n**Note**: {file.name} may not contain complete HTML structure"
+
+                        except Exception as html_check_error:
+                            logger.warning(
+                                f"Could not validate HTML content: {html_check_error}"
+                            )
+                    else:
+                        # For non-image files, still use attachment reference
+                        result_str += f"\n\n![{file.name}](attachment:{file_id})"
+
                     # Store in Redis for backup/download purposes
                     if redis_storage:
                         await redis_storage.put_file(
                             user_id,
                             file_id,
                             data=content,
-                            filename=filename,
+                            filename=file.name,
                             format=mime_type,
                             upload_timestamp=generation_timestamp,
                             indexed=False,
                             source="daytona",
                         )
-
-                    # For image files, use compact Redis references instead of data URLs
-                    if mime_type in images_formats:
-                        result_str += (
-                            f"\n\n![{filename}](redis-chart:{file_id}:{user_id})"
-                        )
-                    else:
-                        # For non-image files, still use attachment reference
-                        result_str += f"\n\n![{filename}](attachment:{file_id})"
                 except Exception as e:
                     logger.error(
                         "Error downloading file from sandbox",
-                        filename=filename,
+                        filename=file.name,
                         error=str(e),
                         exc_info=True,
                     )
 
-            # Download all new files with enhanced HTML handling
-            list_of_files_after_execution = await sandbox.fs.list_files(".")
-            for file in list_of_files_after_execution:
-                mime_type, _ = mimetypes.guess_type(file.name)
-
-                # Markdown files are text/markdown
-                if mime_type is None:
-                    if file.name.lower().endswith(".md"):
-                        mime_type = "text/markdown"
-                    elif file.name.lower().endswith((".pptx", ".ppt")):
-                        # Fallback for PowerPoint files when system mimetypes are missing
-                        mime_type = (
-                            "application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                            if file.name.lower().endswith(".pptx")
-                            else "application/vnd.ms-powerpoint"
-                        )
-                    elif file.name.lower().endswith(".pdf"):
-                        mime_type = "application/pdf"
-                    elif file.name.lower().endswith((".docx", ".doc")):
-                        mime_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-
-                if file.name not in list_of_files and mime_type in supported_extensions:
-                    file_id = str(uuid.uuid4())
-                    try:
-                        content = await sandbox.fs.download_file(file.name)
-                        logger.info(
-                            "Downloaded file from sandbox",
-                            filename=file.name,
-                            size_bytes=len(content),
-                            mime_type=mime_type,
-                        )
-
-                        if mime_type == "text/html":
-                            # Try to validate and fix HTML content
-                            try:
-                                content_str = (
-                                    content.decode("utf-8")
-                                    if isinstance(content, bytes)
-                                    else str(content)
-                                )
-
-                                # Validate and potentially fix the HTML content
-                                fixed_content = validate_and_fix_html_content(
-                                    content_str, file.name
-                                )
+        # Process charts from artifacts
+        if hasattr(response.artifacts, "charts") and response.artifacts.charts:
+            logger.info(
+                "Processing charts from artifacts",
+                num_charts=len(response.artifacts.charts),
+            )
+            for i, chart in enumerate(response.artifacts.charts):
+                image_id = str(uuid.uuid4())
+                title = chart.title or f"Chart {i+1}"
+                try:
+                    if chart.png:
+                        # Chart.png should be base64 string, convert to bytes for storage
+                        import base64
 
-                                # If content was modified, update the stored file
-                                if fixed_content != content_str:
-                                    logger.info(
-                                        f"HTML content was enhanced for {file.name}"
-                                    )
-                                    content = (
-                                        fixed_content.encode("utf-8")
-                                        if isinstance(fixed_content, str)
-                                        else fixed_content
-                                    )
-
-                                if not (
-                                    "<html" in fixed_content.lower()
-                                    or "<body" in fixed_content.lower()
-                                ):
-                                    result_str += f"\n\n**Note**: {file.name} may not contain complete HTML structure"
-
-                            except Exception as html_check_error:
-                                logger.warning(
-                                    f"Could not validate HTML content: {html_check_error}"
-                                )
-                        else:
-                            # For non-image files, still use attachment reference
-                            result_str += f"\n\n![{file.name}](attachment:{file_id})"
+                        chart_data = base64.b64decode(chart.png)
 
                         # Store in Redis for backup/download purposes
                         if redis_storage:
                             await redis_storage.put_file(
                                 user_id,
-                                file_id,
-                                data=content,
-                                filename=file.name,
-                                format=mime_type,
+                                image_id,
+                                data=chart_data,
+                                filename=title,
+                                format="png",
                                 upload_timestamp=generation_timestamp,
                                 indexed=False,
                                 source="daytona",
                             )
-                    except Exception as e:
-                        logger.error(
-                            "Error downloading file from sandbox",
-                            filename=file.name,
-                            error=str(e),
-                            exc_info=True,
-                        )
 
-            # Process charts from artifacts
-            if hasattr(response.artifacts, "charts") and response.artifacts.charts:
-                logger.info(
-                    "Processing charts from artifacts",
-                    num_charts=len(response.artifacts.charts),
-                )
-                for i, chart in enumerate(response.artifacts.charts):
-                    image_id = str(uuid.uuid4())
-                    title = chart.title or f"Chart {i+1}"
-                    try:
-                        if chart.png:
-                            # Chart.png should be base64 string, convert to bytes for storage
-                            import base64
-
-                            chart_data = base64.b64decode(chart.png)
-
-                            # Store in Redis for backup/download purposes
-                            if redis_storage:
-                                await redis_storage.put_file(
-                                    user_id,
-                                    image_id,
-                                    data=chart_data,
-                                    filename=title,
-                                    format="png",
-                                    upload_timestamp=generation_timestamp,
-                                    indexed=False,
-                                    source="daytona",
-                                )
-
-                            # Use compact Redis reference instead of data URL to save context
-                            result_str += (
-                                f"\n\n![{title}](redis-chart:{image_id}:{user_id})"
-                            )
-                            logger.info(
-                                "Successfully stored chart",
-                                chart_index=i,
-                                chart_title=title,
-                                image_id=image_id,
-                            )
-                        else:
-                            logger.info("Chart has no PNG data", chart_index=i)
-                            result_str += f"\n\n**Chart Generated:** {title}"
-                    except Exception as e:
-                        logger.error(
-                            "Error storing chart",
+                        # Use compact Redis reference instead of data URL to save context
+                        result_str += (
+                            f"\n\n![{title}](redis-chart:{image_id}:{user_id})"
+                        )
+                        logger.info(
+                            "Successfully stored chart",
                             chart_index=i,
-                            error=str(e),
-                            exc_info=True,
+                            chart_title=title,
+                            image_id=image_id,
                         )
-                        # Fallback to generic message
+                    else:
+                        logger.info("Chart has no PNG data", chart_index=i)
                         result_str += f"\n\n**Chart Generated:** {title}"
-            else:
-                logger.info("No charts found in response artifacts")
-
-            # Clean up sandbox after processing everything
-            await daytona.close()
-
-            # Final validation and enhancement of result
-            if not result_str.strip():
-                result_str = "Code executed successfully. Check the console output above for any results."
-
-            # Add execution summary
-            files_created = len(
-                [
-                    f
-                    for f in list_of_files_after_execution
-                    if f.name not in list_of_files
-                ]
+                except Exception as e:
+                    logger.error(
+                        "Error storing chart",
+                        chart_index=i,
+                        error=str(e),
+                        exc_info=True,
+                    )
+                    # Fallback to generic message
+                    result_str += f"\n\n**Chart Generated:** {title}"
+        else:
+            logger.info("No charts found in response artifacts")
+
+
+        # Final validation and enhancement of result
+        if not result_str.strip():
+            result_str = "Code executed successfully. Check the console output above for any results."
+
+        # Add execution summary
+        files_created = len(
+            [
+                f
+                for f in list_of_files_after_execution
+                if f.name not in list_of_files
+            ]
+        )
+        if files_created > 0:
+            result_str += f"\n\n**Execution Summary**: {files_created} file(s) created successfully."
+
+        return result_str
+
+    async def async_run_daytona_code(
+        code_to_run: str, pool: Optional[SandboxPool] = None
+    ) -> str:
+        try:
+            daytona_snapshot = os.getenv("DAYTONA_SNAPSHOT")
+
+            # Strip markdown formatting before processing
+            clean_code = strip_markdown_code_blocks(code_to_run)
+
+            # Validate the cleaned code
+            if not clean_code or len(clean_code.strip()) < 3:
+                return "Error: No valid code found after processing input. Please provide valid Python code."
+
+            # Enhanced logging for debugging
+            logger.info(
+                "Processing code for execution",
+                original_length=len(code_to_run),
+                cleaned_length=len(clean_code),
+                first_100_chars=clean_code[:100],
             )
-            if files_created > 0:
-                result_str += f"\n\n**Execution Summary**: {files_created} file(s) created successfully."
 
-            return result_str
+            patched_code, expected_filenames = patch_plot_code_str(clean_code)
+            # A pre-warmed sandbox, scrubbed and returned to the pool afterwards
+            async with (pool or get_sandbox_pool()).lease(
+                daytona_snapshot, user_id
+            ) as sandbox:
+                return await run_in_sandbox(
+                    sandbox, code_to_run, patched_code, expected_filenames
+                )
 
         except Exception as e:
             logger.info("Daytona code execution failed", error=str(e), exc_info=True)
             return f"Error during Daytona code execution: {str(e)}"
 
     def sync_run_daytona_code_wrapper(code_to_run: str) -> str:
-        return asyncio.run(async_run_daytona_code(code_to_run))
+        async def run() -> str:
+            # Pooled sandboxes belong to the server's event loop, not this one
+            pool = SandboxPool(DaytonaSandboxBackend(api_key), snapshots=[], min_idle=0)
+            try:
+                return await async_run_daytona_code(code_to_run, pool)
+            finally:
+                await pool.stop()
+
+        return asyncio.run(run())
 
     def missing_api_key_tool_sync(code: str) -> str:
         return "Daytona tool is not configured: DAYTONA_API_KEY environment variable is not set."
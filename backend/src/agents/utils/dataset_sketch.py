@@ -0,0 +1,193 @@
+"""
+Compact sketches of tabular uploads for chat context.
+
+A sketch describes a table in a few hundred tokens however large it is:
+row and column counts, and per column its dtype, missing values, distinct
+count, numeric stats and quantiles or top values, plus a small sample of
+rows stratified by a low-cardinality column. Sketches are computed once
+at upload (see ``agents.storage.file_text_cache``) and rendered into the
+prompt instead of raw rows.
+"""
+
+import io
+import warnings
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+TOP_VALUES = 5
+SAMPLE_ROWS = 8
+# Stratify the sample by a column with at most this many distinct values
+MAX_STRATA = 12
+MAX_VALUE_CHARS = 40
+
+
+def _short(value: Any) -> str:
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[: MAX_VALUE_CHARS - 3] + "..."
+
+
+def _number(value: float) -> Any:
+    if pd.isna(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else float(f"{value:.6g}")
+
+
+def _parse_dates(series: pd.Series) -> pd.Series:
+    """Text columns whose values all look like dates, e.g. from a CSV, as datetimes."""
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return series
+    head = series.dropna().head(100)
+    if head.empty or not head.astype(str).str.contains(r"\d[-/.]\d").all():
+        return series
+    with warnings.catch_warnings():
+        # Format inference warnings; unparseable values are checked below
+        warnings.simplefilter("ignore")
+        parsed = pd.to_datetime(series, errors="coerce")
+    return parsed if parsed.notna().sum() == series.notna().sum() else series
+
+
+def _column_sketch(series: pd.Series) -> Dict[str, Any]:
+    series = _parse_dates(series)
+    values = series.dropna()
+    column = {
+        "name": _short(series.name),
+        "dtype": str(series.dtype),
+        "missing": int(series.isna().sum()),
+        "distinct": int(values.nunique()),
+    }
+    if values.empty:
+        return column
+
+    if pd.api.types.is_bool_dtype(series):
+        column["top"] = _top_values(values)
+    elif pd.api.types.is_numeric_dtype(series):
+        quantiles = values.quantile(list(QUANTILES))
+        column.update(
+            min=_number(values.min()),
+            max=_number(values.max()),
+            mean=_number(values.mean()),
+            std=_number(values.std()) if len(values) > 1 else 0,
+            quantiles={f"p{int(q * 100)}": _number(quantiles[q]) for q in QUANTILES},
+        )
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        column.update(min=str(values.min()), max=str(values.max()))
+    else:
+        column["top"] = _top_values(values)
+        lengths = values.astype(str).str.len()
+        column["mean_length"] = _number(lengths.mean())
+    return column
+
+
+def _top_values(values: pd.Series) -> List[List[Any]]:
+    counts = values.astype(str).value_counts().head(TOP_VALUES)
+    return [[_short(value), int(count)] for value, count in counts.items()]
+
+
+def _strata_column(df: pd.DataFrame) -> Optional[str]:
+    """The categorical column with the most (but few) distinct values."""
+    best, best_distinct = None, 1
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            continue
+        distinct = series.nunique(dropna=True)
+        if best_distinct < distinct <= MAX_STRATA:
+            best, best_distinct = name, distinct
+    return best
+
+
+def _sample(df: pd.DataFrame, rows: int) -> Dict[str, Any]:
+    if len(df) <= rows:
+        return {"by": None, "rows": df}
+    column = _strata_column(df)
+    if column is None:
+        # Evenly spaced rows, first and last included
+        positions = sorted({round(i * (len(df) - 1) / (rows - 1)) for i in range(rows)})
+        return {"by": None, "rows": df.iloc[positions]}
+
+    groups = df.groupby(column, dropna=False, sort=False)
+    sizes = groups.size().sort_values(ascending=False)
+    # One row per stratum, the rest in proportion to stratum size
+    quota = {key: 1 for key in sizes.index[:rows]}
+    for key, size in sizes.items():
+        if key in quota:
+            quota[key] += int((rows - len(quota)) * size / len(df))
+    picked = [
+        group.iloc[
+            sorted({round(i * (len(group) - 1) / max(quota[key] - 1, 1)) for i in range(quota[key])})
+        ]
+        for key, group in groups
+        if key in quota
+    ]
+    return {"by": _short(column), "rows": pd.concat(picked).sort_index()}
+
+
+def sketch_table(df: pd.DataFrame, name: Optional[str] = None) -> Dict[str, Any]:
+    """Sketch one table (a CSV file or a spreadsheet sheet)."""
+    sample = _sample(df, SAMPLE_ROWS)
+    return {
+        "name": name,
+        "rows": len(df),
+        "columns": [_column_sketch(df[column]) for column in df.columns],
+        "sample_by": sample["by"],
+        "sample": ""
+        if df.empty
+        else sample["rows"]
+        .astype(str)
+        .map(_short)
+        .to_csv(index=False)
+        .strip(),
+    }
+
+
+def sketch_csv(text: str) -> List[Dict[str, Any]]:
+    return [sketch_table(pd.read_csv(io.StringIO(text)))]
+
+
+def sketch_sheets(sheets: Dict[str, Optional[pd.DataFrame]]) -> List[Dict[str, Any]]:
+    """Sketch the sheets parsed by ``agents.utils.file_text.read_xlsx_sheets``."""
+    return [sketch_table(df, name) for name, df in sheets.items() if df is not None]
+
+
+def _describe_column(column: Dict[str, Any], rows: int) -> str:
+    parts = [column["dtype"]]
+    if column["missing"]:
+        parts.append(f"{column['missing'] / max(rows, 1):.1%} missing")
+    parts.append(f"{column['distinct']:,} distinct")
+    line = f"- {column['name']} ({', '.join(parts)})"
+
+    if "quantiles" in column:
+        quantiles = ", ".join(f"{q} {v}" for q, v in column["quantiles"].items())
+        line += (
+            f": min {column['min']}, {quantiles}, max {column['max']}; "
+            f"mean {column['mean']}, std {column['std']}"
+        )
+    elif "min" in column:
+        line += f": {column['min']} to {column['max']}"
+    elif column.get("top") and column["top"][0][1] == 1:
+        # Identifiers and free text: frequencies say nothing
+        line += f": e.g. {', '.join(value for value, _ in column['top'][:3])}"
+    elif column.get("top"):
+        top = ", ".join(f"{value} ({count:,})" for value, count in column["top"])
+        line += f": top {top}"
+    return line
+
+
+def render_sketch(tables: List[Dict[str, Any]], filename: str) -> str:
+    """Prompt text for the sketches of a file's tables."""
+    lines = [f"Dataset sketch of '{filename}' (computed over all rows)"]
+    for table in tables:
+        lines.append("")
+        title = f"Sheet {table['name']}" if table["name"] else "Table"
+        lines.append(
+            f"{title}: {table['rows']:,} rows x {len(table['columns'])} columns"
+        )
+        lines.extend(_describe_column(column, table["rows"]) for column in table["columns"])
+        if table["sample"]:
+            by = f", stratified by {table['sample_by']}" if table["sample_by"] else ""
+            lines.append(f"Sample rows{by}:")
+            lines.append(table["sample"])
+    return "\n".join(lines)
@@ -0,0 +1,176 @@
+"""
+Text extraction of uploaded files for chat context.
+
+PDFs are extracted with pdfplumber, with tables inlined as HTML; XLSX
+sheets are parsed once with pandas and rendered as text.
+These functions are CPU-bound and meant to run on a worker thread.
+"""
+
+import os
+import tempfile
+from typing import TYPE_CHECKING, Dict, Optional
+
+import pdfplumber  # Unified PDF parsing with inline tables
+import structlog
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = structlog.get_logger(__name__)
+
+
+def extract_pdf_bytes(file_data: bytes) -> str:
+    """Extract the text of a PDF held in memory."""
+    # Create a temporary file to write the PDF data
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        temp_file.write(file_data)
+        temp_path = temp_file.name
+
+    try:
+        return extract_pdf_text(temp_path)
+    finally:
+        # Clean up the temporary file
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+
+def extract_pdf_text(file_path: str) -> str:
+    """Unified PDF extraction using pdfplumber with inline table formatting."""
+    text = ""
+
+    try:
+        with pdfplumber.open(file_path) as pdf:
+            for page_num, page in enumerate(pdf.pages):
+                text += f"--- Page {page_num + 1} ---\n"
+
+                # Extract tables from this page
+                tables = page.extract_tables()
+
+                if tables:
+                    # Extract regular text first
+                    page_text = page.extract_text()
+                    if page_text:
+                        text += page_text + "\n\n"
+
+                    # Add clean HTML tables inline for better LLM parsing
+                    for table_idx, table in enumerate(tables):
+                        if table and len(table) > 1:  # Valid table with data
+                            # Convert table to DataFrame for clean HTML output
+                            import pandas as pd
+
+                            # Use first row as headers if it looks like headers
+                            headers = table[0] if table[0] else [f"Column_{i}" for i in range(len(table[0]) if table[0] else 0)]
+                            data_rows = table[1:] if len(table) > 1 else []
+
+                            if data_rows:
+                                # Clean headers and data
+                                clean_headers = []
+                                for i, h in enumerate(headers):
+                                    if h and str(h).strip():
+                                        clean_headers.append(str(h).strip())
+                                    else:
+                                        clean_headers.append(f"Column_{i}")
+
+                                # Create DataFrame with proper data cleaning
+                                clean_data = []
+                                for row in data_rows:
+                                    clean_row = []
+                                    for cell in row:
+                                        if cell:
+                                            cell_text = str(cell).strip().replace('\n', ' ').replace('\r', ' ')
+                                            cell_text = cell_text.replace('  ', ' ').strip()
+                                            clean_row.append(cell_text)
+                                        else:
+                                            clean_row.append("")
+                                    clean_data.append(clean_row)
+
+                                # Ensure data rows match header length
+                                max_cols = len(clean_headers)
+                                for row in clean_data:
+                                    while len(row) < max_cols:
+                                        row.append("")
+                                    if len(row) > max_cols:
+                                        row = row[:max_cols]
+
+                                df = pd.DataFrame(clean_data, columns=clean_headers)
+
+                                # Remove completely empty rows and columns
+                                df = df.dropna(how='all').dropna(axis=1, how='all')
+
+                                if not df.empty:
+                                    # Convert to clean HTML
+                                    html_table = df.to_html(
+                                        index=False,
+                                        na_rep='',
+                                        classes="extracted-table",
+                                        escape=False,
+                                        border=1
+                                    )
+
+                                    text += f"\n[TABLE {table_idx+1} - Page {page_num+1}]\n"
+                                    text += html_table + "\n"
+                                    text += f"[END TABLE {table_idx+1}]\n\n"
+
+                else:
+                    # No tables, just extract text
+                    page_text = page.extract_text()
+                    if page_text:
+                        text += page_text + "\n\n"
+
+    except Exception as e:
+        logger.error(f"Error in pdfplumber extraction: {str(e)}")
+        # Fallback to basic text extraction
+        try:
+            with pdfplumber.open(file_path) as pdf:
+                for page_num, page in enumerate(pdf.pages):
+                    page_text = page.extract_text()
+                    if page_text:
+                        text += f"--- Page {page_num + 1} ---\n{page_text}\n\n"
+        except Exception as fallback_error:
+            logger.error(f"Fallback extraction failed: {str(fallback_error)}")
+            raise
+
+    return text.strip()
+
+
+def read_xlsx_sheets(file_data: bytes) -> Dict[str, Optional["pd.DataFrame"]]:
+    """Parse every sheet of an XLSX file once; unreadable sheets map to None."""
+    import pandas as pd
+    from io import BytesIO
+
+    try:
+        # Create BytesIO object from file data - no temp file needed
+        xlsx_file = pd.ExcelFile(BytesIO(file_data))
+    except Exception as e:
+        logger.error(f"Error in XLSX extraction: {str(e)}")
+        raise
+
+    sheets = {}
+    for sheet_name in xlsx_file.sheet_names:
+        try:
+            sheets[str(sheet_name)] = xlsx_file.parse(sheet_name)
+        except Exception as sheet_error:
+            logger.warning(f"Could not read sheet '{sheet_name}': {str(sheet_error)}")
+            sheets[str(sheet_name)] = None
+    return sheets
+
+
+def render_xlsx_sheets(sheets: Dict[str, Optional["pd.DataFrame"]]) -> str:
+    """Complete text of parsed sheets, as included in chat context."""
+    content = ""
+    for sheet_name, df in sheets.items():
+        content += f"--- Sheet: {sheet_name} ---\n"
+        if df is None:
+            content += f"Could not read sheet '{sheet_name}'\n\n"
+        elif not df.empty:
+            # Provide complete sheet content for comprehensive analysis
+            sheet_content = df.to_string(index=False, max_rows=None, max_cols=None)
+            content += f"{sheet_content}\n\n"
+        else:
+            content += "Empty sheet\n\n"
+    return content.strip()
+
+
+def extract_xlsx_content(file_data: bytes) -> str:
+    """Synchronous XLSX extraction using pandas directly from bytes."""
+    return render_xlsx_sheets(read_xlsx_sheets(file_data))
@@ -0,0 +1,126 @@
+"""
+Lightweight in-process metrics registry.
+
+Collects counters, gauges and latency/size summaries for the storage and
+retrieval layers so they can be inspected through the ``/metrics`` endpoint
+without pulling in an external metrics client.
+"""
+
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+# Number of most recent observations kept per summary for percentiles
+SUMMARY_WINDOW = 1024
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_key(key: MetricKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class _Summary:
+    """Running count/sum/min/max plus a sliding window for percentiles."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.window: Deque[float] = deque(maxlen=SUMMARY_WINDOW)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.window.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.window:
+            return None
+        ordered = sorted(self.window)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and summaries."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = defaultdict(float)
+        self._gauges: Dict[MetricKey, float] = {}
+        self._summaries: Dict[MetricKey, _Summary] = {}
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Increment a counter."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Set a gauge to an absolute value."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record an observation (latency, size, ...) in a summary."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = _Summary()
+            summary.observe(value)
+
+    def get_counter(self, name: str, **labels: Any) -> float:
+        """Read the current value of a counter."""
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a JSON-serialisable view of all metrics."""
+        with self._lock:
+            return {
+                "counters": {_format_key(k): v for k, v in self._counters.items()},
+                "gauges": {_format_key(k): v for k, v in self._gauges.items()},
+                "summaries": {
+                    _format_key(k): s.to_dict() for k, s in self._summaries.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """Drop all recorded metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+_global_metrics_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get the process-wide metrics registry."""
+    return _global_metrics_registry
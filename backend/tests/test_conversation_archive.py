@@ -0,0 +1,37 @@
+import os
+import unittest
+from unittest import mock
+
+from agents.storage.conversation_archive import ConversationArchiver, LocalBlobStore
+
+
+class _ScriptRedis:
+    def register_script(self, script):
+        return None
+
+
+class TestConversationArchiver(unittest.TestCase):
+    def test_refuses_local_store_with_several_replicas(self):
+        archiver = ConversationArchiver(
+            _ScriptRedis(),
+            blob_store=LocalBlobStore("/tmp/archive"),
+            archive_after_days=30,
+            interval=60,
+        )
+        with mock.patch.dict(os.environ, {"BACKEND_REPLICAS": "4"}):
+            with self.assertRaises(ValueError):
+                archiver.start()
+
+    def test_disabled_by_default(self):
+        with mock.patch.dict(os.environ, {"BACKEND_REPLICAS": "4"}):
+            os.environ.pop("CONVERSATION_ARCHIVE_AFTER_DAYS", None)
+            archiver = ConversationArchiver(
+                _ScriptRedis(), blob_store=LocalBlobStore("/tmp/archive")
+            )
+            archiver.start()
+        self.assertEqual(archiver.archive_after_days, 0)
+        self.assertIsNone(archiver._task)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+import pandas as pd
+from agents.utils.dataset_sketch import render_sketch, sketch_csv, sketch_table
+
+
+class TestDatasetSketch(unittest.TestCase):
+    def test_column_stats(self):
+        rows = [f"2024-01-{day:02d},{'ab'[day % 2]},{day}" for day in range(1, 31)]
+        (table,) = sketch_csv("date,group,value\n" + "\n".join(rows) + "\n,a,\n")
+        date, group, value = table["columns"]
+
+        self.assertEqual(table["rows"], 31)
+        self.assertTrue(date["dtype"].startswith("datetime64"))
+        self.assertEqual(date["min"], "2024-01-01 00:00:00")
+        self.assertEqual(group["top"], [["a", 16], ["b", 15]])
+        self.assertEqual(value["missing"], 1)
+        self.assertEqual((value["min"], value["max"]), (1, 30))
+        self.assertEqual(value["quantiles"]["p50"], 15.5)
+
+    def test_sample_covers_every_stratum(self):
+        df = pd.DataFrame(
+            {"kind": ["common"] * 990 + ["rare"] * 10, "value": range(1000)}
+        )
+        table = sketch_table(df)
+        self.assertEqual(table["sample_by"], "kind")
+        sample = table["sample"].splitlines()[1:]
+        self.assertLessEqual(len(sample), 8)
+        self.assertIn("rare", {line.split(",")[0] for line in sample})
+
+    def test_render_is_compact(self):
+        df = pd.DataFrame(
+            {"id": [f"row-{i}" for i in range(50000)], "amount": range(50000)}
+        )
+        text = render_sketch([sketch_table(df, "Sheet1")], "big.xlsx")
+        self.assertIn("Sheet Sheet1: 50,000 rows x 2 columns", text)
+        self.assertIn("- id (", text)
+        self.assertLess(len(text), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
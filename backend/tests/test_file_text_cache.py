@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+
+from agents.storage.file_text_cache import FileTextCache
+
+
+class _PlainEncryption:
+    def encrypt(self, value, user_id):
+        return value
+
+
+class _DictRedis:
+    """Values stored unencrypted; files exist unless listed as deleted."""
+
+    def __init__(self):
+        self.values = {}
+        self.deleted_files = set()
+        self.encryption = _PlainEncryption()
+
+    def register_script(self, script):
+        async def put(keys, args):
+            if keys[1] in self.deleted_files:
+                return 0
+            self.values[keys[0]] = args[0]
+            return 1
+
+        return put
+
+    async def get(self, key, user_id):
+        return self.values.get(key)
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+
+class _Storage:
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+
+    async def get_file(self, user_id, file_id):
+        self.reads += 1
+        return self.data, {}
+
+
+class TestFileTextCache(unittest.TestCase):
+    def test_extracts_once_per_content(self):
+        cache = FileTextCache(_DictRedis())
+        storage = _Storage(b"a,b\n1,2\n")
+        metadata = {"format": "text/csv", "content_hash": "h1"}
+
+        async def run():
+            first = await cache.get_or_extract(storage, "u", "f", metadata)
+            again = await cache.get_or_extract(storage, "u", "f", metadata)
+            changed = await cache.get_or_extract(
+                storage, "u", "f", {**metadata, "content_hash": "h2"}
+            )
+            return first, again, changed
+
+        first, again, changed = asyncio.run(run())
+        self.assertEqual(first["text"], "a,b\n1,2\n")
+        self.assertEqual(again, first)
+        self.assertEqual(changed["content_hash"], "h2")
+        self.assertEqual(storage.reads, 2)
+
+    def test_sketches_large_csv(self):
+        cache = FileTextCache(_DictRedis())
+        cache.inline_table_chars = 100
+        small = b"a,b\n1,2\n"
+        large = b"a,b\n" + b"".join(b"%d,x\n" % i for i in range(100))
+
+        async def run():
+            return (
+                await cache.extract(small, "text/csv", None),
+                await cache.extract(large, "text/csv", None),
+            )
+
+        small_entry, large_entry = asyncio.run(run())
+        self.assertNotIn("sketch", small_entry)
+        self.assertEqual(large_entry["sketch"][0]["rows"], 100)
+
+    def test_records_undecodable_text(self):
+        cache = FileTextCache(_DictRedis())
+
+        async def run():
+            await cache.populate("u", "f", b"\xff\xfe", "text/plain", None)
+            return await cache.get("u", "f", None)
+
+        entry = asyncio.run(run())
+        self.assertTrue(entry["binary"])
+        self.assertIsNone(entry["text"])
+
+    def test_does_not_recreate_entries_of_deleted_files(self):
+        redis_client = _DictRedis()
+        cache = FileTextCache(redis_client)
+        redis_client.deleted_files.add(cache._metadata_key("u", "f"))
+
+        entry = asyncio.run(cache.populate("u", "f", b"text", "text/plain", None))
+        self.assertEqual(entry["text"], "text")
+        self.assertEqual(redis_client.values, {})
+
+    def test_skips_formats_without_text(self):
+        cache = FileTextCache(_DictRedis())
+        entry = asyncio.run(cache.populate("u", "f", b"\x89PNG", "image/png", None))
+        self.assertIsNone(entry)
+        self.assertEqual(cache.redis_client.values, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
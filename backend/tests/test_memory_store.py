@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from agents.rag.memory_store import InMemoryHybridRetriever, NumpyVectorStore
+from langchain_core.embeddings import Embeddings
+
+VOCABULARY = ["revenue", "margin", "churn", "hiring", "pricing", "supply"]
+
+
+class _WordEmbeddings(Embeddings):
+    """One dimension per vocabulary word."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        words = text.lower().split()
+        return [float(words.count(word)) + 0.01 for word in VOCABULARY]
+
+
+class TestNumpyVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.store = NumpyVectorStore(_WordEmbeddings(), initial_capacity=2)
+        self.store.add_texts(
+            ["revenue revenue margin", "churn hiring", "pricing supply", "revenue"],
+            metadatas=[
+                {"user_id": "u1", "document_id": "a"},
+                {"user_id": "u1", "document_id": "a"},
+                {"user_id": "u1", "document_id": "b"},
+                {"user_id": "u2", "document_id": "a"},
+            ],
+        )
+
+    def test_grows_and_finds_nearest(self):
+        self.assertEqual(len(self.store), 4)
+        docs = self.store.similarity_search("revenue", k=2)
+        self.assertEqual(
+            [doc.page_content for doc in docs], ["revenue", "revenue revenue margin"]
+        )
+
+    def test_retriever_filters_by_user_and_document(self):
+        retriever = InMemoryHybridRetriever(
+            store=self.store,
+            embedding_model=self.store.embeddings,
+            user_id="u1",
+            document_ids=("a",),
+            k=5,
+        )
+        docs = asyncio.run(retriever.ainvoke("revenue"))
+        self.assertEqual(
+            [doc.page_content for doc in docs], ["revenue revenue margin", "churn hiring"]
+        )
+
+    def test_keyword_matches_break_vector_ties(self):
+        store = NumpyVectorStore(_WordEmbeddings())
+        store.add_embeddings(
+            ["quarterly outlook", "outlook for hiring"],
+            [[1.0, 0.0], [1.0, 0.0]],
+            [{"user_id": "u"}, {"user_id": "u"}],
+        )
+        docs = store.hybrid_search("hiring outlook", [1.0, 0.0], k=2, user_id="u")
+        self.assertEqual(docs[0].page_content, "outlook for hiring")
+
+
+if __name__ == "__main__":
+    unittest.main()
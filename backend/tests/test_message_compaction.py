@@ -0,0 +1,65 @@
+import json
+import unittest
+
+from agents.storage.message_compaction import compact_messages
+
+
+def _think(message_id, text, agent_name="Research Agent"):
+    return {
+        "event": "think",
+        "data": json.dumps(
+            {"agent_name": agent_name, "text": text, "metadata": {"task": "research"}}
+        ),
+        "user_id": "user-1",
+        "conversation_id": "conv-1",
+        "message_id": message_id,
+    }
+
+
+class TestMessageCompaction(unittest.TestCase):
+    def test_compacts_completed_run(self):
+        messages = [
+            {"event": "stream_start", "message_id": "run-1"},
+            {"event": "stream_start", "message_id": "run-1"},
+            _think("run-1", "step one"),
+            _think("run-1", "step one"),
+            _think("run-1", "step two"),
+            {
+                "event": "agent_completion",
+                "message_id": "run-1",
+                "id": "tracking",
+                "content": "",
+                "additional_kwargs": {"agent_type": "crewai_llm_call"},
+            },
+            {"event": "agent_completion", "message_id": "run-1", "id": "a", "content": "x"},
+            {"event": "agent_completion", "message_id": "run-1", "id": "a", "content": "x"},
+            {"event": "stream_complete", "message_id": "run-1", "final": False},
+            {"event": "stream_complete", "message_id": "run-1", "final": True},
+        ]
+
+        compacted = compact_messages(messages)
+
+        self.assertEqual(
+            [m["event"] for m in compacted],
+            ["stream_start", "think", "think", "agent_completion", "stream_complete"],
+        )
+        self.assertTrue(compacted[-1]["final"])
+        self.assertEqual(compacted[1]["user_id"], "user-1")
+        self.assertEqual(compacted[1]["conversation_id"], "conv-1")
+
+    def test_leaves_running_runs_untouched(self):
+        messages = [
+            {"event": "stream_start", "message_id": "run-1"},
+            {"event": "stream_complete", "message_id": "run-1"},
+            {"event": "stream_start", "message_id": "run-2"},
+            _think("run-2", "step one"),
+            _think("run-2", "step one"),
+        ]
+
+        compacted = compact_messages(messages)
+
+        self.assertEqual(compacted, messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+
+from agents.components.datagen.tools.persistent_daytona import PersistentDaytonaManager
+from agents.components.datagen.tools.sandbox_pool import FakeSandboxBackend, SandboxPool
+
+SNAPSHOT = "data-analysis:test"
+
+
+class _Storage:
+    def __init__(self, files):
+        self.files = files
+        self.reads = []
+
+    async def get_file_metadata(self, user_id, file_id):
+        data, filename = self.files[file_id]
+        return {"filename": filename, "content_hash": f"hash-{data.decode()}"}
+
+    async def get_file(self, user_id, file_id):
+        self.reads.append(file_id)
+        data, _ = self.files[file_id]
+        return data, await self.get_file_metadata(user_id, file_id)
+
+
+def _manager(backend, redis_storage=None, **kwargs):
+    pool = SandboxPool(backend, snapshots=[], min_idle=0)
+    return PersistentDaytonaManager(
+        user_id="u1",
+        redis_storage=redis_storage,
+        snapshot=SNAPSHOT,
+        sandbox_pool=pool,
+        **kwargs,
+    )
+
+
+class TestInputUpload(unittest.TestCase):
+    def test_skips_files_already_in_sandbox(self):
+        storage = _Storage({"f1": (b"a", "sales.csv"), "f2": (b"b", "costs.csv")})
+        manager = _manager(FakeSandboxBackend(), storage, file_ids=["f1"])
+
+        async def run():
+            sandbox = await manager._get_sandbox()
+            # The next message attaches another file to the held sandbox
+            manager.add_file_ids(["f2"])
+            await manager._upload_files(manager._file_ids)
+            return sorted(sandbox.fs.files)
+
+        self.assertEqual(asyncio.run(run()), ["costs.csv", "sales.csv"])
+        self.assertEqual(storage.reads, ["f1", "f2"])
+
+    def test_reuploads_files_changed_in_sandbox(self):
+        storage = _Storage({"f1": (b"a", "sales.csv"), "f2": (b"b", "costs.csv")})
+        manager = _manager(FakeSandboxBackend(), storage, file_ids=["f1", "f2"])
+
+        async def run():
+            sandbox = await manager._get_sandbox()
+            # Code from the last run overwrote one input and deleted the other
+            await sandbox.fs.upload_file(b"edited", "sales.csv")
+            del sandbox.fs.files["costs.csv"]
+            await manager._upload_files(manager._file_ids)
+            return {path: data for path, (data, _) in sandbox.fs.files.items()}
+
+        self.assertEqual(asyncio.run(run()), {"sales.csv": b"a", "costs.csv": b"b"})
+        self.assertEqual(storage.reads, ["f1", "f2", "f1", "f2"])
+
+    def test_lazy_upload_materializes_referenced_files(self):
+        storage = _Storage({"f1": (b"a", "sales.csv"), "f2": (b"b", "costs.csv")})
+        manager = _manager(
+            FakeSandboxBackend(), storage, file_ids=["f1", "f2"], lazy_uploads=True
+        )
+
+        async def run():
+            sandbox = await manager._get_sandbox()
+            before = sorted(sandbox.fs.files)
+            await manager.materialize_files("pd.read_csv('sales.csv')")
+            return before, sorted(sandbox.fs.files)
+
+        before, after = asyncio.run(run())
+        self.assertEqual(before, [])
+        self.assertEqual(after, ["sales.csv"])
+        self.assertEqual(storage.reads, ["f1"])
+
+
+class TestArtifactHarvest(unittest.TestCase):
+    def test_harvests_created_and_modified_files_in_subdirectories(self):
+        manager = _manager(FakeSandboxBackend())
+        stored = {}
+
+        async def store(path, content):
+            stored[path] = content
+            return len(content)
+
+        async def run():
+            sandbox = await manager._get_sandbox()
+            await sandbox.fs.upload_file(b"a,b\n", "data.csv")
+            await sandbox.fs.upload_file(b"old", "out/report.md")
+            await sandbox.fs.upload_file(b"same", "out/notes.txt")
+            before = await manager.snapshot_files()
+
+            await sandbox.fs.upload_file(b"new report", "out/report.md")
+            await sandbox.fs.upload_file(b"png", "out/charts/plot.png")
+            await sandbox.fs.upload_file(b"x", "scratch.tmp")
+            harvested = await manager.harvest_files(
+                before, store, include=lambda path: not path.endswith(".tmp")
+            )
+            await manager.cleanup()
+            return before, harvested
+
+        before, harvested = asyncio.run(run())
+        self.assertEqual(sorted(before), ["data.csv", "out/notes.txt", "out/report.md"])
+        self.assertEqual(harvested, {"out/charts/plot.png": 3, "out/report.md": 10})
+        self.assertEqual(set(stored), set(harvested))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import unittest
+
+from agents.rag.query_cache import QueryEmbeddingCache, normalize_query
+from agents.storage.encryption_service import EncryptionService
+
+
+class _DictRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+def _cache(model_name, redis_client, encryption):
+    return QueryEmbeddingCache(model_name, redis_client=redis_client, encryption=encryption)
+
+
+class _CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    async def aembed(self, text):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [0.5, -1.25, float(len(text))]
+
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    def test_normalizes_whitespace_and_unicode(self):
+        self.assertEqual(
+            normalize_query("  revenue\n in\tＱ3 "), normalize_query("revenue in Q3")
+        )
+
+    def test_replicas_share_vectors_through_redis(self):
+        redis_client = _DictRedis()
+        encryption = EncryptionService()
+        model = _CountingModel()
+
+        async def run():
+            first = _cache("model", redis_client, encryption)
+            second = _cache("model", redis_client, encryption)
+            vector = await first.aget_or_embed("revenue in Q3", model.aembed, "u1")
+            again = await second.aget_or_embed(" revenue  in Q3", model.aembed, "u1")
+            return vector, again
+
+        vector, again = asyncio.run(run())
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(vector, [0.5, -1.25, 13.0])
+        self.assertEqual(again, vector)
+
+    def test_models_do_not_share_entries(self):
+        redis_client = _DictRedis()
+        encryption = EncryptionService()
+        model = _CountingModel()
+
+        async def run():
+            await _cache("a", redis_client, encryption).aget_or_embed("q", model.aembed, "u1")
+            await _cache("b", redis_client, encryption).aget_or_embed("q", model.aembed, "u1")
+
+        asyncio.run(run())
+        self.assertEqual(model.calls, 2)
+
+    def test_users_do_not_share_entries(self):
+        redis_client = _DictRedis()
+        cache = _cache("model", redis_client, EncryptionService())
+        model = _CountingModel()
+
+        async def run():
+            await cache.aget_or_embed("revenue in Q3", model.aembed, "u1")
+            await cache.aget_or_embed("revenue in Q3", model.aembed, "u2")
+
+        asyncio.run(run())
+        self.assertEqual(model.calls, 2)
+        self.assertEqual(
+            sorted(key.split(":")[1] for key in redis_client.values), ["u1", "u2"]
+        )
+        # Keys are keyed hashes, not a plain hash of the query
+        plain = hashlib.sha256(b"revenue in Q3").hexdigest()[:32]
+        self.assertFalse(any(key.endswith(plain) for key in redis_client.values))
+
+    def test_concurrent_misses_embed_once(self):
+        model = _CountingModel()
+        cache = _cache("model", _DictRedis(), EncryptionService())
+
+        async def run():
+            return await asyncio.gather(
+                *(cache.aget_or_embed("same query", model.aembed, "u1") for _ in range(5))
+            )
+
+        vectors = asyncio.run(run())
+        self.assertEqual(model.calls, 1)
+        self.assertTrue(all(vector == vectors[0] for vector in vectors))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from agents.storage.key_migration import target_key
+from agents.storage.keys import split_user_key, user_key
+
+
+class TestRedisKeys(unittest.TestCase):
+    def test_split_user_key_under_both_schemes(self):
+        self.assertEqual(
+            split_user_key("messages:auth0|u1:conv-1"), ("messages", "auth0|u1", "conv-1")
+        )
+        self.assertEqual(
+            split_user_key("messages:{auth0|u1}:conv-1"),
+            ("messages", "auth0|u1", "conv-1"),
+        )
+        self.assertEqual(split_user_key("api_keys:{auth0|u1}"), ("api_keys", "auth0|u1", ""))
+
+    def test_user_key_round_trip(self):
+        self.assertEqual(
+            user_key("user", "u1", "connector:google:token", scheme="hashtag"),
+            "user:{u1}:connector:google:token",
+        )
+        self.assertEqual(user_key("api_keys", "u1", scheme="legacy"), "api_keys:u1")
+
+    def test_target_key(self):
+        self.assertEqual(
+            target_key("chat_metadata:u1:conv-1", "hashtag"), "chat_metadata:{u1}:conv-1"
+        )
+        self.assertEqual(target_key("user_chats:{u1}", "legacy"), "user_chats:u1")
+        # Keys addressed by their own IDs are left alone
+        self.assertIsNone(target_key("share:token-1", "hashtag"))
+        self.assertIsNone(target_key("document:doc-1", "hashtag"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from agents.components.datagen.tools.sandbox_pool import FakeSandboxBackend, SandboxPool
+
+SNAPSHOT = "data-analysis:test"
+
+
+def _pool(backend, **kwargs):
+    settings = dict(
+        snapshots=[SNAPSHOT], min_idle=1, max_size=3, idle_ttl=600, health_interval=60
+    )
+    settings.update(kwargs)
+    return SandboxPool(backend, **settings)
+
+
+class TestSandboxPool(unittest.TestCase):
+    def test_leases_warm_sandbox_and_scrubs_on_release(self):
+        backend = FakeSandboxBackend()
+        pool = _pool(backend)
+
+        async def run():
+            await pool.maintain(SNAPSHOT)
+            pool.start()
+            async with pool.lease(SNAPSHOT, "u1") as first:
+                await first.fs.upload_file(b"secret", "data.csv")
+            async with pool.lease(SNAPSHOT, "u1") as second:
+                files = await second.fs.list_files(".")
+            await pool.stop()
+            return first, second, files
+
+        first, second, files = asyncio.run(run())
+        self.assertIs(first, second)
+        self.assertEqual(files, [])
+        self.assertEqual(backend.created, 1)
+        self.assertEqual(backend.deleted, 1)
+
+    def test_waits_for_release_at_max_size(self):
+        backend = FakeSandboxBackend()
+        pool = _pool(backend, min_idle=0, max_size=1)
+
+        async def run():
+            pool.start()
+            held = await pool.acquire(SNAPSHOT, "u1")
+            waiter = asyncio.create_task(pool.acquire(SNAPSHOT, "u1"))
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiter.done())
+            await pool.release(SNAPSHOT, held, user_id="u1")
+            got = await asyncio.wait_for(waiter, 1)
+            await pool.stop()
+            return held, got
+
+        held, got = asyncio.run(run())
+        self.assertIs(held, got)
+        self.assertEqual(backend.created, 1)
+
+    def test_used_sandboxes_are_not_leased_to_other_users(self):
+        backend = FakeSandboxBackend()
+        pool = _pool(backend, min_idle=0, max_size=1)
+
+        async def run():
+            pool.start()
+            async with pool.lease(SNAPSHOT, "u1") as first:
+                pass
+            # The pool is full with u1's idle sandbox, so it is replaced
+            async with pool.lease(SNAPSHOT, "u2") as second:
+                pass
+            await pool.stop()
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertIsNot(first, second)
+        self.assertEqual(first.state, "destroyed")
+        self.assertEqual(backend.created, 2)
+
+    def test_replaces_unhealthy_and_scales_with_demand(self):
+        backend = FakeSandboxBackend()
+        pool = _pool(backend, health_interval=0)
+
+        async def run():
+            await pool.maintain(SNAPSHOT)
+            (entry,) = pool._pool(SNAPSHOT).idle
+            entry.sandbox.healthy = False
+            await pool.maintain(SNAPSHOT)
+            # The second lease is a cold start, raising the target to two idle
+            leased = [await pool.acquire(SNAPSHOT), await pool.acquire(SNAPSHOT)]
+            await pool.maintain(SNAPSHOT)
+            for sandbox in leased:
+                await pool.release(SNAPSHOT, sandbox, recycle=True)
+            await pool.maintain(SNAPSHOT)
+            return entry.sandbox, pool.stats()[SNAPSHOT]
+
+        unhealthy, stats = asyncio.run(run())
+        self.assertEqual(unhealthy.state, "destroyed")
+        self.assertEqual(stats, {"idle": 2, "leased": 0, "creating": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
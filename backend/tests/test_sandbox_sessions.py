@@ -0,0 +1,161 @@
+import asyncio
+import time
+import unittest
+
+from agents.components.datagen.tools import sandbox_sessions
+from agents.components.datagen.tools.sandbox_pool import FakeSandboxBackend, SandboxPool
+from agents.components.datagen.tools.sandbox_sessions import SandboxSessions
+
+SNAPSHOT = "data-analysis:test"
+
+
+class _Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*a, **kw) for name, a, kw in self.calls]
+
+
+class _DictRedis:
+    """Hashes and sorted sets, with the sessions' scripts run in Python."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def register_script(self, script):
+        run = self._bind if script == sandbox_sessions._BIND_LUA else self._unbind
+
+        async def call(keys, args):
+            return run(keys, [str(arg) for arg in args])
+
+        return call
+
+    def _bind(self, keys, args):
+        session = self.hashes.setdefault(keys[0], {})
+        if "sandbox_id" not in session:
+            session.update(sandbox_id=args[0], snapshot=args[1], last_used=args[2])
+            self.zsets.setdefault(keys[1], {})[args[3]] = float(args[2])
+        return session["sandbox_id"]
+
+    def _unbind(self, keys, args):
+        session = self.hashes.get(keys[0], {})
+        if session.get("sandbox_id") == args[0]:
+            if float(session.get("last_used", 0)) > float(args[1]):
+                return 0
+            self.hashes.pop(keys[0])
+            self.zsets.get(keys[1], {}).pop(args[2], None)
+        return 1
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        session = self.hashes.setdefault(key, {})
+        if field is not None:
+            session[field] = str(value)
+        session.update(mapping or {})
+
+    async def zadd(self, key, mapping, xx=False):
+        zset = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            if not xx or member in zset:
+                zset[member] = score
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zrange(self, key, start, end):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        return [member for member, _ in members][start : end + 1]
+
+    async def zrangebyscore(self, key, low, high):
+        return [
+            member
+            for member, score in sorted(self.zsets.get(key, {}).items(), key=lambda i: i[1])
+            if score <= float(high)
+        ]
+
+
+def _sessions(redis_client, backend, **kwargs):
+    pool = SandboxPool(backend, snapshots=[], min_idle=0)
+    settings = dict(idle_ttl=600, max_per_user=3, reap_interval=60)
+    settings.update(kwargs)
+    return SandboxSessions(redis_client, pool, **settings)
+
+
+class TestSandboxSessions(unittest.TestCase):
+    def test_reattaches_with_uploaded_files(self):
+        backend = FakeSandboxBackend()
+        redis_client = _DictRedis()
+
+        async def run():
+            sessions = _sessions(redis_client, backend)
+            first, uploaded = await sessions.attach("u1", "conv-1", SNAPSHOT)
+            await sessions.mark_uploaded("u1", "conv-1", {"data.csv": "hash-1"})
+            # Another replica picks up the next message
+            other = _sessions(redis_client, backend)
+            second, reuploaded = await other.attach("u1", "conv-1", SNAPSHOT)
+            return first, uploaded, second, reuploaded
+
+        first, uploaded, second, reuploaded = asyncio.run(run())
+        self.assertIs(first, second)
+        self.assertEqual(uploaded, {})
+        self.assertEqual(reuploaded, {"data.csv": "hash-1"})
+        self.assertEqual(backend.created, 1)
+        self.assertEqual(backend.deleted, 0)
+
+    def test_reaps_idle_sessions_and_caps_per_user(self):
+        backend = FakeSandboxBackend()
+        redis_client = _DictRedis()
+
+        async def run():
+            sessions = _sessions(redis_client, backend, max_per_user=2)
+            await sessions.attach("u1", "conv-1", SNAPSHOT)
+            await sessions.attach("u1", "conv-2", SNAPSHOT)
+            # A third conversation evicts the least recently used one
+            await sessions.attach("u1", "conv-3", SNAPSHOT)
+            evicted = dict(redis_client.zsets[sessions._user_key("u1")])
+
+            # conv-2 idled past the TTL, conv-3 is still in use
+            await redis_client.zadd(
+                sandbox_sessions.IDLE_INDEX_KEY,
+                {
+                    member: time.time() - 3600
+                    for member in redis_client.zsets[sandbox_sessions.IDLE_INDEX_KEY]
+                    if '"conv-2"' in member
+                },
+            )
+            await redis_client.hset(
+                sessions._session_key("u1", "conv-2"), "last_used", time.time() - 3600
+            )
+            reaped = await sessions.reap()
+            return evicted, reaped, await sessions._session("u1", "conv-3")
+
+        evicted, reaped, remaining = asyncio.run(run())
+        self.assertEqual(sorted(evicted), ["conv-2", "conv-3"])
+        self.assertEqual(reaped, 1)
+        self.assertIn("sandbox_id", remaining)
+        self.assertEqual(backend.created, 3)
+        self.assertEqual(backend.deleted, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from agents.rag.vector_index import ChunkLayout, VectorIndexSettings
+
+
+class TestVectorIndexLayout(unittest.TestCase):
+    def test_default_settings_keep_current_vector_layout(self):
+        schema = VectorIndexSettings().schema(8)
+        layout = ChunkLayout.from_schema(schema)
+        self.assertEqual(layout, ChunkLayout(datatype="float32", store_text=True))
+        record = layout.record(
+            "chunk", [0.5] * 8, {"user_id": "u", "document_id": "d", "page": 3}
+        )
+        self.assertEqual(set(record), {"embedding", "text", "user_id", "document_id"})
+        self.assertEqual(len(record["embedding"]), 32)
+
+    def test_compact_layout_compresses_text(self):
+        settings = VectorIndexSettings(
+            algorithm="hnsw", datatype="float16", store_text=False
+        )
+        layout = ChunkLayout.from_schema(settings.schema(8))
+        record = layout.record("revenue in Q3 — €", np.ones(8), {"user_id": "u"})
+        self.assertNotIn("text", record)
+        self.assertEqual(len(record["embedding"]), 16)
+        self.assertEqual(ChunkLayout.chunk_text(record), "revenue in Q3 — €")
+
+    def test_settings_match_only_their_own_layout(self):
+        hnsw = VectorIndexSettings(algorithm="hnsw", m=32)
+        self.assertTrue(hnsw.matches(hnsw.schema(8)))
+        self.assertFalse(VectorIndexSettings(algorithm="hnsw").matches(hnsw.schema(8)))
+        self.assertFalse(VectorIndexSettings().matches(hnsw.schema(8)))
+
+
+if __name__ == "__main__":
+    unittest.main()